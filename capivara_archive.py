@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - ARQUIVO COLUNAR DE JOGOS ENCERRADOS
+Jogos que não estão mais em andamento saem do jogos.json e vão para
+data/arquivo/, um arquivo binário por coluna (largura fixa, na ordem de
+bytes da máquina, como array.tobytes):
+
+    • id_jogo, numero_jogadores, status (índice na tabela de strings),
+      data_inicio/data_fim (microssegundos desde 1970), pontos_meta,
+      jogadores/pontuacao/partidas_vencidas (4 posições por jogo, 0 = vazia),
+      vencedor_id (0 = nenhum), total_rodadas
+    • rodadas.idx + rodadas.bin - rodadas de cada jogo (bytes de
+      capivara_replay), coluna de tamanho variável
+    • nomes_ids.bin + nomes.idx + nomes.bin - tabela de strings com o
+      nome_usuario de cada jogador na data do arquivamento
+    • placar_*.bin - totais por usuário (base das estatísticas e do ranking,
+      lidos na inicialização sem percorrer os jogos)
+    • manifesto.json - total de linhas, tabelas de status/tipos de vitória,
+      resumo e os IDs do último lote
+
+As colunas são lidas por mmap como memoryview tipada: as análises percorrem
+milhões de jogos sem JSON e sem criar objetos Game. O manifesto é gravado
+por último; bytes além do total do manifesto (gravação interrompida) são
+descartados no próximo arquivamento.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+
+from capivara_model import Game, Rodada
+from capivara_storage import escrever_json_atomico
+
+VERSAO_ARQUIVO = 1
+MAX_JOGADORES = 4
+SEM_DATA = -(1 << 63)
+EPOCA = datetime(1970, 1, 1)
+MICROSSEGUNDO = timedelta(microseconds=1)
+
+# (nome, formato de array/memoryview, valores por jogo)
+COLUNAS = (
+    ("id_jogo", "q", 1),
+    ("numero_jogadores", "b", 1),
+    ("status", "B", 1),
+    ("data_inicio", "q", 1),
+    ("data_fim", "q", 1),
+    ("pontos_meta", "h", 1),
+    ("jogadores", "i", MAX_JOGADORES),
+    ("pontuacao", "i", MAX_JOGADORES),
+    ("partidas_vencidas", "h", MAX_JOGADORES),
+    ("vencedor_id", "i", 1),
+    ("total_rodadas", "h", 1),
+)
+FORMATO_COLUNA = {nome: (formato, largura) for nome, formato, largura in COLUNAS}
+
+CAMPOS_PLACAR = ("jogos", "jogos_vencidos", "partidas", "partidas_vencidas", "pontos")
+
+# Cabeçalho de cada rodada em rodadas.bin: numero, vencedor_id, tipo_vitoria
+# (índice na tabela; 255 = nenhum), pontos, tamanho dos movimentos
+RODADA = struct.Struct("<HiBhH")
+SEM_TIPO = 255
+
+
+class ArchiveError(Exception):
+    """Arquivo de jogos inconsistente ou em versão desconhecida"""
+
+
+def data_para_micro(texto):
+    if not texto:
+        return SEM_DATA
+    try:
+        return (datetime.fromisoformat(texto) - EPOCA) // MICROSSEGUNDO
+    except (TypeError, ValueError):
+        return SEM_DATA
+
+
+def micro_para_data(valor):
+    return None if valor == SEM_DATA else (EPOCA + valor * MICROSSEGUNDO).isoformat()
+
+
+class GameArchive:
+    """Arquivo colunar em ``pasta``, lido por mmap"""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.manifest_path = pasta / "manifesto.json"
+        self.mapas = {}
+        self.reload()
+
+    def reload(self):
+        """Relê o manifesto (arquivo alterado por outro processo)"""
+        self.fechar()
+        self.manifest = self._novo_manifesto()
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("versao") != VERSAO_ARQUIVO:
+                raise ArchiveError(f"Versão do arquivo desconhecida: {self.manifest.get('versao')}")
+
+    @staticmethod
+    def _novo_manifesto():
+        return {
+            "versao": VERSAO_ARQUIVO,
+            "total": 0,
+            "bytes_rodadas": 0,
+            "total_nomes": 0,
+            "bytes_nomes": 0,
+            "total_placar": 0,
+            "status": [],
+            "tipos_vitoria": [],
+            "max_id": 0,
+            "por_jogadores": {},
+            "por_status": {},
+            "rodadas": 0,
+            "ultimo_lote": []
+        }
+
+    def __len__(self):
+        return self.manifest["total"]
+
+    @property
+    def max_id(self):
+        return self.manifest["max_id"]
+
+    # ------------------------------------------------------------------
+    # Leitura (mmap)
+    # ------------------------------------------------------------------
+
+    def _mapa(self, arquivo):
+        mapa = self.mapas.get(arquivo)
+        if mapa is None:
+            path = self.pasta / arquivo
+            if not path.exists() or path.stat().st_size == 0:
+                return b""
+            with open(path, 'rb') as f:
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapas[arquivo] = mapa
+        return mapa
+
+    def _view(self, arquivo, formato, quantidade):
+        tamanho = quantidade * struct.calcsize(formato)
+        mapa = self._mapa(arquivo)
+        if len(mapa) < tamanho:
+            raise ArchiveError(f"{arquivo}: {len(mapa)} bytes, esperados {tamanho}")
+        return memoryview(mapa)[:tamanho].cast(formato)
+
+    def coluna(self, nome):
+        """memoryview tipada da coluna (``largura`` valores por jogo, em sequência)"""
+        formato, largura = FORMATO_COLUNA[nome]
+        return self._view(f"{nome}.bin", formato, len(self) * largura)
+
+    def placar(self):
+        """{campo: memoryview} dos totais por usuário (campo "id_usuario" incluso)"""
+        total = self.manifest["total_placar"]
+        colunas = {"id_usuario": self._view("placar_id_usuario.bin", "i", total)}
+        for campo in CAMPOS_PLACAR:
+            colunas[campo] = self._view(f"placar_{campo}.bin", "q", total)
+        return colunas
+
+    def nomes(self):
+        """{id_usuario: nome_usuario} da tabela de strings"""
+        total = self.manifest["total_nomes"]
+        ids = self._view("nomes_ids.bin", "i", total)
+        offsets = self._view("nomes.idx", "Q", total + 1) if total else []
+        dados = self._mapa("nomes.bin")
+        return {ids[i]: bytes(dados[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(total)}
+
+    def fechar(self):
+        """Fecha os mapas (necessário antes de gravar no Windows)"""
+        for mapa in self.mapas.values():
+            try:
+                mapa.close()
+            except BufferError:
+                pass  # ainda há memoryviews em uso: o coletor fecha depois
+        self.mapas = {}
+
+    # ------------------------------------------------------------------
+    # Análises sobre as colunas
+    # ------------------------------------------------------------------
+
+    def vitorias_por_usuario(self):
+        vitorias = Counter(self.coluna("vencedor_id"))
+        vitorias.pop(0, None)
+        return vitorias
+
+    def participacoes_por_usuario(self):
+        participacoes = Counter(self.coluna("jogadores"))
+        participacoes.pop(0, None)
+        return participacoes
+
+    def media_rodadas(self):
+        return sum(self.coluna("total_rodadas")) / len(self) if len(self) else 0.0
+
+    def contagem_por_jogadores(self):
+        return {int(k): v for k, v in self.manifest["por_jogadores"].items()}
+
+    def contagem_por_status(self):
+        return dict(self.manifest["por_status"])
+
+    def status_por_jogo(self):
+        tabela = self.manifest["status"]
+        return [tabela[codigo] for codigo in self.coluna("status")]
+
+    # ------------------------------------------------------------------
+    # Reconstrução de jogos
+    # ------------------------------------------------------------------
+
+    def _rodadas(self, linha, offsets, dados):
+        tipos = self.manifest["tipos_vitoria"]
+        rodadas = []
+        pos = offsets[linha]
+        fim = offsets[linha + 1]
+        while pos < fim:
+            numero, vencedor_id, tipo, pontos, tamanho = RODADA.unpack_from(dados, pos)
+            pos += RODADA.size
+            rodadas.append(Rodada(numero, vencedor_id or None, pontos,
+                                  None if tipo == SEM_TIPO else tipos[tipo],
+                                  dados[pos:pos + tamanho]))
+            pos += tamanho
+        return rodadas
+
+    def iter_games(self, linhas=None):
+        """Gera objetos Game (todas as linhas ou só as indicadas)"""
+        if not len(self):
+            return
+        colunas = {nome: self.coluna(nome) for nome, _, _ in COLUNAS}
+        offsets = self._view("rodadas.idx", "Q", len(self) + 1)
+        dados = self._mapa("rodadas.bin")
+        status = self.manifest["status"]
+        for linha in (range(len(self)) if linhas is None else linhas):
+            num = colunas["numero_jogadores"][linha]
+            base = linha * MAX_JOGADORES
+            yield Game(
+                colunas["id_jogo"][linha], num, status[colunas["status"][linha]],
+                micro_para_data(colunas["data_inicio"][linha]),
+                micro_para_data(colunas["data_fim"][linha]),
+                colunas["pontos_meta"][linha],
+                colunas["jogadores"][base:base + num].tolist(),
+                colunas["pontuacao"][base:base + num].tolist(),
+                colunas["vencedor_id"][linha] or None,
+                colunas["total_rodadas"][linha],
+                colunas["partidas_vencidas"][base:base + num].tolist(),
+                self._rodadas(linha, offsets, dados)
+            )
+
+    def game(self, id_jogo):
+        """Game arquivado pelo id (None se não estiver no arquivo)"""
+        if not len(self):
+            return None
+        try:
+            linha = self.coluna("id_jogo").tolist().index(id_jogo)
+        except ValueError:
+            return None
+        return next(self.iter_games([linha]))
+
+    # ------------------------------------------------------------------
+    # Gravação
+    # ------------------------------------------------------------------
+
+    def _anexar(self, arquivo, tamanho_valido, dados):
+        """Trunca restos de gravação interrompida e anexa ``dados``"""
+        path = self.pasta / arquivo
+        with open(path, 'ab') as f:
+            f.truncate(tamanho_valido)
+            f.write(dados)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _bytes(formato, valores):
+        return array(formato, valores).tobytes()
+
+    def _gravar(self, arquivo, formato, valores):
+        path = self.pasta / arquivo
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(self._bytes(formato, valores))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def append(self, games, nomes=None):
+        """Arquiva ``games`` e atualiza tabelas, placar e manifesto.
+
+        ``nomes`` é {id_usuario: nome_usuario} dos jogadores (tabela de strings).
+        """
+        games = list(games)
+        if not games:
+            return 0
+        self.fechar()
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        manifest = dict(self.manifest)
+        status = list(manifest["status"])
+        tipos = list(manifest["tipos_vitoria"])
+        indice_status = {s: i for i, s in enumerate(status)}
+        indice_tipos = {t: i for i, t in enumerate(tipos)}
+
+        valores = {nome: [] for nome, _, _ in COLUNAS}
+        rodadas = bytearray()
+        offsets = []
+        base_rodadas = manifest["bytes_rodadas"]
+        por_jogadores = dict(manifest["por_jogadores"])
+        por_status = dict(manifest["por_status"])
+        for game in games:
+            if game.numero_jogadores > MAX_JOGADORES:
+                raise ArchiveError(f"Jogo {game.id}: mais de {MAX_JOGADORES} jogadores")
+            if game.status not in indice_status:
+                indice_status[game.status] = len(status)
+                status.append(game.status)
+            vazio = MAX_JOGADORES - len(game.jogadores)
+            valores["id_jogo"].append(game.id)
+            valores["numero_jogadores"].append(game.numero_jogadores)
+            valores["status"].append(indice_status[game.status])
+            valores["data_inicio"].append(data_para_micro(game.data_inicio))
+            valores["data_fim"].append(data_para_micro(game.data_fim))
+            valores["pontos_meta"].append(game.pontos_meta)
+            valores["jogadores"].extend(list(game.jogadores) + [0] * vazio)
+            valores["pontuacao"].extend(list(game.pontuacao) + [0] * vazio)
+            valores["partidas_vencidas"].extend(list(game.partidas_vencidas) + [0] * vazio)
+            valores["vencedor_id"].append(game.vencedor_id or 0)
+            valores["total_rodadas"].append(game.total_rodadas)
+
+            for rodada in game.rodadas:
+                tipo = SEM_TIPO
+                if rodada.tipo_vitoria is not None:
+                    if rodada.tipo_vitoria not in indice_tipos:
+                        indice_tipos[rodada.tipo_vitoria] = len(tipos)
+                        tipos.append(rodada.tipo_vitoria)
+                    tipo = indice_tipos[rodada.tipo_vitoria]
+                rodadas += RODADA.pack(rodada.numero, rodada.vencedor_id or 0, tipo,
+                                       rodada.pontos, len(rodada.movimentos))
+                rodadas += rodada.movimentos
+            offsets.append(base_rodadas + len(rodadas))
+
+            chave = str(game.numero_jogadores)
+            por_jogadores[chave] = por_jogadores.get(chave, 0) + 1
+            por_status[game.status] = por_status.get(game.status, 0) + 1
+            manifest["rodadas"] += game.total_rodadas
+            manifest["max_id"] = max(manifest["max_id"], game.id)
+
+        total = manifest["total"]
+        for nome, formato, largura in COLUNAS:
+            self._anexar(f"{nome}.bin", total * largura * struct.calcsize(formato),
+                         self._bytes(formato, valores[nome]))
+        self._anexar("rodadas.idx", (total + 1) * 8 if total else 0,
+                     self._bytes("Q", ([0] if not total else []) + offsets))
+        self._anexar("rodadas.bin", base_rodadas, bytes(rodadas))
+
+        self._gravar_nomes(manifest, nomes or {}, games)
+        self._gravar_placar(manifest, games)
+
+        manifest.update(total=total + len(games), bytes_rodadas=base_rodadas + len(rodadas),
+                        status=status, tipos_vitoria=tipos, por_jogadores=por_jogadores,
+                        por_status=por_status, ultimo_lote=[g.id for g in games])
+        escrever_json_atomico(self.manifest_path, manifest)
+        self.manifest = manifest
+        return len(games)
+
+    def _gravar_nomes(self, manifest, nomes, games):
+        """Acrescenta à tabela de strings os jogadores ainda sem nome"""
+        existentes = self.nomes() if manifest["total_nomes"] else {}
+        novos = []
+        for game in games:
+            for user_id in game.jogadores:
+                if user_id not in existentes and user_id in nomes:
+                    existentes[user_id] = nomes[user_id]
+                    novos.append(user_id)
+        self.fechar()
+        if not novos:
+            return
+        total = manifest["total_nomes"]
+        base = manifest["bytes_nomes"]
+        blob = bytearray()
+        offsets = []
+        for user_id in novos:
+            blob += existentes[user_id].encode('utf-8')
+            offsets.append(base + len(blob))
+        self._anexar("nomes_ids.bin", total * 4, self._bytes("i", novos))
+        self._anexar("nomes.idx", (total + 1) * 8 if total else 0,
+                     self._bytes("Q", ([0] if not total else []) + offsets))
+        self._anexar("nomes.bin", base, bytes(blob))
+        manifest.update(total_nomes=total + len(novos), bytes_nomes=base + len(blob))
+
+    def _gravar_placar(self, manifest, games):
+        """Soma a contribuição dos jogos aos totais por usuário e regrava o placar"""
+        placar = {}
+        if manifest["total_placar"]:
+            colunas = self.placar()
+            for linha, user_id in enumerate(colunas["id_usuario"]):
+                placar[user_id] = [colunas[campo][linha] for campo in CAMPOS_PLACAR]
+            del colunas
+        self.fechar()
+
+        def entrada(user_id):
+            if user_id not in placar:
+                placar[user_id] = [0] * len(CAMPOS_PLACAR)
+            return placar[user_id]
+
+        for game in games:
+            for user_id, pontos, vencidas in zip(game.jogadores, game.pontuacao, game.partidas_vencidas):
+                valores = entrada(user_id)
+                valores[0] += 1
+                valores[2] += game.total_rodadas
+                valores[3] += vencidas
+                valores[4] += pontos
+            if game.vencedor_id is not None:
+                entrada(game.vencedor_id)[1] += 1
+
+        ids = sorted(placar)
+        self._gravar("placar_id_usuario.bin", "i", ids)
+        for indice, campo in enumerate(CAMPOS_PLACAR):
+            self._gravar(f"placar_{campo}.bin", "q", (placar[i][indice] for i in ids))
+        manifest["total_placar"] = len(ids)
+
+    def clear(self):
+        """Apaga o arquivo inteiro (ex.: restauração de backup com todos os jogos)"""
+        self.fechar()
+        if self.pasta.exists():
+            shutil.rmtree(self.pasta)
+        self.manifest = self._novo_manifesto()
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - BACKUPS INCREMENTAIS
+Cada backup é uma pasta em data/backups/ com:
+
+    • usuarios.jsonl.gz / jogos.jsonl.gz - um registro por linha, gzip;
+      no backup incremental, apenas os registros alterados desde o anterior
+    • sql/ - segmentos do log SQL ainda não copiados por backups anteriores
+    • estado.json.gz - CRC32 de cada registro existente (base do próximo
+      incremental) e os IDs incluídos neste backup
+    • manifesto.json - tipo, backup base, contagens e SHA-256 dos arquivos
+
+A restauração percorre a cadeia (completo + incrementais) em streaming,
+sem carregar os registros em memória: só os IDs ficam em conjuntos.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from datetime import datetime
+
+from capivara_storage import escrever_json_atomico, serializar
+
+COLECOES = {
+    "usuarios": "id_usuario",
+    "jogos": "id_jogo",
+}
+
+BLOCO_LEITURA = 1024 * 1024
+
+
+class BackupError(Exception):
+    """Backup inexistente, corrompido ou com cadeia incompleta"""
+
+
+def sha256_arquivo(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(BLOCO_LEITURA), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+class BackupManager:
+    """Cria, verifica e restaura backups em ``backup_dir``"""
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+
+    def manifest_path(self, nome):
+        return self.backup_dir / nome / "manifesto.json"
+
+    def read_manifest(self, nome):
+        path = self.manifest_path(nome)
+        if not path.exists():
+            raise BackupError(f"Backup '{nome}' não encontrado")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list(self):
+        """Manifestos dos backups existentes, do mais antigo ao mais recente"""
+        if not self.backup_dir.exists():
+            return []
+        return [self.read_manifest(p.name) for p in sorted(self.backup_dir.iterdir())
+                if (p / "manifesto.json").exists()]
+
+    def latest(self):
+        manifests = self.list()
+        return manifests[-1] if manifests else None
+
+    def read_state(self, nome):
+        with gzip.open(self.backup_dir / nome / "estado.json.gz", 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def chain(self, nome):
+        """Cadeia de manifestos do backup completo até ``nome``"""
+        cadeia = []
+        while nome is not None:
+            manifest = self.read_manifest(nome)
+            cadeia.append(manifest)
+            nome = manifest["base"]
+        cadeia.reverse()
+        return cadeia
+
+    # ------------------------------------------------------------------
+    # Criação
+    # ------------------------------------------------------------------
+
+    def create(self, users, games, sql_log=None, full=False):
+        """Grava um backup (incremental sobre o último, ou completo).
+
+        Retorna o manifesto gravado.
+        """
+        anterior = None if full else self.latest()
+        estado_anterior = self.read_state(anterior["nome"]) if anterior else None
+
+        nome = "backup_" + datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        pasta = self.backup_dir / nome
+        pasta.mkdir(parents=True)
+
+        manifest = {
+            "nome": nome,
+            "sistema": "Capivara Game LBD",
+            "data_backup": datetime.now().isoformat(),
+            "tipo": "incremental" if anterior else "completo",
+            "base": anterior["nome"] if anterior else None,
+            "registros": {},
+            "removidos": {},
+            "segmentos_sql": [],
+            "arquivos": {}
+        }
+        estado = {"incluidos": {}}
+
+        for colecao, registros in (("usuarios", users), ("jogos", games)):
+            chave = COLECOES[colecao]
+            crc_anterior = estado_anterior[colecao] if estado_anterior else {}
+            crcs = {}
+            incluidos = []
+            with gzip.open(pasta / f"{colecao}.jsonl.gz", 'wt', encoding='utf-8') as f:
+                for registro in registros:
+                    dados = serializar(registro)
+                    linha = json.dumps(dados, ensure_ascii=False, sort_keys=True)
+                    registro_id = str(dados[chave])
+                    crc = zlib.crc32(linha.encode('utf-8'))
+                    crcs[registro_id] = crc
+                    if crc_anterior.get(registro_id) != crc:
+                        f.write(linha + "\n")
+                        incluidos.append(registro_id)
+            estado[colecao] = crcs
+            estado["incluidos"][colecao] = incluidos
+            manifest["registros"][colecao] = len(incluidos)
+            manifest["removidos"][colecao] = sum(1 for k in crc_anterior if k not in crcs)
+
+        with gzip.open(pasta / "estado.json.gz", 'wt', encoding='utf-8') as f:
+            json.dump(estado, f)
+
+        if sql_log is not None:
+            copiados = set()
+            if anterior:
+                for item in self.chain(anterior["nome"]):
+                    copiados.update(item["segmentos_sql"])
+            sql_log.flush()
+            ativo = sql_log.manifest["ativo"]
+            (pasta / "sql").mkdir()
+            for numero in sql_log.segments():
+                segmento = sql_log.segment_path(numero)
+                # Segmentos fechados não mudam: cada um é copiado uma única vez
+                if segmento.name in copiados and numero != ativo:
+                    continue
+                with open(segmento, 'rb') as src, gzip.open(pasta / "sql" / (segmento.name + ".gz"), 'wb') as dst:
+                    shutil.copyfileobj(src, dst, BLOCO_LEITURA)
+                if numero != ativo:
+                    manifest["segmentos_sql"].append(segmento.name)
+
+        for path in sorted(pasta.rglob("*")):
+            if path.is_file():
+                manifest["arquivos"][path.relative_to(pasta).as_posix()] = {
+                    "bytes": path.stat().st_size,
+                    "sha256": sha256_arquivo(path)
+                }
+        escrever_json_atomico(pasta / "manifesto.json", manifest)
+        return manifest
+
+    # ------------------------------------------------------------------
+    # Verificação e restauração
+    # ------------------------------------------------------------------
+
+    def verify(self, nome):
+        """Confere os checksums de toda a cadeia; retorna a lista de problemas"""
+        problemas = []
+        try:
+            cadeia = self.chain(nome)
+        except BackupError as e:
+            return [str(e)]
+        for manifest in cadeia:
+            pasta = self.backup_dir / manifest["nome"]
+            for arquivo, info in manifest["arquivos"].items():
+                path = pasta / arquivo
+                if not path.exists():
+                    problemas.append(f"{manifest['nome']}/{arquivo}: ausente")
+                elif sha256_arquivo(path) != info["sha256"]:
+                    problemas.append(f"{manifest['nome']}/{arquivo}: checksum inválido")
+        return problemas
+
+    def restore(self, nome, users_file, games_file, verify=True):
+        """Reconstrói usuarios.json/jogos.json a partir da cadeia do backup.
+
+        Retorna {colecao: quantidade de registros restaurados}.
+        """
+        if verify:
+            problemas = self.verify(nome)
+            if problemas:
+                raise BackupError("; ".join(problemas))
+
+        cadeia = self.chain(nome)
+        estados = [self.read_state(m["nome"]) for m in cadeia]
+        final = estados[-1]
+        totais = {}
+
+        for colecao, destino in (("usuarios", users_file), ("jogos", games_file)):
+            existentes = set(final[colecao])
+            # IDs regravados por backups posteriores da cadeia
+            posteriores = [set() for _ in cadeia]
+            acumulado = set()
+            for i in range(len(cadeia) - 1, -1, -1):
+                posteriores[i] = set(acumulado)
+                acumulado.update(estados[i]["incluidos"][colecao])
+
+            chave = COLECOES[colecao]
+            tmp_path = destino.with_name(destino.name + ".tmp")
+            total = 0
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                out.write("[")
+                for manifest, ignorar in zip(cadeia, posteriores):
+                    origem = self.backup_dir / manifest["nome"] / f"{colecao}.jsonl.gz"
+                    with gzip.open(origem, 'rt', encoding='utf-8') as f:
+                        for linha in f:
+                            registro_id = str(json.loads(linha)[chave])
+                            if registro_id in ignorar or registro_id not in existentes:
+                                continue
+                            out.write(",\n" if total else "\n")
+                            out.write(linha.rstrip("\n"))
+                            total += 1
+                out.write("\n]\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, destino)
+            totais[colecao] = total
+        return totais
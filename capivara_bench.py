@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - BENCHMARKS
+Gera bases sintéticas (usuários + jogos finalizados no formato v2) em uma
+pasta temporária e mede, para cada tamanho, no modo JSON (sem PostgreSQL):
+
+    • carga: DatabaseInterface() com load_data e índices
+    • inserção: execute_json_operation (create_user / create_game) por segundo
+    • busca: search_users fria (construção do índice) e quente (p50/p95)
+    • listagens: list_users e game_stats do menu (saída descartada)
+    • backup: completo e incremental, tempo e pico de memória (tracemalloc)
+    • arquivo: mover os jogos encerrados para o arquivo colunar, carga com
+      o arquivo e varredura (vitórias por usuário + média de rodadas)
+
+e a velocidade do simulador (simular_lote, jogos/s) e do replay das
+rodadas gravadas (movimentos/s). O teste de concorrência roda ``--writers``
+processos escrevendo na mesma pasta (usuários novos e incrementos em um
+jogo compartilhado, com nova tentativa em ConflictError) e confere ao final
+que nenhuma escrita se perdeu e nenhum id se repetiu. O resultado é gravado
+em JSON para comparar commits: ``--compare anterior.json`` aponta as
+métricas que pioraram além da tolerância.
+
+Uso:
+    python capivara_bench.py --sizes 1000 100000 --output bench.json
+    python capivara_bench.py --sizes 1000 --compare bench.json
+    python capivara_bench.py --sizes --sim-games 0 --writers 8 --writes 1000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import capivara_domino as domino
+import capivara_replay as replay
+from capivara_lbd_final import CapivaraGameLBD, DatabaseInterface
+from capivara_model import Game
+from capivara_storage import ConflictError, escrever_json_atomico
+
+TAMANHOS_PADRAO = (1000, 100000, 1000000)
+INSERCOES_PADRAO = 2000
+BUSCAS_PADRAO = 200
+REPETICOES_LISTAGEM = 5
+JOGOS_SIMULACAO = 2000
+TOLERANCIA_PADRAO = 0.10
+ESCRITORES_PADRAO = 4
+ESCRITAS_PADRAO = 500
+# Limite baixo para que os escritores também compactem concorrentemente
+COMPACTACAO_CONCORRENCIA = 50
+
+NOMES = ("ana", "bruno", "carla", "diego", "elisa", "fabio", "gabriela", "heitor",
+         "iris", "joao", "karina", "lucas", "marina", "nicolas", "olivia", "pedro")
+SOBRENOMES = ("Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa",
+              "Almeida", "Ribeiro", "Carvalho")
+
+
+# ----------------------------------------------------------------------
+# Bases sintéticas
+# ----------------------------------------------------------------------
+
+def gerar_usuarios(n, rng):
+    inicio = datetime(2024, 1, 1)
+    usuarios = []
+    for i in range(1, n + 1):
+        nome = NOMES[i % len(NOMES)]
+        usuarios.append({
+            "id_usuario": i,
+            "nome_usuario": f"{nome}{i}",
+            "nome_completo": f"{nome.capitalize()} {rng.choice(SOBRENOMES)}",
+            "email": f"{nome}{i}@capivara.com",
+            "senha_hash": f"hash{i}",
+            "data_cadastro": (inicio + timedelta(minutes=i)).isoformat(),
+            "ativo": rng.random() > 0.05
+        })
+    return usuarios
+
+
+def gerar_jogos(n, num_usuarios, rng):
+    """Jogos finalizados no formato atual (Game.to_dict)"""
+    agora = datetime(2025, 1, 1).isoformat()
+    jogos = []
+    for i in range(1, n + 1):
+        num_jogadores = rng.choice((2, 3, 4))
+        jogadores = tuple(rng.sample(range(1, num_usuarios + 1), num_jogadores))
+        vencedor = rng.randrange(num_jogadores)
+        pontuacao = tuple(domino.PONTOS_META + rng.randrange(30) if p == vencedor
+                          else rng.randrange(domino.PONTOS_META) for p in range(num_jogadores))
+        vencidas = [rng.randrange(3) for _ in range(num_jogadores)]
+        vencidas[vencedor] += 3
+        jogos.append(Game(i, num_jogadores, "finalizado", agora, agora, domino.PONTOS_META,
+                          jogadores, pontuacao, jogadores[vencedor], sum(vencidas),
+                          tuple(vencidas)).to_dict())
+    return jogos
+
+
+def gravar_base(pasta, tamanho, seed):
+    """Grava usuarios.json e jogos.json com ``tamanho`` registros cada"""
+    rng = random.Random(seed)
+    escrever_json_atomico(pasta / "usuarios.json", gerar_usuarios(tamanho, rng))
+    escrever_json_atomico(pasta / "jogos.json", gerar_jogos(tamanho, tamanho, rng))
+
+
+# ----------------------------------------------------------------------
+# Medição
+# ----------------------------------------------------------------------
+
+def cronometrar(func, repeticoes):
+    amostras = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        amostras.append(time.perf_counter() - inicio)
+    return amostras
+
+
+def percentis_ms(amostras):
+    ordenadas = sorted(amostras)
+    def percentil(p):
+        return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))] * 1000
+    return {"p50": percentil(0.50), "p95": percentil(0.95), "max": ordenadas[-1] * 1000}
+
+
+def medir_memoria(func):
+    """Executa ``func`` e retorna (segundos, pico de memória alocada em MB)"""
+    tracemalloc.start()
+    try:
+        inicio = time.perf_counter()
+        func()
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return segundos, pico / (1024 * 1024)
+
+
+def medir_tamanho(tamanho, args, silencio):
+    resultado = {"usuarios": tamanho, "jogos": tamanho}
+    with tempfile.TemporaryDirectory(prefix="capivara_bench_") as tmp:
+        pasta = Path(tmp)
+        inicio = time.perf_counter()
+        gravar_base(pasta, tamanho, args.seed)
+        resultado["geracao_s"] = time.perf_counter() - inicio
+        resultado["arquivos_mb"] = sum(p.stat().st_size for p in pasta.glob("*.json")) / (1024 * 1024)
+
+        with redirect_stdout(silencio):
+            inicio = time.perf_counter()
+            db = DatabaseInterface(data_dir=pasta, use_postgres=False)
+            resultado["carga_s"] = time.perf_counter() - inicio
+        resultado["modo_armazenamento"] = db.storage_mode
+
+        try:
+            rng = random.Random(args.seed)
+            total = min(args.inserts, tamanho)
+
+            def inserir_usuarios():
+                for i in range(total):
+                    with db.lock:
+                        db.execute_json_operation("create_user", {
+                            "nome_usuario": f"bench{i}", "nome_completo": f"Bench {i}",
+                            "email": f"bench{i}@capivara.com", "senha_hash": "hash"
+                        })
+            resultado["insercao_usuarios_por_s"] = total / cronometrar(inserir_usuarios, 1)[0]
+
+            def inserir_jogos():
+                for _ in range(total):
+                    num_jogadores = rng.choice((2, 3, 4))
+                    with db.lock:
+                        db.execute_json_operation("create_game", {
+                            "numero_jogadores": num_jogadores,
+                            "participantes": rng.sample(range(1, tamanho + 1), num_jogadores)
+                        })
+            resultado["insercao_jogos_por_s"] = total / cronometrar(inserir_jogos, 1)[0]
+
+            # Termos reais em quatro formas: exato, prefixo, substring e com erro
+            amostra = [u["nome_usuario"] for u in rng.sample(db.users, min(args.searches, len(db.users)))]
+            termos = [t if i % 4 == 0 else t[:4] if i % 4 == 1 else t[1:-1] if i % 4 == 2
+                      else t[:2] + t[3:] for i, t in enumerate(amostra)]
+            db.search_index = None
+            resultado["busca_fria_s"] = cronometrar(lambda: db.search_users(termos[0]), 1)[0]
+            amostras = []
+            for termo in termos:
+                amostras.extend(cronometrar(lambda: db.search_users(termo), 1))
+            resultado["busca_ms"] = percentis_ms(amostras)
+
+            app = CapivaraGameLBD(db=db)
+            with redirect_stdout(silencio):
+                resultado["list_users_ms"] = percentis_ms(cronometrar(app.list_users, REPETICOES_LISTAGEM))
+                resultado["game_stats_ms"] = percentis_ms(cronometrar(app.game_stats, REPETICOES_LISTAGEM))
+
+            segundos, pico = medir_memoria(lambda: db.create_backup(full=True))
+            resultado["backup_completo_s"] = segundos
+            resultado["backup_completo_pico_mb"] = pico
+            db.execute_json_operation("create_game", {"numero_jogadores": 2, "participantes": [1, 2]})
+            segundos, pico = medir_memoria(db.create_backup)
+            resultado["backup_incremental_s"] = segundos
+            resultado["backup_incremental_pico_mb"] = pico
+
+            resultado["arquivamento_s"] = cronometrar(db.archive_finished_games, 1)[0]
+            resultado["analise_arquivo_ms"] = percentis_ms(cronometrar(
+                lambda: (db.archive.vitorias_por_usuario(), db.archive.media_rodadas()),
+                REPETICOES_LISTAGEM))
+        finally:
+            with redirect_stdout(silencio):
+                db.close()
+
+        with redirect_stdout(silencio):
+            inicio = time.perf_counter()
+            db = DatabaseInterface(data_dir=pasta, use_postgres=False)
+            resultado["carga_com_arquivo_s"] = time.perf_counter() - inicio
+            db.close()
+    return resultado
+
+
+def medir_simulacao(num_jogadores, num_jogos, seed):
+    inicio = time.perf_counter()
+    domino.simular_lote(num_jogadores, num_jogos, seed)
+    segundos = time.perf_counter() - inicio
+    return {"jogadores": num_jogadores, "jogos": num_jogos, "segundos": segundos,
+            "jogos_por_s": num_jogos / segundos}
+
+
+def medir_replay(num_jogadores, num_partidas, seed):
+    """Reconstrói o estado final de rodadas gravadas como em simulate_game"""
+    rng = random.Random(seed)
+    distribuicoes = domino.gerar_distribuicoes(num_jogadores, rng)
+    rodadas = []
+    for _ in range(num_partidas):
+        ids, maos, monte, primeiro = next(distribuicoes)
+        resultado = domino.jogar_partida(num_jogadores, rng, distribuicao=(maos, monte, primeiro),
+                                         registrar=True)
+        rodadas.append(replay.codificar(resultado.movimentos, primeiro, [i - 1 for i in ids]))
+    inicio = time.perf_counter()
+    movimentos = 0
+    for dados in rodadas:
+        partida = replay.Replay(dados, num_jogadores)
+        partida.estado()
+        movimentos += len(partida)
+    segundos = time.perf_counter() - inicio
+    return {"partidas": num_partidas, "movimentos": movimentos, "segundos": segundos,
+            "bytes_por_partida": sum(map(len, rodadas)) / num_partidas,
+            "movimentos_por_s": movimentos / segundos}
+
+
+def escritor(pasta, indice, escritas, id_jogo):
+    """Processo do teste de concorrência: alterna um usuário novo e um
+    incremento na pontuação do jogo compartilhado (leitura fora do lock,
+    nova tentativa quando outro processo gravou antes)"""
+    with open(os.devnull, 'w', encoding='utf-8') as silencio, redirect_stdout(silencio):
+        db = DatabaseInterface(data_dir=pasta, use_postgres=False)
+        db.journal.compact_threshold = COMPACTACAO_CONCORRENCIA
+        conflitos = 0
+        inicio = time.perf_counter()
+        for i in range(escritas):
+            if i % 2 == 0:
+                db.execute_json_operation("create_user", {
+                    "nome_usuario": f"escritor{indice}_{i}", "nome_completo": f"Escritor {indice}",
+                    "email": f"escritor{indice}_{i}@capivara.com", "senha_hash": "hash"
+                })
+                continue
+            while True:
+                jogo = Game.from_dict(db.get_game(id_jogo).to_dict())
+                jogo.pontuacao = (jogo.pontuacao[0] + 1,) + jogo.pontuacao[1:]
+                try:
+                    db.update_game(jogo)
+                    break
+                except ConflictError:
+                    conflitos += 1
+        segundos = time.perf_counter() - inicio
+        db.close()
+    return {"segundos": segundos, "conflitos": conflitos}
+
+
+def medir_concorrencia(processos, escritas, silencio):
+    """``processos`` escritores simultâneos na mesma pasta (modo journal)"""
+    with tempfile.TemporaryDirectory(prefix="capivara_bench_") as tmp:
+        pasta = Path(tmp)
+        with redirect_stdout(silencio):
+            db = DatabaseInterface(data_dir=pasta, use_postgres=False)
+            db.execute_json_operation("create_game", {"numero_jogadores": 2, "participantes": [1, 2]})
+            id_jogo = db.last_insert_id
+            usuarios_iniciais = len(db.users)
+            db.close()
+
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            tarefas = [executor.submit(escritor, pasta, indice, escritas, id_jogo)
+                       for indice in range(processos)]
+            parciais = [tarefa.result() for tarefa in tarefas]
+        segundos = time.perf_counter() - inicio
+
+        with redirect_stdout(silencio):
+            db = DatabaseInterface(data_dir=pasta, use_postgres=False)
+            ids = [u["id_usuario"] for u in db.users]
+            nomes = {u["nome_usuario"] for u in db.users}
+            incrementos = db.get_game(id_jogo).pontuacao[0]
+            db.close()
+
+    usuarios_esperados = processos * ((escritas + 1) // 2)
+    incrementos_esperados = processos * (escritas // 2)
+    perdidas = sum(1 for indice in range(processos) for i in range(0, escritas, 2)
+                   if f"escritor{indice}_{i}" not in nomes)
+    return {
+        "processos": processos,
+        "escritas": processos * escritas,
+        "segundos": segundos,
+        "escritas_por_s": processos * escritas / segundos,
+        "conflitos": sum(p["conflitos"] for p in parciais),
+        "usuarios_perdidos": perdidas + max(0, usuarios_iniciais + usuarios_esperados - len(ids)),
+        "ids_repetidos": len(ids) - len(set(ids)),
+        "incrementos_perdidos": incrementos_esperados - incrementos,
+    }
+
+
+# ----------------------------------------------------------------------
+# Comparação entre execuções
+# ----------------------------------------------------------------------
+
+def metricas_planas(resultado, prefixo=""):
+    """{"100000.busca_ms.p95": valor} com todas as métricas numéricas"""
+    planas = {}
+    for chave, valor in resultado.items():
+        nome = f"{prefixo}{chave}"
+        if isinstance(valor, dict):
+            planas.update(metricas_planas(valor, nome + "."))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            planas[nome] = valor
+    return planas
+
+
+def comparar(atual, anterior, tolerancia):
+    """Lista de (métrica, anterior, atual, variação) que pioraram além da tolerância.
+
+    Métricas terminadas em ``_por_s`` são vazões (maior é melhor); as
+    demais são tempos ou memória (menor é melhor). Tamanhos de base que
+    não existem nas duas execuções são ignorados.
+    """
+    def planas(resultado):
+        return metricas_planas({"simulacao": resultado["simulacao"],
+                                "replay": resultado.get("replay", {}),
+                                "concorrencia": resultado.get("concorrencia", {}),
+                                **resultado["tamanhos"]})
+    planas_atual = planas(atual)
+    planas_anterior = planas(anterior)
+    piores = []
+    for nome, valor in planas_atual.items():
+        base = planas_anterior.get(nome)
+        # Contagens, custo de gerar a base, máximos (uma amostra só, ruidosos)
+        # e durações totais (dependem da quantidade; a vazão já as cobre)
+        if not base or nome.endswith((".usuarios", ".jogos", ".jogadores", ".partidas",
+                                      ".movimentos", ".segundos", "arquivos_mb", "geracao_s",
+                                      ".max", ".processos", ".escritas", ".conflitos")):
+            continue
+        variacao = valor / base - 1
+        if nome.endswith("_por_s"):
+            variacao = -variacao
+        if variacao > tolerancia:
+            piores.append((nome, base, valor, variacao))
+    return piores
+
+
+def commit_atual():
+    try:
+        resultado = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                   text=True, cwd=Path(__file__).parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return resultado.stdout.strip() or None
+
+
+def imprimir_resumo(tamanho, r):
+    print(f"   carga: {r['carga_s']:.2f}s | inserção: {r['insercao_usuarios_por_s']:,.0f} usuários/s, "
+          f"{r['insercao_jogos_por_s']:,.0f} jogos/s")
+    print(f"   busca: fria {r['busca_fria_s'] * 1000:.1f}ms, p50 {r['busca_ms']['p50']:.2f}ms, "
+          f"p95 {r['busca_ms']['p95']:.2f}ms")
+    print(f"   list_users p50: {r['list_users_ms']['p50']:.1f}ms | "
+          f"game_stats p50: {r['game_stats_ms']['p50']:.2f}ms")
+    print(f"   backup completo: {r['backup_completo_s']:.2f}s ({r['backup_completo_pico_mb']:.1f} MB) | "
+          f"incremental: {r['backup_incremental_s']:.2f}s ({r['backup_incremental_pico_mb']:.1f} MB)")
+    print(f"   arquivo: arquivamento {r['arquivamento_s']:.2f}s, carga {r['carga_com_arquivo_s']:.2f}s, "
+          f"análise p50 {r['analise_arquivo_ms']['p50']:.2f}ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do Capivara Game LBD (modo JSON)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(TAMANHOS_PADRAO),
+                        help="Tamanhos das bases sintéticas (usuários e jogos)")
+    parser.add_argument("--inserts", type=int, default=INSERCOES_PADRAO,
+                        help="Inserções medidas por coleção (limitadas ao tamanho da base)")
+    parser.add_argument("--searches", type=int, default=BUSCAS_PADRAO,
+                        help="Buscas medidas por base")
+    parser.add_argument("--sim-games", type=int, default=JOGOS_SIMULACAO,
+                        help="Jogos simulados na medição do simulador (0 desliga)")
+    parser.add_argument("--writers", type=int, default=ESCRITORES_PADRAO,
+                        help="Processos no teste de concorrência (0 desliga)")
+    parser.add_argument("--writes", type=int, default=ESCRITAS_PADRAO,
+                        help="Escritas por processo no teste de concorrência")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Arquivo JSON de resultados")
+    parser.add_argument("--compare", type=Path, help="Resultado anterior para comparação")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCIA_PADRAO,
+                        help="Piora relativa tolerada na comparação (padrão: 0.10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    resultados = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"inserts": args.inserts, "searches": args.searches,
+                       "sim_games": args.sim_games, "writers": args.writers,
+                       "writes": args.writes, "seed": args.seed},
+        "tamanhos": {},
+        "simulacao": {},
+        "replay": {},
+        "concorrencia": {}
+    }
+    falhou = False
+
+    with open(os.devnull, 'w', encoding='utf-8') as silencio:
+        for tamanho in args.sizes:
+            print(f"⏱️  Base com {tamanho:,} usuários e {tamanho:,} jogos...")
+            resultado = medir_tamanho(tamanho, args, silencio)
+            resultados["tamanhos"][str(tamanho)] = resultado
+            imprimir_resumo(tamanho, resultado)
+
+        if args.writers > 0:
+            print(f"⏱️  {args.writers} processos × {args.writes} escritas na mesma pasta...")
+            r = resultados["concorrencia"] = medir_concorrencia(args.writers, args.writes, silencio)
+            print(f"   {r['escritas_por_s']:,.0f} escritas/s, {r['conflitos']} conflito(s) resolvido(s)")
+            falhou = bool(r["usuarios_perdidos"] or r["ids_repetidos"] or r["incrementos_perdidos"])
+            if falhou:
+                print(f"❌ Escritas perdidas: {r['usuarios_perdidos']} usuário(s), "
+                      f"{r['incrementos_perdidos']} incremento(s); {r['ids_repetidos']} id(s) repetido(s)")
+            else:
+                print("✅ Nenhuma escrita perdida, nenhum id repetido")
+
+    if args.sim_games > 0:
+        resultados["simulacao"] = medir_simulacao(4, args.sim_games, args.seed)
+        print(f"🎲 Simulador: {resultados['simulacao']['jogos_por_s']:,.0f} jogos/s")
+        resultados["replay"] = medir_replay(4, args.sim_games, args.seed)
+        print(f"🎞️ Replay: {resultados['replay']['movimentos_por_s']:,.0f} movimentos/s "
+              f"({resultados['replay']['bytes_por_partida']:.0f} bytes por partida)")
+
+    if args.output:
+        escrever_json_atomico(args.output, resultados)
+        print(f"💾 Resultados gravados em {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        piores = comparar(resultados, anterior, args.tolerance)
+        print(f"\n📊 Comparação com {args.compare} (commit {anterior.get('commit')}):")
+        if not piores:
+            print(f"✅ Nenhuma métrica piorou mais de {args.tolerance:.0%}")
+        for nome, base, valor, variacao in piores:
+            print(f"❌ {nome}: {base:.4g} → {valor:.4g} ({variacao:+.0%} pior)")
+        return 1 if piores or falhou else 0
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - MOTOR DE REGRAS DO DOMINÓ
+Implementação em Python das regras definidas em PL/pgSQL
+(iniciar_partida, executar_jogada, comprar_peca_monte,
+detectar_jogo_trancado, calcular_pontos_partida).
+
+Representação:
+    • as 28 peças são índices 0-27, na mesma ordem de pecas_domino
+      (id_peca = índice + 1): 0-0, 0-1, ..., 0-6, 1-1, ..., 6-6;
+    • uma mão é uma máscara de 28 bits;
+    • MASCARA_PIP[n] tem os bits de todas as peças que contêm o número n.
+"""
+
+import random
+from collections import namedtuple
+
+NUM_PECAS = 28
+PECAS_POR_JOGADOR = 7
+PONTOS_META = 50
+
+PECAS = tuple((a, b) for a in range(7) for b in range(a, 7))
+INDICE_PECA = {}
+for _i, (_a, _b) in enumerate(PECAS):
+    INDICE_PECA[(_a, _b)] = _i
+    INDICE_PECA[(_b, _a)] = _i
+
+VALOR_PECA = tuple(a + b for a, b in PECAS)
+MASCARA_TODAS = (1 << NUM_PECAS) - 1
+MASCARA_PIP = tuple(
+    sum(1 << i for i, (a, b) in enumerate(PECAS) if a == n or b == n)
+    for n in range(7)
+)
+# Máscara das peças que encaixam em um par de extremidades (ext_esq, ext_dir)
+MASCARA_EXTREMIDADES = tuple(
+    tuple(MASCARA_PIP[ext_esq] | MASCARA_PIP[ext_dir] for ext_dir in range(7))
+    for ext_esq in range(7)
+)
+PECA_66 = INDICE_PECA[(6, 6)]
+
+# Tipos de jogada (mesmos valores de jogadas.tipo_jogada)
+JOGOU = "jogou_peca"
+PASSOU = "passou"
+COMPROU = "comprou_monte"
+
+ESQUERDA = "esquerda"
+DIREITA = "direita"
+INICIAL = "inicial"
+
+Movimento = namedtuple("Movimento", "jogador tipo peca lado")
+ResultadoPartida = namedtuple(
+    "ResultadoPartida", "vencedor tipo_vitoria pontos primeiro_jogador maos movimentos"
+)
+ResultadoJogo = namedtuple("ResultadoJogo", "vencedor pontuacao partidas")
+
+
+def iterar_bits(mascara):
+    """Itera os índices das peças presentes na máscara"""
+    while mascara:
+        bit = mascara & -mascara
+        yield bit.bit_length() - 1
+        mascara ^= bit
+
+
+def contar_pecas(mascara):
+    return bin(mascara).count("1")
+
+
+def pontos_mao(mascara):
+    """Soma dos valores das peças na mão (equivalente a calcular_pontos_mao)"""
+    return sum(VALOR_PECA[i] for i in iterar_bits(mascara))
+
+
+def mascara_de(pecas):
+    """Converte uma lista de pares (a, b) em máscara"""
+    mascara = 0
+    for peca in pecas:
+        mascara |= 1 << INDICE_PECA[tuple(peca)]
+    return mascara
+
+
+def formatar_peca(indice):
+    a, b = PECAS[indice]
+    return f"{a}-{b}"
+
+
+def jogadas_possiveis(mao, ext_esq, ext_dir):
+    """Máscara das peças jogáveis da mão (mesa vazia: qualquer peça)"""
+    if ext_esq is None:
+        return mao
+    return mao & MASCARA_EXTREMIDADES[ext_esq][ext_dir]
+
+
+def lados_possiveis(peca, ext_esq, ext_dir):
+    """Lados em que a peça encaixa, como em obter_jogadas_possiveis"""
+    if ext_esq is None:
+        return (INICIAL,)
+    lados = []
+    bit = 1 << peca
+    if bit & MASCARA_PIP[ext_esq]:
+        lados.append(ESQUERDA)
+    if bit & MASCARA_PIP[ext_dir]:
+        lados.append(DIREITA)
+    return tuple(lados)
+
+
+def aplicar_jogada(peca, lado, ext_esq, ext_dir):
+    """Novas extremidades após jogar a peça no lado indicado (executar_jogada)"""
+    a, b = PECAS[peca]
+    if ext_esq is None:
+        return a, b
+    if lado == ESQUERDA:
+        return (b if a == ext_esq else a), ext_dir
+    return ext_esq, (b if a == ext_dir else a)
+
+
+def dupla_de(posicao):
+    """Dupla (0 ou 1) de uma posição 0-based: posições 1 e 3 x 2 e 4 na mesa"""
+    return posicao % 2
+
+
+def distribuir_baralho(baralho, num_jogadores, rng=random):
+    """Distribui a partir de uma ordem já embaralhada das 28 peças.
+
+    Mesma regra de iniciar_partida: o jogador k recebe baralho[7k:7k+7] e o
+    restante é o monte (vazio com 4 jogadores). Quem tem o 6-6 começa; sem
+    6-6 distribuído, o primeiro jogador é sorteado. Retorna
+    (maos, monte, primeiro_jogador).
+    """
+    maos = []
+    primeiro = None
+    for jogador in range(num_jogadores):
+        mao = 0
+        for peca in baralho[jogador * PECAS_POR_JOGADOR:(jogador + 1) * PECAS_POR_JOGADOR]:
+            mao |= 1 << peca
+        if mao >> PECA_66 & 1:
+            primeiro = jogador
+        maos.append(mao)
+    monte = list(baralho[num_jogadores * PECAS_POR_JOGADOR:]) if num_jogadores < 4 else []
+    if primeiro is None:
+        primeiro = rng.randrange(num_jogadores)
+    return maos, monte, primeiro
+
+
+def distribuir(num_jogadores, rng=random):
+    """Embaralha as 28 peças uma única vez e distribui 7 para cada jogador.
+
+    Retorna (maos, monte, primeiro_jogador). O monte é a lista embaralhada
+    restante; comprar do fim dela equivale à compra aleatória de
+    comprar_peca_monte.
+    """
+    pecas = list(range(NUM_PECAS))
+    rng.shuffle(pecas)
+    return distribuir_baralho(pecas, num_jogadores, rng)
+
+
+def gerar_distribuicoes(num_jogadores, rng=random):
+    """Gera distribuições sem fim, uma por partida.
+
+    Cada item é (ids, maos, monte, primeiro_jogador); ``ids`` é a ordem do
+    baralho em id_peca (1-28), o parâmetro p_pecas de iniciar_partida, que
+    então grava exatamente as mesmas mãos e monte. O primeiro jogador só
+    difere quando ninguém recebe o 6-6 (o banco faz o próprio sorteio).
+    """
+    pecas = list(range(NUM_PECAS))
+    while True:
+        rng.shuffle(pecas)
+        maos, monte, primeiro = distribuir_baralho(pecas, num_jogadores, rng)
+        yield [peca + 1 for peca in pecas], maos, monte, primeiro
+
+
+def estrategia_maior_peca(mao, jogaveis, ext_esq, ext_dir, rng):
+    """Joga a peça jogável de maior valor (livra-se dos pontos primeiro)"""
+    melhor = max(iterar_bits(jogaveis), key=VALOR_PECA.__getitem__)
+    return melhor, lados_possiveis(melhor, ext_esq, ext_dir)[0]
+
+
+def estrategia_aleatoria(mao, jogaveis, ext_esq, ext_dir, rng):
+    """Joga uma peça jogável qualquer, em um lado possível qualquer"""
+    peca = rng.choice(list(iterar_bits(jogaveis)))
+    return peca, rng.choice(lados_possiveis(peca, ext_esq, ext_dir))
+
+
+def tem_jogada(maos, ext_esq, ext_dir):
+    """False quando nenhum jogador com peças na mão consegue jogar (trancamento)"""
+    mascara = MASCARA_TODAS if ext_esq is None else MASCARA_EXTREMIDADES[ext_esq][ext_dir]
+    return any(mao & mascara for mao in maos)
+
+
+def jogar_partida(num_jogadores, rng=random, estrategia=estrategia_maior_peca,
+                  distribuicao=None, registrar=False):
+    """Joga uma partida completa e retorna um ResultadoPartida.
+
+    ``vencedor`` é a posição (0-based) de quem bateu ou de quem fez a jogada
+    que trancou o jogo, como em verificar_vitoria_partida. ``pontos`` é a
+    lista de pontos ganhos por posição nesta partida.
+    """
+    maos, monte, primeiro = distribuicao or distribuir(num_jogadores, rng)
+    maos = list(maos)
+    monte = list(monte)
+    movimentos = [] if registrar else None
+    ext_esq = ext_dir = None
+    jogador = primeiro
+
+    while True:
+        mao = maos[jogador]
+        jogaveis = jogadas_possiveis(mao, ext_esq, ext_dir)
+
+        # Sem jogada: compra do monte até conseguir jogar ou o monte acabar
+        while not jogaveis and monte:
+            peca = monte.pop()
+            mao |= 1 << peca
+            if registrar:
+                movimentos.append(Movimento(jogador, COMPROU, peca, None))
+            jogaveis = jogadas_possiveis(mao, ext_esq, ext_dir)
+
+        if not jogaveis:
+            maos[jogador] = mao
+            if registrar:
+                movimentos.append(Movimento(jogador, PASSOU, None, None))
+            jogador = (jogador + 1) % num_jogadores
+            continue
+
+        peca, lado = estrategia(mao, jogaveis, ext_esq, ext_dir, rng)
+        if ext_esq is None:
+            lado = INICIAL
+        mao &= ~(1 << peca)
+        maos[jogador] = mao
+        ext_esq, ext_dir = aplicar_jogada(peca, lado, ext_esq, ext_dir)
+        if registrar:
+            movimentos.append(Movimento(jogador, JOGOU, peca, lado))
+
+        if not mao:
+            tipo_vitoria = "batida"
+            break
+        if not tem_jogada(maos, ext_esq, ext_dir):
+            tipo_vitoria = "trancamento"
+            break
+        jogador = (jogador + 1) % num_jogadores
+
+    pontos = pontuar_partida(maos, jogador, tipo_vitoria)
+    return ResultadoPartida(jogador, tipo_vitoria, pontos, primeiro, maos, movimentos)
+
+
+def pontuar_partida(maos, vencedor, tipo_vitoria):
+    """Pontos ganhos por posição, conforme o trigger calcular_pontos_partida.
+
+    2-3 jogadores: o vencedor leva a soma das mãos dos adversários.
+    4 jogadores (duplas): na batida a dupla do vencedor leva os pontos da
+    outra dupla; no trancamento vence a dupla com menos pontos na mão e, em
+    caso de empate, perde a dupla de quem trancou.
+    """
+    num_jogadores = len(maos)
+    pontos = [0] * num_jogadores
+    valores = [pontos_mao(m) for m in maos]
+
+    if num_jogadores <= 3:
+        pontos[vencedor] = sum(valores) - valores[vencedor]
+        return pontos
+
+    por_dupla = [valores[0] + valores[2], valores[1] + valores[3]]
+    if tipo_vitoria == "batida":
+        dupla_vencedora = dupla_de(vencedor)
+    elif por_dupla[0] != por_dupla[1]:
+        dupla_vencedora = 0 if por_dupla[0] < por_dupla[1] else 1
+    else:
+        dupla_vencedora = 1 - dupla_de(vencedor)
+
+    ganho = por_dupla[1 - dupla_vencedora]
+    for posicao in range(num_jogadores):
+        if dupla_de(posicao) == dupla_vencedora:
+            pontos[posicao] = ganho
+    return pontos
+
+
+def jogar_jogo(num_jogadores, rng=random, estrategia=estrategia_maior_peca,
+               meta=PONTOS_META, max_partidas=None, registrar=False):
+    """Joga partidas até alguém atingir a meta e retorna um ResultadoJogo.
+
+    O vencedor do jogo é a posição com maior pontuação total (em empate,
+    a de menor posição na mesa).
+    """
+    pontuacao = [0] * num_jogadores
+    partidas = []
+    while max(pontuacao) < meta:
+        if max_partidas is not None and len(partidas) >= max_partidas:
+            break
+        resultado = jogar_partida(num_jogadores, rng, estrategia, registrar=registrar)
+        for posicao, pontos in enumerate(resultado.pontos):
+            pontuacao[posicao] += pontos
+        partidas.append(resultado)
+
+    vencedor = max(range(num_jogadores), key=lambda p: (pontuacao[p], -p))
+    return ResultadoJogo(vencedor, pontuacao, partidas)
+
+
+def simular_lote(num_jogadores, num_jogos, seed=None, meta=PONTOS_META,
+                 estrategia=estrategia_maior_peca):
+    """Simula jogos completos sem E/S (unidade de trabalho de um processo).
+
+    Retorna (jogos, vitorias, pontos, partidas_vencidas): ``jogos`` é uma lista
+    de (vencedor, pontuacao, numero_partidas, partidas_vencidas_por_posicao) e
+    os demais são totais agregados por posição, já somados no próprio processo.
+    """
+    rng = random.Random(seed)
+    jogos = []
+    vitorias = [0] * num_jogadores
+    pontos = [0] * num_jogadores
+    partidas_vencidas = [0] * num_jogadores
+    for _ in range(num_jogos):
+        resultado = jogar_jogo(num_jogadores, rng, estrategia, meta=meta)
+        vencidas = [0] * num_jogadores
+        for partida in resultado.partidas:
+            vencidas[partida.vencedor] += 1
+        jogos.append((resultado.vencedor, tuple(resultado.pontuacao),
+                      len(resultado.partidas), tuple(vencidas)))
+        vitorias[resultado.vencedor] += 1
+        for posicao in range(num_jogadores):
+            pontos[posicao] += resultado.pontuacao[posicao]
+            partidas_vencidas[posicao] += vencidas[posicao]
+    return jogos, vitorias, pontos, partidas_vencidas
@@ -4,82 +4,862 @@ CAPIVARA GAME LBD - SOLUÇÃO DEFINITIVA
 Sistema híbrido: PostgreSQL + JSON para demonstração completa
 """
 
+import argparse
+import bisect
+import csv
+import functools
+import glob
+import io
+import itertools
 import subprocess
 import sys
+import threading
 import json
 import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
-class DatabaseInterface:
-    """Interface híbrida que funciona com PostgreSQL via linha de comando"""
+import capivara_domino as domino
+import capivara_montecarlo as montecarlo
+import capivara_replay as replay
+from capivara_archive import CAMPOS_PLACAR, GameArchive
+from capivara_backup import BackupManager, BackupError
+from capivara_metrics import METRICS
+from capivara_model import Game, Rodada, VERSAO_JOGO
+from capivara_reports import FORMATOS_EXPORTACAO, RELATORIOS, RELATORIOS_POR_CHAVE, ReportEngine
+from capivara_search import UserSearchIndex, normalizar, EXATO, PREFIXO, SUBSTRING, APROXIMADO
+from capivara_sqllog import SqlLog
+from capivara_storage import ConflictError, FileLock, JournalStore, StoreBusyError, escrever_json_atomico
+from capivara_writebehind import PermanentWriteError, WriteBehindQueue
+
+try:
+    import psycopg2
+    from psycopg2 import extras as pg_extras
+    from psycopg2 import pool as pg_pool
+except ImportError:  # psycopg2-binary é opcional: sem ele usamos o psql
+    psycopg2 = None
+    pg_extras = None
+    pg_pool = None
+
+if psycopg2 is not None:
+    class HotConnection(psycopg2.extensions.connection):
+        """Conexão que guarda os comandos quentes já preparados nela.
+        
+        O conjunto vive e morre com a conexão: uma conexão descartada pelo
+        pool não deixa nomes para outra que venha a ocupar o mesmo endereço.
+        """
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = set()
+
+# Configuração da conexão PostgreSQL (sobrescrita por variáveis de ambiente)
+PG_CONFIG = {
+    "host": os.environ.get("CAPIVARA_PG_HOST", "localhost"),
+    "port": int(os.environ.get("CAPIVARA_PG_PORT", "5433")),
+    "user": os.environ.get("CAPIVARA_PG_USER", "postgres"),
+    "dbname": os.environ.get("CAPIVARA_PG_DB", "capivara_game"),
+}
+PG_POOL_MIN = int(os.environ.get("CAPIVARA_PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.environ.get("CAPIVARA_PG_POOL_MAX", "5"))
+# Espera máxima (s) da conexão de teste feita na detecção do servidor
+PG_CONNECT_TIMEOUT = int(os.environ.get("CAPIVARA_PG_CONNECT_TIMEOUT", "3"))
+
+# Modo de armazenamento JSON: "journal" (append-only + snapshot) ou "json"
+# (reescrita completa dos arquivos a cada operação)
+STORAGE_MODE = os.environ.get("CAPIVARA_STORAGE", "journal")
+
+# Espera máxima (s) pelo lock da pasta de dados quando outro processo escreve
+LOCK_TIMEOUT = float(os.environ.get("CAPIVARA_LOCK_TIMEOUT", "30"))
+
+# Jogos encerrados no JSON a partir dos quais o close() os move para o
+# arquivo colunar (data/arquivo/)
+ARCHIVE_MIN_GAMES = int(os.environ.get("CAPIVARA_ARCHIVE_MIN", "1000"))
+
+# Menu interativo: JSON lidos só no primeiro acesso aos dados ("0" = na abertura)
+LAZY_LOAD = os.environ.get("CAPIVARA_LAZY", "1") != "0"
+
+# Instalações padrão do psql no Windows (depois de CAPIVARA_PSQL,
+# data/postgres.json e do PATH)
+PSQL_WINDOWS_GLOB = r"C:\Program Files\PostgreSQL\*\bin\psql.exe"
+
+# Atributos criados por load_data/rebuild_indexes: no modo lazy o primeiro
+# acesso a qualquer um deles carrega os dados
+LAZY_ATTRIBUTES = frozenset({
+    "users", "games", "stats", "search_index", "users_by_id", "users_by_nome",
+    "users_by_email", "user_positions", "games_by_id", "games_by_status",
+    "game_positions", "next_user_id", "next_game_id", "last_insert_id"
+})
+
+class Leaderboard:
+    """Ranking (jogos vencidos, pontos) mantido ordenado a cada alteração.
+    
+    Equivalente em memória da tabela placar_usuarios: cada usuário tem uma
+    chave na lista ordenada, removida e reinserida (bisect) quando o placar
+    dele muda, então ler o top N não exige ordenar todos os usuários.
+    """
     
     def __init__(self):
-        self.data_dir = Path(__file__).parent / "data"
-        self.data_dir.mkdir(exist_ok=True)
+        self.keys = []
+        self.key_by_user = {}
+    
+    def update(self, user_id, jogos_vencidos, pontos):
+        key = (-jogos_vencidos, -pontos, user_id)
+        old = self.key_by_user.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, old)]
+        bisect.insort(self.keys, key)
+        self.key_by_user[user_id] = key
+    
+    def __iter__(self):
+        """IDs dos usuários, do primeiro ao último colocado"""
+        return (key[2] for key in self.keys)
+    
+    def __len__(self):
+        return len(self.keys)
+
+class StatsCounters:
+    """Contadores de estatísticas mantidos a cada mutação (leitura O(1)).
+    
+    Os totais por usuário seguem a definição da view ranking_usuarios:
+    jogos participados, jogos vencidos, partidas vencidas e pontos acumulados.
+    """
+    
+    def __init__(self):
+        self.users_total = 0
+        self.users_active = 0
+        self.games_total = 0
+        self.games_by_players = {}
+        self.games_by_status = {}
+        self.rounds_total = 0
+        self.per_user = {}
+        self.leaderboard = Leaderboard()
+    
+    def add_user(self, user, sign=1):
+        """Soma (sign=1) ou remove (sign=-1) um usuário dos totais"""
+        self.users_total += sign
+        if user.get("ativo", True):
+            self.users_active += sign
+        self.update_leaderboard(user["id_usuario"])
+    
+    def update_leaderboard(self, user_id):
+        entry = self.per_user.get(user_id)
+        if entry is None:
+            self.leaderboard.update(user_id, 0, 0)
+        else:
+            self.leaderboard.update(user_id, entry["jogos_vencidos"], entry["pontos"])
+    
+    def rebuild_leaderboard(self, user_ids):
+        """Reconstrói o ranking do zero a partir dos contadores por usuário"""
+        self.leaderboard = Leaderboard()
+        for user_id in user_ids:
+            self.update_leaderboard(user_id)
+    
+    def user_entry(self, user_id):
+        entry = self.per_user.get(user_id)
+        if entry is None:
+            entry = self.per_user[user_id] = {
+                "jogos": 0, "jogos_vencidos": 0, "partidas": 0,
+                "partidas_vencidas": 0, "pontos": 0
+            }
+        return entry
+    
+    def add_game(self, game, sign=1):
+        """Soma (sign=1) ou remove (sign=-1) a contribuição de um jogo"""
+        self.games_total += sign
+        num = game.numero_jogadores
+        self.games_by_players[num] = self.games_by_players.get(num, 0) + sign
+        self.change_status(None, game.status, sign)
+        rounds = game.total_rodadas
+        self.rounds_total += rounds * sign
+        
+        for user_id, pontos, wins in zip(game.jogadores, game.pontuacao, game.partidas_vencidas):
+            entry = self.user_entry(user_id)
+            entry["jogos"] += sign
+            entry["partidas"] += rounds * sign
+            entry["pontos"] += pontos * sign
+            entry["partidas_vencidas"] += wins * sign
+            self.update_leaderboard(user_id)
+        if game.vencedor_id is not None:
+            self.user_entry(game.vencedor_id)["jogos_vencidos"] += sign
+            self.update_leaderboard(game.vencedor_id)
+    
+    def add_archive(self, archive):
+        """Soma os totais do arquivo colunar sem percorrer os jogos arquivados"""
+        if not len(archive):
+            return
+        self.games_total += len(archive)
+        for num, count in archive.contagem_por_jogadores().items():
+            self.games_by_players[num] = self.games_by_players.get(num, 0) + count
+        for status, count in archive.contagem_por_status().items():
+            self.change_status(None, status, count)
+        self.rounds_total += archive.manifest["rodadas"]
+        
+        placar = archive.placar()
+        colunas = [placar[campo] for campo in CAMPOS_PLACAR]
+        for user_id, *valores in zip(placar["id_usuario"], *colunas):
+            entry = self.user_entry(user_id)
+            for campo, valor in zip(CAMPOS_PLACAR, valores):
+                entry[campo] += valor
+            self.update_leaderboard(user_id)
+    
+    def change_status(self, old_status, new_status, count=1):
+        if old_status is not None:
+            self.games_by_status[old_status] = self.games_by_status.get(old_status, 0) - count
+        self.games_by_status[new_status] = self.games_by_status.get(new_status, 0) + count
+    
+    def average_rounds(self):
+        return self.rounds_total / self.games_total if self.games_total else 0.0
+
+# Quantidade de comandos exibidos em "Ver log SQL"
+SQL_LOG_TAIL = 10
+
+# Separador de colunas usado ao ler resultados do psql (modo fallback)
+PSQL_FIELD_SEP = "\x1f"
+
+# Busca por trigramas no PostgreSQL: pg_trgm + unaccent com wrapper IMMUTABLE
+# (unaccent() sozinho não pode ser usado em índices de expressão). Roda em
+# transação própria na configuração: sem as extensões a busca usa ILIKE
+SEARCH_INDEX_COMMANDS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+        SELECT public.unaccent('public.unaccent', $1)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT""",
+    "CREATE INDEX IF NOT EXISTS idx_usuarios_nome_usuario_trgm ON usuarios "
+    "USING gin (f_unaccent(lower(nome_usuario)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_usuarios_nome_completo_trgm ON usuarios "
+    "USING gin (f_unaccent(lower(nome_completo)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_usuarios_email_trgm ON usuarios "
+    "USING gin (lower(email) gin_trgm_ops)"
+]
+
+SEARCH_USERS_SQL = """
+    SELECT id_usuario, nome_usuario, nome_completo, email,
+           CASE WHEN f_unaccent(lower(nome_usuario)) = %(q)s OR lower(email) = %(q)s THEN 0
+                WHEN f_unaccent(lower(nome_usuario)) LIKE %(prefixo)s
+                  OR f_unaccent(lower(nome_completo)) LIKE %(prefixo)s
+                  OR lower(email) LIKE %(prefixo)s THEN 1
+                WHEN f_unaccent(lower(nome_usuario)) LIKE %(substring)s
+                  OR f_unaccent(lower(nome_completo)) LIKE %(substring)s
+                  OR lower(email) LIKE %(substring)s THEN 2
+                ELSE 3 END AS tipo,
+           GREATEST(similarity(f_unaccent(lower(nome_usuario)), %(q)s),
+                    word_similarity(%(q)s, f_unaccent(lower(nome_completo))),
+                    similarity(lower(email), %(q)s)) AS similaridade
+    FROM usuarios
+    WHERE f_unaccent(lower(nome_usuario)) LIKE %(substring)s
+       OR f_unaccent(lower(nome_completo)) LIKE %(substring)s
+       OR lower(email) LIKE %(substring)s
+       OR f_unaccent(lower(nome_usuario)) %% %(q)s
+       OR %(q)s <%% f_unaccent(lower(nome_completo))
+       OR lower(email) %% %(q)s
+    ORDER BY tipo, similaridade DESC, id_usuario
+    LIMIT %(limit)s
+"""
+
+# Sem pg_trgm/unaccent: exato, prefixo e substring (sem aproximação nem acentos)
+SEARCH_USERS_ILIKE_SQL = """
+    SELECT id_usuario, nome_usuario, nome_completo, email,
+           CASE WHEN lower(nome_usuario) = %(q)s OR lower(email) = %(q)s THEN 0
+                WHEN nome_usuario ILIKE %(prefixo)s OR nome_completo ILIKE %(prefixo)s
+                  OR email ILIKE %(prefixo)s THEN 1
+                ELSE 2 END AS tipo
+    FROM usuarios
+    WHERE nome_usuario ILIKE %(substring)s
+       OR nome_completo ILIKE %(substring)s
+       OR email ILIKE %(substring)s
+    ORDER BY tipo, id_usuario
+    LIMIT %(limit)s
+"""
+
+SEARCH_TRIGRAM_CHECK_SQL = (
+    "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') "
+    "AND EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'f_unaccent')"
+)
+
+# Ranking materializado (placar_usuarios) para o esquema simplificado criado
+# pelo próprio sistema (usuarios, jogos e participantes_jogo, sem partidas nem
+# vencedor do jogo): jogos e pontos vêm de participantes_jogo. Só é instalado
+# quando placar_usuarios não existe - no modelo completo (sql/02, 04 e 05) a
+# tabela, os triggers e reconstruir_ranking já vêm prontos.
+PLACAR_CHECK_SQL = "SELECT to_regclass('public.placar_usuarios') IS NOT NULL"
+PLACAR_COMMANDS = [
+    """CREATE TABLE IF NOT EXISTS placar_usuarios (
+        id_usuario INTEGER PRIMARY KEY REFERENCES usuarios(id_usuario) ON DELETE CASCADE,
+        total_jogos INTEGER NOT NULL DEFAULT 0,
+        jogos_vencidos INTEGER NOT NULL DEFAULT 0,
+        total_partidas INTEGER NOT NULL DEFAULT 0,
+        partidas_vencidas INTEGER NOT NULL DEFAULT 0,
+        pontos_totais INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_placar_usuarios_ranking "
+    "ON placar_usuarios(jogos_vencidos DESC, pontos_totais DESC)",
+    """CREATE OR REPLACE FUNCTION somar_placar(
+        p_id_usuario INTEGER, p_jogos INTEGER, p_jogos_vencidos INTEGER,
+        p_partidas INTEGER, p_partidas_vencidas INTEGER, p_pontos INTEGER
+    ) RETURNS VOID AS $$
+        INSERT INTO placar_usuarios AS pl (
+            id_usuario, total_jogos, jogos_vencidos, total_partidas, partidas_vencidas, pontos_totais
+        )
+        SELECT p_id_usuario, p_jogos, p_jogos_vencidos, p_partidas, p_partidas_vencidas, p_pontos
+        WHERE p_id_usuario IS NOT NULL
+        ON CONFLICT (id_usuario) DO UPDATE SET
+            total_jogos = pl.total_jogos + EXCLUDED.total_jogos,
+            jogos_vencidos = pl.jogos_vencidos + EXCLUDED.jogos_vencidos,
+            total_partidas = pl.total_partidas + EXCLUDED.total_partidas,
+            partidas_vencidas = pl.partidas_vencidas + EXCLUDED.partidas_vencidas,
+            pontos_totais = pl.pontos_totais + EXCLUDED.pontos_totais;
+    $$ LANGUAGE sql""",
+    """CREATE OR REPLACE FUNCTION placar_novo_usuario() RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO placar_usuarios (id_usuario) VALUES (NEW.id_usuario)
+        ON CONFLICT (id_usuario) DO NOTHING;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trigger_placar_usuario ON usuarios",
+    "CREATE TRIGGER trigger_placar_usuario AFTER INSERT ON usuarios "
+    "FOR EACH ROW EXECUTE FUNCTION placar_novo_usuario()",
+    """CREATE OR REPLACE FUNCTION placar_participantes() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM somar_placar(OLD.id_usuario, -1, 0, 0, 0, -COALESCE(OLD.pontos_acumulados, 0));
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM somar_placar(NEW.id_usuario, 1, 0, 0, 0, COALESCE(NEW.pontos_acumulados, 0));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trigger_placar_participantes ON participantes_jogo",
+    "CREATE TRIGGER trigger_placar_participantes "
+    "AFTER INSERT OR DELETE OR UPDATE OF id_usuario, id_jogo, pontos_acumulados ON participantes_jogo "
+    "FOR EACH ROW EXECUTE FUNCTION placar_participantes()",
+    """CREATE OR REPLACE FUNCTION reconstruir_ranking() RETURNS INTEGER AS $$
+    DECLARE
+        v_total INTEGER;
+    BEGIN
+        LOCK TABLE placar_usuarios IN EXCLUSIVE MODE;
+        DELETE FROM placar_usuarios;
+        INSERT INTO placar_usuarios (id_usuario, total_jogos, pontos_totais)
+        SELECT u.id_usuario, COUNT(pj.id_participante), COALESCE(SUM(pj.pontos_acumulados), 0)
+        FROM usuarios u
+        LEFT JOIN participantes_jogo pj ON pj.id_usuario = u.id_usuario
+        GROUP BY u.id_usuario;
+        GET DIAGNOSTICS v_total = ROW_COUNT;
+        RETURN v_total;
+    END;
+    $$ LANGUAGE plpgsql""",
+    # Usuários e participações gravados antes do placar existir
+    "SELECT reconstruir_ranking()"
+]
+
+# Comandos quentes, preparados (PREPARE) uma vez por conexão e executados com
+# parâmetros: nome -> (tipos dos parâmetros, SQL com $1..$n)
+HOT_STATEMENTS = {
+    "insert_usuario": (
+        ("varchar", "varchar", "varchar", "varchar"),
+        "INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash) "
+        "VALUES ($1, $2, $3, $4)"
+    ),
+    "insert_jogo": (
+        ("integer", "varchar"),
+        "INSERT INTO jogos (numero_jogadores, status) VALUES ($1, $2) RETURNING id_jogo"
+    ),
+    "finalizar_jogo": (
+        ("integer",),
+        "UPDATE jogos SET status = 'finalizado' WHERE id_jogo = $1"
+    ),
+}
+
+# Comandos por ida ao servidor no executemany via execute_batch
+HOT_PAGE_SIZE = 100
+
+def sql_literal(value):
+    """Representa um valor Python como literal SQL (para o fallback via psql)"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return "ARRAY[" + ", ".join(sql_literal(v) for v in value) + "]"
+    return "'" + str(value).replace("'", "''") + "'"
+
+def interpolate_params(sql_command, params):
+    """Substitui parâmetros estilo psycopg2 (%s / %(nome)s) por literais SQL"""
+    if params is None:
+        return sql_command
+    if isinstance(params, dict):
+        return sql_command % {k: sql_literal(v) for k, v in params.items()}
+    return sql_command % tuple(sql_literal(v) for v in params)
+
+def bind_positional(sql_command, params):
+    """Substitui $1..$n por literais SQL (fallback via psql e log)"""
+    return re.sub(r"\$(\d+)", lambda m: sql_literal(params[int(m.group(1)) - 1]), sql_command)
+
+def describe_hot(name, params):
+    """Texto de um comando quente com os parâmetros, para o log SQL"""
+    return bind_positional(HOT_STATEMENTS[name][1], params)
+
+def like_escape(text):
+    """Escapa curingas do LIKE"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Linhas por bloco enviado no COPY da importação em lote
+BULK_CHUNK_SIZE = 10000
+
+def csv_chunks(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Divide tuplas em blocos CSV (StringIO) prontos para COPY ... FROM STDIN"""
+    for start in range(0, len(rows), chunk_size):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows[start:start + chunk_size])
+        buffer.seek(0)
+        yield buffer
+
+def read_import_rows(path):
+    """Lê linhas de importação (CSV com cabeçalho ou JSONL) como dicionários"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def parse_bool(value, default=True):
+    """Converte valores de CSV/JSON ("true", "0", "s"...) em booleano"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "t", "s", "sim", "yes")
+
+def psql_version(path):
+    """Versão da instalação em ...\\PostgreSQL\\<versão>\\bin\\psql.exe (0 se não numérica)"""
+    version = Path(path).parent.parent.name
+    return int(version) if version.isdigit() else 0
+
+def find_psql(configured=None):
+    """Localiza o psql: CAPIVARA_PSQL, caminho configurado, PATH e as
+    instalações padrão do Windows (versão mais nova primeiro)"""
+    candidates = [os.environ.get("CAPIVARA_PSQL"), configured, shutil.which("psql")]
+    candidates += sorted(glob.glob(PSQL_WINDOWS_GLOB), key=psql_version, reverse=True)
+    for path in candidates:
+        if path and Path(path).is_file():
+            return str(path)
+    return None
+
+class StartupProfile:
+    """Tempo de cada etapa da inicialização (--startup-profile)"""
+
+    def __init__(self):
+        self.steps = []
+        self.last = time.perf_counter()
+
+    def mark(self, step):
+        """Fecha a etapa ``step`` (tempo desde a marca anterior)"""
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def report(self):
+        print("\n⏱️ PERFIL DE INICIALIZAÇÃO:")
+        for step, seconds in self.steps:
+            print(f"   {step:<34} {seconds * 1000:8.2f} ms")
+        print(f"   {'total':<34} {sum(s for _, s in self.steps) * 1000:8.2f} ms")
+
+def with_store_lock(method):
+    """Executa o método com o lock das threads e o lock da pasta de dados"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock, self.store_lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+def with_write_session(method):
+    """Executa o método dentro de DatabaseInterface.write_session"""
+    @functools.wraps(method)
+    def session(self, *args, **kwargs):
+        with self.write_session():
+            return method(self, *args, **kwargs)
+    return session
+
+class DatabaseInterface:
+    """Interface híbrida: PostgreSQL (pool psycopg2 ou psql) + JSON"""
+    
+    def __init__(self, data_dir=None, use_postgres=True, lazy=False, profile=None):
+        """``data_dir`` troca a pasta de dados (padrão: data/ ao lado do
+        script); ``use_postgres=False`` força o modo JSON.
+        
+        Com ``lazy=True`` os JSON só são lidos no primeiro acesso aos dados
+        (``users``, ``games``, índices...). ``profile`` (StartupProfile)
+        recebe o tempo de cada etapa.
+        """
+        self.loaded = False
+        self.profile = profile if profile is not None else StartupProfile()
+        self.data_dir = Path(data_dir) if data_dir is not None else Path(__file__).parent / "data"
+        self.data_dir.mkdir(parents=True, exist_ok=True)
         
         self.users_file = self.data_dir / "usuarios.json"
         self.games_file = self.data_dir / "jogos.json"
-        self.sql_log = self.data_dir / "sql_commands.sql"
+        self.sql_log = SqlLog(self.data_dir / "sql_log",
+                              legacy_file=self.data_dir / "sql_commands.sql")
+        # Contagens do último snapshot, lidas pelo menu sem abrir os JSON
+        self.header_file = self.data_dir / "cabecalho.json"
+        self.postgres_config_file = self.data_dir / "postgres.json"
+        
+        self.backups = BackupManager(self.data_dir / "backups")
+        
+        self.storage_mode = STORAGE_MODE
+        self.journal = None
+        if self.storage_mode == "journal":
+            self.journal = JournalStore(self.data_dir, self.users_file, self.games_file)
+        
+        # Lock entre processos da pasta de dados: no modo journal tomado a cada
+        # escrita (write_session); no modo json, que regrava os arquivos
+        # inteiros, durante toda a execução
+        self.store_lock = FileLock(self.data_dir / ".capivara.lock", LOCK_TIMEOUT)
+        if self.journal is None:
+            try:
+                self.store_lock.pin()
+            except StoreBusyError:
+                raise StoreBusyError(
+                    f"{self.data_dir} em uso por outro processo (o modo json é exclusivo; "
+                    f"use CAPIVARA_STORAGE=journal para vários processos)") from None
+        
+        self.pg_config = dict(PG_CONFIG)
+        self.pg_pools = {}
+        self.pg_trigram = None  # pg_trgm/f_unaccent no banco (None: ainda não verificado)
+        self.pg_placar = None  # placar_usuarios no banco (None: ainda não verificado)
+        self.pg_backend = None
+        self.psql_path = None
+        
+        # Protege usuarios/jogos entre o menu e a thread de escrita assíncrona
+        self.lock = threading.RLock()
+        # Incrementada a cada mutação (chave do cache de relatórios)
+        self.data_version = 0
+        self.reports = ReportEngine(self, self.data_dir / "relatorios")
+        # Jogos encerrados, fora do jogos.json (lidos por mmap)
+        self.archive = GameArchive(self.data_dir / "arquivo")
+        self.profile.mark("estruturas (log, journal, arquivo)")
+        
+        # Detecção em segundo plano; postgres_available espera por ela
+        self.postgres_message = None
+        self._postgres_available = False
+        self.postgres_discovery = None
+        if use_postgres:
+            self.postgres_discovery = threading.Thread(
+                target=self.discover_postgres, name="capivara-postgres", daemon=True
+            )
+            self.postgres_discovery.start()
+        
+        if not lazy:
+            self.load_data()
+            self.profile.mark("dados JSON")
+        
+        self.write_behind = WriteBehindQueue(
+            self.data_dir / "pendentes.jsonl", self.apply_postgres_batch,
+            gravar_json=self.save_data, failed_file=self.data_dir / "pendentes_falhas.jsonl"
+        )
+        self.profile.mark("escrita assíncrona")
+        if self.write_behind.recovered and self.postgres_available:
+            print(f"🔁 {self.write_behind.recovered} comando(s) PostgreSQL pendente(s) reenfileirado(s)")
+            self.get_postgres_password()
+            self.write_behind.start()
+    
+    def __getattr__(self, name):
+        # Só chamado para atributos ausentes: no modo lazy, os dados ainda não carregados
+        if name in LAZY_ATTRIBUTES:
+            self.ensure_loaded()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+    
+    def ensure_loaded(self):
+        """Carrega os JSON se ainda não foram carregados (modo lazy)"""
+        with self.lock:
+            if not self.loaded:
+                self.load_data()
+    
+    @contextmanager
+    def write_session(self):
+        """Seção de escrita: lock das threads + lock da pasta de dados, com a
+        memória já atualizada com o que outros processos gravaram.
+        
+        Toda mutação passa por aqui (with_write_session): como os IDs são
+        alocados e as validações (UNIQUE) feitas depois do refresh, dois
+        processos nunca gravam o mesmo id nem perdem as escritas um do outro.
+        """
+        with self.lock, self.store_lock:
+            if not self.loaded:
+                self.load_data()
+            else:
+                self.refresh()
+            yield
+    
+    def refresh(self):
+        """Aplica em memória o que outros processos anexaram ao journal.
         
-        self.postgres_available = self.check_postgres()
-        self.load_data()
+        Incremental para registros novos; recarrega tudo quando o snapshot
+        foi regravado por inteiro (reset, restauração, arquivamento).
+        """
+        if self.journal is None or not self.loaded:
+            return
+        with self.lock, self.store_lock:
+            records = self.journal.catch_up()
+            if records is None:
+                self.archive.reload()
+                self.load_data()
+                return
+            if not records:
+                return
+            
+            for record in records:
+                if record["op"] != "upsert":
+                    continue
+                if record["colecao"] == "usuarios":
+                    user = record["registro"]
+                    old = self.users_by_id.get(user["id_usuario"])
+                    if old is None:
+                        self.users.append(user)
+                    else:
+                        self.users[self.user_positions[user["id_usuario"]]] = user
+                        self.unindex_user(old)
+                    self.index_user(user)
+                    # IDs já reservados localmente (ex.: simulação em andamento) continuam reservados
+                    self.next_user_id = max(self.next_user_id, user["id_usuario"] + 1)
+                else:
+                    game = Game.from_dict(record["registro"])
+                    old = self.games_by_id.get(game.id)
+                    if old is None:
+                        self.games.append(game)
+                    else:
+                        self.games[self.game_positions[game.id]] = game
+                        self.unindex_game(old)
+                    self.index_game(game)
+                    self.next_game_id = max(self.next_game_id, game.id + 1)
+            self.data_version += 1
     
-    def check_postgres(self):
-        """Verifica se PostgreSQL está acessível"""
-        pg_paths = [
-            r"C:\Program Files\PostgreSQL\17\bin\psql.exe",
-            r"C:\Program Files\PostgreSQL\16\bin\psql.exe",
-            r"C:\Program Files\PostgreSQL\15\bin\psql.exe",
-            r"C:\Program Files\PostgreSQL\14\bin\psql.exe"
-        ]
+    def wait_postgres_discovery(self):
+        discovery = self.postgres_discovery
+        if discovery is not None:
+            discovery.join()
+            self.postgres_discovery = None
+    
+    @property
+    def postgres_available(self):
+        """Resultado da detecção do PostgreSQL (aguarda a thread, se ainda rodando)"""
+        self.wait_postgres_discovery()
+        return self._postgres_available
+    
+    @postgres_available.setter
+    def postgres_available(self, available):
+        # Uma detecção ainda em andamento não pode sobrescrever o novo valor
+        self.wait_postgres_discovery()
+        self._postgres_available = available
+    
+    def discover_postgres(self):
+        """Thread de detecção: mesmo resultado de check_postgres, sem imprimir"""
+        self._postgres_available = self.check_postgres(verbose=False)
+    
+    def read_postgres_config(self):
+        """data/postgres.json opcional: host, port, user, dbname e psql"""
+        if not self.postgres_config_file.exists():
+            return {}
+        try:
+            with open(self.postgres_config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ {self.postgres_config_file} ignorado: {e}")
+            return {}
+        return config if isinstance(config, dict) else {}
+    
+    def check_postgres(self, verbose=True):
+        """Verifica se PostgreSQL está acessível (driver psycopg2 ou psql).
         
-        for path in pg_paths:
-            if Path(path).exists():
-                self.psql_path = path
-                print(f"✅ PostgreSQL encontrado: {path}")
-                return True
+        A conexão vem de PG_CONFIG (ambiente) e de data/postgres.json; o psql
+        é procurado por find_psql. A mensagem fica em ``postgres_message``.
+        """
+        config = self.read_postgres_config()
+        self.pg_config = dict(PG_CONFIG)
+        self.pg_config.update({key: config[key] for key in PG_CONFIG if key in config})
+        
+        available = True
+        if psycopg2 is not None:
+            self.pg_backend = "psycopg2"
+            error = self.probe_postgres()
+            if error is None:
+                self.postgres_message = (f"✅ Driver psycopg2 encontrado - pool de conexões em "
+                                         f"{self.pg_config['host']}:{self.pg_config['port']}")
+            else:
+                available = False
+                self.postgres_message = (f"⚠️ PostgreSQL inacessível em {self.pg_config['host']}:"
+                                         f"{self.pg_config['port']} ({error}) - usando modo JSON")
+        else:
+            self.psql_path = find_psql(config.get("psql"))
+            if self.psql_path is not None:
+                self.pg_backend = "psql"
+                self.postgres_message = f"✅ PostgreSQL encontrado: {self.psql_path}"
+            else:
+                available = False
+                self.postgres_message = "⚠️ PostgreSQL não encontrado - usando modo JSON"
         
-        print("⚠️ PostgreSQL não encontrado - usando modo JSON")
-        return False
+        if verbose:
+            print(self.postgres_message)
+        return available
+    
+    def probe_postgres(self):
+        """Conexão de teste (connect_timeout curto) com ``SELECT 1`` no banco
+        ``postgres``. Retorna None se o servidor respondeu ou a mensagem de erro.
+        
+        Sem senha no ambiente, a recusa por falta de senha também prova que o
+        servidor está no ar (a senha é pedida depois, na primeira conexão).
+        """
+        password = (getattr(self, 'postgres_password', None) or
+                    os.environ.get("CAPIVARA_PG_PASSWORD") or os.environ.get("PGPASSWORD"))
+        config = dict(self.pg_config, dbname="postgres")
+        try:
+            conn = psycopg2.connect(connect_timeout=PG_CONNECT_TIMEOUT, password=password, **config)
+        except psycopg2.OperationalError as e:
+            message = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+            if password is None and "password" in message:
+                return None
+            return message
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        except psycopg2.Error as e:
+            return str(e).strip() or type(e).__name__
+        finally:
+            conn.close()
+        return None
+    
+    def get_postgres_password(self):
+        """Obtém a senha do PostgreSQL (ambiente ou prompt, uma única vez)"""
+        if not hasattr(self, 'postgres_password'):
+            env_password = os.environ.get("CAPIVARA_PG_PASSWORD") or os.environ.get("PGPASSWORD")
+            if env_password is not None:
+                self.postgres_password = env_password
+            else:
+                self.postgres_password = input("Digite senha do PostgreSQL: ")
+        return self.postgres_password
+    
+    def log_sql(self, sql_command):
+        """Registra o comando no log SQL (gravação assíncrona em segmentos)"""
+        self.sql_log.log(sql_command)
+    
+    def get_pool(self, database):
+        """Retorna (criando se preciso) o pool de conexões do banco"""
+        pool = self.pg_pools.get(database)
+        if pool is None:
+            config = dict(self.pg_config)
+            config["dbname"] = database
+            pool = pg_pool.ThreadedConnectionPool(
+                PG_POOL_MIN, PG_POOL_MAX,
+                password=self.get_postgres_password(),
+                connection_factory=HotConnection,
+                **config
+            )
+            self.pg_pools[database] = pool
+        return pool
+    
+    def close_pools(self):
+        """Fecha todas as conexões abertas nos pools"""
+        for pool in self.pg_pools.values():
+            pool.closeall()
+        self.pg_pools = {}
+    
+    @contextmanager
+    def transaction(self, database=None, autocommit=False):
+        """Empresta uma conexão do pool e abre uma transação.
+        
+        Todos os comandos executados no cursor entregue fazem parte da
+        mesma transação: commit ao sair do bloco, rollback em caso de erro.
+        """
+        database = database or self.pg_config["dbname"]
+        pool = self.get_pool(database)
+        conn = pool.getconn()
+        broken = False
+        try:
+            conn.autocommit = autocommit
+            with conn.cursor() as cursor:
+                yield cursor
+            if not autocommit:
+                conn.commit()
+        except Exception:
+            if conn.closed:
+                broken = True
+            elif not autocommit:
+                conn.rollback()
+            # PREPARE feito nesta transação pode ter sido desfeito
+            conn.prepared.clear()
+            raise
+        finally:
+            pool.putconn(conn, close=broken)
     
-    def execute_postgres_command(self, sql_command, database="postgres"):
-        """Executa comando PostgreSQL via linha de comando"""
+    @METRICS.timed("run_psql", ok=lambda result: result.returncode == 0)
+    def run_psql(self, sql_command, database, fetch=False, script=None):
+        """Executa SQL via processo psql (fallback sem psycopg2).
+        
+        Com ``script`` o conteúdo é enviado pela entrada padrão e executado
+        em uma única transação (usado pelo COPY da importação em lote).
+        """
+        cmd = [
+            self.psql_path,
+            "-h", self.pg_config["host"],
+            "-p", str(self.pg_config["port"]),
+            "-U", self.pg_config["user"],
+            "-d", database,
+            "-v", "ON_ERROR_STOP=1",
+        ]
+        if fetch:
+            # Saída sem alinhamento/cabeçalho para reconstruir as linhas
+            cmd += ["-q", "-A", "-t", "-F", PSQL_FIELD_SEP]
+        if script is not None:
+            cmd += ["-1", "-f", "-"]
+        else:
+            cmd += ["-c", sql_command]
+        
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.get_postgres_password()
+        env['PGCLIENTENCODING'] = 'LATIN1'
+        
+        return subprocess.run(
+            cmd,
+            env=env,
+            input=script,
+            capture_output=True,
+            text=True,
+            timeout=30 if script is None else None
+        )
+    
+    @METRICS.timed("execute_postgres_command", ok=bool)
+    def execute_postgres_command(self, sql_command, database="postgres", params=None, autocommit=False):
+        """Executa um comando PostgreSQL (pool psycopg2, ou psql como fallback)"""
         if not self.postgres_available:
             return False
         
         try:
             # Log do comando SQL
-            with open(self.sql_log, 'a', encoding='utf-8') as f:
-                f.write(f"-- {datetime.now()}\n{sql_command};\n\n")
-            
-            # Obter senha
-            if not hasattr(self, 'postgres_password'):
-                self.postgres_password = input("Digite senha do PostgreSQL: ")
+            self.log_sql(sql_command)
             
-            # Preparar comando
-            cmd = [
-                self.psql_path,
-                "-h", "localhost",
-                "-p", "5433",
-                "-U", "postgres", 
-                "-d", database,
-                "-c", sql_command
-            ]
-            
-            # Executar
-            env = os.environ.copy()
-            env['PGPASSWORD'] = self.postgres_password
-            env['PGCLIENTENCODING'] = 'LATIN1'
-            
-            result = subprocess.run(
-                cmd, 
-                env=env,
-                capture_output=True, 
-                text=True,
-                timeout=30
-            )
+            if self.pg_backend == "psycopg2":
+                with self.transaction(database, autocommit=autocommit) as cursor:
+                    cursor.execute(sql_command, params)
+                print("✅ Comando PostgreSQL executado")
+                return True
             
+            result = self.run_psql(interpolate_params(sql_command, params), database)
             if result.returncode == 0:
                 print("✅ Comando PostgreSQL executado")
                 return True
@@ -91,6 +871,230 @@ class DatabaseInterface:
             print(f"❌ Erro ao executar PostgreSQL: {e}")
             return False
     
+    def prepare_hot(self, cursor, name):
+        """Prepara o comando quente na conexão do cursor (uma vez por conexão)"""
+        prepared = cursor.connection.prepared
+        if name in prepared:
+            return
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+        if not cursor.fetchone():
+            types, sql_command = HOT_STATEMENTS[name]
+            cursor.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql_command}")
+        prepared.add(name)
+    
+    def run_hot(self, cursor, name, rows, fetch=False):
+        """Executa o comando preparado para cada linha de parâmetros.
+        
+        Várias linhas são enviadas com execute_batch (HOT_PAGE_SIZE comandos
+        por ida ao servidor) em vez de uma ida por linha.
+        """
+        self.prepare_hot(cursor, name)
+        placeholders = ", ".join(["%s"] * len(HOT_STATEMENTS[name][0]))
+        execute_sql = f"EXECUTE {name} ({placeholders})"
+        if len(rows) == 1 or fetch:
+            results = []
+            for row in rows:
+                cursor.execute(execute_sql, row)
+                if fetch:
+                    results.extend(cursor.fetchall())
+            return results
+        if pg_extras is not None:
+            pg_extras.execute_batch(cursor, execute_sql, rows, page_size=HOT_PAGE_SIZE)
+        else:
+            cursor.executemany(execute_sql, rows)
+        return []
+    
+    def execute_prepared(self, name, params, database="capivara_game", fetch=False):
+        """Executa um comando quente com parâmetros.
+        
+        Retorna as linhas (com ``fetch``) ou True; None/False em caso de erro.
+        """
+        rows = self.execute_prepared_many(name, [params], database, fetch)
+        if fetch:
+            return rows
+        return rows is not None
+    
+    @METRICS.timed("execute_prepared_many", ok=lambda rows: rows is not None)
+    def execute_prepared_many(self, name, rows, database="capivara_game", fetch=False):
+        """Executa um comando quente para várias linhas em uma única transação"""
+        if not self.postgres_available:
+            return None
+        
+        try:
+            for params in rows:
+                self.log_sql(describe_hot(name, params))
+            
+            if self.pg_backend == "psycopg2":
+                with self.transaction(database) as cursor:
+                    return self.run_hot(cursor, name, rows, fetch)
+            
+            # psql: cada processo é uma sessão nova, então não há o que preparar
+            script = "".join(describe_hot(name, params) + ";\n" for params in rows)
+            result = self.run_psql(None, database, fetch=fetch, script=script)
+            if result.returncode != 0:
+                print(f"❌ Erro PostgreSQL: {result.stderr}")
+                return None
+            return [tuple(line.split(PSQL_FIELD_SEP))
+                    for line in result.stdout.splitlines() if line]
+        
+        except Exception as e:
+            print(f"❌ Erro ao executar PostgreSQL: {e}")
+            return None
+    
+    def benchmark_hot_statements(self, rows=1000, database="capivara_game"):
+        """Latência por INSERT de usuário: SQL montado com f-string (antes),
+        comando preparado executado linha a linha e execute_batch.
+        
+        Tudo roda em uma única transação desfeita ao final. Retorna
+        {variante: microssegundos por comando}.
+        """
+        tag = f"bench{os.getpid()}_{int(time.time())}"
+        def sample(variant):
+            return [(f"{tag}_{variant}_{i}", f"Bench O'Neil {i}", f"{tag}_{variant}_{i}@bench", "hash")
+                    for i in range(rows)]
+        
+        pool = self.get_pool(database)
+        conn = pool.getconn()
+        results = {}
+        try:
+            with conn.cursor() as cursor:
+                start = time.perf_counter()
+                for nome, nome_completo, email, senha in sample("a"):
+                    cursor.execute(
+                        "INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash) "
+                        f"VALUES ('{nome}', '{nome_completo.replace(chr(39), chr(39) * 2)}', "
+                        f"'{email}', '{senha}')"
+                    )
+                results["f-string"] = (time.perf_counter() - start) / rows * 1e6
+                
+                start = time.perf_counter()
+                for params in sample("b"):
+                    self.run_hot(cursor, "insert_usuario", [params])
+                results["preparado"] = (time.perf_counter() - start) / rows * 1e6
+                
+                start = time.perf_counter()
+                self.run_hot(cursor, "insert_usuario", sample("c"))
+                results["preparado + execute_batch"] = (time.perf_counter() - start) / rows * 1e6
+        finally:
+            conn.rollback()
+            conn.prepared.clear()
+            pool.putconn(conn)
+        return results
+    
+    @METRICS.timed("execute_postgres_transaction", ok=bool)
+    def execute_postgres_transaction(self, sql_commands, database="capivara_game"):
+        """Executa vários comandos em uma única transação"""
+        if not self.postgres_available:
+            return False
+        
+        try:
+            for sql_command in sql_commands:
+                self.log_sql(sql_command)
+            
+            if self.pg_backend == "psycopg2":
+                with self.transaction(database) as cursor:
+                    for sql_command in sql_commands:
+                        cursor.execute(sql_command)
+                print(f"✅ Transação PostgreSQL executada ({len(sql_commands)} comandos)")
+                return True
+            
+            # psql -c executa múltiplos comandos em uma única transação
+            result = self.run_psql(";\n".join(sql_commands), database)
+            if result.returncode == 0:
+                print(f"✅ Transação PostgreSQL executada ({len(sql_commands)} comandos)")
+                return True
+            else:
+                print(f"❌ Erro PostgreSQL: {result.stderr}")
+                return False
+        
+        except Exception as e:
+            print(f"❌ Erro ao executar PostgreSQL: {e}")
+            return False
+    
+    @METRICS.timed("copy_to_postgres", ok=bool)
+    def copy_to_postgres(self, copies, extra_commands=(), database="capivara_game",
+                         prepare_commands=()):
+        """Envia linhas via COPY ... FROM STDIN, tudo em uma única transação.
+        
+        ``copies`` é uma lista de (tabela, colunas, linhas); ``prepare_commands``
+        roda no início e ``extra_commands`` ao final da mesma transação
+        (ex.: TRUNCATE antes da restauração, ajuste das sequences depois).
+        """
+        if not self.postgres_available:
+            return False
+        
+        copies = [(table, columns, rows) for table, columns, rows in copies if rows]
+        if not copies and not prepare_commands:
+            return True
+        
+        try:
+            for sql_command in prepare_commands:
+                self.log_sql(sql_command)
+            statements = []
+            for table, columns, rows in copies:
+                copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+                statements.append(copy_sql)
+                self.log_sql(f"{copy_sql} -- {len(rows)} linhas")
+            for sql_command in extra_commands:
+                self.log_sql(sql_command)
+            
+            if self.pg_backend == "psycopg2":
+                with self.transaction(database) as cursor:
+                    for sql_command in prepare_commands:
+                        cursor.execute(sql_command)
+                    for copy_sql, (_, _, rows) in zip(statements, copies):
+                        for chunk in csv_chunks(rows):
+                            cursor.copy_expert(copy_sql, chunk)
+                    for sql_command in extra_commands:
+                        cursor.execute(sql_command)
+                return True
+            
+            script = io.StringIO()
+            for sql_command in prepare_commands:
+                script.write(sql_command + ";\n")
+            for copy_sql, (_, _, rows) in zip(statements, copies):
+                script.write(copy_sql + ";\n")
+                for chunk in csv_chunks(rows):
+                    script.write(chunk.getvalue())
+                script.write("\\.\n")
+            for sql_command in extra_commands:
+                script.write(sql_command + ";\n")
+            
+            result = self.run_psql(None, database, script=script.getvalue())
+            if result.returncode == 0:
+                return True
+            print(f"❌ Erro PostgreSQL: {result.stderr}")
+            return False
+        
+        except Exception as e:
+            print(f"❌ Erro no COPY PostgreSQL: {e}")
+            return False
+    
+    @METRICS.timed("query_postgres", ok=lambda rows: rows is not None)
+    def query_postgres(self, sql_command, database="capivara_game", params=None):
+        """Executa uma consulta e retorna as linhas (lista de tuplas) ou None"""
+        if not self.postgres_available:
+            return None
+        
+        try:
+            self.log_sql(sql_command)
+            
+            if self.pg_backend == "psycopg2":
+                with self.transaction(database) as cursor:
+                    cursor.execute(sql_command, params)
+                    return cursor.fetchall() if cursor.description else []
+            
+            result = self.run_psql(interpolate_params(sql_command, params), database, fetch=True)
+            if result.returncode != 0:
+                print(f"❌ Erro PostgreSQL: {result.stderr}")
+                return None
+            return [tuple(line.split(PSQL_FIELD_SEP))
+                    for line in result.stdout.splitlines() if line]
+        
+        except Exception as e:
+            print(f"❌ Erro ao consultar PostgreSQL: {e}")
+            return None
+    
     def ensure_postgres_tables(self):
         """Garante que as tabelas existem no PostgreSQL"""
         if not self.postgres_available:
@@ -127,10 +1131,46 @@ class DatabaseInterface:
             )"""
         ]
         
-        for cmd in commands:
-            self.execute_postgres_command(cmd, "capivara_game")
+        self.execute_postgres_transaction(commands, "capivara_game")
+        self.ensure_placar()
         
         return True
+    
+    def ensure_placar(self):
+        """Cria placar_usuarios, seus triggers e reconstruir_ranking no
+        esquema simplificado, se o banco ainda não tiver o placar"""
+        if not self.postgres_available:
+            return False
+        if not self.pg_placar:
+            rows = self.query_postgres(PLACAR_CHECK_SQL, "capivara_game")
+            if rows is None:
+                return False
+            self.pg_placar = parse_bool(rows[0][0], default=False)
+            if not self.pg_placar:
+                self.pg_placar = self.execute_postgres_transaction(PLACAR_COMMANDS, "capivara_game")
+                if not self.pg_placar:
+                    print("⚠️ Não foi possível criar placar_usuarios no PostgreSQL")
+        return self.pg_placar
+    
+    def ensure_search_index(self):
+        """Extensões pg_trgm/unaccent e índices de trigramas, em transação
+        própria: sem permissão para criar as extensões a estrutura do banco
+        não é afetada e a busca passa a usar ILIKE"""
+        if not self.postgres_available:
+            return False
+        self.pg_trigram = self.execute_postgres_transaction(SEARCH_INDEX_COMMANDS, "capivara_game")
+        if not self.pg_trigram:
+            print("⚠️ Busca por trigramas indisponível (pg_trgm/unaccent) - usando ILIKE")
+        return self.pg_trigram
+    
+    def has_trigram_search(self):
+        """Verdadeiro se pg_trgm e f_unaccent existem no banco (consultado uma vez)"""
+        if self.pg_trigram is None:
+            rows = self.query_postgres(SEARCH_TRIGRAM_CHECK_SQL, "capivara_game")
+            if rows is None:
+                return False
+            self.pg_trigram = parse_bool(rows[0][0], default=False)
+        return self.pg_trigram
 
     def setup_postgres_database(self):
         """Configura banco PostgreSQL"""
@@ -142,21 +1182,20 @@ class DatabaseInterface:
         
         # 1. Criar novo banco (ignorar erro se já existir)
         print("📦 Criando banco capivara_game...")
-        self.execute_postgres_command("CREATE DATABASE capivara_game")
+        # CREATE DATABASE não pode rodar dentro de transação
+        self.execute_postgres_command("CREATE DATABASE capivara_game", autocommit=True)
         
         # 3. Criar estrutura no banco capivara_game
         print("📋 Criando tabelas...")
         
         # Primeiro, limpar tabelas se existirem
         cleanup_commands = [
+            "DROP TABLE IF EXISTS placar_usuarios CASCADE",
             "DROP TABLE IF EXISTS participantes_jogo CASCADE",
             "DROP TABLE IF EXISTS jogos CASCADE", 
             "DROP TABLE IF EXISTS usuarios CASCADE"
         ]
         
-        for cmd in cleanup_commands:
-            self.execute_postgres_command(cmd, "capivara_game")
-        
         # Agora criar as tabelas
         commands = [
             """CREATE TABLE usuarios (
@@ -192,18 +1231,36 @@ class DatabaseInterface:
                 ('pedro', 'Pedro Santos', 'pedro@email.com', 'hash101')"""
         ]
         
-        for cmd in commands:
-            self.execute_postgres_command(cmd, "capivara_game")
+        # Limpeza e criação na mesma transação; a busca por trigramas à parte
+        if not self.execute_postgres_transaction(cleanup_commands + commands, "capivara_game"):
+            return False
+        self.pg_placar = None
+        self.ensure_placar()
+        self.ensure_search_index()
         
         print("✅ PostgreSQL configurado!")
         return True
     
+    @METRICS.timed("load_data")
+    @with_store_lock
     def load_data(self):
-        """Carrega dados dos arquivos JSON"""
+        """Carrega dados dos arquivos JSON (snapshot + journal no modo journal)"""
+        self.loaded = True
+        if self.journal is not None:
+            users, games = self.journal.load()
+        else:
+            users = games = None
+            if self.users_file.exists():
+                with open(self.users_file, 'r', encoding='utf-8') as f:
+                    users = json.load(f)
+            if self.games_file.exists():
+                with open(self.games_file, 'r', encoding='utf-8') as f:
+                    games = json.load(f)
+        
         # Usuários
-        if self.users_file.exists():
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                self.users = json.load(f)
+        missing = users is None or games is None
+        if users is not None:
+            self.users = users
         else:
             self.users = [
                 {
@@ -225,42 +1282,669 @@ class DatabaseInterface:
                     "ativo": True
                 }
             ]
+        
+        # Jogos: qualquer formato antigo é migrado para o modelo normalizado
+        games = games if games is not None else []
+        self.games = [Game.from_dict(g) for g in games]
+        migrated = sum(1 for g in games if g.get("versao") != VERSAO_JOGO)
+        
+        # Arquivamento interrompido antes de regravar o jogos.json: vale o arquivo
+        last_batch = set(self.archive.manifest["ultimo_lote"])
+        duplicated = 0
+        if last_batch:
+            live = [g for g in self.games if g.id not in last_batch]
+            duplicated = len(self.games) - len(live)
+            self.games = live
+        
+        self.rebuild_indexes()
+        
+        if migrated:
+            print(f"🔄 {migrated} jogo(s) migrado(s) para o formato v{VERSAO_JOGO}")
+        if missing or migrated or duplicated:
+            self.save_data()
+    
+    def rebuild_indexes(self):
+        """Reconstrói os índices em memória e os contadores de ID"""
+        self.data_version += 1
+        self.stats = StatsCounters()
+        self.search_index = None  # construído sob demanda na primeira busca
+        self.users_by_id = {}
+        self.users_by_nome = {}
+        self.users_by_email = {}
+        # id -> posição na lista (substituição O(1) no refresh)
+        self.user_positions = {user["id_usuario"]: i for i, user in enumerate(self.users)}
+        for user in self.users:
+            self.index_user(user)
+        
+        self.games_by_id = {}
+        self.games_by_status = {}
+        self.game_positions = {game.id: i for i, game in enumerate(self.games)}
+        for game in self.games:
+            self.index_game(game)
+        self.stats.add_archive(self.archive)
+        
+        # Contadores monotônicos (equivalentes às sequences SERIAL)
+        self.next_user_id = max(self.users_by_id, default=0) + 1
+        self.next_game_id = max(max(self.games_by_id, default=0), self.archive.max_id) + 1
+        self.last_insert_id = None
+    
+    def index_user(self, user):
+        """Adiciona um usuário aos índices por id, nome_usuario e email
+        (usuário novo: chamado logo depois do append em ``users``)"""
+        self.user_positions.setdefault(user["id_usuario"], len(self.users) - 1)
+        self.users_by_id[user["id_usuario"]] = user
+        self.users_by_nome[user["nome_usuario"]] = user
+        self.users_by_email[user["email"]] = user
+        self.stats.add_user(user)
+        if self.search_index is not None:
+            self.search_index.add(user)
+    
+    def unindex_user(self, user):
+        """Remove um usuário dos índices (inverso de index_user; a posição fica)"""
+        self.users_by_id.pop(user["id_usuario"], None)
+        if self.users_by_nome.get(user["nome_usuario"]) is user:
+            del self.users_by_nome[user["nome_usuario"]]
+        if self.users_by_email.get(user["email"]) is user:
+            del self.users_by_email[user["email"]]
+        self.stats.add_user(user, sign=-1)
+    
+    def index_game(self, game):
+        """Adiciona um jogo aos índices por id e por status
+        (jogo novo: chamado logo depois do append em ``games``)"""
+        self.game_positions.setdefault(game.id, len(self.games) - 1)
+        self.games_by_id[game.id] = game
+        self.games_by_status.setdefault(game.status, {})[game.id] = game
+        self.stats.add_game(game)
+    
+    def unindex_game(self, game):
+        """Remove um jogo dos índices (inverso de index_game; a posição fica)"""
+        self.games_by_id.pop(game.id, None)
+        bucket = self.games_by_status.get(game.status)
+        if bucket is not None:
+            bucket.pop(game.id, None)
+            if not bucket:
+                del self.games_by_status[game.status]
+        self.stats.add_game(game, sign=-1)
+    
+    def set_game_status(self, game, status):
+        """Altera o status de um jogo mantendo o índice por status consistente"""
+        old_bucket = self.games_by_status.get(game.status)
+        if old_bucket is not None:
+            old_bucket.pop(game.id, None)
+            if not old_bucket:
+                del self.games_by_status[game.status]
+        self.stats.change_status(game.status, status)
+        game.status = status
+        self.data_version += 1
+        self.games_by_status.setdefault(status, {})[game.id] = game
+    
+    def allocate_user_id(self):
+        new_id = self.next_user_id
+        self.next_user_id += 1
+        return new_id
+    
+    def allocate_game_id(self):
+        new_id = self.next_game_id
+        self.next_game_id += 1
+        return new_id
+    
+    @with_write_session
+    def add_game(self, game):
+        """Registra um jogo já montado (ex.: simulação), o persiste e retorna
+        o id definitivo (pode diferir do reservado)"""
+        if game.id in self.games_by_id or game.id <= self.archive.max_id:
+            # Id reservado antes de outro processo gravar um jogo com o mesmo id
+            game.id = self.allocate_game_id()
+        self.games.append(game)
+        self.index_game(game)
+        self.persist("jogos", game)
+        return game.id
+    
+    @with_write_session
+    def update_game(self, game):
+        """Grava uma cópia alterada de um jogo ativo.
+        
+        ``game.rev`` é a revisão em que a cópia se baseou: se o jogo foi
+        gravado depois dela (por outro processo no modo journal, ou por outra
+        cópia no modo json), levanta ConflictError sem alterar nada (releia
+        com get_game e aplique a alteração de novo).
+        """
+        old = self.games_by_id[game.id]
+        if self.journal is None:
+            # No modo journal quem confere a revisão é o próprio journal
+            if game.rev != old.rev:
+                raise ConflictError("jogos", game.id, game.rev, old.rev)
+            game.rev = old.rev + 1
+        self.persist("jogos", game)
+        self.games[self.game_positions[game.id]] = game
+        self.unindex_game(old)
+        self.index_game(game)
+    
+    @with_write_session
+    def archive_finished_games(self, save=True):
+        """Move os jogos encerrados (status diferente de em_andamento) para o
+        arquivo colunar; no JSON ficam só os jogos ativos.
+        
+        Retorna o número de jogos arquivados.
+        """
+        finished = [g for g in self.games if g.status != "em_andamento"]
+        if not finished:
+            return 0
+        names = {user_id: self.users_by_id[user_id]["nome_usuario"]
+                 for game in finished for user_id in game.jogadores
+                 if user_id in self.users_by_id}
+        self.archive.append(finished, names)
+        self.games = [g for g in self.games if g.status == "em_andamento"]
+        self.rebuild_indexes()
+        if save:
             self.save_data()
+        return len(finished)
+    
+    def get_game(self, game_id):
+        """Jogo ativo (em memória) ou arquivado (reconstruído do arquivo)"""
+        game = self.games_by_id.get(game_id)
+        return game if game is not None else self.archive.game(game_id)
+    
+    def check_user_unique(self, nome_usuario, email):
+        """Valida as restrições UNIQUE de usuarios; retorna mensagem de erro ou None"""
+        if nome_usuario in self.users_by_nome:
+            return f"Nome de usuário '{nome_usuario}' já existe"
+        if email in self.users_by_email:
+            return f"Email '{email}' já cadastrado"
+        return None
+    
+    def search_users(self, termo, limit=20):
+        """Busca usuários por nome de usuário, nome completo ou email.
+        
+        Retorna [(usuario, tipo)] ordenados por relevância (exato, prefixo,
+        substring e aproximado), usando pg_trgm quando o PostgreSQL está
+        ativo (ILIKE se as extensões não estão instaladas) e o índice de
+        trigramas em memória caso contrário.
+        """
+        consulta = normalizar(termo.strip())
+        if not consulta:
+            return []
+        
+        if self.postgres_available:
+            params = {
+                "q": consulta,
+                "prefixo": like_escape(consulta) + "%",
+                "substring": "%" + like_escape(consulta) + "%",
+                "limit": limit
+            }
+            sql = SEARCH_USERS_SQL if self.has_trigram_search() else SEARCH_USERS_ILIKE_SQL
+            rows = self.query_postgres(sql, "capivara_game", params)
+            if rows is not None:
+                return [({"id_usuario": int(r[0]), "nome_usuario": r[1],
+                          "nome_completo": r[2], "email": r[3]}, int(r[4])) for r in rows]
+        
+        if self.search_index is None:
+            self.search_index = UserSearchIndex()
+            self.search_index.build(self.users)
+        return [(self.users_by_id[user_id], tipo)
+                for user_id, tipo, _ in self.search_index.search(consulta, limit)]
+    
+    def ranking_usuarios(self, limit=None):
+        """Ranking no formato da view ranking_usuarios (apenas usuários ativos).
         
-        # Jogos
-        if self.games_file.exists():
-            with open(self.games_file, 'r', encoding='utf-8') as f:
-                self.games = json.load(f)
+        Percorre o Leaderboard já ordenado e para nos ``limit`` primeiros.
+        """
+        rows = []
+        for user_id in self.stats.leaderboard:
+            if limit is not None and len(rows) >= limit:
+                break
+            user = self.users_by_id.get(user_id)
+            if user is None or not user.get("ativo", True):
+                continue
+            entry = self.stats.user_entry(user_id)
+            rows.append({
+                "id_usuario": user["id_usuario"],
+                "nome_usuario": user["nome_usuario"],
+                "nome_completo": user["nome_completo"],
+                "total_jogos_participados": entry["jogos"],
+                "jogos_vencidos": entry["jogos_vencidos"],
+                "partidas_vencidas": entry["partidas_vencidas"],
+                "pontos_totais_acumulados": entry["pontos"],
+                "percentual_vitorias_jogos": round(
+                    entry["jogos_vencidos"] / entry["jogos"] * 100 if entry["jogos"] else 0, 2),
+                "percentual_vitorias_partidas": round(
+                    entry["partidas_vencidas"] / entry["partidas"] * 100 if entry["partidas"] else 0, 2)
+            })
+        return rows
+    
+    def rebuild_ranking(self):
+        """Reconstrução completa do ranking: placar_usuarios no PostgreSQL
+        (reconstruir_ranking) e o Leaderboard em memória.
+        
+        Retorna o número de linhas do placar no PostgreSQL, None sem banco ou
+        False se o banco está disponível mas a reconstrução falhou.
+        """
+        with self.lock:
+            self.stats.rebuild_leaderboard(self.users_by_id)
+        if not self.postgres_available:
+            return None
+        self.ensure_placar()
+        rows = self.query_postgres("SELECT reconstruir_ranking()")
+        return int(rows[0][0]) if rows else False
+    
+    @with_write_session
+    def reset_data(self):
+        """Apaga todos os dados locais"""
+        self.users = []
+        self.games = []
+        self.archive.clear()
+        self.rebuild_indexes()
+        self.save_data()
+    
+    @METRICS.timed("save_data")
+    @with_write_session
+    def save_data(self):
+        """Salva dados completos nos arquivos (no modo journal: compactação
+        síncrona em uma nova geração, que os outros processos recarregam)"""
+        if self.journal is not None:
+            self.journal.compact(self.users, self.games, background=False,
+                                 extras=self.snapshot_extras(), new_generation=True)
+            return
+        
+        escrever_json_atomico(self.users_file, self.users, metrica="save_data.usuarios")
+        escrever_json_atomico(self.games_file, [g.to_dict() for g in self.games],
+                              metrica="save_data.jogos")
+        escrever_json_atomico(self.header_file, dict(self.header(),
+                                                     arquivos=self.file_signatures()), indent=None)
+    
+    def snapshot_extras(self):
+        """Arquivos derivados gravados junto de cada snapshot do journal"""
+        return {self.header_file: self.header(self.journal.seq)}
+    
+    def header(self, seq=None):
+        return {"seq": seq, "usuarios": len(self.users), "jogos": len(self.games)}
+    
+    def file_signatures(self):
+        """[tamanho, mtime] de usuarios.json e jogos.json (validade do cabeçalho no modo json)"""
+        signatures = {}
+        for path in (self.users_file, self.games_file):
+            if path.exists():
+                st = path.stat()
+                signatures[path.name] = [st.st_size, st.st_mtime_ns]
+        return signatures
+    
+    def read_header(self):
+        """Cabeçalho do último snapshot, ou None se não corresponder mais aos
+        arquivos (journal com registros novos, JSON alterados)"""
+        try:
+            with open(self.header_file, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.journal is not None:
+            current = self.journal.is_current(header.get("seq"))
+        else:
+            current = header.get("seq") is None and header.get("arquivos") == self.file_signatures()
+        return header if current else None
+    
+    def counts(self):
+        """(usuários, jogos ativos) sem carregar os JSON quando o cabeçalho é válido"""
+        if not self.loaded:
+            header = self.read_header()
+            if header is not None:
+                return header["usuarios"], header["jogos"]
+        return len(self.users), len(self.games)
+    
+    @METRICS.timed("persist")
+    def persist(self, colecao, registro):
+        """Persiste um registro novo/alterado da coleção ("usuarios" ou "jogos").
+        
+        No modo journal custa O(registro): a mutação é anexada ao journal e a
+        compactação roda em segundo plano ao atingir o limite de registros.
+        No modo json a regravação é feita pela thread de escrita assíncrona,
+        agrupando operações seguidas.
+        """
+        self.data_version += 1
+        if self.journal is None:
+            self.write_behind.request_json_flush()
+            return
+        
+        if isinstance(registro, Game):
+            registro.rev = self.journal.append("upsert", colecao, registro.to_dict())
         else:
-            self.games = []
+            self.journal.append("upsert", colecao, registro)
+        if self.journal.needs_compaction():
+            self.journal.compact(self.users, self.games, extras=self.snapshot_extras())
+    
+    def persist_many(self, colecao, registros):
+        """Persiste um lote de registros com uma única escrita"""
+        self.data_version += 1
+        if self.journal is None:
             self.save_data()
+            return
+        
+        revs = self.journal.append_many("upsert", colecao,
+                                        [r.to_dict() if isinstance(r, Game) else r for r in registros])
+        for registro, rev in zip(registros, revs):
+            if isinstance(registro, Game):
+                registro.rev = rev
+        if self.journal.needs_compaction():
+            self.journal.compact(self.users, self.games, extras=self.snapshot_extras())
     
-    def save_data(self):
-        """Salva dados nos arquivos"""
-        with open(self.users_file, 'w', encoding='utf-8') as f:
-            json.dump(self.users, f, ensure_ascii=False, indent=2)
+    @with_write_session
+    def bulk_create_users(self, rows):
+        """Cria usuários em lote: COPY no PostgreSQL + um único append no JSON.
         
-        with open(self.games_file, 'w', encoding='utf-8') as f:
-            json.dump(self.games, f, ensure_ascii=False, indent=2)
+        ``rows`` é um iterável de dicionários com nome_usuario, nome_completo,
+        email e, opcionalmente, senha_hash e ativo. Linhas inválidas ou que
+        violam as restrições UNIQUE são rejeitadas. Retorna o relatório.
+        """
+        start = time.perf_counter()
+        now = datetime.now().isoformat()
+        new_users = []
+        rejected = 0
+        
+        for row in rows:
+            nome = (row.get("nome_usuario") or "").strip()
+            nome_completo = (row.get("nome_completo") or "").strip()
+            email = (row.get("email") or "").strip()
+            if not all([nome, nome_completo, email]) or self.check_user_unique(nome, email):
+                rejected += 1
+                continue
+            
+            new_user = {
+                "id_usuario": self.allocate_user_id(),
+                "nome_usuario": nome,
+                "nome_completo": nome_completo,
+                "email": email,
+                "senha_hash": row.get("senha_hash") or f"hash_{hash(nome)}",
+                "data_cadastro": row.get("data_cadastro") or now,
+                "ativo": parse_bool(row.get("ativo"))
+            }
+            self.users.append(new_user)
+            self.index_user(new_user)
+            new_users.append(new_user)
+        
+        pg_success = self.copy_to_postgres(
+            [("usuarios",
+              ("id_usuario", "nome_usuario", "nome_completo", "email",
+               "senha_hash", "data_cadastro", "ativo"),
+              [(u["id_usuario"], u["nome_usuario"], u["nome_completo"], u["email"],
+                u["senha_hash"], u["data_cadastro"], u["ativo"]) for u in new_users])],
+            ["SELECT setval(pg_get_serial_sequence('usuarios', 'id_usuario'), "
+             "(SELECT MAX(id_usuario) FROM usuarios))"]
+        )
+        
+        if new_users:
+            self.persist_many("usuarios", new_users)
+        
+        return self.bulk_report("usuarios", len(new_users), rejected, start, pg_success)
+    
+    @with_write_session
+    def bulk_create_games(self, rows):
+        """Cria jogos em lote: COPY de jogos/participantes + um único append no JSON.
+        
+        ``rows`` traz numero_jogadores e, opcionalmente, status, pontos_meta e
+        participantes (lista de id_usuario ou texto "1;2;3" no CSV).
+        """
+        start = time.perf_counter()
+        now = datetime.now().isoformat()
+        new_games = []
+        rejected = 0
+        
+        for row in rows:
+            try:
+                num_players = int(row.get("numero_jogadores"))
+                participantes = row.get("participantes") or []
+                if isinstance(participantes, str):
+                    participantes = [int(p) for p in participantes.split(";") if p.strip()]
+                participantes = [int(p) for p in participantes]
+                pontos_meta = int(row.get("pontos_meta") or 50)
+            except (TypeError, ValueError):
+                rejected += 1
+                continue
+            
+            if (num_players not in (2, 3, 4) or len(participantes) > num_players or
+                    len(set(participantes)) != len(participantes) or
+                    any(p not in self.users_by_id for p in participantes)):
+                rejected += 1
+                continue
+            
+            new_game = Game(self.allocate_game_id(), num_players,
+                            row.get("status") or "em_andamento",
+                            row.get("data_inicio") or now, pontos_meta=pontos_meta,
+                            jogadores=participantes)
+            self.games.append(new_game)
+            self.index_game(new_game)
+            new_games.append(new_game)
+        
+        pg_success = self.copy_to_postgres(
+            [("jogos",
+              ("id_jogo", "numero_jogadores", "data_inicio", "status", "pontos_meta"),
+              [(g.id, g.numero_jogadores, g.data_inicio, g.status,
+                g.pontos_meta) for g in new_games]),
+             ("participantes_jogo",
+              ("id_jogo", "id_usuario", "posicao_mesa"),
+              [(g.id, id_usuario, posicao)
+               for g in new_games
+               for posicao, id_usuario in enumerate(g.jogadores, 1)])],
+            ["SELECT setval(pg_get_serial_sequence('jogos', 'id_jogo'), "
+             "(SELECT MAX(id_jogo) FROM jogos))"]
+        )
+        
+        if new_games:
+            self.persist_many("jogos", new_games)
+        
+        return self.bulk_report("jogos", len(new_games), rejected, start, pg_success)
     
-    def execute_sql_and_json(self, sql_command, operation, data=None):
-        """Executa tanto no PostgreSQL quanto no JSON"""
+    @with_write_session
+    def bulk_add_simulations(self, players, jogos):
+        """Grava em lote os jogos de uma simulação em massa.
         
-        # 1. Tentar PostgreSQL
-        pg_success = False
+        ``players`` são os usuários por posição na mesa e ``jogos`` a lista de
+        (vencedor, pontuacao, numero_partidas, partidas_vencidas) produzida por
+        simular_lote.
+        """
+        now = datetime.now().isoformat()
+        ids = tuple(p["id_usuario"] for p in players)
+        new_games = []
+        for vencedor, pontuacao, num_partidas, vencidas in jogos:
+            new_game = Game(self.allocate_game_id(), len(players), "finalizado", now, now,
+                            domino.PONTOS_META, ids, pontuacao, ids[vencedor],
+                            num_partidas, vencidas)
+            self.games.append(new_game)
+            self.index_game(new_game)
+            new_games.append(new_game)
+        
+        pg_success = self.copy_to_postgres(
+            [("jogos",
+              ("id_jogo", "numero_jogadores", "data_inicio", "status", "pontos_meta"),
+              [(g.id, g.numero_jogadores, now, "finalizado", g.pontos_meta) for g in new_games]),
+             ("participantes_jogo",
+              ("id_jogo", "id_usuario", "posicao_mesa", "pontos_acumulados"),
+              [(g.id, id_usuario, posicao, total)
+               for g in new_games
+               for posicao, (id_usuario, total) in enumerate(zip(g.jogadores, g.pontuacao), 1)])],
+            ["SELECT setval(pg_get_serial_sequence('jogos', 'id_jogo'), "
+             "(SELECT MAX(id_jogo) FROM jogos))"]
+        )
+        
+        if new_games:
+            self.persist_many("jogos", new_games)
+        return pg_success
+    
+    def bulk_report(self, tabela, inserted, rejected, start, pg_success):
+        """Monta e imprime o relatório de throughput da importação"""
+        elapsed = time.perf_counter() - start
+        report = {
+            "tabela": tabela,
+            "inseridos": inserted,
+            "rejeitados": rejected,
+            "segundos": round(elapsed, 3),
+            "linhas_por_segundo": round(inserted / elapsed, 1) if elapsed > 0 else 0.0,
+            "postgres": pg_success
+        }
+        print(f"📥 Importação de {tabela}: {inserted} inseridos, {rejected} rejeitados "
+              f"em {report['segundos']}s ({report['linhas_por_segundo']:,.0f} linhas/s)")
         if self.postgres_available:
-            pg_success = self.execute_postgres_command(sql_command, "capivara_game")
+            print(f"   • PostgreSQL (COPY): {'✅ OK' if pg_success else '❌ Falhou'}")
+        return report
+    
+    def create_backup(self, full=False):
+        """Backup incremental (ou completo) de usuários, jogos (ativos e
+        arquivados) e log SQL"""
+        return self.backups.create(self.users, itertools.chain(self.games, self.archive.iter_games()),
+                                   self.sql_log, full=full)
+    
+    @with_write_session
+    def restore_backup(self, nome, postgres=False):
+        """Restaura usuarios.json/jogos.json a partir de um backup e recarrega.
         
-        # 2. Executar no JSON como backup
-        json_success = self.execute_json_operation(operation, data)
+        Com ``postgres`` as tabelas usuarios/jogos/participantes_jogo são
+        recarregadas via COPY na mesma transação do TRUNCATE.
+        Retorna {colecao: registros restaurados}.
+        """
+        problemas = self.backups.verify(nome)
+        if problemas:
+            raise BackupError("; ".join(problemas))
+        
+        if self.journal is not None:
+            self.journal.reset()
+        totais = self.backups.restore(nome, self.users_file, self.games_file, verify=False)
+        # O jogos.json restaurado já tem todos os jogos, inclusive os arquivados
+        self.archive.clear()
+        self.load_data()
+        self.save_data()
+        
+        if postgres and self.postgres_available:
+            self.ensure_postgres_tables()
+            pg_success = self.copy_to_postgres(
+                [("usuarios",
+                  ("id_usuario", "nome_usuario", "nome_completo", "email",
+                   "senha_hash", "data_cadastro", "ativo"),
+                  [(u["id_usuario"], u["nome_usuario"], u["nome_completo"], u["email"],
+                    u["senha_hash"], u["data_cadastro"], u.get("ativo", True)) for u in self.users]),
+                 ("jogos",
+                  ("id_jogo", "numero_jogadores", "data_inicio", "status", "pontos_meta"),
+                  [(g.id, g.numero_jogadores, g.data_inicio, g.status, g.pontos_meta)
+                   for g in self.games]),
+                 ("participantes_jogo",
+                  ("id_jogo", "id_usuario", "posicao_mesa", "pontos_acumulados"),
+                  [(g.id, id_usuario, posicao, pontos)
+                   for g in self.games
+                   for posicao, (id_usuario, pontos) in enumerate(zip(g.jogadores, g.pontuacao), 1)])],
+                ["SELECT setval(pg_get_serial_sequence('usuarios', 'id_usuario'), "
+                 "(SELECT COALESCE(MAX(id_usuario), 1) FROM usuarios))",
+                 "SELECT setval(pg_get_serial_sequence('jogos', 'id_jogo'), "
+                 "(SELECT COALESCE(MAX(id_jogo), 1) FROM jogos))"],
+                prepare_commands=["TRUNCATE participantes_jogo, jogos, usuarios RESTART IDENTITY CASCADE"]
+            )
+            totais["postgres"] = pg_success
+        return totais
+    
+    def close(self):
+        """Libera recursos: esvazia a escrita assíncrona, compacta o journal,
+        grava o log SQL e fecha os pools"""
+        self.write_behind.drain()
+        # Dados nunca carregados (modo lazy): nada mudou, o snapshot em disco vale
+        if self.loaded:
+            with self.write_session():
+                archived = 0
+                if sum(1 for g in self.games if g.status != "em_andamento") >= ARCHIVE_MIN_GAMES:
+                    archived = self.archive_finished_games(save=False)
+                if self.journal is not None:
+                    self.journal.close(self.users, self.games, extras=self.snapshot_extras(),
+                                       new_generation=archived > 0)
+                else:
+                    self.save_data()
+        self.store_lock.close()
+        self.archive.fechar()
+        self.sql_log.close()
+        self.close_pools()
+        if METRICS.enabled:
+            self.export_metrics()
+    
+    def export_metrics(self):
+        """Grava data/metricas.json e data/metricas.prom (texto do Prometheus)"""
+        return [METRICS.export(self.data_dir / "metricas.json"),
+                METRICS.export(self.data_dir / "metricas.prom", "prometheus")]
+    
+    @METRICS.timed("execute_sql_and_json", ok=bool)
+    def execute_sql_and_json(self, sql_command, operation, data=None, params=None):
+        """Aplica a operação no JSON e enfileira o comando para o PostgreSQL.
+        
+        ``sql_command`` pode ser o nome de um comando de HOT_STATEMENTS. O menu
+        não espera pelo banco: o comando é gravado em pendentes.jsonl e
+        aplicado em lote pela thread de escrita assíncrona.
+        """
+        with self.lock:
+            json_success = self.execute_json_operation(operation, data)
+        
+        if json_success and self.postgres_available:
+            self.get_postgres_password()  # eventual prompt na thread do menu
+            self.log_sql(describe_hot(sql_command, params) if sql_command in HOT_STATEMENTS
+                         else sql_command)
+            self.write_behind.submit(sql_command, "capivara_game", params)
+        
+        return json_success
+    
+    @METRICS.timed("apply_postgres_batch")
+    def apply_postgres_batch(self, database, commands):
+        """Aplica [(sql, params)] em uma única transação (usado pela escrita assíncrona).
+        
+        Erros de conexão sobem como exceções comuns (nova tentativa); erros
+        do próprio comando viram PermanentWriteError.
+        """
+        if not self.postgres_available:
+            raise RuntimeError("PostgreSQL não disponível")
+        
+        if self.pg_backend == "psycopg2":
+            try:
+                with self.transaction(database) as cursor:
+                    # Comandos quentes consecutivos vão juntos em um execute_batch
+                    for sql_command, group in itertools.groupby(commands, key=lambda c: c[0]):
+                        if sql_command in HOT_STATEMENTS:
+                            self.run_hot(cursor, sql_command, [params for _, params in group])
+                        else:
+                            for _, params in group:
+                                cursor.execute(sql_command, params)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
+            except psycopg2.Error as e:
+                raise PermanentWriteError(str(e)) from e
+            return
         
-        return pg_success or json_success
+        script = "".join(
+            (describe_hot(sql_command, params) if sql_command in HOT_STATEMENTS
+             else interpolate_params(sql_command, params)) + ";\n"
+            for sql_command, params in commands
+        )
+        result = self.run_psql(None, database, script=script)
+        if result.returncode == 3:  # erro em um comando do script (ON_ERROR_STOP)
+            raise PermanentWriteError(result.stderr.strip())
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
     
+    def drain_writes(self, timeout=10.0):
+        """Aguarda a fila de escrita assíncrona; o que sobrar fica para a próxima execução"""
+        if self.write_behind.queue.unfinished_tasks:
+            print(f"⏳ Gravando {self.write_behind.queue.unfinished_tasks} operação(ões) pendente(s) no PostgreSQL...")
+        remaining = self.write_behind.drain(timeout)
+        if remaining:
+            print(f"⚠️ {remaining} comando(s) ficaram em {self.write_behind.pending_file} "
+                  f"e serão reenviados na próxima execução")
+        if self.write_behind.falhas:
+            print(f"❌ {self.write_behind.falhas} comando(s) rejeitado(s) pelo PostgreSQL "
+                  f"(ver {self.write_behind.failed_file})")
+        return remaining
+    
+    @with_write_session
     def execute_json_operation(self, operation, data):
-        """Executa operações no JSON"""
+        """Executa operações no JSON (validação e ids sobre os dados já
+        atualizados com as escritas de outros processos)"""
         try:
             if operation == "create_user":
-                new_id = max([u['id_usuario'] for u in self.users], default=0) + 1
+                error = self.check_user_unique(data["nome_usuario"], data["email"])
+                if error:
+                    print(f"❌ {error}")
+                    return False
+                
+                new_id = self.allocate_user_id()
                 new_user = {
                     "id_usuario": new_id,
                     "nome_usuario": data["nome_usuario"],
@@ -271,21 +1955,20 @@ class DatabaseInterface:
                     "ativo": True
                 }
                 self.users.append(new_user)
-                self.save_data()
+                self.index_user(new_user)
+                self.last_insert_id = new_id
+                self.persist("usuarios", new_user)
                 return True
             
             elif operation == "create_game":
-                new_id = max([g['id_jogo'] for g in self.games], default=0) + 1
-                new_game = {
-                    "id_jogo": new_id,
-                    "numero_jogadores": data["numero_jogadores"],
-                    "data_inicio": datetime.now().isoformat(),
-                    "status": "em_andamento",
-                    "pontos_meta": 50,
-                    "participantes": data.get("participantes", [])
-                }
+                new_id = self.allocate_game_id()
+                new_game = Game(new_id, data["numero_jogadores"], "em_andamento",
+                                datetime.now().isoformat(),
+                                jogadores=data.get("participantes", []))
                 self.games.append(new_game)
-                self.save_data()
+                self.index_game(new_game)
+                self.last_insert_id = new_id
+                self.persist("jogos", new_game)
                 return True
             
             return False
@@ -297,8 +1980,10 @@ class DatabaseInterface:
 class CapivaraGameLBD:
     """Sistema Capivara Game para LBD"""
     
-    def __init__(self):
-        self.db = DatabaseInterface()
+    def __init__(self, db=None, profile=None):
+        """``profile`` (StartupProfile) é impresso antes do primeiro menu"""
+        self.profile = profile
+        self.db = db if db is not None else DatabaseInterface(lazy=LAZY_LOAD, profile=profile)
     
     def start(self):
         """Inicia o sistema"""
@@ -309,28 +1994,43 @@ class CapivaraGameLBD:
         print("📚 Desenvolvido para disciplina LBD")
         print("=" * 60)
         
+        # Detecção iniciada em segundo plano pelo DatabaseInterface
+        postgres_available = self.db.postgres_available
+        if self.db.postgres_message:
+            print(self.db.postgres_message)
+        if self.profile is not None:
+            self.profile.mark("detecção PostgreSQL (espera)")
+        
+        self.show_status()
+        if self.profile is not None:
+            self.profile.mark("status")
+            self.profile.report()
+        
         # Configurar PostgreSQL se disponível
-        if self.db.postgres_available:
+        if postgres_available:
             setup = input("\n🔧 Configurar PostgreSQL agora? (s/n): ").lower()
             if setup == 's':
                 self.db.setup_postgres_database()
         
-        self.show_status()
         self.main_menu()
     
     def show_status(self):
-        """Mostra status do sistema"""
+        """Mostra status do sistema (contagens do cabeçalho se os dados ainda
+        não foram carregados)"""
+        users, games = self.db.counts()
         print(f"\n📊 STATUS DO SISTEMA:")
         print(f"   • PostgreSQL: {'✅ Disponível' if self.db.postgres_available else '❌ Não disponível'}")
-        print(f"   • Usuários: {len(self.db.users)}")
-        print(f"   • Jogos: {len(self.db.games)}")
+        print(f"   • Usuários: {users}")
+        print(f"   • Jogos: {games}")
         print(f"   • Dados salvos em: {self.db.data_dir}")
         if self.db.postgres_available:
-            print(f"   • SQL log: {self.db.sql_log}")
+            print(f"   • SQL log: {self.db.sql_log.directory}")
     
     def main_menu(self):
         """Menu principal"""
         while True:
+            # Escritas de outros processos na mesma pasta de dados
+            self.db.refresh()
             print("\n" + "=" * 50)
             print("📋 MENU PRINCIPAL - LBD")
             print("=" * 50)
@@ -402,9 +2102,10 @@ class CapivaraGameLBD:
             print("❌ Todos os campos são obrigatórios!")
             return
         
-        # SQL para PostgreSQL
-        sql_command = f"""INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash) 
-                         VALUES ('{nome}', '{nome_completo}', '{email}', 'hash_{hash(nome)}')"""
+        error = self.db.check_user_unique(nome, email)
+        if error:
+            print(f"❌ {error}!")
+            return
         
         # Dados para JSON
         user_data = {
@@ -414,15 +2115,23 @@ class CapivaraGameLBD:
             "senha_hash": f"hash_{hash(nome)}"
         }
         
-        # Executar em ambos
-        success = self.db.execute_sql_and_json(sql_command, "create_user", user_data)
+        # Executar em ambos (PostgreSQL: comando preparado com parâmetros)
+        success = self.db.execute_sql_and_json(
+            "insert_usuario", "create_user", user_data,
+            (nome, nome_completo, email, user_data["senha_hash"])
+        )
         
         if success:
             print(f"✅ Usuário '{nome}' criado com sucesso!")
-            print("💾 Dados salvos no PostgreSQL e JSON")
+            print(self.saved_message())
         else:
             print("❌ Erro ao criar usuário!")
     
+    def saved_message(self):
+        if self.db.postgres_available:
+            return "💾 Dados salvos no JSON (PostgreSQL em segundo plano)"
+        return "💾 Dados salvos no JSON"
+    
     def list_users(self):
         """Lista usuários"""
         users = self.db.users
@@ -447,9 +2156,10 @@ class CapivaraGameLBD:
             print("2. 📋 Listar Jogos")
             print("3. 🏆 Simular Partida")
             print("4. 📊 Estatísticas de Jogos")
-            print("5. 🔙 Voltar")
+            print("5. 🎞️ Rever Jogo (replay)")
+            print("6. 🔙 Voltar")
             
-            choice = input("\n🔸 Escolha (1-5): ").strip()
+            choice = input("\n🔸 Escolha (1-6): ").strip()
             
             if choice == "1":
                 self.create_game()
@@ -460,6 +2170,8 @@ class CapivaraGameLBD:
             elif choice == "4":
                 self.game_stats()
             elif choice == "5":
+                self.replay_game()
+            elif choice == "6":
                 break
     
     def create_game(self):
@@ -473,9 +2185,6 @@ class CapivaraGameLBD:
                 print("❌ Número deve ser 2, 3 ou 4!")
                 return
             
-            # SQL para PostgreSQL
-            sql_command = f"INSERT INTO jogos (numero_jogadores) VALUES ({num_players})"
-            
             # Dados para JSON
             game_data = {
                 "numero_jogadores": num_players,
@@ -483,12 +2192,13 @@ class CapivaraGameLBD:
             }
             
             # Executar
-            success = self.db.execute_sql_and_json(sql_command, "create_game", game_data)
+            success = self.db.execute_sql_and_json("insert_jogo", "create_game", game_data,
+                                                   (num_players, "em_andamento"))
             
             if success:
-                game_id = len(self.db.games)
+                game_id = self.db.last_insert_id
                 print(f"✅ Jogo {game_id} criado com {num_players} jogadores!")
-                print("💾 Dados salvos no PostgreSQL e JSON")
+                print(self.saved_message())
             else:
                 print("❌ Erro ao criar jogo!")
                 
@@ -505,72 +2215,133 @@ class CapivaraGameLBD:
         print("-" * 60)
         
         for game in games:
-            data = game['data_inicio'][:19] if game['data_inicio'] else "N/A"
-            print(f"{game['id_jogo']:<4} {game['numero_jogadores']:<10} "
-                  f"{game['status']:<15} {data:<20}")
+            data = game.data_inicio[:19] if game.data_inicio else "N/A"
+            print(f"{game.id:<4} {game.numero_jogadores:<10} "
+                  f"{game.status:<15} {data:<20}")
+        if len(self.db.archive):
+            print(f"🗄️ + {len(self.db.archive)} jogo(s) encerrado(s) no arquivo (data/arquivo)")
     
-    def reports_menu(self):
-        """Menu de relatórios SQL"""
-        print("\n📊 RELATÓRIOS E CONSULTAS SQL")
-        print("=" * 40)
+    def replay_game(self):
+        """Mostra as rodadas gravadas de um jogo, movimento a movimento"""
+        try:
+            game = self.db.get_game(int(input("ID do jogo: ").strip()))
+        except ValueError:
+            game = None
+        if game is None or not game.rodadas:
+            print("❌ Jogo não encontrado ou sem rodadas gravadas")
+            return
         
-        queries = [
-            ("Total de usuários ativos", "SELECT COUNT(*) FROM usuarios WHERE ativo = TRUE"),
-            ("Total de jogos criados", "SELECT COUNT(*) FROM jogos"),
-            ("Jogos por número de jogadores", "SELECT numero_jogadores, COUNT(*) FROM jogos GROUP BY numero_jogadores"),
-            ("Usuários mais recentes", "SELECT nome_usuario, data_cadastro FROM usuarios ORDER BY data_cadastro DESC LIMIT 5")
-        ]
+        names = [self.db.users_by_id[user_id]["nome_completo"] if user_id in self.db.users_by_id
+                 else f"Usuário {user_id}" for user_id in game.jogadores]
+        print(f"\n🎞️ JOGO {game.id}: {', '.join(names)}")
+        for rodada in game.rodadas:
+            vencedor = self.db.users_by_id.get(rodada.vencedor_id, {}).get("nome_completo", "-")
+            print(f"  Rodada {rodada.numero}: {len(rodada.movimentos)} bytes, "
+                  f"{rodada.tipo_vitoria or '-'}, vencedor {vencedor} (+{rodada.pontos})")
         
-        for i, (desc, sql) in enumerate(queries, 1):
-            print(f"{i}. {desc}")
-            print(f"   SQL: {sql}")
-            print()
+        try:
+            indice = int(input("\nRodada para rever: ").strip()) - 1
+            if not 0 <= indice < len(game.rodadas):
+                raise ValueError
+        except ValueError:
+            print("❌ Rodada inválida")
+            return
+        
+        try:
+            partida = game.replay(indice)
+            for numero, linha in enumerate(partida.renderizar(names), 1):
+                estado = partida.estado(numero)
+                pontas = f"pontas {estado.extremidades[0]}|{estado.extremidades[1]}" if estado.extremidades else ""
+                print(f"  {numero:>3}. {linha:<45} {pontas}")
+            estado = partida.estado()
+        except replay.ReplayError as e:
+            print(f"❌ Rodada com movimentos inválidos: {e}")
+            return
+        print(f"\n🁫 Mesa: {replay.renderizar_mesa(estado.mesa)}")
+        if partida.livre:
+            print("ℹ️ Rodada de simulação antiga: peças sorteadas, sem as regras da mesa")
+        if estado.maos is not None:
+            for name, mao in zip(names, estado.maos):
+                pecas = " ".join(domino.formatar_peca(p) for p in domino.iterar_bits(mao))
+                print(f"   {name}: {pecas or '(sem peças)'}")
+    
+    def reports_menu(self):
+        """Menu de relatórios: executa no PostgreSQL ou nos dados em memória"""
+        last = []
+        while True:
+            print("\n📊 RELATÓRIOS E CONSULTAS")
+            print("=" * 40)
+            for i, report in enumerate(RELATORIOS, 1):
+                print(f"{i}. {report.titulo}")
+            print("T. Executar todos")
+            print("E. Exportar último resultado (CSV/JSON)")
+            print("0. Voltar")
+            
+            choice = input("\n🎯 Escolha uma opção: ").strip().upper()
+            if choice == "0":
+                break
+            if choice == "T":
+                last = self.db.reports.run_all()
+            elif choice == "E":
+                self.export_reports(last)
+                continue
+            elif choice.isdigit() and 1 <= int(choice) <= len(RELATORIOS):
+                last = [self.db.reports.run(RELATORIOS[int(choice) - 1].chave)]
+            else:
+                print("❌ Opção inválida!")
+                continue
+            
+            for result in last:
+                print_report(result)
+            input("\n📱 Pressione Enter para continuar...")
+    
+    def export_reports(self, results):
+        if not results:
+            print("❌ Execute um relatório antes de exportar")
+            return
+        formato = input("📁 Formato (csv/json): ").strip().lower() or "csv"
+        if formato not in FORMATOS_EXPORTACAO:
+            print("❌ Formato inválido!")
+            return
+        path = self.db.reports.export(results, formato)
+        print(f"✅ Exportado para {path}")
     
     def show_sql_log(self):
-        """Mostra log de comandos SQL"""
+        """Mostra os últimos comandos do log SQL"""
         print("\n📜 LOG DE COMANDOS SQL")
         print("=" * 60)
         
-        if not self.db.sql_log.exists():
-            print("📝 Nenhum comando SQL foi executado ainda")
-            print("💡 Execute algumas operações para ver comandos aqui!")
-            input("\n📱 Pressione Enter para continuar...")
-            return
-        
         try:
-            with open(self.db.sql_log, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                
-            if not content:
-                print("📝 Arquivo de log está vazio")
+            self.db.sql_log.flush()
+            info = self.db.sql_log.info()
+            
+            if not info["comandos"]:
+                print("📝 Nenhum comando SQL foi executado ainda")
+                print("💡 Execute algumas operações para ver comandos aqui!")
                 input("\n📱 Pressione Enter para continuar...")
                 return
             
-            # Mostrar informações do arquivo
-            lines = content.split('\n')
-            file_size = self.db.sql_log.stat().st_size
-            
+            # Mostrar informações do log (lidas do índice, sem percorrer o log)
             print(f"📊 Informações do log:")
-            print(f"   • Arquivo: {self.db.sql_log}")
-            print(f"   • Tamanho: {file_size} bytes")
-            print(f"   • Linhas: {len(lines)}")
-            print(f"   • Última modificação: {datetime.fromtimestamp(self.db.sql_log.stat().st_mtime)}")
+            print(f"   • Pasta: {info['diretorio']}")
+            print(f"   • Segmentos: {info['segmentos']}")
+            print(f"   • Tamanho: {info['bytes']} bytes")
+            print(f"   • Último comando: {info['ultimo_comando']}")
             
-            print("\n📋 COMANDOS EXECUTADOS:")
+            print("\n📋 ÚLTIMOS COMANDOS EXECUTADOS:")
             print("-" * 60)
             
-            # Mostrar último conteúdo (últimos 1500 caracteres)
-            if len(content) > 1500:
+            if info["comandos"] > SQL_LOG_TAIL:
                 print("... (mostrando últimos comandos) ...")
-                print(content[-1500:])
-            else:
-                print(content)
+            for command in self.db.sql_log.tail(SQL_LOG_TAIL):
+                print(command)
+                print()
             
             print("-" * 60)
-            print(f"💡 Total de {len([line for line in lines if line.strip() and not line.startswith('--')])} comandos SQL")
+            print(f"💡 Total de {info['comandos']} comandos SQL")
             
         except Exception as e:
-            print(f"❌ Erro ao ler arquivo de log: {e}")
+            print(f"❌ Erro ao ler log SQL: {e}")
         
         input("\n📱 Pressione Enter para continuar...")
     
@@ -609,87 +2380,75 @@ class CapivaraGameLBD:
             selected_players = list(self.db.users.values())[:num_players]
         
         # Criar jogo
-        if isinstance(self.db.games, list):
-            game_id = len(self.db.games) + 1
-        else:
-            game_id = len(self.db.games) + 1
-            
-        new_game = {
-            "id": game_id,
-            "jogadores": [p["id_usuario"] for p in selected_players],
-            "nomes_jogadores": [p["nome_completo"] for p in selected_players],
-            "data_inicio": datetime.now().isoformat(),
-            "status": "simulacao",
-            "rodadas": [],
-            "pontuacao": {str(p["id_usuario"]): 0 for p in selected_players}
-        }
-        
-        # Log SQL
-        sql_insert = f"INSERT INTO jogos (numero_jogadores, status) VALUES ({num_players}, 'simulacao')"
-        self.db.execute_postgres_command(sql_insert)
+        game_id = self.db.allocate_game_id()
+        player_ids = [p["id_usuario"] for p in selected_players]
+        data_inicio = datetime.now().isoformat()
+        pontuacao = [0] * num_players
+        rodadas = []
+        
+        # O id no PostgreSQL vem da sequence (pode diferir do id no JSON)
+        pg_game_id = None
+        if self.db.postgres_available:
+            rows = self.db.execute_prepared("insert_jogo", (num_players, "em_andamento"), fetch=True)
+            if rows:
+                pg_game_id = int(rows[0][0])
         
         print("\n🎲 INICIANDO SIMULAÇÃO...")
         print(f"🎯 Jogadores: {', '.join([p['nome_completo'] for p in selected_players])}")
         
-        # Simular rodadas
-        import random
+        # Simular rodadas (cada rodada é uma partida real jogada pelo motor de regras)
         rodada = 1
+        distribuicoes = domino.gerar_distribuicoes(num_players)
         
-        while max(new_game["pontuacao"].values()) < 50:  # Meta de 50 pontos
+        while max(pontuacao) < domino.PONTOS_META:
             print(f"\n🎲 RODADA {rodada}")
             print("-" * 30)
             
-            # Distribuir pontos aleatórios
-            ganhador_rodada = random.choice(selected_players)
-            pontos_rodada = random.randint(5, 15)
+            # Só o motor de regras (sem as pausas e a saída do menu)
+            with METRICS.timer("simulate_game.rodada"):
+                ids_pecas, maos, monte, primeiro = next(distribuicoes)
+                resultado = domino.jogar_partida(num_players, distribuicao=(maos, monte, primeiro),
+                                                 registrar=True)
+            ganhador_rodada = selected_players[resultado.vencedor]
+            pontos_rodada = max(resultado.pontos)
             
-            new_game["pontuacao"][str(ganhador_rodada["id_usuario"])] += pontos_rodada
+            for posicao, pontos in enumerate(resultado.pontos):
+                pontuacao[posicao] += pontos
             
-            # Simular jogadas
-            jogadas = []
-            for i, player in enumerate(selected_players):
-                peca = f"{random.randint(0,6)}-{random.randint(0,6)}"
-                jogadas.append(f"{player['nome_completo']}: [{peca}]")
-            
-            new_game["rodadas"].append({
-                "rodada": rodada,
-                "ganhador": ganhador_rodada["nome_completo"],
-                "pontos": pontos_rodada,
-                "jogadas": jogadas
-            })
+            # Distribuição + todos os movimentos, um byte cada (ver capivara_replay)
+            movimentos = replay.codificar(resultado.movimentos, primeiro,
+                                          [peca - 1 for peca in ids_pecas])
+            rodadas.append(Rodada(rodada, ganhador_rodada["id_usuario"], pontos_rodada,
+                                  resultado.tipo_vitoria, movimentos))
             
+            jogadas = sum(1 for m in resultado.movimentos if m.tipo == domino.JOGOU)
+            print(f"🎯 {jogadas} peças jogadas - vitória por {resultado.tipo_vitoria}")
             print(f"🏆 Ganhador da rodada: {ganhador_rodada['nome_completo']} (+{pontos_rodada} pontos)")
             
             # Mostrar pontuação atual
             print("\n📊 PONTUAÇÃO ATUAL:")
-            for player_id, pontos in new_game["pontuacao"].items():
-                player_name = next(p["nome_completo"] for p in selected_players if str(p["id_usuario"]) == player_id)
-                print(f"   {player_name}: {pontos} pontos")
+            for player, pontos in zip(selected_players, pontuacao):
+                print(f"   {player['nome_completo']}: {pontos} pontos")
             
             rodada += 1
             
             # Pausa dramática
-            import time
             time.sleep(1)
             
             if rodada > 10:  # Limite de segurança
                 break
         
         # Determinar vencedor
-        vencedor_id = max(new_game["pontuacao"].items(), key=lambda x: x[1])[0]
-        vencedor = next(p for p in selected_players if str(p["id_usuario"]) == vencedor_id)
-        pontos_vencedor = new_game["pontuacao"][vencedor_id]
-        
-        new_game["status"] = "finalizado"
-        new_game["vencedor"] = vencedor["nome_completo"]
-        new_game["data_fim"] = datetime.now().isoformat()
+        posicao_vencedor = max(range(num_players), key=lambda p: (pontuacao[p], -p))
+        vencedor = selected_players[posicao_vencedor]
+        pontos_vencedor = pontuacao[posicao_vencedor]
         
         # Salvar jogo
-        if isinstance(self.db.games, list):
-            self.db.games.append(new_game)
-        else:
-            self.db.games[str(game_id)] = new_game
-        self.db.save_data()
+        with METRICS.timer("simulate_game.gravacao"):
+            game_id = self.db.add_game(Game(game_id, num_players, "finalizado", data_inicio,
+                                            datetime.now().isoformat(), domino.PONTOS_META,
+                                            player_ids, pontuacao, vencedor["id_usuario"],
+                                            rodadas=rodadas))
         
         # Resultado final
         print("\n" + "="*50)
@@ -703,8 +2462,7 @@ class CapivaraGameLBD:
         print("📊 Atualizando PostgreSQL...")
         self.db.ensure_postgres_tables()
         
-        sql_update = f"UPDATE jogos SET status='finalizado' WHERE id_jogo={game_id}"
-        if self.db.execute_postgres_command(sql_update, "capivara_game"):
+        if pg_game_id is not None and self.db.execute_prepared("finalizar_jogo", (pg_game_id,)):
             print("✅ Status atualizado no PostgreSQL!")
         else:
             print("⚠️ Erro ao atualizar PostgreSQL, mas jogo salvo em JSON")
@@ -721,10 +2479,14 @@ class CapivaraGameLBD:
             print(f"📁 Pasta de dados: {self.db.data_dir}")
             
             if self.db.postgres_available:
-                print(f"🔗 Caminho psql: {self.db.psql_path}")
-                print(f"📋 Log SQL: {self.db.sql_log}")
-                print(f"🗄️ Banco atual: capivara_game")
-                print(f"🔌 Porta: 5433")
+                if self.db.pg_backend == "psycopg2":
+                    print(f"🔗 Driver: psycopg2 (pool {PG_POOL_MIN}-{PG_POOL_MAX} conexões)")
+                else:
+                    print(f"🔗 Caminho psql: {self.db.psql_path}")
+                print(f"📋 Log SQL: {self.db.sql_log.directory}")
+                print(f"🗄️ Banco atual: {self.db.pg_config['dbname']}")
+                print(f"🖥️ Host: {self.db.pg_config['host']}")
+                print(f"🔌 Porta: {self.db.pg_config['port']}")
             
             print("\n📋 OPÇÕES:")
             print("1. 🔄 Reconfigurar PostgreSQL")
@@ -732,9 +2494,10 @@ class CapivaraGameLBD:
             print("3. 📊 Verificar estrutura do banco")
             print("4. 🔧 Testar conexão PostgreSQL")
             print("5. 📁 Ver localização dos arquivos")
-            print("6. 🔙 Voltar")
+            print("6. 📈 Métricas de desempenho")
+            print("7. 🔙 Voltar")
             
-            choice = input("\n🔸 Escolha (1-6): ").strip()
+            choice = input("\n🔸 Escolha (1-7): ").strip()
             
             if choice == "1":
                 self.reconfigure_postgres()
@@ -747,17 +2510,71 @@ class CapivaraGameLBD:
             elif choice == "5":
                 self.show_file_locations()
             elif choice == "6":
+                self.metrics_menu()
+            elif choice == "7":
                 break
             else:
                 print("❌ Opção inválida!")
     
+    def metrics_menu(self):
+        """Latência, contadores e tamanhos de escrita por operação"""
+        while True:
+            print("\n📈 MÉTRICAS DE DESEMPENHO")
+            print("=" * 30)
+            print(f"📊 Coleta: {'✅ Ligada' if METRICS.enabled else '❌ Desligada'}")
+            print("1. 📋 Ver métricas")
+            print(f"2. {'⏸️ Desligar' if METRICS.enabled else '▶️ Ligar'} coleta")
+            print("3. 💾 Exportar (JSON e Prometheus)")
+            print("4. 🧹 Zerar métricas")
+            print("5. 🔙 Voltar")
+            
+            choice = input("\n🔸 Escolha (1-5): ").strip()
+            
+            if choice == "1":
+                self.show_metrics()
+            elif choice == "2":
+                METRICS.enabled = not METRICS.enabled
+            elif choice == "3":
+                for path in self.db.export_metrics():
+                    print(f"✅ Métricas exportadas: {path}")
+            elif choice == "4":
+                METRICS.reset()
+                print("✅ Métricas zeradas")
+            elif choice == "5":
+                break
+    
+    def show_metrics(self):
+        """Tabela de latências (ms), tamanhos de escrita e contadores"""
+        dados = METRICS.snapshot()
+        if not any((dados["contadores"], dados["latencia_s"], dados["tamanho_bytes"])):
+            print("📝 Nenhuma métrica coletada" + ("" if METRICS.enabled else " (coleta desligada)"))
+            return
+        print(f"\n⏱️ Desde {dados['desde']}")
+        if dados["latencia_s"]:
+            print(f"\n{'Operação':<32} {'N':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+            print("-" * 80)
+            for nome, h in dados["latencia_s"].items():
+                print(f"{nome:<32} {h['n']:>7} {h['p50'] * 1000:>9.2f} {h['p95'] * 1000:>9.2f} "
+                      f"{h['p99'] * 1000:>9.2f} {h['max'] * 1000:>9.2f}")
+        if dados["tamanho_bytes"]:
+            print(f"\n{'Escrita':<32} {'N':>7} {'p50 B':>9} {'p99 B':>9} {'total B':>12}")
+            print("-" * 73)
+            for nome, h in dados["tamanho_bytes"].items():
+                print(f"{nome:<32} {h['n']:>7} {h['p50']:>9.0f} {h['p99']:>9.0f} {h['soma']:>12}")
+        if dados["contadores"]:
+            print(f"\n{'Contador':<40} {'Total':>9}")
+            print("-" * 50)
+            for nome, valor in dados["contadores"].items():
+                print(f"{nome:<40} {valor:>9}")
+    
     def reconfigure_postgres(self):
         """Reconfigura PostgreSQL"""
         print("\n🔄 RECONFIGURANDO POSTGRESQL...")
         
-        # Resetar senha se necessário
+        # Resetar senha e conexões abertas
         if hasattr(self.db, 'postgres_password'):
             delattr(self.db, 'postgres_password')
+        self.db.close_pools()
         
         # Verificar novamente
         self.db.postgres_available = self.db.check_postgres()
@@ -773,9 +2590,7 @@ class CapivaraGameLBD:
         """Limpa dados JSON"""
         confirm = input("⚠️ Isso apagará todos os dados locais! Confirmar? (s/n): ").lower()
         if confirm == 's':
-            self.db.users = []
-            self.db.games = []
-            self.db.save_data()
+            self.db.reset_data()
             print("✅ Dados JSON limpos!")
         else:
             print("❌ Operação cancelada")
@@ -799,10 +2614,12 @@ class CapivaraGameLBD:
         """
         
         print("🔍 Verificando tabelas existentes...")
-        success = self.db.execute_postgres_command(tables_query, "capivara_game")
+        rows = self.db.query_postgres(tables_query, "capivara_game")
         
-        if success:
-            print("✅ Consulta executada - verifique o terminal para resultados")
+        if rows is not None:
+            print(f"✅ {len(rows)} tabela(s) encontrada(s):")
+            for row in rows:
+                print(f"   • {row[0]}")
         else:
             print("❌ Erro ao verificar estrutura")
         
@@ -819,10 +2636,10 @@ class CapivaraGameLBD:
         
         test_query = "SELECT 'Conexão OK!' as status, current_timestamp as horario;"
         
-        success = self.db.execute_postgres_command(test_query, "postgres")
+        rows = self.db.query_postgres(test_query, "postgres")
         
-        if success:
-            print("✅ Conexão PostgreSQL funcionando!")
+        if rows:
+            print(f"✅ Conexão PostgreSQL funcionando! ({rows[0][0]} - {rows[0][1]})")
         else:
             print("❌ Falha na conexão PostgreSQL")
         
@@ -836,87 +2653,472 @@ class CapivaraGameLBD:
         print(f"💾 Pasta de dados: {self.db.data_dir}")
         print(f"👥 Arquivo usuários: {self.db.users_file}")
         print(f"🎮 Arquivo jogos: {self.db.games_file}")
-        print(f"📋 Log SQL: {self.db.sql_log}")
+        print(f"📋 Log SQL: {self.db.sql_log.directory}")
         
         if self.db.postgres_available:
-            print(f"🔗 PostgreSQL: {self.db.psql_path}")
+            print(f"🔗 PostgreSQL: {self.db.psql_path or self.db.pg_backend}")
         
         input("📱 Pressione Enter para continuar...")
     
     def backup_menu(self):
-        """Menu de backup"""
-        print("\n💾 BACKUP E EXPORTAÇÃO")
-        print("=" * 30)
-        
-        backup_file = self.db.data_dir.parent / f"backup_capivara_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        
-        backup_data = {
-            "sistema": "Capivara Game LBD",
-            "data_backup": datetime.now().isoformat(),
-            "usuarios": self.db.users,
-            "jogos": self.db.games,
-            "sql_commands": []
-        }
-        
-        # Adicionar comandos SQL se existirem
-        if self.db.sql_log.exists():
-            with open(self.db.sql_log, 'r', encoding='utf-8') as f:
-                backup_data["sql_commands"] = f.read().split('\n')
-        
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ Backup criado: {backup_file}")
+        """Menu de backup e restauração"""
+        while True:
+            print("\n💾 BACKUP E RESTAURAÇÃO")
+            print("=" * 30)
+            print("1. 📦 Backup incremental")
+            print("2. 🗃️ Backup completo")
+            print("3. 📋 Listar backups")
+            print("4. 🔍 Verificar backup")
+            print("5. ♻️ Restaurar backup")
+            print("6. 🔙 Voltar")
+            
+            choice = input("\n🔸 Escolha (1-6): ").strip()
+            
+            if choice in ("1", "2"):
+                start = time.perf_counter()
+                manifest = self.db.create_backup(full=choice == "2")
+                elapsed = time.perf_counter() - start
+                tamanho = sum(f["bytes"] for f in manifest["arquivos"].values())
+                print(f"✅ Backup {manifest['tipo']} criado: {manifest['nome']}")
+                print(f"   • Usuários gravados: {manifest['registros']['usuarios']}")
+                print(f"   • Jogos gravados: {manifest['registros']['jogos']}")
+                print(f"   • Segmentos SQL: {len(manifest['segmentos_sql'])}")
+                print(f"   • Tamanho: {tamanho} bytes em {elapsed:.2f}s")
+            elif choice == "3":
+                self.list_backups()
+            elif choice == "4":
+                nome = input("Nome do backup: ").strip()
+                problemas = self.db.backups.verify(nome)
+                if problemas:
+                    print("❌ Backup inválido:")
+                    for problema in problemas:
+                        print(f"   • {problema}")
+                else:
+                    print("✅ Checksums conferem em toda a cadeia")
+            elif choice == "5":
+                self.restore_backup_menu()
+            elif choice == "6":
+                break
+    
+    def list_backups(self):
+        """Lista os backups existentes"""
+        manifests = self.db.backups.list()
+        if not manifests:
+            print("📝 Nenhum backup encontrado")
+            return
+        print(f"\n{'Nome':<36} {'Tipo':<12} {'Usuários':<9} {'Jogos':<9}")
+        print("-" * 70)
+        for manifest in manifests:
+            print(f"{manifest['nome']:<36} {manifest['tipo']:<12} "
+                  f"{manifest['registros']['usuarios']:<9} {manifest['registros']['jogos']:<9}")
+    
+    def restore_backup_menu(self):
+        """Restaura um backup (padrão: o mais recente)"""
+        latest = self.db.backups.latest()
+        if latest is None:
+            print("📝 Nenhum backup encontrado")
+            return
+        nome = input(f"Nome do backup [{latest['nome']}]: ").strip() or latest["nome"]
+        postgres = False
+        if self.db.postgres_available:
+            postgres = input("Restaurar também no PostgreSQL? (s/N): ").strip().lower() == "s"
+        if input("⚠️ Os dados atuais serão substituídos. Confirmar? (s/N): ").strip().lower() != "s":
+            print("❌ Operação cancelada")
+            return
+        try:
+            totais = self.db.restore_backup(nome, postgres=postgres)
+        except BackupError as e:
+            print(f"❌ {e}")
+            return
+        print(f"✅ Restaurados {totais['usuarios']} usuários e {totais['jogos']} jogos")
+        if "postgres" in totais:
+            print(f"   • PostgreSQL (COPY): {'✅ OK' if totais['postgres'] else '❌ Falhou'}")
     
     def search_user(self):
-        """Busca usuário"""
-        termo = input("Digite parte do nome ou email: ").strip().lower()
-        found = [u for u in self.db.users if 
-                termo in u['nome_usuario'].lower() or 
-                termo in u['nome_completo'].lower() or
-                termo in u['email'].lower()]
+        """Busca usuário (exata, prefixo, substring ou aproximada, sem acentos)"""
+        termo = input("Digite parte do nome ou email: ").strip()
+        found = self.db.search_users(termo)
         
+        tipos = {EXATO: "exato", PREFIXO: "prefixo", SUBSTRING: "contém", APROXIMADO: "aproximado"}
         if found:
             print(f"✅ {len(found)} usuário(s) encontrado(s):")
-            for user in found:
-                print(f"• {user['nome_usuario']} - {user['nome_completo']}")
+            for user, tipo in found:
+                print(f"• {user['nome_usuario']} - {user['nome_completo']} ({tipos[tipo]})")
         else:
             print("❌ Nenhum usuário encontrado")
     
     def user_stats(self):
-        """Estatísticas de usuários"""
-        total = len(self.db.users)
-        ativos = len([u for u in self.db.users if u['ativo']])
+        """Estatísticas de usuários (contadores mantidos a cada operação)"""
+        stats = self.db.stats
         
         print(f"\n📈 ESTATÍSTICAS DE USUÁRIOS")
-        print(f"Total: {total}")
-        print(f"Ativos: {ativos}")
-        print(f"Inativos: {total - ativos}")
+        print(f"Total: {stats.users_total}")
+        print(f"Ativos: {stats.users_active}")
+        print(f"Inativos: {stats.users_total - stats.users_active}")
+        
+        ranking = self.db.ranking_usuarios(limit=5)
+        if ranking:
+            print("\n🏆 TOP 5 (jogos vencidos / pontos):")
+            for pos, row in enumerate(ranking, 1):
+                print(f"  {pos}. {row['nome_usuario']:<15} {row['jogos_vencidos']:>5} vitórias "
+                      f"{row['pontos_totais_acumulados']:>7} pontos")
     
     def game_stats(self):
-        """Estatísticas de jogos"""
-        total = len(self.db.games)
-        por_jogadores = {}
-        
-        for game in self.db.games:
-            num = game['numero_jogadores']
-            por_jogadores[num] = por_jogadores.get(num, 0) + 1
+        """Estatísticas de jogos (contadores mantidos a cada operação)"""
+        stats = self.db.stats
         
         print(f"\n📈 ESTATÍSTICAS DE JOGOS")
-        print(f"Total: {total}")
+        print(f"Total: {stats.games_total}")
         print("Por número de jogadores:")
-        for num, count in por_jogadores.items():
-            print(f"  {num} jogadores: {count}")
+        for num, count in sorted(stats.games_by_players.items()):
+            if count:
+                print(f"  {num} jogadores: {count}")
+        print("Por status:")
+        for status, count in stats.games_by_status.items():
+            if count:
+                print(f"  {status}: {count}")
+        print(f"Média de rodadas por jogo: {stats.average_rounds():.1f}")
+
+def positive_int(value):
+    """Tipo do argparse: inteiro maior ou igual a 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"deve ser pelo menos 1 (recebido: {value})")
+    return number
+
+def parse_args(argv=None):
+    """Argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Capivara Game LBD")
+    parser.add_argument("--import-users", metavar="ARQUIVO",
+                        help="importa usuários em lote (CSV com cabeçalho ou JSONL) e sai")
+    parser.add_argument("--import-games", metavar="ARQUIVO",
+                        help="importa jogos em lote (CSV com cabeçalho ou JSONL) e sai")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="mostra o tempo de cada etapa da inicialização antes do menu")
+    
+    subparsers = parser.add_subparsers(dest="command")
+    simulate = subparsers.add_parser("simulate", help="simulação em massa, sem interação")
+    simulate.add_argument("--games", type=positive_int, default=1000,
+                          help="número de jogos (padrão: 1000)")
+    simulate.add_argument("--players", type=int, choices=(2, 3, 4), default=4,
+                          help="jogadores por jogo (padrão: 4)")
+    simulate.add_argument("--workers", type=positive_int, default=os.cpu_count() or 1,
+                          help="processos em paralelo (padrão: núcleos da CPU)")
+    simulate.add_argument("--seed", type=int, default=None, help="semente para resultados reproduzíveis")
+    simulate.add_argument("--no-save", action="store_true",
+                          help="apenas simula e reporta, sem gravar os jogos")
+    
+    monte_carlo = subparsers.add_parser("montecarlo",
+                                        help="taxas de vitória por partida (NumPy, vetorizado)")
+    monte_carlo.add_argument("--players", type=int, nargs="+", choices=(2, 3, 4), default=[2, 3, 4],
+                             help="jogadores por partida (padrão: 2 3 4)")
+    monte_carlo.add_argument("--hands", type=int, default=montecarlo.PARTIDAS_PADRAO,
+                             help=f"partidas simuladas (padrão: {montecarlo.PARTIDAS_PADRAO})")
+    monte_carlo.add_argument("--strategy", nargs="+", default=["maior_peca"],
+                             help="estratégia para todos ou uma por posição, em ciclo "
+                                  f"({', '.join(montecarlo.ESTRATEGIAS)})")
+    monte_carlo.add_argument("--seed", type=int, default=None, help="semente para resultados reproduzíveis")
+    
+    bench_sql = subparsers.add_parser("bench-sql",
+                                      help="latência dos INSERTs com e sem comandos preparados")
+    bench_sql.add_argument("--rows", type=int, default=1000, help="comandos por variante (padrão: 1000)")
+    
+    report = subparsers.add_parser("report", help="executa relatórios (PostgreSQL ou JSON)")
+    report.add_argument("report", nargs="?", default="all",
+                        help="chave do relatório ou 'all' (padrão)")
+    report.add_argument("--export", choices=FORMATOS_EXPORTACAO, help="exporta para data/relatorios")
+    
+    subparsers.add_parser("rebuild-ranking",
+                          help="recalcula o ranking materializado (placar_usuarios)")
+    
+    backup = subparsers.add_parser("backup", help="backup incremental comprimido")
+    backup.add_argument("--full", action="store_true", help="força um backup completo")
+    
+    restore = subparsers.add_parser("restore", help="restaura usuarios.json/jogos.json de um backup")
+    restore.add_argument("backup", nargs="?", help="nome do backup (padrão: o mais recente)")
+    restore.add_argument("--postgres", action="store_true",
+                         help="recarrega também as tabelas do PostgreSQL via COPY")
+    
+    archive = subparsers.add_parser("archive",
+                                    help="move os jogos encerrados para o arquivo colunar (data/arquivo)")
+    archive.add_argument("--stats", action="store_true",
+                         help="mostra vitórias por usuário e média de rodadas lendo só o arquivo")
+    return parser.parse_args(argv)
+
+def print_report(result):
+    """Mostra um resultado de relatório em forma de tabela, com o tempo"""
+    print(f"\n📋 {result.titulo}")
+    widths = [max([len(str(c))] + [len(str(row[i])) for row in result.linhas])
+              for i, c in enumerate(result.colunas)]
+    print("   " + "  ".join(str(c).ljust(w) for c, w in zip(result.colunas, widths)))
+    for row in result.linhas:
+        print("   " + "  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
+    if not result.linhas:
+        print("   (sem linhas)")
+    origem = "cache" if result.cache else result.fonte
+    print(f"   ⏱️ {result.segundos * 1000:.2f} ms ({origem})")
+
+def run_reports(args):
+    """Executa relatórios sem o menu e, opcionalmente, exporta"""
+    db = DatabaseInterface()
+    try:
+        if args.report == "all":
+            results = db.reports.run_all()
+        elif args.report in RELATORIOS_POR_CHAVE:
+            results = [db.reports.run(args.report)]
+        else:
+            print(f"❌ Relatório desconhecido: {args.report} "
+                  f"(disponíveis: all, {', '.join(RELATORIOS_POR_CHAVE)})")
+            return
+        for result in results:
+            print_report(result)
+        if args.export:
+            print(f"\n✅ Exportado para {db.reports.export(results, args.export)}")
+    finally:
+        db.close()
+
+def format_estimate(estimativa):
+    return (f"{estimativa.taxa * 100:6.2f}% "
+            f"[{estimativa.ic_inferior * 100:5.2f} - {estimativa.ic_superior * 100:5.2f}]")
+
+def run_monte_carlo(args):
+    """Estima taxas de vitória por posição, ordem de jogada, 6-6 e estratégia"""
+    if montecarlo.np is None:
+        print("❌ NumPy não instalado (pip install numpy)")
+        return
+    for num_jogadores in args.players:
+        try:
+            result = montecarlo.estimar(num_jogadores, args.hands, args.strategy, args.seed)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        
+        print(f"\n🎲 {num_jogadores} JOGADORES - {result.partidas:,} partidas em {result.segundos:.2f}s "
+              f"({result.partidas / result.segundos:,.0f} partidas/s)")
+        if num_jogadores == 4:
+            print("   (vitória da dupla: referência 50%)")
+        print(f"   Estratégias por posição: {', '.join(result.estrategias)}")
+        print("   Taxa de vitória [IC 95%]:")
+        for ordem, estimativa in enumerate(result.por_ordem, 1):
+            print(f"   {ordem}º a jogar:        {format_estimate(estimativa)}")
+        for posicao, estimativa in enumerate(result.por_posicao, 1):
+            print(f"   Posição {posicao} na mesa:  {format_estimate(estimativa)} "
+                  f"{result.pontos_medios[posicao - 1]:6.2f} pontos/partida")
+        print(f"   Com o 6-6:          {format_estimate(result.com_66)}")
+        print(f"   Sem o 6-6:          {format_estimate(result.sem_66)}")
+        if result.primeiro_sem_66.amostras:
+            print(f"   1º sem 6-6 (monte): {format_estimate(result.primeiro_sem_66)}")
+        if len(result.por_estrategia) > 1:
+            for nome, estimativa in result.por_estrategia.items():
+                print(f"   {nome:<19} {format_estimate(estimativa)}")
+        print(f"   Trancamentos:       {format_estimate(result.trancamentos)}")
+
+def run_statement_benchmark(args):
+    """Compara a latência dos INSERTs antes/depois dos comandos preparados"""
+    db = DatabaseInterface()
+    try:
+        if db.pg_backend != "psycopg2":
+            print("❌ O benchmark de comandos preparados requer psycopg2 e PostgreSQL acessível")
+            return
+        results = db.benchmark_hot_statements(args.rows)
+        print(f"\n⏱️ INSERT INTO usuarios - {args.rows} comandos (transação desfeita ao final)")
+        base = results["f-string"]
+        for variant, micros in results.items():
+            print(f"   • {variant:<28} {micros:>9.1f} µs/comando  ({base / micros:.1f}x)")
+    finally:
+        db.close()
+
+def run_rebuild_ranking(args):
+    """Reconstrói o ranking (placar_usuarios e cache em memória) e sai"""
+    db = DatabaseInterface()
+    try:
+        start = time.perf_counter()
+        total = db.rebuild_ranking()
+        elapsed = time.perf_counter() - start
+        if total is False:
+            print("❌ Falha ao reconstruir placar_usuarios no PostgreSQL "
+                  f"(ranking em memória reconstruído em {elapsed:.2f}s)")
+            return 1
+        if total is None:
+            print(f"✅ Ranking em memória reconstruído ({len(db.stats.leaderboard)} usuários) "
+                  f"em {elapsed:.2f}s")
+        else:
+            print(f"✅ placar_usuarios reconstruído no PostgreSQL ({total} usuários) em {elapsed:.2f}s")
+    finally:
+        db.close()
+
+def run_backup(args):
+    """Cria um backup e sai"""
+    db = DatabaseInterface()
+    try:
+        start = time.perf_counter()
+        manifest = db.create_backup(full=args.full)
+        print(f"✅ Backup {manifest['tipo']} {manifest['nome']}: "
+              f"{manifest['registros']['usuarios']} usuários, {manifest['registros']['jogos']} jogos "
+              f"em {time.perf_counter() - start:.2f}s")
+    finally:
+        db.close()
+
+def run_restore(args):
+    """Restaura um backup e sai"""
+    db = DatabaseInterface()
+    try:
+        nome = args.backup
+        if nome is None:
+            latest = db.backups.latest()
+            if latest is None:
+                print("❌ Nenhum backup encontrado")
+                return
+            nome = latest["nome"]
+        start = time.perf_counter()
+        try:
+            totais = db.restore_backup(nome, postgres=args.postgres)
+        except BackupError as e:
+            print(f"❌ {e}")
+            return
+        print(f"✅ Backup {nome} restaurado: {totais['usuarios']} usuários, {totais['jogos']} jogos "
+              f"em {time.perf_counter() - start:.2f}s")
+        if "postgres" in totais:
+            print(f"   • PostgreSQL (COPY): {'✅ OK' if totais['postgres'] else '❌ Falhou'}")
+    finally:
+        db.close()
 
-def main():
+def run_batch_simulation(args):
+    """Simula muitos jogos em um pool de processos e grava tudo em lote no final"""
+    db = DatabaseInterface()
+    try:
+        players = [u for u in db.users if u["ativo"]][:args.players]
+        if len(players) < args.players:
+            print(f"❌ Só há {len(players)} usuários ativos cadastrados!")
+            return
+        
+        # Blocos menores que games/workers equilibram a carga entre processos
+        workers = max(1, min(args.workers, args.games))
+        num_chunks = min(args.games, workers * 4)
+        sizes = [args.games // num_chunks + (1 if i < args.games % num_chunks else 0)
+                 for i in range(num_chunks)]
+        seeds = [None if args.seed is None else args.seed + i for i in range(num_chunks)]
+        
+        print(f"🎲 Simulando {args.games} jogos com {args.players} jogadores em {workers} processo(s)...")
+        start = time.perf_counter()
+        if workers == 1:
+            results = [domino.simular_lote(args.players, size, seed) for size, seed in zip(sizes, seeds)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # só aqui: pesa na inicialização
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(domino.simular_lote, [args.players] * num_chunks, sizes, seeds))
+        elapsed = time.perf_counter() - start
+        
+        jogos = []
+        vitorias = [0] * args.players
+        pontos = [0] * args.players
+        partidas_vencidas = [0] * args.players
+        for chunk_jogos, chunk_vitorias, chunk_pontos, chunk_partidas in results:
+            jogos.extend(chunk_jogos)
+            for posicao in range(args.players):
+                vitorias[posicao] += chunk_vitorias[posicao]
+                pontos[posicao] += chunk_pontos[posicao]
+                partidas_vencidas[posicao] += chunk_partidas[posicao]
+        
+        if not jogos:
+            print("⚠️ Nenhum jogo simulado")
+            return
+        rate = len(jogos) / elapsed if elapsed > 0 else 0.0
+        print(f"✅ {len(jogos)} jogos em {elapsed:.2f}s ({rate:,.0f} jogos/s)")
+        print(f"\n{'Jogador':<25} {'Vitórias':>10} {'%':>7} {'Partidas':>10} {'Pontos':>12}")
+        print("-" * 68)
+        for posicao, player in enumerate(players):
+            print(f"{player['nome_completo']:<25} {vitorias[posicao]:>10} "
+                  f"{vitorias[posicao] / len(jogos) * 100:>6.1f}% "
+                  f"{partidas_vencidas[posicao]:>10} {pontos[posicao]:>12}")
+        
+        if not args.no_save:
+            start = time.perf_counter()
+            db.bulk_add_simulations(players, jogos)
+            print(f"\n💾 {len(jogos)} jogos gravados em {time.perf_counter() - start:.2f}s")
+    finally:
+        db.close()
+
+def run_bulk_import(args):
+    """Executa a importação em lote pedida na linha de comando"""
+    db = DatabaseInterface()
+    try:
+        if args.import_users:
+            db.bulk_create_users(read_import_rows(args.import_users))
+        if args.import_games:
+            db.bulk_create_games(read_import_rows(args.import_games))
+    finally:
+        db.close()
+
+def run_archive(args):
+    """Arquiva os jogos encerrados e, com --stats, varre o arquivo colunar"""
+    db = DatabaseInterface()
+    try:
+        start = time.perf_counter()
+        total = db.archive_finished_games()
+        print(f"✅ {total} jogo(s) arquivado(s) em {time.perf_counter() - start:.2f}s "
+              f"({len(db.archive)} no arquivo, {len(db.games)} no JSON)")
+        if not args.stats or not len(db.archive):
+            return
+        
+        start = time.perf_counter()
+        wins = db.archive.vitorias_por_usuario()
+        media = db.archive.media_rodadas()
+        elapsed = time.perf_counter() - start
+        nomes = db.archive.nomes()
+        print(f"\n📦 Arquivo: {len(db.archive)} jogos, média de {media:.2f} rodadas por jogo")
+        print("🏆 Vitórias por usuário (top 10):")
+        for user_id, count in sorted(wins.items(), key=lambda item: (-item[1], item[0]))[:10]:
+            print(f"   {nomes.get(user_id, f'#{user_id}'):<20} {count}")
+        print(f"   ⏱️ varredura em {elapsed * 1000:.2f} ms")
+    finally:
+        db.close()
+
+def main(argv=None):
     """Função principal"""
+    profile = StartupProfile()
+    args = parse_args(argv)
+    profile.mark("argumentos")
+    if args.command == "simulate":
+        run_batch_simulation(args)
+        return
+    if args.command == "montecarlo":
+        run_monte_carlo(args)
+        return
+    if args.command == "bench-sql":
+        run_statement_benchmark(args)
+        return
+    if args.command == "report":
+        run_reports(args)
+        return
+    if args.command == "rebuild-ranking":
+        return run_rebuild_ranking(args)
+    if args.command == "backup":
+        run_backup(args)
+        return
+    if args.command == "restore":
+        run_restore(args)
+        return
+    if args.command == "archive":
+        run_archive(args)
+        return
+    if args.import_users or args.import_games:
+        run_bulk_import(args)
+        return
+    
+    game = None
     try:
-        game = CapivaraGameLBD()
+        game = CapivaraGameLBD(profile=profile if args.startup_profile else None)
         game.start()
     except KeyboardInterrupt:
         print("\n\n🛑 Sistema interrompido pelo usuário.")
     except Exception as e:
         print(f"\n❌ Erro inesperado: {e}")
+    finally:
+        if game is not None:
+            # Operações ainda na fila de escrita assíncrona antes de sair
+            game.db.drain_writes()
+            game.db.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - MÉTRICAS DE DESEMPENHO
+Contadores, histogramas de latência (p50/p95/p99) e tamanhos de escrita
+por operação, com exportação em JSON e no formato texto do Prometheus.
+
+Desligadas por padrão (CAPIVARA_METRICS=1 liga desde a abertura): com a
+coleta desligada, uma operação decorada com ``timed`` custa só a checagem
+de ``METRICS.enabled``.
+
+Os histogramas usam baldes logarítmicos (fator 2^(1/4), ~19% de
+resolução): memória constante por operação, qualquer que seja o número
+de amostras.
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+FATOR_BALDE = 2 ** 0.25
+LOG_FATOR = math.log(FATOR_BALDE)
+PERCENTIS = (0.50, 0.95, 0.99)
+
+
+class Histogram:
+    """Histograma em baldes logarítmicos a partir de ``minimo``"""
+
+    __slots__ = ("minimo", "baldes", "count", "total", "max")
+
+    def __init__(self, minimo):
+        self.minimo = minimo
+        self.baldes = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, valor):
+        balde = 0 if valor <= self.minimo else math.ceil(math.log(valor / self.minimo) / LOG_FATOR)
+        self.baldes[balde] = self.baldes.get(balde, 0) + 1
+        self.count += 1
+        self.total += valor
+        if valor > self.max:
+            self.max = valor
+
+    def percentile(self, p):
+        """Limite superior do balde do percentil ``p`` (nunca acima do máximo)"""
+        if not self.count:
+            return 0
+        alvo = p * self.count
+        acumulado = 0
+        for balde in sorted(self.baldes):
+            acumulado += self.baldes[balde]
+            if acumulado >= alvo:
+                return min(self.minimo * FATOR_BALDE ** balde, self.max)
+        return self.max
+
+    def to_dict(self):
+        resumo = {"n": self.count, "soma": self.total, "max": self.max}
+        for p in PERCENTIS:
+            resumo[f"p{int(p * 100)}"] = self.percentile(p)
+        return resumo
+
+
+def nome_prometheus(nome):
+    return "capivara_" + "".join(c if c.isalnum() else "_" for c in nome)
+
+
+class Metrics:
+    """Registro de métricas do processo (thread-safe)"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.latencies = {}
+            self.sizes = {}
+            self.since = time.time()
+
+    def incr(self, nome, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[nome] = self.counters.get(nome, 0) + n
+
+    def observe(self, nome, segundos):
+        """Registra a latência de uma execução de ``nome``"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histograma = self.latencies.get(nome)
+            if histograma is None:
+                histograma = self.latencies[nome] = Histogram(1e-6)
+            histograma.observe(segundos)
+
+    def observe_size(self, nome, tamanho):
+        """Registra o tamanho (bytes) de uma escrita de ``nome``"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histograma = self.sizes.get(nome)
+            if histograma is None:
+                histograma = self.sizes[nome] = Histogram(1)
+            histograma.observe(tamanho)
+
+    @contextmanager
+    def timer(self, nome):
+        """Mede o bloco como uma execução de ``nome`` (exceções contam em ``nome.excecao``)"""
+        if not self.enabled:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr(f"{nome}.excecao")
+            raise
+        finally:
+            self.observe(nome, time.perf_counter() - inicio)
+
+    def timed(self, nome, ok=None):
+        """Decorador: mede cada chamada como ``nome``.
+
+        Com ``ok`` (predicado sobre o retorno) conta também ``nome.ok`` e
+        ``nome.falha``; exceções contam em ``nome.excecao``.
+        """
+        def decorador(func):
+            @functools.wraps(func)
+            def medido(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                inicio = time.perf_counter()
+                try:
+                    resultado = func(*args, **kwargs)
+                except BaseException:
+                    self.incr(f"{nome}.excecao")
+                    raise
+                finally:
+                    self.observe(nome, time.perf_counter() - inicio)
+                if ok is not None:
+                    self.incr(f"{nome}.ok" if ok(resultado) else f"{nome}.falha")
+                return resultado
+            return medido
+        return decorador
+
+    # ------------------------------------------------------------------
+    # Exportação
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        """Cópia serializável de todas as métricas"""
+        with self.lock:
+            return {
+                "desde": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.since)),
+                "contadores": dict(sorted(self.counters.items())),
+                "latencia_s": {k: h.to_dict() for k, h in sorted(self.latencies.items())},
+                "tamanho_bytes": {k: h.to_dict() for k, h in sorted(self.sizes.items())},
+            }
+
+    def to_prometheus(self):
+        """Texto no formato de exposição do Prometheus (histogramas como summary)"""
+        dados = self.snapshot()
+        linhas = []
+        for nome, valor in dados["contadores"].items():
+            metrica = nome_prometheus(nome) + "_total"
+            linhas += [f"# TYPE {metrica} counter", f"{metrica} {valor}"]
+        for secao, sufixo in (("latencia_s", "_seconds"), ("tamanho_bytes", "_bytes")):
+            for nome, resumo in dados[secao].items():
+                metrica = nome_prometheus(nome) + sufixo
+                linhas.append(f"# TYPE {metrica} summary")
+                for p in PERCENTIS:
+                    linhas.append(f'{metrica}{{quantile="{p}"}} {resumo[f"p{int(p * 100)}"]}')
+                linhas += [f"{metrica}_sum {resumo['soma']}", f"{metrica}_count {resumo['n']}"]
+        return "\n".join(linhas) + "\n"
+
+    def export(self, path, formato="json"):
+        """Grava as métricas em ``path`` ("json" ou "prometheus")"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if formato == "prometheus":
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+METRICS = Metrics(enabled=os.environ.get("CAPIVARA_METRICS") == "1")
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - MODELO NORMALIZADO DE JOGOS
+Representação única e compacta (classes com __slots__) para os jogos,
+com migração dos formatos antigos de data/jogos.json:
+
+    • criação (create_game):   id_jogo / numero_jogadores / participantes
+    • simulação (simulate_game): id / jogadores / nomes_jogadores /
+      pontuacao com chaves texto / nomes completos em cada rodada
+
+No formato atual (versão 3) os jogadores são sempre IDs inteiros e os
+valores por jogador são listas alinhadas com ``jogadores``. Os movimentos
+de cada rodada ficam codificados em bytes (capivara_replay), gravados em
+base64; a versão 2 guardava [id_usuario, peça] por peça jogada.
+"""
+
+import base64
+import re
+
+from capivara_domino import INDICE_PECA
+from capivara_replay import Replay, de_jogadas
+
+VERSAO_JOGO = 3
+
+# "Nome do Jogador: [3-0]" (jogadas gravadas pelas simulações antigas)
+PADRAO_JOGADA = re.compile(r"^(.*): \[(\d)-(\d)\]$")
+
+
+class Rodada:
+    """Uma partida (rodada) dentro de um jogo"""
+
+    __slots__ = ("numero", "vencedor_id", "tipo_vitoria", "pontos", "movimentos")
+
+    def __init__(self, numero, vencedor_id, pontos, tipo_vitoria=None, movimentos=b""):
+        self.numero = numero
+        self.vencedor_id = vencedor_id
+        self.tipo_vitoria = tipo_vitoria
+        self.pontos = pontos
+        # Bytes de capivara_replay: cabeçalho (+ distribuição) e 1 byte por movimento
+        self.movimentos = bytes(movimentos)
+
+    def to_dict(self):
+        return {
+            "rodada": self.numero,
+            "vencedor_id": self.vencedor_id,
+            "tipo_vitoria": self.tipo_vitoria,
+            "pontos": self.pontos,
+            "movimentos": base64.b64encode(self.movimentos).decode("ascii")
+        }
+
+    @classmethod
+    def from_dict(cls, data, jogadores=()):
+        """Carrega a rodada; ``jogadores`` converte o formato da versão 2"""
+        if "movimentos" in data:
+            movimentos = base64.b64decode(data["movimentos"])
+        elif data.get("jogadas"):
+            movimentos = de_jogadas([tuple(j) for j in data["jogadas"]], jogadores)
+        else:
+            movimentos = b""
+        return cls(data["rodada"], data.get("vencedor_id"), data.get("pontos", 0),
+                   data.get("tipo_vitoria"), movimentos)
+
+
+class Game:
+    """Jogo no formato normalizado (versão 3)"""
+
+    __slots__ = ("id", "numero_jogadores", "status", "data_inicio", "data_fim",
+                 "pontos_meta", "jogadores", "pontuacao", "vencedor_id",
+                 "total_rodadas", "partidas_vencidas", "rodadas", "rev")
+
+    def __init__(self, id, numero_jogadores, status="em_andamento", data_inicio=None,
+                 data_fim=None, pontos_meta=50, jogadores=(), pontuacao=None,
+                 vencedor_id=None, total_rodadas=None, partidas_vencidas=None, rodadas=(),
+                 rev=0):
+        self.id = id
+        self.numero_jogadores = numero_jogadores
+        self.status = status
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.pontos_meta = pontos_meta
+        self.jogadores = tuple(jogadores)
+        self.pontuacao = tuple(pontuacao) if pontuacao is not None else (0,) * len(self.jogadores)
+        self.vencedor_id = vencedor_id
+        self.rodadas = tuple(rodadas)
+        self.total_rodadas = total_rodadas if total_rodadas is not None else len(self.rodadas)
+        if partidas_vencidas is None:
+            posicoes = {user_id: pos for pos, user_id in enumerate(self.jogadores)}
+            vencidas = [0] * len(self.jogadores)
+            for rodada in self.rodadas:
+                if rodada.vencedor_id in posicoes:
+                    vencidas[posicoes[rodada.vencedor_id]] += 1
+            partidas_vencidas = vencidas
+        self.partidas_vencidas = tuple(partidas_vencidas)
+        # Revisão do registro no journal (controle de concorrência otimista)
+        self.rev = rev
+
+    def replay(self, indice):
+        """Replay da rodada ``indice`` (0-based)"""
+        return Replay(self.rodadas[indice].movimentos, self.numero_jogadores)
+
+    def pontos_de(self, user_id):
+        """Pontuação de um jogador neste jogo"""
+        try:
+            return self.pontuacao[self.jogadores.index(user_id)]
+        except ValueError:
+            return 0
+
+    def to_dict(self):
+        data = {
+            "versao": VERSAO_JOGO,
+            "id_jogo": self.id,
+            "numero_jogadores": self.numero_jogadores,
+            "status": self.status,
+            "data_inicio": self.data_inicio,
+            "data_fim": self.data_fim,
+            "pontos_meta": self.pontos_meta,
+            "jogadores": list(self.jogadores),
+            "pontuacao": list(self.pontuacao),
+            "vencedor_id": self.vencedor_id,
+            "total_rodadas": self.total_rodadas,
+            "partidas_vencidas": list(self.partidas_vencidas),
+            "rev": self.rev
+        }
+        if self.rodadas:
+            data["rodadas"] = [r.to_dict() for r in self.rodadas]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Carrega um jogo em qualquer formato (migrando os antigos)"""
+        if data.get("versao") in (2, VERSAO_JOGO):
+            jogadores = data.get("jogadores", [])
+            return cls(
+                data["id_jogo"], data["numero_jogadores"], data.get("status", "em_andamento"),
+                data.get("data_inicio"), data.get("data_fim"), data.get("pontos_meta", 50),
+                jogadores, data.get("pontuacao"), data.get("vencedor_id"),
+                data.get("total_rodadas"), data.get("partidas_vencidas"),
+                (Rodada.from_dict(r, jogadores) for r in data.get("rodadas", [])),
+                data.get("rev", 0)
+            )
+        if "id_jogo" in data:
+            return migrar_jogo_criado(data)
+        return migrar_jogo_simulado(data)
+
+
+def migrar_jogo_criado(data):
+    """Formato de create_game: id_jogo / numero_jogadores / participantes"""
+    return Game(
+        data["id_jogo"], data["numero_jogadores"], data.get("status", "em_andamento"),
+        data.get("data_inicio"), data.get("data_fim"), data.get("pontos_meta", 50),
+        data.get("participantes", [])
+    )
+
+
+def migrar_jogo_simulado(data):
+    """Formato de simulate_game: nomes repetidos e pontuação com chaves texto"""
+    jogadores = [int(j) for j in data.get("jogadores", [])]
+    ids_por_nome = dict(zip(data.get("nomes_jogadores", []), jogadores))
+    pontuacao_antiga = data.get("pontuacao", {})
+    pontuacao = [pontuacao_antiga.get(str(j), 0) for j in jogadores]
+
+    rodadas = []
+    for rodada in data.get("rodadas", []):
+        jogadas = []
+        for jogada in rodada.get("jogadas", []):
+            match = PADRAO_JOGADA.match(jogada)
+            if match and match.group(1) in ids_por_nome:
+                peca = INDICE_PECA[(int(match.group(2)), int(match.group(3)))]
+                jogadas.append((ids_por_nome[match.group(1)], peca))
+        rodadas.append(Rodada(
+            rodada.get("rodada", len(rodadas) + 1), ids_por_nome.get(rodada.get("ganhador")),
+            rodada.get("pontos", 0), rodada.get("tipo_vitoria"), de_jogadas(jogadas, jogadores)
+        ))
+
+    vencidas_antigas = data.get("partidas_vencidas")
+    return Game(
+        data["id"], len(jogadores), data.get("status", "simulacao"),
+        data.get("data_inicio"), data.get("data_fim"), data.get("pontos_meta", 50),
+        jogadores, pontuacao, ids_por_nome.get(data.get("vencedor")),
+        data.get("total_rodadas"),
+        [vencidas_antigas.get(str(j), 0) for j in jogadores] if vencidas_antigas else None,
+        rodadas
+    )
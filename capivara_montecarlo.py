@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - ESTIMADOR MONTE CARLO (NUMPY)
+Joga lotes de centenas de milhares de partidas ao mesmo tempo, com as
+mesmas regras de capivara_domino.jogar_partida: cada passo do laço avança
+uma jogada em todas as partidas ainda ativas, com mãos em máscaras de 28
+bits (um int64 por jogador) e extremidades em arrays.
+
+Estratégias são funções de prioridade ``(rng, n) -> array (n, 28) ou (28,)``:
+entre as peças jogáveis, joga a de maior prioridade (empate: menor índice,
+como max() no motor em Python), no primeiro lado possível. Cada posição da
+mesa pode usar uma estratégia diferente.
+
+As taxas de vitória saem com intervalo de confiança de Wilson (95%). Com 4
+jogadores a vitória é da dupla (posições 1 e 3 x 2 e 4), então a referência
+é 50%.
+
+NumPy é opcional: sem ele o módulo importa, mas estimar() levanta
+RuntimeError.
+"""
+
+import math
+import time
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: só o estimador depende dele
+    np = None
+
+from capivara_domino import (
+    MASCARA_EXTREMIDADES, MASCARA_PIP, MASCARA_TODAS, NUM_PECAS, PECA_66, PECAS,
+    PECAS_POR_JOGADOR, VALOR_PECA
+)
+
+PARTIDAS_PADRAO = 200000
+TAMANHO_LOTE = 50000
+Z_95 = 1.959964
+
+# Extremidade 7 = mesa vazia
+VAZIA = 7
+
+Estimativa = namedtuple("Estimativa", "taxa ic_inferior ic_superior vitorias amostras")
+ResultadoMonteCarlo = namedtuple(
+    "ResultadoMonteCarlo",
+    "num_jogadores partidas estrategias segundos por_posicao por_ordem com_66 sem_66 "
+    "primeiro_sem_66 por_estrategia trancamentos pontos_medios"
+)
+
+if np is not None:
+    BIT = np.left_shift(np.int64(1), np.arange(NUM_PECAS, dtype=np.int64))
+    INDICES = np.arange(NUM_PECAS, dtype=np.int64)
+    PECA_A = np.array([a for a, _ in PECAS], dtype=np.int8)
+    PECA_B = np.array([b for _, b in PECAS], dtype=np.int8)
+    VALOR = np.array(VALOR_PECA, dtype=np.float64)
+    DUPLA = np.array([a == b for a, b in PECAS], dtype=np.float64)
+    # Máscara das peças jogáveis por (ext_esq, ext_dir); mesa vazia: todas
+    MASCARA_EXT = np.full((VAZIA + 1, VAZIA + 1), MASCARA_TODAS, dtype=np.int64)
+    MASCARA_EXT[:VAZIA, :VAZIA] = MASCARA_EXTREMIDADES
+    MASCARA_PIP_EXT = np.array(MASCARA_PIP + (0,), dtype=np.int64)
+    # Soma dos valores da mão por tabela: 14 bits baixos + 14 bits altos
+    _METADE = NUM_PECAS // 2
+    _BITS_METADE = (np.arange(1 << _METADE)[:, None] >> np.arange(_METADE)) & 1
+    _VALOR_METADE = np.stack([
+        _BITS_METADE @ np.array(VALOR_PECA[:_METADE], dtype=np.int64),
+        _BITS_METADE @ np.array(VALOR_PECA[_METADE:], dtype=np.int64),
+    ])
+
+
+# ----------------------------------------------------------------------
+# Estratégias (prioridade de cada peça)
+# ----------------------------------------------------------------------
+
+def prioridade_maior_peca(rng, n):
+    """Maior valor primeiro (mesma escolha de estrategia_maior_peca)"""
+    return VALOR
+
+
+def prioridade_menor_peca(rng, n):
+    """Menor valor primeiro (guarda os pontos na mão)"""
+    return -VALOR
+
+
+def prioridade_manter_duplas(rng, n):
+    """Maior valor, deixando as duplas para quando não houver outra peça"""
+    return VALOR - 100 * DUPLA
+
+
+def prioridade_duplas_primeiro(rng, n):
+    """Livra-se das duplas antes, depois maior valor"""
+    return VALOR + 100 * DUPLA
+
+
+def prioridade_aleatoria(rng, n):
+    """Qualquer peça jogável"""
+    return rng.random((n, NUM_PECAS))
+
+
+ESTRATEGIAS = {
+    "maior_peca": prioridade_maior_peca,
+    "menor_peca": prioridade_menor_peca,
+    "manter_duplas": prioridade_manter_duplas,
+    "duplas_primeiro": prioridade_duplas_primeiro,
+    "aleatoria": prioridade_aleatoria,
+}
+
+
+def resolver_estrategias(estrategias, num_jogadores):
+    """Normaliza para [(nome, função)] por posição.
+
+    Aceita um nome/função para todos ou uma lista repetida em ciclo pelas
+    posições (com 4 jogadores, duas estratégias = uma por dupla).
+    """
+    if isinstance(estrategias, str) or callable(estrategias):
+        estrategias = [estrategias]
+    estrategias = list(estrategias)
+    if not estrategias or num_jogadores % len(estrategias):
+        raise ValueError(f"O número de estratégias deve dividir {num_jogadores} "
+                         f"(recebidas {len(estrategias)})")
+    estrategias *= num_jogadores // len(estrategias)
+    resolvidas = []
+    for estrategia in estrategias:
+        if callable(estrategia):
+            resolvidas.append((getattr(estrategia, "__name__", "personalizada"), estrategia))
+        elif estrategia in ESTRATEGIAS:
+            resolvidas.append((estrategia, ESTRATEGIAS[estrategia]))
+        else:
+            raise ValueError(f"Estratégia desconhecida: {estrategia} "
+                             f"(disponíveis: {', '.join(ESTRATEGIAS)})")
+    return resolvidas
+
+
+# ----------------------------------------------------------------------
+# Simulação vetorizada
+# ----------------------------------------------------------------------
+
+def valores_maos(maos):
+    """Soma dos valores das peças de cada máscara (array de qualquer forma)"""
+    return (_VALOR_METADE[0][maos & ((1 << _METADE) - 1)] +
+            _VALOR_METADE[1][maos >> _METADE])
+
+
+def jogar_lote(num_jogadores, n, prioridades, rng):
+    """Distribui e joga ``n`` partidas; retorna um dict de arrays por partida.
+
+    Chaves: baralho (n, 28), primeiro, dono_66 (-1 se o 6-6 ficou no monte),
+    vencedor, batida, maos finais (n, J), pontos (n, J) e venceu (n, J).
+    """
+    J = num_jogadores
+    linhas = np.arange(n)
+
+    # Uma permutação das 28 peças por partida: mãos em blocos de 7, resto é o monte
+    baralho = np.argsort(rng.random((n, NUM_PECAS)), axis=1)
+    maos = np.bitwise_or.reduce(
+        BIT[baralho[:, :J * PECAS_POR_JOGADOR]].reshape(n, J, PECAS_POR_JOGADOR), axis=2
+    )
+    tem_66 = (maos >> PECA_66) & 1 == 1
+    distribuido = tem_66.any(axis=1)
+    dono_66 = np.where(distribuido, tem_66.argmax(axis=1), -1)
+    primeiro = np.where(distribuido, dono_66, rng.integers(J, size=n))
+    # O monte é baralho[7J:7J + restantes]; a compra tira do fim (monte.pop())
+    restantes = np.full(n, NUM_PECAS - J * PECAS_POR_JOGADOR)
+
+    ext_esq = np.full(n, VAZIA, dtype=np.int64)
+    ext_dir = np.full(n, VAZIA, dtype=np.int64)
+    jogador = primeiro.copy()
+    vencedor = np.zeros(n, dtype=np.int64)
+    batida = np.zeros(n, dtype=bool)
+    ativo = np.ones(n, dtype=bool)
+    ativos = linhas
+
+    while ativos.size:
+        j = jogador[ativos]
+        mao = maos[ativos, j]
+        mascara = MASCARA_EXT[ext_esq[ativos], ext_dir[ativos]]
+        jogaveis = mao & mascara
+
+        # Sem jogada: compra do monte até conseguir jogar ou o monte acabar
+        comprar = (jogaveis == 0) & (restantes[ativos] > 0)
+        while comprar.any():
+            sel = ativos[comprar]
+            mao[comprar] |= BIT[baralho[sel, J * PECAS_POR_JOGADOR + restantes[sel] - 1]]
+            restantes[sel] -= 1
+            jogaveis[comprar] = mao[comprar] & mascara[comprar]
+            comprar = (jogaveis == 0) & (restantes[ativos] > 0)
+        maos[ativos, j] = mao
+
+        joga = jogaveis != 0
+        passa = ~joga
+        jogador[ativos[passa]] = (j[passa] + 1) % J
+
+        sel = ativos[joga]
+        jj = j[joga]
+        bits = (jogaveis[joga][:, None] >> INDICES) & 1 == 1
+        prioridade = np.empty(bits.shape)
+        for posicao, funcao in enumerate(prioridades):
+            da_posicao = jj == posicao
+            if da_posicao.any():
+                prioridade[da_posicao] = funcao(rng, int(da_posicao.sum()))
+        peca = np.where(bits, prioridade, -np.inf).argmax(axis=1)
+
+        # Extremidades: mesa vazia recebe a peça inteira; senão, esquerda se encaixar
+        ee = ext_esq[sel]
+        ed = ext_dir[sel]
+        a = PECA_A[peca]
+        b = PECA_B[peca]
+        vazia = ee == VAZIA
+        esquerda = (BIT[peca] & MASCARA_PIP_EXT[ee]) != 0
+        novo_esq = np.where(vazia, a, np.where(esquerda, np.where(a == ee, b, a), ee))
+        novo_dir = np.where(vazia, b, np.where(esquerda, ed, np.where(a == ed, b, a)))
+        ext_esq[sel] = novo_esq
+        ext_dir[sel] = novo_dir
+        mao_nova = maos[sel, jj] & ~BIT[peca]
+        maos[sel, jj] = mao_nova
+
+        bateu = mao_nova == 0
+        trancou = ~bateu & ~((maos[sel] & MASCARA_EXT[novo_esq, novo_dir][:, None]) != 0).any(axis=1)
+        fim = bateu | trancou
+        vencedor[sel[fim]] = jj[fim]
+        batida[sel[bateu]] = True
+        continua = ~fim
+        jogador[sel[continua]] = (jj[continua] + 1) % J
+        ativo[sel[fim]] = False
+        ativos = ativos[ativo[ativos]]
+
+    # Pontuação (trigger calcular_pontos_partida / pontuar_partida)
+    valores = valores_maos(maos)
+    posicoes = np.arange(J)
+    if J <= 3:
+        venceu = posicoes[None, :] == vencedor[:, None]
+        pontos = np.where(venceu, (valores.sum(axis=1) - valores[linhas, vencedor])[:, None], 0)
+    else:
+        dupla_0 = valores[:, 0] + valores[:, 2]
+        dupla_1 = valores[:, 1] + valores[:, 3]
+        dupla_vencedora = np.where(
+            batida, vencedor % 2,
+            np.where(dupla_0 != dupla_1, (dupla_0 > dupla_1).astype(np.int64), 1 - vencedor % 2)
+        )
+        venceu = posicoes[None, :] % 2 == dupla_vencedora[:, None]
+        ganho = np.where(dupla_vencedora == 0, dupla_1, dupla_0)
+        pontos = np.where(venceu, ganho[:, None], 0)
+
+    return {"baralho": baralho, "primeiro": primeiro, "dono_66": dono_66,
+            "vencedor": vencedor, "batida": batida, "maos": maos,
+            "pontos": pontos, "venceu": venceu}
+
+
+# ----------------------------------------------------------------------
+# Estimativas
+# ----------------------------------------------------------------------
+
+def intervalo_wilson(vitorias, amostras, z=Z_95):
+    """Taxa de sucesso com intervalo de confiança de Wilson"""
+    vitorias = int(vitorias)
+    amostras = int(amostras)
+    if not amostras:
+        return Estimativa(0.0, 0.0, 1.0, 0, 0)
+    p = vitorias / amostras
+    denominador = 1 + z * z / amostras
+    centro = (p + z * z / (2 * amostras)) / denominador
+    margem = z * math.sqrt(p * (1 - p) / amostras + z * z / (4 * amostras * amostras)) / denominador
+    return Estimativa(p, max(0.0, centro - margem), min(1.0, centro + margem), vitorias, amostras)
+
+
+def estimar(num_jogadores, partidas=PARTIDAS_PADRAO, estrategias="maior_peca", seed=None,
+            tamanho_lote=TAMANHO_LOTE):
+    """Estima taxas de vitória por partida com ``partidas`` partidas simuladas.
+
+    Retorna um ResultadoMonteCarlo com Estimativas por posição na mesa, por
+    ordem de jogada (0 = quem começa), para quem tem o 6-6 e para os
+    demais, para quem começa sem o 6-6 (só com 2-3 jogadores, quando ele
+    fica no monte e o primeiro é sorteado) e por estratégia.
+    """
+    if np is None:
+        raise RuntimeError("NumPy não instalado (pip install numpy)")
+    if num_jogadores not in (2, 3, 4):
+        raise ValueError("O dominó é jogado por 2, 3 ou 4 jogadores")
+    resolvidas = resolver_estrategias(estrategias, num_jogadores)
+    prioridades = [funcao for _, funcao in resolvidas]
+    rng = np.random.default_rng(seed)
+    J = num_jogadores
+
+    # Posições de cada estratégia: ela vence a partida se uma delas vencer
+    posicoes_estrategia = {}
+    for posicao, (nome, _) in enumerate(resolvidas):
+        posicoes_estrategia.setdefault(nome, []).append(posicao)
+    vitorias_estrategia = dict.fromkeys(posicoes_estrategia, 0)
+    vitorias_posicao = np.zeros(J, dtype=np.int64)
+    vitorias_ordem = np.zeros(J, dtype=np.int64)
+    pontos_posicao = np.zeros(J, dtype=np.int64)
+    com_66 = [0, 0]
+    sem_66 = [0, 0]
+    primeiro_sem_66 = [0, 0]
+    trancamentos = 0
+
+    inicio = time.perf_counter()
+    feitas = 0
+    while feitas < partidas:
+        n = min(tamanho_lote, partidas - feitas)
+        lote = jogar_lote(J, n, prioridades, rng)
+        linhas = np.arange(n)
+        venceu = lote["venceu"]
+        vitorias_posicao += venceu.sum(axis=0)
+        pontos_posicao += lote["pontos"].sum(axis=0)
+        for ordem in range(J):
+            vitorias_ordem[ordem] += venceu[linhas, (lote["primeiro"] + ordem) % J].sum()
+
+        dono = lote["dono_66"]
+        distribuido = dono >= 0
+        venceu_dono = venceu[linhas[distribuido], dono[distribuido]].sum()
+        com_66[0] += venceu_dono
+        com_66[1] += distribuido.sum()
+        sem_66[0] += venceu[distribuido].sum() - venceu_dono
+        sem_66[1] += distribuido.sum() * (J - 1)
+        primeiro_sem_66[0] += venceu[linhas[~distribuido], lote["primeiro"][~distribuido]].sum()
+        primeiro_sem_66[1] += (~distribuido).sum()
+        trancamentos += (~lote["batida"]).sum()
+        for nome, posicoes in posicoes_estrategia.items():
+            vitorias_estrategia[nome] += venceu[:, posicoes].any(axis=1).sum()
+        feitas += n
+    segundos = time.perf_counter() - inicio
+
+    return ResultadoMonteCarlo(
+        num_jogadores=J,
+        partidas=partidas,
+        estrategias=[nome for nome, _ in resolvidas],
+        segundos=segundos,
+        por_posicao=[intervalo_wilson(v, partidas) for v in vitorias_posicao],
+        por_ordem=[intervalo_wilson(v, partidas) for v in vitorias_ordem],
+        com_66=intervalo_wilson(*com_66),
+        sem_66=intervalo_wilson(*sem_66),
+        primeiro_sem_66=intervalo_wilson(*primeiro_sem_66),
+        por_estrategia={nome: intervalo_wilson(v, partidas) for nome, v in vitorias_estrategia.items()},
+        trancamentos=intervalo_wilson(trancamentos, partidas),
+        pontos_medios=[p / partidas for p in pontos_posicao.tolist()],
+    )
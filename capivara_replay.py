@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - CODIFICAÇÃO COMPACTA E REPLAY DE PARTIDAS
+Cada rodada é gravada como uma sequência de bytes:
+
+    • cabeçalho (1 byte): bits 0-1 = posição de quem começou;
+      0x80 = seguem 28 bytes com a ordem do baralho (a distribuição),
+      0x40 = movimentos livres (simulações antigas, sem regras)
+    • um byte por movimento:
+          0-27    peça jogada na esquerda (ou a primeira da mesa)
+          32-59   peça jogada na direita
+          64-91   peça comprada do monte
+          128     passou a vez
+
+O jogador de cada movimento não é gravado: sai da ordem da mesa (jogar ou
+passar passa a vez; comprar não). Com a distribuição, o replay reconstrói
+também as mãos e o monte em qualquer ponto da partida.
+"""
+
+from collections import deque, namedtuple
+
+from capivara_domino import (
+    COMPROU, DIREITA, ESQUERDA, INICIAL, JOGOU, MASCARA_PIP, NUM_PECAS, PASSOU, PECAS,
+    PECAS_POR_JOGADOR, Movimento, aplicar_jogada, formatar_peca
+)
+
+JOGADA_DIREITA = 0x20
+COMPRA = 0x40
+PASSE = 0x80
+MASCARA_PECA = 0x1F
+
+COM_DISTRIBUICAO = 0x80
+LIVRE = 0x40
+MASCARA_PRIMEIRO = 0x03
+
+EstadoMesa = namedtuple("EstadoMesa", "movimentos jogador mesa extremidades maos monte")
+
+
+class ReplayError(ValueError):
+    """Sequência de movimentos inválida para as regras (ou bytes corrompidos)"""
+
+
+def _decodificar_codigo(codigo):
+    if codigo == PASSE:
+        return (PASSOU, None, None)
+    peca = codigo & MASCARA_PECA
+    if peca >= NUM_PECAS or codigo & ~(COMPRA | JOGADA_DIREITA | MASCARA_PECA):
+        return None
+    if codigo & COMPRA:
+        return None if codigo & JOGADA_DIREITA else (COMPROU, peca, None)
+    return (JOGOU, peca, DIREITA if codigo & JOGADA_DIREITA else ESQUERDA)
+
+
+# (tipo, peça, lado) de cada valor de byte; None = código inválido
+TABELA_CODIGOS = tuple(_decodificar_codigo(c) for c in range(256))
+
+# Forma usada no laço do replay: (ação, peça, bit, a, b)
+PASSA, COMPRA_PECA, ESQUERDA_PECA, DIREITA_PECA = range(4)
+_ACOES = {PASSOU: PASSA, COMPROU: COMPRA_PECA, ESQUERDA: ESQUERDA_PECA, DIREITA: DIREITA_PECA}
+TABELA_REPLAY = tuple(
+    None if item is None else
+    (_ACOES[item[2] or item[0]], item[1],
+     None if item[1] is None else 1 << item[1],
+     *(PECAS[item[1]] if item[1] is not None else (None, None)))
+    for item in TABELA_CODIGOS
+)
+
+
+def codificar_movimento(tipo, peca=None, lado=None):
+    if tipo == PASSOU:
+        return PASSE
+    if tipo == COMPROU:
+        return COMPRA | peca
+    return (JOGADA_DIREITA if lado == DIREITA else 0) | peca
+
+
+def codificar(movimentos, primeiro, baralho=None, livre=False):
+    """Bytes de uma rodada a partir dos Movimento de jogar_partida(registrar=True).
+
+    ``baralho`` é a ordem das 28 peças (índices 0-27) usada na distribuição.
+    """
+    cabecalho = primeiro | (COM_DISTRIBUICAO if baralho is not None else 0) | (LIVRE if livre else 0)
+    return (bytes((cabecalho,)) + (bytes(baralho) if baralho is not None else b"") +
+            bytes(codificar_movimento(m.tipo, m.peca, m.lado) for m in movimentos))
+
+
+def de_jogadas(jogadas, jogadores):
+    """Converte a lista antiga [(id_usuario, peça)] (só as peças jogadas).
+
+    Os passes são deduzidos pela ordem da mesa e o lado é o primeiro em que
+    a peça encaixa (a escolha do motor de regras). Se alguma peça não
+    encaixar - as simulações antigas sorteavam peças -, a rodada é gravada
+    como livre.
+    """
+    posicoes = {user_id: posicao for posicao, user_id in enumerate(jogadores)}
+    jogadas = [(posicoes[user_id], peca) for user_id, peca in jogadas if user_id in posicoes]
+    num_jogadores = len(jogadores)
+    primeiro = jogadas[0][0] if jogadas else 0
+
+    codigos = bytearray()
+    livre = False
+    usadas = 0
+    ext_esq = ext_dir = None
+    esperado = primeiro
+    for posicao, peca in jogadas:
+        while esperado != posicao:
+            codigos.append(PASSE)
+            esperado = (esperado + 1) % num_jogadores
+        lado = ESQUERDA
+        if not livre:
+            bit = 1 << peca
+            if usadas & bit:
+                livre = True
+            elif ext_esq is not None:
+                if not bit & MASCARA_PIP[ext_esq]:
+                    if bit & MASCARA_PIP[ext_dir]:
+                        lado = DIREITA
+                    else:
+                        livre = True
+            if not livre:
+                usadas |= bit
+                ext_esq, ext_dir = aplicar_jogada(peca, lado, ext_esq, ext_dir)
+        codigos.append(codificar_movimento(JOGOU, peca, lado))
+        esperado = (posicao + 1) % num_jogadores
+
+    if livre:
+        # Sem regras, o lado não significa nada: tudo na esquerda
+        codigos = bytearray(c & ~JOGADA_DIREITA if c != PASSE else c for c in codigos)
+    return bytes((primeiro | (LIVRE if livre else 0),)) + bytes(codigos)
+
+
+class Replay:
+    """Reconstrói uma rodada a partir dos bytes, movimento a movimento"""
+
+    def __init__(self, dados, num_jogadores):
+        if not dados:
+            raise ReplayError("Rodada sem movimentos gravados")
+        self.num_jogadores = num_jogadores
+        cabecalho = dados[0]
+        self.primeiro = cabecalho & MASCARA_PRIMEIRO
+        self.livre = bool(cabecalho & LIVRE)
+        inicio = 1
+        self.baralho = None
+        if cabecalho & COM_DISTRIBUICAO:
+            inicio += NUM_PECAS
+            self.baralho = tuple(dados[1:inicio])
+            if sorted(self.baralho) != list(range(NUM_PECAS)):
+                raise ReplayError("Distribuição corrompida")
+        self.codigos = bytes(dados[inicio:])
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def movimentos(self):
+        """Movimento(jogador, tipo, peca, lado) de cada byte, com o jogador deduzido"""
+        resultado = []
+        jogador = self.primeiro
+        num_jogadores = self.num_jogadores
+        mesa_vazia = True
+        for codigo in self.codigos:
+            decodificado = TABELA_CODIGOS[codigo]
+            if decodificado is None:
+                raise ReplayError(f"Código de movimento inválido: {codigo}")
+            tipo, peca, lado = decodificado
+            if tipo == JOGOU and mesa_vazia:
+                lado = INICIAL
+                mesa_vazia = False
+            resultado.append(Movimento(jogador, tipo, peca, lado))
+            if tipo != COMPROU:
+                jogador = (jogador + 1) % num_jogadores
+        return resultado
+
+    def estado(self, ate=None):
+        """EstadoMesa depois dos ``ate`` primeiros movimentos (padrão: todos).
+
+        ``mesa`` é a sequência de peças da esquerda para a direita, já
+        orientadas; ``maos`` (máscaras por posição) e ``monte`` (peças
+        restantes) só existem quando a distribuição foi gravada.
+        """
+        codigos = self.codigos if ate is None else self.codigos[:ate]
+        num_jogadores = self.num_jogadores
+        tabela = TABELA_REPLAY
+        livre = self.livre
+        mesa = deque()
+        ext_esq = ext_dir = None
+        jogador = self.primeiro
+        maos = monte = None
+        if self.baralho is not None:
+            maos = []
+            for posicao in range(num_jogadores):
+                mao = 0
+                for peca in self.baralho[posicao * PECAS_POR_JOGADOR:(posicao + 1) * PECAS_POR_JOGADOR]:
+                    mao |= 1 << peca
+                maos.append(mao)
+            monte = list(self.baralho[num_jogadores * PECAS_POR_JOGADOR:]) if num_jogadores < 4 else []
+
+        for numero, codigo in enumerate(codigos, 1):
+            decodificado = tabela[codigo]
+            if decodificado is None:
+                raise ReplayError(f"Movimento {numero}: código inválido {codigo}")
+            acao, peca, bit, a, b = decodificado
+            if acao == PASSA:
+                jogador = (jogador + 1) % num_jogadores
+                continue
+            if acao == COMPRA_PECA:
+                if maos is not None:
+                    if not monte or monte[-1] != peca:
+                        raise ReplayError(f"Movimento {numero}: compra de {formatar_peca(peca)} "
+                                          f"fora da ordem do monte")
+                    monte.pop()
+                    maos[jogador] |= bit
+                continue
+
+            if maos is not None:
+                if not maos[jogador] & bit:
+                    raise ReplayError(f"Movimento {numero}: {formatar_peca(peca)} "
+                                      f"não está na mão do jogador {jogador + 1}")
+                maos[jogador] &= ~bit
+            if livre:
+                mesa.append((a, b))
+            elif ext_esq is None:
+                mesa.append((a, b))
+                ext_esq, ext_dir = a, b
+            elif acao == ESQUERDA_PECA:
+                if a != ext_esq and b != ext_esq:
+                    raise ReplayError(f"Movimento {numero}: {formatar_peca(peca)} "
+                                      f"não encaixa na esquerda ({ext_esq})")
+                novo = b if a == ext_esq else a
+                mesa.appendleft((novo, ext_esq))
+                ext_esq = novo
+            else:
+                if a != ext_dir and b != ext_dir:
+                    raise ReplayError(f"Movimento {numero}: {formatar_peca(peca)} "
+                                      f"não encaixa na direita ({ext_dir})")
+                novo = b if a == ext_dir else a
+                mesa.append((ext_dir, novo))
+                ext_dir = novo
+            jogador = (jogador + 1) % num_jogadores
+
+        return EstadoMesa(
+            len(codigos), jogador, tuple(mesa),
+            None if ext_esq is None else (ext_esq, ext_dir),
+            tuple(maos) if maos is not None else None,
+            len(monte) if monte is not None else None
+        )
+
+    def renderizar(self, nomes=None):
+        """Linhas legíveis ("Nome: [6-4] na direita"), geradas sob demanda"""
+        nomes = nomes or [f"Jogador {p + 1}" for p in range(self.num_jogadores)]
+        linhas = []
+        for movimento in self.movimentos():
+            nome = nomes[movimento.jogador]
+            if movimento.tipo == PASSOU:
+                linhas.append(f"{nome}: passou")
+            elif movimento.tipo == COMPROU:
+                linhas.append(f"{nome}: comprou [{formatar_peca(movimento.peca)}]")
+            elif self.livre or movimento.lado == INICIAL:
+                linhas.append(f"{nome}: [{formatar_peca(movimento.peca)}]")
+            else:
+                linhas.append(f"{nome}: [{formatar_peca(movimento.peca)}] na {movimento.lado}")
+        return linhas
+
+
+def renderizar_mesa(mesa):
+    """Mesa como texto: [6|6][6|4][4|1]"""
+    return "".join(f"[{a}|{b}]" for a, b in mesa)
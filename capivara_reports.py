@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - RELATÓRIOS
+Cada relatório tem a consulta SQL, executada no PostgreSQL quando ele está
+disponível, e a versão equivalente sobre os dados JSON em memória. Esta
+última trabalha com colunas (ColumnStore: um array/lista por campo) e
+agregações feitas em C (Counter, bytes.count, sum, heapq) em vez de laços
+sobre os dicionários.
+
+Os resultados ficam em cache pela versão dos dados
+(DatabaseInterface.data_version, incrementada a cada mutação): repetir um
+relatório sem alterações no meio não executa nada.
+"""
+
+import csv
+import heapq
+import json
+import time
+from array import array
+from collections import Counter, namedtuple
+from datetime import datetime
+
+Relatorio = namedtuple("Relatorio", "chave titulo colunas sql calcular")
+ResultadoRelatorio = namedtuple(
+    "ResultadoRelatorio", "chave titulo colunas linhas fonte segundos cache"
+)
+
+FORMATOS_EXPORTACAO = ("csv", "json")
+
+
+class ColumnStore:
+    """Dados de usuários e jogos (ativos + arquivo colunar) organizados por coluna"""
+
+    def __init__(self, users, games, archive=None):
+        self.user_ids = array('q', (u["id_usuario"] for u in users))
+        self.user_nomes = [u["nome_usuario"] for u in users]
+        self.user_cadastro = [u.get("data_cadastro") or "" for u in users]
+        self.user_ativo = bytes(1 if u.get("ativo", True) else 0 for u in users)
+        self.game_jogadores = array('b', (g.numero_jogadores for g in games))
+        self.game_status = [g.status for g in games]
+        if archive is not None and len(archive):
+            self.game_jogadores.frombytes(archive.coluna("numero_jogadores"))
+            self.game_status.extend(archive.status_por_jogo())
+
+
+def _contagem_agrupada(coluna):
+    return sorted(Counter(coluna).items())
+
+
+RELATORIOS = (
+    Relatorio(
+        "usuarios_ativos", "Total de usuários ativos", ("total",),
+        "SELECT COUNT(*) FROM usuarios WHERE ativo = TRUE",
+        lambda store, db: [(store.user_ativo.count(1),)]
+    ),
+    Relatorio(
+        "total_jogos", "Total de jogos criados", ("total",),
+        "SELECT COUNT(*) FROM jogos",
+        lambda store, db: [(len(store.game_jogadores),)]
+    ),
+    Relatorio(
+        "jogos_por_jogadores", "Jogos por número de jogadores", ("numero_jogadores", "total"),
+        "SELECT numero_jogadores, COUNT(*) FROM jogos GROUP BY numero_jogadores ORDER BY numero_jogadores",
+        lambda store, db: _contagem_agrupada(store.game_jogadores)
+    ),
+    Relatorio(
+        "jogos_por_status", "Jogos por status", ("status", "total"),
+        "SELECT status, COUNT(*) FROM jogos GROUP BY status ORDER BY status",
+        lambda store, db: _contagem_agrupada(store.game_status)
+    ),
+    Relatorio(
+        "usuarios_recentes", "Usuários mais recentes", ("nome_usuario", "data_cadastro"),
+        "SELECT nome_usuario, data_cadastro FROM usuarios ORDER BY data_cadastro DESC LIMIT 5",
+        # Datas ISO 8601: a ordem do texto é a ordem cronológica
+        lambda store, db: [(nome, cadastro) for cadastro, nome in
+                           heapq.nlargest(5, zip(store.user_cadastro, store.user_nomes))]
+    ),
+    Relatorio(
+        "ranking", "Ranking (top 10)", ("nome_usuario", "jogos_vencidos", "pontos_totais_acumulados"),
+        "SELECT nome_usuario, jogos_vencidos, pontos_totais_acumulados FROM ranking_usuarios LIMIT 10",
+        lambda store, db: [(r["nome_usuario"], r["jogos_vencidos"], r["pontos_totais_acumulados"])
+                           for r in db.ranking_usuarios(limit=10)]
+    ),
+)
+
+RELATORIOS_POR_CHAVE = {r.chave: r for r in RELATORIOS}
+
+
+class ReportEngine:
+    """Executa relatórios (PostgreSQL ou memória) com cache por versão dos dados"""
+
+    def __init__(self, db, export_dir):
+        self.db = db
+        self.export_dir = export_dir
+        self.cache = {}
+        self.store = None
+        self.store_version = None
+
+    def version(self):
+        """Versão dos dados: mutações locais + comandos já aplicados no PostgreSQL"""
+        write_behind = getattr(self.db, "write_behind", None)
+        return (self.db.data_version, write_behind.acked_id if write_behind else 0)
+
+    def columns(self):
+        """ColumnStore dos dados atuais (reconstruído só quando a versão muda)"""
+        with self.db.lock:
+            if self.store is None or self.store_version != self.db.data_version:
+                self.store = ColumnStore(self.db.users, self.db.games,
+                                         getattr(self.db, "archive", None))
+                self.store_version = self.db.data_version
+            return self.store
+
+    def run(self, chave, usar_cache=True):
+        relatorio = RELATORIOS_POR_CHAVE[chave]
+        versao = self.version()
+        em_cache = self.cache.get(chave)
+        if usar_cache and em_cache is not None and em_cache[0] == versao:
+            return em_cache[1]._replace(cache=True)
+
+        inicio = time.perf_counter()
+        linhas = None
+        fonte = "postgresql"
+        if self.db.postgres_available:
+            linhas = self.db.query_postgres(relatorio.sql)
+        if linhas is None:
+            # Sem PostgreSQL (ou consulta indisponível no esquema): dados em memória
+            fonte = "json"
+            linhas = relatorio.calcular(self.columns(), self.db)
+        resultado = ResultadoRelatorio(
+            relatorio.chave, relatorio.titulo, relatorio.colunas,
+            [tuple(linha) for linha in linhas], fonte, time.perf_counter() - inicio, False
+        )
+        self.cache[chave] = (versao, resultado)
+        return resultado
+
+    def run_all(self, usar_cache=True):
+        return [self.run(r.chave, usar_cache) for r in RELATORIOS]
+
+    def export(self, resultados, formato):
+        """Grava um ou mais resultados em data/relatorios; retorna o caminho"""
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato inválido: {formato}")
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        nome = resultados[0].chave if len(resultados) == 1 else "relatorios"
+        path = self.export_dir / f"{nome}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+
+        if formato == "json":
+            dados = {
+                r.chave: {
+                    "titulo": r.titulo,
+                    "fonte": r.fonte,
+                    "segundos": r.segundos,
+                    "linhas": [dict(zip(r.colunas, linha)) for linha in r.linhas]
+                }
+                for r in resultados
+            }
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, ensure_ascii=False, indent=2, default=str)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                for i, r in enumerate(resultados):
+                    if len(resultados) > 1:
+                        if i:
+                            writer.writerow([])
+                        writer.writerow([f"# {r.titulo}"])
+                    writer.writerow(r.colunas)
+                    writer.writerows(r.linhas)
+        return path
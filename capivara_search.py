@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - ÍNDICE DE BUSCA DE USUÁRIOS
+Índice invertido de trigramas com remoção de acentos ("João" ~ "joao"),
+equivalente em memória ao pg_trgm do PostgreSQL.
+"""
+
+import bisect
+import heapq
+import unicodedata
+
+# Campos pesquisáveis de um usuário
+CAMPOS_BUSCA = ("nome_usuario", "nome_completo", "email")
+
+# Mesmo limiar padrão de pg_trgm.similarity_threshold
+LIMIAR_SIMILARIDADE = 0.3
+
+# Trigramas muito frequentes são ignorados na busca aproximada para que o
+# custo dependa do tamanho da consulta, não do número de usuários
+MAX_POSTAGEM_FUZZY = 50000
+
+# Ordem de relevância dos tipos de resultado
+EXATO, PREFIXO, SUBSTRING, APROXIMADO = range(4)
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: "João" -> "joao" """
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def trigramas(texto, preenchido=True):
+    """Conjunto de trigramas do texto já normalizado.
+
+    Com ``preenchido`` o texto ganha dois espaços à esquerda e um à direita,
+    como no pg_trgm; sem ele só entram os trigramas internos (usados para
+    garantir que uma substring esteja contida no campo).
+    """
+    if preenchido:
+        texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class UserSearchIndex:
+    """Índice de busca de usuários: exata, por prefixo, substring e aproximada"""
+
+    def __init__(self):
+        self.postagens = {}
+        self.campos = {}
+        self.exatos = {}  # nome_usuario/email normalizados -> ids
+        self.termos = []
+
+    def build(self, users):
+        """Constrói o índice completo de uma vez (ordena os termos uma única vez)"""
+        self.postagens = {}
+        self.campos = {}
+        self.exatos = {}
+        termos = []
+        for user in users:
+            termos.extend(self._indexar(user))
+        termos.sort()
+        self.termos = termos
+
+    def add(self, user):
+        """Indexa (ou reindexa) um usuário"""
+        if user["id_usuario"] in self.campos:
+            self.remove(user["id_usuario"])
+        for termo in self._indexar(user):
+            bisect.insort(self.termos, termo)
+
+    def _indexar(self, user):
+        """Preenche as postagens do usuário e retorna seus termos de prefixo"""
+        user_id = user["id_usuario"]
+        campos = tuple(normalizar(user.get(campo) or "") for campo in CAMPOS_BUSCA)
+        self.campos[user_id] = campos
+        for chave in (campos[0], campos[2]):
+            self.exatos.setdefault(chave, set()).add(user_id)
+        for campo in campos:
+            for trigrama in trigramas(campo):
+                self.postagens.setdefault(trigrama, set()).add(user_id)
+        return [(termo, user_id) for termo in self.termos_de(campos)]
+
+    def remove(self, user_id):
+        campos = self.campos.pop(user_id, None)
+        if campos is None:
+            return
+        for chave in (campos[0], campos[2]):
+            ids = self.exatos.get(chave)
+            if ids is not None:
+                ids.discard(user_id)
+                if not ids:
+                    del self.exatos[chave]
+        for campo in campos:
+            for trigrama in trigramas(campo):
+                postagem = self.postagens.get(trigrama)
+                if postagem is not None:
+                    postagem.discard(user_id)
+        for termo in self.termos_de(campos):
+            pos = bisect.bisect_left(self.termos, (termo, user_id))
+            if pos < len(self.termos) and self.termos[pos] == (termo, user_id):
+                del self.termos[pos]
+
+    def termos_de(self, campos):
+        """Termos para busca por prefixo: campos inteiros e palavras do nome"""
+        termos = set(campos)
+        termos.update(campos[1].split())
+        return termos
+
+    def search(self, consulta, limit=20):
+        """Retorna [(user_id, tipo, pontuação)] ordenados por relevância"""
+        consulta = normalizar(consulta.strip())
+        if not consulta:
+            return []
+
+        resultados = {}
+
+        def registrar(user_id, tipo, pontuacao):
+            atual = resultados.get(user_id)
+            if atual is None or (tipo, -pontuacao) < (atual[0], -atual[1]):
+                resultados[user_id] = (tipo, pontuacao)
+
+        # Igualdade de nome_usuario/email: busca direta, antes de tudo
+        for user_id in self.exatos.get(consulta, ()):
+            registrar(user_id, EXATO, 1.0)
+
+        # Prefixo via lista ordenada de termos. Dentro do mesmo tipo o
+        # desempate é pelo id (como no ORDER BY do PostgreSQL), então todos
+        # os termos com o prefixo são percorridos antes de cortar no limite
+        if len(resultados) < limit:
+            encontrados = set()
+            pos = bisect.bisect_left(self.termos, (consulta,))
+            while pos < len(self.termos):
+                termo, user_id = self.termos[pos]
+                if not termo.startswith(consulta):
+                    break
+                if user_id not in resultados:
+                    encontrados.add(user_id)
+                pos += 1
+            for user_id in heapq.nsmallest(limit - len(resultados), encontrados):
+                registrar(user_id, PREFIXO, 1.0)
+
+        # Substring: interseção das postagens dos trigramas da consulta
+        if len(resultados) < limit and len(consulta) >= 3:
+            postagens = sorted(
+                (self.postagens.get(t, set()) for t in trigramas(consulta, preenchido=False)),
+                key=len
+            )
+            # Percorre a menor postagem sem materializar a interseção completa
+            encontrados = [
+                user_id for user_id in postagens[0]
+                if user_id not in resultados and all(user_id in p for p in postagens[1:])
+                and any(consulta in c for c in self.campos[user_id])
+            ]
+            for user_id in heapq.nsmallest(limit - len(resultados), encontrados):
+                registrar(user_id, SUBSTRING, 1.0)
+
+        # Aproximada: similaridade de trigramas (como similarity() do pg_trgm)
+        if len(resultados) < limit:
+            trigramas_consulta = trigramas(consulta)
+            contagem = {}
+            for trigrama in trigramas_consulta:
+                postagem = self.postagens.get(trigrama)
+                if not postagem or len(postagem) > MAX_POSTAGEM_FUZZY:
+                    continue
+                for user_id in postagem:
+                    contagem[user_id] = contagem.get(user_id, 0) + 1
+            for user_id, comuns in contagem.items():
+                # comuns / |consulta| é um limite superior da similaridade
+                if user_id in resultados or comuns / len(trigramas_consulta) < LIMIAR_SIMILARIDADE:
+                    continue
+                # Cada campo (e cada palavra do nome, como word_similarity do
+                # pg_trgm) é comparado isoladamente
+                similaridade = 0.0
+                for campo in self.termos_de(self.campos[user_id]):
+                    trigramas_campo = trigramas(campo)
+                    iguais = len(trigramas_consulta & trigramas_campo)
+                    similaridade = max(similaridade, iguais / len(trigramas_consulta | trigramas_campo))
+                if similaridade >= LIMIAR_SIMILARIDADE:
+                    registrar(user_id, APROXIMADO, similaridade)
+
+        ordenados = sorted(resultados.items(), key=lambda item: (item[1][0], -item[1][1], item[0]))
+        return [(user_id, tipo, pontuacao) for user_id, (tipo, pontuacao) in ordenados[:limit]]
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - LOG SQL SEGMENTADO
+Os comandos SQL executados são gravados em segmentos rotacionados por
+tamanho (data/sql_log/sql_commands.NNNNNN.sql), no mesmo formato do antigo
+data/sql_commands.sql. Cada segmento tem um índice binário (.idx) com o
+offset e o horário de cada comando, e o manifesto (indice.json) guarda as
+contagens dos segmentos fechados: contar comandos e ler os últimos N não
+exige ler o log inteiro.
+
+A escrita é feita por uma thread com buffer; ``log()`` só enfileira.
+"""
+
+import json
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+
+from capivara_storage import escrever_json_atomico
+
+# Entrada do .idx: offset do comando no segmento + horário (epoch)
+ENTRADA_INDICE = struct.Struct("<Qd")
+
+TAMANHO_SEGMENTO = 1024 * 1024
+MAX_SEGMENTOS = 8
+INTERVALO_FLUSH = 0.5
+
+# Cabeçalho de cada comando no formato antigo: "-- 2024-01-01 12:00:00.123456"
+PADRAO_CABECALHO = re.compile(rb"^-- (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)$")
+
+
+def formatar_comando(momento, sql_command):
+    return f"-- {momento}\n{sql_command};\n\n".encode("utf-8")
+
+
+class SqlLog:
+    """Log SQL em segmentos rotacionados com índice lateral e escrita assíncrona"""
+
+    def __init__(self, directory, legacy_file=None, segment_size=TAMANHO_SEGMENTO,
+                 max_segments=MAX_SEGMENTOS, flush_interval=INTERVALO_FLUSH):
+        self.directory = directory
+        self.directory.mkdir(exist_ok=True)
+        self.manifest_file = directory / "indice.json"
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+
+        self.lock = threading.RLock()
+        self.queue = queue.Queue()
+        self.handles = None
+        self.writer = None
+
+        self.manifest = self._load_manifest()
+        if legacy_file is not None and legacy_file.exists():
+            self._import_legacy(legacy_file)
+
+    # ------------------------------------------------------------------
+    # Manifesto e segmentos
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self):
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"segmentos": [], "ativo": 0, "comandos_descartados": 0}
+
+    def _save_manifest(self):
+        escrever_json_atomico(self.manifest_file, self.manifest)
+
+    def segment_path(self, numero):
+        return self.directory / f"sql_commands.{numero:06d}.sql"
+
+    def index_path(self, numero):
+        return self.directory / f"sql_commands.{numero:06d}.idx"
+
+    def _active_count(self):
+        path = self.index_path(self.manifest["ativo"])
+        return path.stat().st_size // ENTRADA_INDICE.size if path.exists() else 0
+
+    def _import_legacy(self, legacy_file):
+        """Converte o sql_commands.sql antigo em um segmento fechado (uma única vez)"""
+        with self.lock:
+            numero = self.manifest["ativo"]
+            self.manifest["ativo"] = numero + 1
+            os.replace(legacy_file, self.segment_path(numero))
+
+            entradas = []
+            offset = 0
+            with open(self.segment_path(numero), 'rb') as f:
+                for line in f:
+                    match = PADRAO_CABECALHO.match(line.rstrip(b"\r\n"))
+                    if match:
+                        momento = datetime.fromisoformat(match.group(1).decode())
+                        entradas.append(ENTRADA_INDICE.pack(offset, momento.timestamp()))
+                    offset += len(line)
+            with open(self.index_path(numero), 'wb') as f:
+                f.write(b"".join(entradas))
+
+            self.manifest["segmentos"].append(self._segment_summary(numero, len(entradas), offset))
+            self._save_manifest()
+
+    def _segment_summary(self, numero, comandos, tamanho):
+        inicio = fim = None
+        if comandos:
+            with open(self.index_path(numero), 'rb') as f:
+                inicio = ENTRADA_INDICE.unpack(f.read(ENTRADA_INDICE.size))[1]
+                f.seek(-ENTRADA_INDICE.size, os.SEEK_END)
+                fim = ENTRADA_INDICE.unpack(f.read(ENTRADA_INDICE.size))[1]
+        return {"numero": numero, "comandos": comandos, "bytes": tamanho,
+                "inicio": inicio, "fim": fim}
+
+    def _rotate(self):
+        """Fecha o segmento ativo e descarta os mais antigos além do limite"""
+        numero = self.manifest["ativo"]
+        self._close_handles()
+        self.manifest["segmentos"].append(
+            self._segment_summary(numero, self._active_count(), self.segment_path(numero).stat().st_size)
+        )
+        self.manifest["ativo"] = numero + 1
+        while len(self.manifest["segmentos"]) >= self.max_segments:
+            antigo = self.manifest["segmentos"].pop(0)
+            self.manifest["comandos_descartados"] += antigo["comandos"]
+            for path in (self.segment_path(antigo["numero"]), self.index_path(antigo["numero"])):
+                if path.exists():
+                    path.unlink()
+        self._save_manifest()
+
+    # ------------------------------------------------------------------
+    # Escrita assíncrona
+    # ------------------------------------------------------------------
+
+    def log(self, sql_command):
+        """Enfileira um comando para gravação (não bloqueia em E/S)"""
+        if self.writer is None or not self.writer.is_alive():
+            with self.lock:
+                if self.writer is None or not self.writer.is_alive():
+                    self.writer = threading.Thread(target=self._run_writer,
+                                                   name="capivara-sqllog", daemon=True)
+                    self.writer.start()
+        self.queue.put((datetime.now(), sql_command))
+
+    def _run_writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            lote = [item]
+            # Agrupa o que chegar dentro do intervalo em uma única escrita
+            prazo = time.monotonic() + self.flush_interval
+            parar = False
+            while True:
+                try:
+                    proximo = self.queue.get(timeout=max(0.0, prazo - time.monotonic()))
+                except queue.Empty:
+                    break
+                if proximo is None:
+                    parar = True
+                    break
+                lote.append(proximo)
+            try:
+                self._write_batch(lote)
+            finally:
+                for _ in range(len(lote) + parar):
+                    self.queue.task_done()
+            if parar:
+                return
+
+    def _open_handles(self):
+        if self.handles is None:
+            numero = self.manifest["ativo"]
+            self.handles = (open(self.segment_path(numero), 'ab'),
+                            open(self.index_path(numero), 'ab'))
+        return self.handles
+
+    def _close_handles(self):
+        if self.handles is not None:
+            for handle in self.handles:
+                handle.close()
+            self.handles = None
+
+    def _write_batch(self, lote):
+        with self.lock:
+            pos = 0
+            while pos < len(lote):
+                segmento, indice = self._open_handles()
+                offset = segmento.tell()
+                dados = []
+                entradas = []
+                while pos < len(lote) and offset < self.segment_size:
+                    momento, sql_command = lote[pos]
+                    texto = formatar_comando(momento, sql_command)
+                    entradas.append(ENTRADA_INDICE.pack(offset, momento.timestamp()))
+                    dados.append(texto)
+                    offset += len(texto)
+                    pos += 1
+                segmento.write(b"".join(dados))
+                indice.write(b"".join(entradas))
+                segmento.flush()
+                indice.flush()
+                if offset >= self.segment_size:
+                    self._rotate()
+
+    def flush(self):
+        """Aguarda a gravação de tudo o que já foi enfileirado"""
+        self.queue.join()
+
+    def close(self):
+        """Esvazia a fila, encerra a thread de escrita e fecha os arquivos"""
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        self.writer = None
+        with self.lock:
+            self._close_handles()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def segments(self):
+        """Números dos segmentos existentes, do mais antigo ao ativo"""
+        numeros = [s["numero"] for s in self.manifest["segmentos"]]
+        if self.segment_path(self.manifest["ativo"]).exists():
+            numeros.append(self.manifest["ativo"])
+        return numeros
+
+    def count(self):
+        """Total de comandos registrados (inclusive os de segmentos descartados)"""
+        with self.lock:
+            return (self.manifest["comandos_descartados"] +
+                    sum(s["comandos"] for s in self.manifest["segmentos"]) +
+                    self._active_count())
+
+    def info(self):
+        with self.lock:
+            numeros = self.segments()
+            tamanho = sum(self.segment_path(n).stat().st_size for n in numeros)
+            ultimo = None
+            for numero in reversed(numeros):
+                path = self.index_path(numero)
+                if path.exists() and path.stat().st_size:
+                    with open(path, 'rb') as f:
+                        f.seek(-ENTRADA_INDICE.size, os.SEEK_END)
+                        ultimo = datetime.fromtimestamp(ENTRADA_INDICE.unpack(f.read())[1])
+                    break
+            return {"diretorio": str(self.directory), "segmentos": len(numeros),
+                    "bytes": tamanho, "comandos": self.count(), "ultimo_comando": ultimo}
+
+    def tail(self, limit=10):
+        """Últimos ``limit`` comandos como texto, lendo só o fim dos segmentos"""
+        with self.lock:
+            blocos = []
+            for numero in reversed(self.segments()):
+                faltam = limit - len(blocos)
+                if faltam <= 0:
+                    break
+                index_path = self.index_path(numero)
+                if not index_path.exists():
+                    continue
+                tamanho_indice = index_path.stat().st_size // ENTRADA_INDICE.size
+                ler = min(faltam, tamanho_indice)
+                if not ler:
+                    continue
+                with open(index_path, 'rb') as f:
+                    f.seek((tamanho_indice - ler) * ENTRADA_INDICE.size)
+                    offsets = [ENTRADA_INDICE.unpack_from(dados)[0] for dados in
+                               iter(lambda: f.read(ENTRADA_INDICE.size), b"")]
+                with open(self.segment_path(numero), 'rb') as f:
+                    f.seek(offsets[0])
+                    dados = f.read()
+                inicio = offsets[0]
+                fins = offsets[1:] + [inicio + len(dados)]
+                textos = [dados[o - inicio:fim - inicio].decode('utf-8', 'replace').strip()
+                          for o, fim in zip(offsets, fins)]
+                blocos = textos + blocos
+            return blocos
@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - ARMAZENAMENTO JSON COM JOURNAL
+Mutações são anexadas em JSONL; o snapshot (usuarios.json/jogos.json)
+é reescrito apenas na compactação.
+
+Vários processos podem usar a mesma pasta de dados: as escritas acontecem
+com o FileLock da pasta, depois de ler o que os outros anexaram
+(JournalStore.catch_up). Cada registro tem uma revisão (``rev``); gravar
+sobre uma revisão que não é mais a atual levanta ConflictError.
+"""
+
+import json
+import os
+import threading
+import time
+
+from capivara_metrics import METRICS
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Chave primária de cada coleção (jogos simulados antigos, ainda não
+# migrados, usam "id")
+CHAVES_COLECAO = {
+    "usuarios": ("id_usuario",),
+    "jogos": ("id_jogo", "id"),
+}
+
+
+class StoreBusyError(Exception):
+    """Lock da pasta de dados não obtido dentro do prazo"""
+
+
+class ConflictError(Exception):
+    """Registro gravado por outro processo depois da revisão usada como base"""
+
+    def __init__(self, colecao, chave, esperada, atual):
+        super().__init__(f"{colecao} {chave}: revisão {esperada} desatualizada "
+                         f"(atual: {atual}, gravada por outro processo)")
+        self.colecao = colecao
+        self.chave = chave
+        self.esperada = esperada
+        self.atual = atual
+
+
+def chave_registro(colecao, registro):
+    """Retorna a chave primária de um registro da coleção"""
+    for campo in CHAVES_COLECAO[colecao]:
+        if campo in registro:
+            return registro[campo]
+    return None
+
+
+def serializar(registro):
+    """Cópia serializável de um registro (dict ou objeto do modelo com to_dict)"""
+    if hasattr(registro, "to_dict"):
+        return registro.to_dict()
+    return dict(registro)
+
+
+def escrever_json_atomico(path, dados, indent=2, metrica="escrever_json_atomico"):
+    """Grava JSON em arquivo temporário e substitui o destino (rename atômico)"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+        METRICS.observe_size(metrica, f.tell())
+    os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------------------------
+# Locks entre processos
+# ----------------------------------------------------------------------
+
+def travar_arquivo(fd, bloquear=True):
+    """Lock exclusivo consultivo no descritor; False se ocupado e ``bloquear`` falso"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not bloquear:
+                return False
+            time.sleep(0.01)
+
+
+def destravar_arquivo(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Lock exclusivo entre processos (flock / msvcrt.locking) em ``path``.
+
+    Reentrante dentro do processo: as threads se revezam por um RLock e o
+    lock do sistema é tomado na primeira entrada e solto na última. ``pin``
+    segura o lock do sistema até ``close`` (uso exclusivo da pasta).
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.pinned = False
+        self.fd = None
+
+    def _acquire_os(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if self.timeout is None:
+            travar_arquivo(self.fd)
+            return
+        deadline = time.monotonic() + self.timeout
+        pausa = 0.001
+        while not travar_arquivo(self.fd, bloquear=False):
+            if time.monotonic() >= deadline:
+                raise StoreBusyError(f"{self.path} ocupado há mais de {self.timeout:.0f}s "
+                                     "por outro processo")
+            time.sleep(pausa)
+            pausa = min(pausa * 2, 0.05)
+
+    def acquire(self):
+        self.rlock.acquire()
+        if self.depth == 0 and not self.pinned:
+            try:
+                self._acquire_os()
+            except BaseException:
+                self.rlock.release()
+                raise
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0 and not self.pinned:
+            destravar_arquivo(self.fd)
+        self.rlock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def pin(self):
+        """Toma o lock do sistema e o mantém até close()"""
+        with self.rlock:
+            if not self.pinned:
+                if self.depth == 0:
+                    self._acquire_os()
+                self.pinned = True
+
+    def close(self):
+        with self.rlock:
+            if self.fd is None:
+                return
+            if self.pinned or self.depth:
+                destravar_arquivo(self.fd)
+            self.pinned = False
+            os.close(self.fd)
+            self.fd = None
+
+
+# ----------------------------------------------------------------------
+# Journal
+# ----------------------------------------------------------------------
+
+class JournalStore:
+    """Journal append-only (JSONL) + snapshot compactado em segundo plano.
+
+    Cada mutação vira um registro ``{"seq", "op", "colecao", "registro"}``.
+    O snapshot guarda em ``snapshot_meta.json`` o último ``seq`` incluído;
+    no carregamento só o que vem depois dele é reaplicado. Como toda operação
+    é um upsert pela chave primária, reaplicar o journal é idempotente.
+
+    Com vários processos, quem chama append/compact segura o FileLock da
+    pasta e chamou catch_up antes (ver DatabaseInterface.write_session).
+    A gravação do snapshot roda fora desse lock, protegida só pelo lock de
+    compactação (uma por vez entre os processos); por isso load() confere o
+    manifesto antes e depois da leitura. ``geracao`` no manifesto muda quando
+    o snapshot deixa de ser só o journal compactado (reset, restauração,
+    arquivamento): os outros processos recarregam tudo.
+    """
+
+    def __init__(self, data_dir, users_file, games_file,
+                 fsync_batch=32, fsync_interval=1.0, compact_threshold=1000):
+        self.users_file = users_file
+        self.games_file = games_file
+        self.journal_file = data_dir / "journal.jsonl"
+        self.rotated_file = data_dir / "journal.jsonl.1"
+        self.meta_file = data_dir / "snapshot_meta.json"
+        self.compact_lock_file = data_dir / ".capivara_compactacao.lock"
+
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.RLock()
+        self.handle = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.generation = 0
+        self.pending_fsync = 0
+        self.last_fsync = time.monotonic()
+        self.records_since_snapshot = 0
+        self.compaction_thread = None
+        # (colecao, chave) -> revisão atual
+        self.revisions = {}
+        # inode -> (seq do primeiro registro, bytes já lidos)
+        self.offsets = {}
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        """Reconstrói (usuarios, jogos) a partir do snapshot + cauda do journal.
+
+        Retorna ``None`` na coleção cujo arquivo de snapshot não existe.
+        """
+        self._reopen_if_rotated()
+        while True:
+            meta = self._read_meta()
+            users = self._read_snapshot(self.users_file)
+            games = self._read_snapshot(self.games_file)
+
+            self.snapshot_seq = meta.get("seq", 0)
+            self.generation = meta.get("geracao", 0)
+            self.seq = self.snapshot_seq
+
+            state = {"usuarios": users, "jogos": games}
+            positions = {
+                colecao: {chave_registro(colecao, r): i for i, r in enumerate(registros or [])}
+                for colecao, registros in state.items()
+            }
+            self.revisions = {
+                (colecao, chave_registro(colecao, r)): r.get("rev", 0)
+                for colecao, registros in state.items() for r in registros or []
+            }
+
+            self.offsets = {}
+            replayed = 0
+            for record in self._read_new_records():
+                self._apply(state, positions, record)
+                replayed += 1
+            # Compactação de outro processo terminou durante a leitura: ler de novo
+            if self._read_meta() == meta:
+                break
+        self.records_since_snapshot = replayed
+
+        # Compactação interrompida: consolidar antes de aceitar novas escritas
+        if self.rotated_file.exists():
+            self.compact(state["usuarios"] or [], state["jogos"] or [], background=False)
+
+        return state["usuarios"], state["jogos"]
+
+    def is_current(self, seq):
+        """Verdadeiro se o snapshot em disco é o de ``seq`` e não há journal
+        a reaplicar sobre ele (sem ler os snapshots)"""
+        if seq is None:
+            return False
+        for path in (self.journal_file, self.rotated_file):
+            if path.exists() and path.stat().st_size:
+                return False
+        return self._read_meta().get("seq") == seq
+
+    def catch_up(self):
+        """Registros que outros processos anexaram desde a última leitura.
+
+        Retorna a lista (vazia se nada mudou) ou ``None`` quando é preciso
+        recarregar tudo: nova geração ou registros que só existem no
+        snapshot (o journal que os continha já foi compactado e apagado).
+        """
+        with self.lock:
+            self._reopen_if_rotated()
+            lido = self.seq
+            records = self._read_new_records()
+            meta = self._read_meta()
+            # Lacuna: registros já compactados (e o journal apagado) antes desta leitura
+            if (meta.get("geracao", 0) != self.generation or meta.get("seq", 0) > self.seq or
+                    (records and records[0]["seq"] != lido + 1)):
+                return None
+            if meta.get("seq", 0) > self.snapshot_seq:
+                self.snapshot_seq = meta["seq"]
+                self.records_since_snapshot = self.seq - self.snapshot_seq
+            else:
+                self.records_since_snapshot += len(records)
+            return records
+
+    def _reopen_if_rotated(self):
+        """Fecha o handle de escrita se outro processo rotacionou o journal
+        (ele apontaria para o arquivo antigo, já incluído ou a caminho do snapshot)"""
+        if self.handle is None:
+            return
+        try:
+            current = os.stat(self.journal_file).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self.handle.fileno()).st_ino:
+            self.sync()
+            self.handle.close()
+            self.handle = None
+
+    def _read_new_records(self):
+        """Lê journal.jsonl.1 e journal.jsonl a partir do ponto já lido,
+        devolvendo só registros com seq maior que o atual"""
+        records = []
+        inodes = set()
+        for path in (self.rotated_file, self.journal_file):
+            for record in self._read_journal(path, inodes):
+                if record["seq"] > self.seq:
+                    self.seq = record["seq"]
+                    if "colecao" in record:
+                        chave = chave_registro(record["colecao"], record["registro"])
+                        self.revisions[(record["colecao"], chave)] = record["registro"].get("rev", 0)
+                    records.append(record)
+        self.offsets = {ino: pos for ino, pos in self.offsets.items() if ino in inodes}
+        return records
+
+    def _read_snapshot(self, path):
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _read_journal(self, path, inodes):
+        """Lê registros do journal a partir do ponto já lido, descartando uma
+        última linha incompleta.
+
+        O ponto é guardado por inode junto do seq do primeiro registro, que
+        identifica o arquivo mesmo se o inode for reaproveitado.
+        """
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return []
+        records = []
+        with f:
+            ino = os.fstat(f.fileno()).st_ino
+            inodes.add(ino)
+            first = f.readline()
+            try:
+                first_seq = json.loads(first.decode('utf-8'))["seq"] if first else None
+            except (ValueError, UnicodeDecodeError, KeyError):
+                first_seq = None
+            known_seq, offset = self.offsets.get(ino, (None, 0))
+            if known_seq != first_seq:
+                offset = 0
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    # Escrita interrompida no meio: truncar a cauda corrompida
+                    break
+                offset += len(line)
+                records.append(record)
+            size = os.fstat(f.fileno()).st_size
+        if offset < size:
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        self.offsets[ino] = (first_seq, offset)
+        return records
+
+    def _apply(self, state, positions, record):
+        op = record["op"]
+        colecao = record["colecao"]
+        registro = record["registro"]
+        if state[colecao] is None:
+            state[colecao] = []
+        chave = chave_registro(colecao, registro)
+
+        if op == "upsert":
+            pos = positions[colecao].get(chave)
+            if pos is None:
+                positions[colecao][chave] = len(state[colecao])
+                state[colecao].append(registro)
+            else:
+                state[colecao][pos] = registro
+
+    def _next_revision(self, colecao, registro):
+        """Confere a revisão base de ``registro`` e grava nele a próxima"""
+        chave = chave_registro(colecao, registro)
+        atual = self.revisions.get((colecao, chave), 0)
+        if registro.get("rev", 0) != atual:
+            raise ConflictError(colecao, chave, registro.get("rev", 0), atual)
+        return chave, atual + 1
+
+    def append(self, op, colecao=None, registro=None):
+        """Anexa uma mutação ao journal (custo O(registro)).
+
+        ``registro["rev"]`` é a revisão em que a alteração se baseia: se outro
+        processo gravou depois dela, levanta ConflictError. Retorna a nova
+        revisão (também gravada em ``registro``).
+        """
+        with self.lock:
+            rev = None
+            record = {"seq": self.seq + 1, "op": op}
+            if colecao is not None:
+                chave, rev = self._next_revision(colecao, registro)
+                registro["rev"] = rev
+                self.revisions[(colecao, chave)] = rev
+                record["colecao"] = colecao
+                record["registro"] = registro
+            self.seq += 1
+
+            if self.handle is None:
+                self.handle = open(self.journal_file, 'a', encoding='utf-8')
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            self.handle.write(line)
+            self.handle.flush()
+            METRICS.observe_size("journal.append", len(line))
+
+            self.pending_fsync += 1
+            self.records_since_snapshot += 1
+            if (self.pending_fsync >= self.fsync_batch or
+                    time.monotonic() - self.last_fsync >= self.fsync_interval):
+                self.sync()
+            return rev
+
+    def append_many(self, op, colecao, registros):
+        """Anexa um lote de mutações com uma única escrita e um único fsync.
+
+        As revisões de todo o lote são conferidas antes de gravar qualquer
+        registro; retorna a lista das novas revisões.
+        """
+        with self.lock:
+            novas = [self._next_revision(colecao, registro) for registro in registros]
+            lines = []
+            for registro, (chave, rev) in zip(registros, novas):
+                self.seq += 1
+                registro["rev"] = rev
+                self.revisions[(colecao, chave)] = rev
+                lines.append(json.dumps(
+                    {"seq": self.seq, "op": op, "colecao": colecao, "registro": registro},
+                    ensure_ascii=False
+                ))
+            if not lines:
+                return []
+
+            if self.handle is None:
+                self.handle = open(self.journal_file, 'a', encoding='utf-8')
+            data = "\n".join(lines) + "\n"
+            self.handle.write(data)
+            self.handle.flush()
+            METRICS.observe_size("journal.append_many", len(data))
+
+            self.pending_fsync += len(lines)
+            self.records_since_snapshot += len(lines)
+            self.sync()
+            return [rev for _, rev in novas]
+
+    def sync(self):
+        """Força o fsync das escritas pendentes do journal"""
+        with self.lock:
+            if self.handle is not None and self.pending_fsync:
+                os.fsync(self.handle.fileno())
+            self.pending_fsync = 0
+            self.last_fsync = time.monotonic()
+
+    def needs_compaction(self):
+        return self.records_since_snapshot >= self.compact_threshold
+
+    @METRICS.timed("journal.compact")
+    def compact(self, users, games, background=True, extras=None, new_generation=False):
+        """Grava um novo snapshot e descarta o journal já incluído nele.
+
+        O journal atual é rotacionado para ``journal.jsonl.1`` e novas
+        escritas seguem em um journal vazio enquanto o snapshot é gravado.
+        ``extras`` ({path: dados}) são arquivos derivados gravados junto.
+        ``new_generation`` avisa os outros processos para recarregarem tudo.
+
+        Em segundo plano, se outro processo já está compactando, não faz
+        nada (o journal continua valendo); a compactação síncrona espera.
+        """
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                if background:
+                    return
+                self.compaction_thread.join()
+
+            self.sync()
+            compact_fd = os.open(self.compact_lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            if not travar_arquivo(compact_fd, bloquear=not background):
+                os.close(compact_fd)
+                return
+
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+
+            if self.journal_file.exists():
+                if self.rotated_file.exists():
+                    with open(self.rotated_file, 'ab') as dst, open(self.journal_file, 'rb') as src:
+                        dst.write(src.read())
+                    self.journal_file.unlink()
+                else:
+                    os.replace(self.journal_file, self.rotated_file)
+
+            if new_generation:
+                self.generation += 1
+            seq = self.seq
+            generation = self.generation
+            users_copy = [serializar(u) for u in users]
+            games_copy = [serializar(g) for g in games]
+            extras = dict(extras or {})
+            self.records_since_snapshot = 0
+
+        def write_snapshot():
+            try:
+                escrever_json_atomico(self.users_file, users_copy)
+                escrever_json_atomico(self.games_file, games_copy)
+                for path, dados in extras.items():
+                    escrever_json_atomico(path, dados)
+                escrever_json_atomico(self.meta_file, {"seq": seq, "geracao": generation}, indent=None)
+                self.snapshot_seq = seq
+                if self.rotated_file.exists():
+                    self.rotated_file.unlink()
+            finally:
+                destravar_arquivo(compact_fd)
+                os.close(compact_fd)
+
+        if background:
+            self.compaction_thread = threading.Thread(
+                target=write_snapshot, name="capivara-compactacao", daemon=True
+            )
+            self.compaction_thread.start()
+        else:
+            write_snapshot()
+
+    def reset(self):
+        """Descarta o journal: o snapshot em disco passa a ser o estado
+        completo (usado ao restaurar um backup). Inicia uma nova geração."""
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                self.compaction_thread.join()
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+            for path in (self.journal_file, self.rotated_file):
+                if path.exists():
+                    path.unlink()
+            self.generation += 1
+            escrever_json_atomico(self.meta_file, {"seq": 0, "geracao": self.generation}, indent=None)
+            self.seq = self.snapshot_seq = 0
+            self.pending_fsync = 0
+            self.records_since_snapshot = 0
+            self.revisions = {}
+            self.offsets = {}
+
+    def close(self, users, games, extras=None, new_generation=False):
+        """Compacta de forma síncrona e fecha o journal"""
+        self.compact(users, games, background=False, extras=extras, new_generation=new_generation)
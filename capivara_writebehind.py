@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+CAPIVARA GAME LBD - ESCRITA ASSÍNCRONA (WRITE-BEHIND)
+Comandos destinados ao PostgreSQL entram em uma fila limitada e são
+aplicados por uma thread em lotes (uma transação por lote), com novas
+tentativas e espera exponencial. Cada comando é gravado antes em
+data/pendentes.jsonl; o que não foi confirmado é reenfileirado na próxima
+inicialização.
+
+Os pedidos de gravação dos arquivos JSON (modo "json") têm uma thread
+própria, que agrupa vários pedidos seguidos em uma única regravação: com o
+PostgreSQL fora do ar ou lento, o JSON não espera pelas novas tentativas.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+TAMANHO_FILA = 1000
+TAMANHO_LOTE = 100
+ESPERA_LOTE = 0.05
+ESPERA_INICIAL = 0.5
+ESPERA_MAXIMA = 30.0
+
+
+class PermanentWriteError(Exception):
+    """Erro que não se resolve tentando de novo (ex.: violação de UNIQUE)"""
+
+
+class WriteBehindQueue:
+    """Fila de escrita assíncrona com arquivo de pendências para recuperação.
+
+    ``executar(database, comandos)`` aplica uma lista de (sql, params) em uma
+    única transação; deve levantar PermanentWriteError para erros que não
+    valem nova tentativa e qualquer outra exceção para falhas transitórias.
+    ``gravar_json()`` regrava os arquivos JSON.
+    """
+
+    def __init__(self, pending_file, executar, gravar_json=None, failed_file=None,
+                 maxsize=TAMANHO_FILA, batch_size=TAMANHO_LOTE):
+        self.pending_file = pending_file
+        self.failed_file = failed_file
+        self.executar = executar
+        self.gravar_json = gravar_json
+        self.batch_size = batch_size
+
+        self.maxsize = maxsize
+        self.queue = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.json_dirty = threading.Event()
+        self.json_stop = threading.Event()
+        self.json_worker = None
+        self.worker = None
+        self.handle = None
+        self.next_id = 1
+        self.acked_id = 0
+        self.falhas = 0
+
+        self.recovered = self._recover()
+
+    # ------------------------------------------------------------------
+    # Arquivo de pendências
+    # ------------------------------------------------------------------
+
+    def _recover(self):
+        """Reenfileira os comandos gravados e ainda não confirmados.
+
+        A thread só começa a aplicá-los em ``start()``.
+        """
+        self.queue = queue.Queue(self.maxsize)
+        if not self.pending_file.exists():
+            return 0
+        pendentes = []
+        ack = 0
+        with open(self.pending_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    registro = json.loads(line)
+                except ValueError:
+                    break  # última linha incompleta
+                if "ack" in registro:
+                    ack = max(ack, registro["ack"])
+                else:
+                    pendentes.append(registro)
+        pendentes = [p for p in pendentes if p["id"] > ack]
+        self.acked_id = ack
+        self.next_id = max([ack] + [p["id"] for p in pendentes]) + 1
+        if not pendentes:
+            self.pending_file.unlink()
+            return 0
+        self.queue = queue.Queue(max(self.maxsize, len(pendentes) + 1))
+        for item in pendentes:
+            self.queue.put(item)
+        return len(pendentes)
+
+    def _write_pending(self, registro):
+        if self.handle is None:
+            self.handle = open(self.pending_file, 'a', encoding='utf-8')
+        self.handle.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+
+    def _ack(self, last_id):
+        with self.lock:
+            self.acked_id = last_id
+            if last_id == self.next_id - 1:
+                # Tudo confirmado: o arquivo de pendências pode ser zerado
+                if self.handle is not None:
+                    self.handle.close()
+                    self.handle = None
+                if self.pending_file.exists():
+                    self.pending_file.unlink()
+            else:
+                self._write_pending({"ack": last_id})
+
+    def _fail(self, item, erro):
+        """Registra em failed_file um comando descartado por erro permanente"""
+        self.falhas += 1
+        if self.failed_file is not None:
+            with open(self.failed_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(item, erro=str(erro)), ensure_ascii=False) + "\n")
+
+    # ------------------------------------------------------------------
+    # Produtores
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stop_event.clear()
+            self.worker = threading.Thread(target=self._run, name="capivara-write-behind",
+                                           daemon=True)
+            self.worker.start()
+
+    def submit(self, sql_command, database, params=None):
+        """Grava o comando em pendentes.jsonl e o enfileira (bloqueia se a fila encher)"""
+        with self.lock:
+            item = {"id": self.next_id, "database": database, "sql": sql_command, "params": params}
+            self.next_id += 1
+            self._write_pending(item)
+            self.start()
+        self.queue.put(item)
+
+    def request_json_flush(self):
+        """Pede uma regravação dos arquivos JSON (pedidos seguidos são agrupados).
+
+        Não passa pela fila limitada: quem pede pode estar segurando o lock
+        dos dados que a própria regravação precisa.
+        """
+        self.json_dirty.set()
+        if self.json_worker is None or not self.json_worker.is_alive():
+            self.json_stop.clear()
+            self.json_worker = threading.Thread(target=self._run_json, name="capivara-json",
+                                                daemon=True)
+            self.json_worker.start()
+
+    def pending(self):
+        return self.next_id - 1 - self.acked_id
+
+    # ------------------------------------------------------------------
+    # Consumidor
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                primeiro = self.queue.get(timeout=ESPERA_LOTE * 4)
+            except queue.Empty:
+                primeiro = None
+            if primeiro is not None:
+                lote = [primeiro]
+                prazo = time.monotonic() + ESPERA_LOTE
+                while len(lote) < self.batch_size:
+                    try:
+                        lote.append(self.queue.get(timeout=max(0.0, prazo - time.monotonic())))
+                    except queue.Empty:
+                        break
+                try:
+                    self._process(lote)
+                finally:
+                    for _ in lote:
+                        self.queue.task_done()
+
+    def _run_json(self):
+        # Um pedido pendente é sempre gravado antes de atender ao stop
+        while True:
+            self.json_dirty.wait(ESPERA_LOTE * 4)
+            if self.json_dirty.is_set():
+                self.json_dirty.clear()
+                if self.gravar_json is not None:
+                    self.gravar_json()
+            elif self.json_stop.is_set():
+                return
+
+    def flush_json(self):
+        """Grava o JSON pendente e encerra a thread de gravação JSON"""
+        if self.json_worker is not None and self.json_worker.is_alive():
+            self.json_stop.set()
+            self.json_worker.join()
+        self.json_worker = None
+        if self.json_dirty.is_set() and self.gravar_json is not None:
+            self.json_dirty.clear()
+            self.gravar_json()
+
+    def _process(self, lote):
+        # Comandos consecutivos do mesmo banco vão na mesma transação
+        grupos = []
+        for item in lote:
+            if grupos and grupos[-1][0]["database"] == item["database"]:
+                grupos[-1].append(item)
+            else:
+                grupos.append([item])
+        for grupo in grupos:
+            if not self._apply(grupo):
+                return
+            self._ack(grupo[-1]["id"])
+
+    def _apply(self, grupo):
+        """Aplica o grupo com novas tentativas; False se interrompido pelo stop"""
+        espera = ESPERA_INICIAL
+        while True:
+            try:
+                self.executar(grupo[0]["database"], [(i["sql"], i["params"]) for i in grupo])
+                return True
+            except PermanentWriteError as e:
+                if len(grupo) == 1:
+                    self._fail(grupo[0], e)
+                    return True
+                # Isola o comando com problema aplicando um a um
+                for item in grupo:
+                    if not self._apply([item]):
+                        return False
+                return True
+            except Exception:
+                if self.stop_event.wait(espera):
+                    return False
+                espera = min(espera * 2, ESPERA_MAXIMA)
+
+    def drain(self, timeout=10.0):
+        """Grava o JSON pendente, aguarda a fila esvaziar (até ``timeout``)
+        e encerra as threads.
+
+        O JSON é gravado antes e sem prazo: não depende do PostgreSQL. O que
+        não for aplicado no banco continua em pendentes.jsonl para a próxima
+        inicialização. Retorna o número de comandos pendentes.
+        """
+        self.flush_json()
+        if self.worker is not None and self.worker.is_alive():
+            limite = time.monotonic() + timeout
+            while self.queue.unfinished_tasks and time.monotonic() < limite:
+                time.sleep(0.05)
+            self.stop_event.set()
+            self.worker.join()
+        self.worker = None
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+        return self.pending()
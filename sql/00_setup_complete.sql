@@ -22,6 +22,9 @@
 \echo 'Criando views...'
 \i 06_create_views.sql
 
+\echo 'Criando índices de busca...'
+\i 08_create_search_indexes.sql
+
 \echo 'Povoando dados iniciais...'
 \i 07_populate_data.sql
 
@@ -123,10 +123,49 @@ CREATE TABLE monte_partida (
     UNIQUE(id_partida)
 );
 
+-- Estado corrente de cada partida (uma linha por partida), atualizado na
+-- mesma transação de cada jogada/compra: validar uma jogada e mostrar a
+-- mesa viram leituras por chave primária
+CREATE TABLE estado_partida (
+    id_partida INTEGER PRIMARY KEY,
+    extremidade_a INTEGER, -- NULL enquanto a mesa estiver vazia
+    extremidade_b INTEGER,
+    proxima_ordem_jogada INTEGER NOT NULL DEFAULT 1,
+    proximo_turno INTEGER NOT NULL DEFAULT 1,
+    pecas_mesa INTEGER NOT NULL DEFAULT 0,
+    pecas_monte INTEGER NOT NULL DEFAULT 0,
+    jogadores INTEGER[] NOT NULL, -- IDs em ordem de posicao_mesa
+    pecas_mao INTEGER[] NOT NULL, -- peças na mão, alinhado com jogadores
+    jogador_atual INTEGER,
+    ultimo_jogador INTEGER,
+    ultima_peca INTEGER,
+    ultima_jogada TIMESTAMP,
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    FOREIGN KEY (jogador_atual) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (ultimo_jogador) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (ultima_peca) REFERENCES pecas_domino(id_peca)
+);
+
+-- Placar por usuário (uma linha por usuário), mantido pelos triggers de
+-- 05_create_triggers.sql; base da view ranking_usuarios.
+-- reconstruir_ranking() recalcula tudo a partir das tabelas base.
+CREATE TABLE placar_usuarios (
+    id_usuario INTEGER PRIMARY KEY,
+    total_jogos INTEGER NOT NULL DEFAULT 0,
+    jogos_vencidos INTEGER NOT NULL DEFAULT 0,
+    total_partidas INTEGER NOT NULL DEFAULT 0, -- partidas dos jogos em que participa
+    partidas_vencidas INTEGER NOT NULL DEFAULT 0,
+    pontos_totais INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario) ON DELETE CASCADE
+);
+
 -- Índices para otimização
 CREATE INDEX idx_participantes_jogo_usuario ON participantes_jogo(id_usuario);
 CREATE INDEX idx_partidas_jogo ON partidas(id_jogo);
 CREATE INDEX idx_pecas_partida_usuario ON pecas_partida(id_usuario);
+-- Mãos de uma partida (verificação de jogadas e de trancamento)
+CREATE INDEX idx_pecas_partida_mao ON pecas_partida(id_partida, id_usuario) WHERE status = 'na_mao';
 CREATE INDEX idx_mesa_jogo_partida ON mesa_jogo(id_partida);
 CREATE INDEX idx_jogadas_partida ON jogadas(id_partida);
-CREATE INDEX idx_jogadas_usuario ON jogadas(id_usuario);
\ No newline at end of file
+CREATE INDEX idx_jogadas_usuario ON jogadas(id_usuario);
+CREATE INDEX idx_placar_usuarios_ranking ON placar_usuarios(jogos_vencidos DESC, pontos_totais DESC);
@@ -2,86 +2,59 @@
 -- FUNÇÕES DO SISTEMA CAPIVARA GAME
 -- ============================================
 
+-- As três funções abaixo são consultas únicas (set-based): as extremidades
+-- da mesa são lidas uma vez, na CTE (chave primária de estado_partida), e
+-- cruzadas com as mãos em um só join - sem laço por jogador nem consulta
+-- por peça. São chamadas pelo trigger verificar_vitoria_partida a cada
+-- peça jogada.
+
 -- Função para verificar se uma jogada é possível
 CREATE OR REPLACE FUNCTION verificar_jogada_possivel(
     p_id_partida INTEGER,
     p_id_usuario INTEGER,
     p_id_peca INTEGER
 ) RETURNS BOOLEAN AS $$
-DECLARE
-    v_lado_a INTEGER;
-    v_lado_b INTEGER;
-    v_extremidade_esq INTEGER;
-    v_extremidade_dir INTEGER;
-    v_tem_peca BOOLEAN;
-BEGIN
-    -- Verificar se o usuário possui a peça
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    )
     SELECT EXISTS(
-        SELECT 1 FROM pecas_partida pp
-        WHERE pp.id_partida = p_id_partida 
-        AND pp.id_usuario = p_id_usuario 
-        AND pp.id_peca = p_id_peca 
+        SELECT 1
+        FROM pecas_partida pp
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
+        AND pp.id_usuario = p_id_usuario
+        AND pp.id_peca = p_id_peca
         AND pp.status = 'na_mao'
-    ) INTO v_tem_peca;
-    
-    IF NOT v_tem_peca THEN
-        RETURN FALSE;
-    END IF;
-    
-    -- Obter valores da peça
-    SELECT lado_a, lado_b INTO v_lado_a, v_lado_b
-    FROM pecas_domino WHERE id_peca = p_id_peca;
-    
-    -- Obter extremidades atuais da mesa
-    SELECT extremidade_a, extremidade_b INTO v_extremidade_esq, v_extremidade_dir
-    FROM mesa_jogo 
-    WHERE id_partida = p_id_partida 
-    ORDER BY ordem_jogada DESC 
-    LIMIT 1;
-    
-    -- Se não há peças na mesa, qualquer peça pode ser jogada
-    IF v_extremidade_esq IS NULL THEN
-        RETURN TRUE;
-    END IF;
-    
-    -- Verificar se a peça encaixa em alguma extremidade
-    RETURN (v_lado_a = v_extremidade_esq OR v_lado_b = v_extremidade_esq OR
-            v_lado_a = v_extremidade_dir OR v_lado_b = v_extremidade_dir);
-END;
-$$ LANGUAGE plpgsql;
+        -- Mesa vazia: qualquer peça pode ser jogada
+        AND (e.extremidade_a IS NULL OR
+             pd.lado_a IN (e.extremidade_a, e.extremidade_b) OR
+             pd.lado_b IN (e.extremidade_a, e.extremidade_b))
+    );
+$$ LANGUAGE sql STABLE;
 
--- Função para detectar jogo trancado
+-- Função para detectar jogo trancado (nenhuma peça em nenhuma mão encaixa)
 CREATE OR REPLACE FUNCTION detectar_jogo_trancado(p_id_partida INTEGER) 
 RETURNS BOOLEAN AS $$
-DECLARE
-    v_usuario RECORD;
-    v_tem_jogada_possivel BOOLEAN := FALSE;
-BEGIN
-    -- Para cada usuário na partida
-    FOR v_usuario IN (
-        SELECT DISTINCT pp.id_usuario
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    )
+    SELECT NOT EXISTS(
+        SELECT 1
         FROM pecas_partida pp
-        WHERE pp.id_partida = p_id_partida 
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
         AND pp.status = 'na_mao'
-    ) LOOP
-        -- Verificar se tem alguma peça jogável
-        SELECT EXISTS(
-            SELECT 1 FROM pecas_partida pp
-            JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
-            WHERE pp.id_partida = p_id_partida
-            AND pp.id_usuario = v_usuario.id_usuario
-            AND pp.status = 'na_mao'
-            AND verificar_jogada_possivel(p_id_partida, v_usuario.id_usuario, pp.id_peca)
-        ) INTO v_tem_jogada_possivel;
-        
-        IF v_tem_jogada_possivel THEN
-            RETURN FALSE;
-        END IF;
-    END LOOP;
-    
-    RETURN TRUE;
-END;
-$$ LANGUAGE plpgsql;
+        AND (e.extremidade_a IS NULL OR
+             pd.lado_a IN (e.extremidade_a, e.extremidade_b) OR
+             pd.lado_b IN (e.extremidade_a, e.extremidade_b))
+    );
+$$ LANGUAGE sql STABLE;
 
 -- Função para obter jogadas possíveis de um usuário
 CREATE OR REPLACE FUNCTION obter_jogadas_possiveis(
@@ -94,40 +67,29 @@ CREATE OR REPLACE FUNCTION obter_jogadas_possiveis(
     pode_jogar_esq BOOLEAN,
     pode_jogar_dir BOOLEAN
 ) AS $$
-DECLARE
-    v_extremidade_esq INTEGER;
-    v_extremidade_dir INTEGER;
-BEGIN
-    -- Obter extremidades atuais da mesa
-    SELECT extremidade_a, extremidade_b INTO v_extremidade_esq, v_extremidade_dir
-    FROM mesa_jogo 
-    WHERE id_partida = p_id_partida 
-    ORDER BY ordem_jogada DESC 
-    LIMIT 1;
-    
-    RETURN QUERY
-    SELECT 
-        pp.id_peca,
-        pd.lado_a,
-        pd.lado_b,
-        CASE 
-            WHEN v_extremidade_esq IS NULL THEN TRUE
-            ELSE (pd.lado_a = v_extremidade_esq OR pd.lado_b = v_extremidade_esq)
-        END as pode_jogar_esq,
-        CASE 
-            WHEN v_extremidade_dir IS NULL THEN TRUE
-            ELSE (pd.lado_a = v_extremidade_dir OR pd.lado_b = v_extremidade_dir)
-        END as pode_jogar_dir
-    FROM pecas_partida pp
-    JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
-    WHERE pp.id_partida = p_id_partida
-    AND pp.id_usuario = p_id_usuario
-    AND pp.status = 'na_mao'
-    AND (v_extremidade_esq IS NULL OR 
-         pd.lado_a = v_extremidade_esq OR pd.lado_b = v_extremidade_esq OR
-         pd.lado_a = v_extremidade_dir OR pd.lado_b = v_extremidade_dir);
-END;
-$$ LANGUAGE plpgsql;
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    ),
+    mao AS (
+        SELECT
+            pp.id_peca,
+            pd.lado_a,
+            pd.lado_b,
+            (e.extremidade_a IS NULL OR e.extremidade_a IN (pd.lado_a, pd.lado_b)) AS pode_jogar_esq,
+            (e.extremidade_b IS NULL OR e.extremidade_b IN (pd.lado_a, pd.lado_b)) AS pode_jogar_dir
+        FROM pecas_partida pp
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
+        AND pp.id_usuario = p_id_usuario
+        AND pp.status = 'na_mao'
+    )
+    SELECT id_peca, lado_a, lado_b, pode_jogar_esq, pode_jogar_dir
+    FROM mao
+    WHERE pode_jogar_esq OR pode_jogar_dir;
+$$ LANGUAGE sql STABLE;
 
 -- Função para calcular pontos na mão de um jogador
 CREATE OR REPLACE FUNCTION calcular_pontos_mao(
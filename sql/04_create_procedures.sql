@@ -2,6 +2,73 @@
 -- PROCEDIMENTOS ARMAZENADOS - CAPIVARA GAME
 -- ============================================
 
+-- Recalcula o estado corrente de uma partida a partir das tabelas base
+-- (ao iniciar a partida e para partidas criadas antes de estado_partida)
+CREATE OR REPLACE FUNCTION reconstruir_estado_partida(p_id_partida INTEGER)
+RETURNS VOID AS $$
+    INSERT INTO estado_partida (
+        id_partida, extremidade_a, extremidade_b, proxima_ordem_jogada, proximo_turno,
+        pecas_mesa, pecas_monte, jogadores, pecas_mao, jogador_atual,
+        ultimo_jogador, ultima_peca, ultima_jogada
+    )
+    SELECT
+        p.id_partida,
+        ultima.extremidade_a,
+        ultima.extremidade_b,
+        COALESCE(ultima.ordem_jogada, 0) + 1,
+        COALESCE(turno.ordem_turno, 0) + 1,
+        (SELECT COUNT(*) FROM mesa_jogo WHERE id_partida = p.id_partida),
+        (SELECT COUNT(*) FROM pecas_partida WHERE id_partida = p.id_partida AND status = 'no_monte'),
+        maos.jogadores,
+        maos.pecas_mao,
+        COALESCE(obter_proximo_jogador(p.id_partida, turno.id_usuario), p.primeiro_jogador),
+        ultima.id_usuario,
+        ultima.id_peca,
+        ultima.timestamp_jogada
+    FROM partidas p
+    CROSS JOIN LATERAL (
+        SELECT
+            ARRAY_AGG(pj.id_usuario ORDER BY pj.posicao_mesa) AS jogadores,
+            ARRAY_AGG((
+                SELECT COUNT(*)::INTEGER FROM pecas_partida pp
+                WHERE pp.id_partida = p.id_partida
+                AND pp.id_usuario = pj.id_usuario
+                AND pp.status = 'na_mao'
+            ) ORDER BY pj.posicao_mesa) AS pecas_mao
+        FROM participantes_jogo pj
+        WHERE pj.id_jogo = p.id_jogo
+    ) maos
+    LEFT JOIN LATERAL (
+        SELECT m.extremidade_a, m.extremidade_b, m.ordem_jogada, m.id_usuario,
+               m.id_peca, m.timestamp_jogada
+        FROM mesa_jogo m
+        WHERE m.id_partida = p.id_partida
+        ORDER BY m.ordem_jogada DESC
+        LIMIT 1
+    ) ultima ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT jg.ordem_turno, jg.id_usuario
+        FROM jogadas jg
+        WHERE jg.id_partida = p.id_partida
+        ORDER BY jg.ordem_turno DESC
+        LIMIT 1
+    ) turno ON TRUE
+    WHERE p.id_partida = p_id_partida
+    ON CONFLICT (id_partida) DO UPDATE SET
+        extremidade_a = EXCLUDED.extremidade_a,
+        extremidade_b = EXCLUDED.extremidade_b,
+        proxima_ordem_jogada = EXCLUDED.proxima_ordem_jogada,
+        proximo_turno = EXCLUDED.proximo_turno,
+        pecas_mesa = EXCLUDED.pecas_mesa,
+        pecas_monte = EXCLUDED.pecas_monte,
+        jogadores = EXCLUDED.jogadores,
+        pecas_mao = EXCLUDED.pecas_mao,
+        jogador_atual = EXCLUDED.jogador_atual,
+        ultimo_jogador = EXCLUDED.ultimo_jogador,
+        ultima_peca = EXCLUDED.ultima_peca,
+        ultima_jogada = EXCLUDED.ultima_jogada;
+$$ LANGUAGE sql;
+
 -- Procedimento para comprar peça do monte
 CREATE OR REPLACE FUNCTION comprar_peca_monte(
     p_id_partida INTEGER,
@@ -12,16 +79,24 @@ CREATE OR REPLACE FUNCTION comprar_peca_monte(
     mensagem TEXT
 ) AS $$
 DECLARE
+    v_estado estado_partida%ROWTYPE;
+    v_posicao INTEGER;
     v_peca_disponivel INTEGER;
-    v_pecas_monte INTEGER;
 BEGIN
-    -- Verificar se há peças no monte
-    SELECT COUNT(*) INTO v_pecas_monte
-    FROM pecas_partida pp
-    WHERE pp.id_partida = p_id_partida 
-    AND pp.status = 'no_monte';
+    -- Estado corrente (a trava da linha serializa jogadas e compras da partida)
+    SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    IF NOT FOUND THEN
+        PERFORM reconstruir_estado_partida(p_id_partida);
+        SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    END IF;
+    v_posicao := array_position(v_estado.jogadores, p_id_usuario);
     
-    IF v_pecas_monte = 0 THEN
+    IF v_posicao IS NULL THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, 'Jogador não participa da partida'::TEXT;
+        RETURN;
+    END IF;
+    
+    IF v_estado.pecas_monte = 0 THEN
         RETURN QUERY SELECT FALSE, NULL::INTEGER, 'Monte vazio'::TEXT;
         RETURN;
     END IF;
@@ -49,6 +124,11 @@ BEGIN
     AND id_peca = v_peca_disponivel 
     AND status = 'no_monte';
     
+    UPDATE estado_partida
+    SET pecas_monte = pecas_monte - 1,
+        pecas_mao[v_posicao] = pecas_mao[v_posicao] + 1
+    WHERE id_partida = p_id_partida;
+    
     -- Atualizar contador do monte
     UPDATE monte_partida 
     SET pecas_restantes = pecas_restantes - 1
@@ -71,39 +151,51 @@ CREATE OR REPLACE FUNCTION executar_jogada(
     nova_extremidade_b INTEGER
 ) AS $$
 DECLARE
-    v_pode_jogar BOOLEAN;
+    v_estado estado_partida%ROWTYPE;
+    v_posicao INTEGER;
     v_lado_a INTEGER;
     v_lado_b INTEGER;
     v_extremidade_esq INTEGER;
     v_extremidade_dir INTEGER;
     v_nova_extremidade_a INTEGER;
     v_nova_extremidade_b INTEGER;
-    v_ordem_jogada INTEGER;
-    v_valor_conectar INTEGER;
-    v_valor_livre INTEGER;
 BEGIN
-    -- Verificar se a jogada é possível
-    SELECT verificar_jogada_possivel(p_id_partida, p_id_usuario, p_id_peca) INTO v_pode_jogar;
-    
-    IF NOT v_pode_jogar THEN
-        RETURN QUERY SELECT FALSE, 'Jogada não é possível'::TEXT, NULL::INTEGER, NULL::INTEGER;
-        RETURN;
+    -- Estado corrente (a trava da linha serializa jogadas e compras da partida)
+    SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    IF NOT FOUND THEN
+        PERFORM reconstruir_estado_partida(p_id_partida);
+        SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
     END IF;
+    v_posicao := array_position(v_estado.jogadores, p_id_usuario);
+    v_extremidade_esq := v_estado.extremidade_a;
+    v_extremidade_dir := v_estado.extremidade_b;
     
     -- Obter dados da peça
     SELECT lado_a, lado_b INTO v_lado_a, v_lado_b
     FROM pecas_domino WHERE id_peca = p_id_peca;
     
-    -- Obter extremidades atuais
-    SELECT extremidade_a, extremidade_b INTO v_extremidade_esq, v_extremidade_dir
-    FROM mesa_jogo 
+    -- Verificar se a peça encaixa em alguma extremidade (mesa vazia: qualquer uma)
+    IF v_posicao IS NULL OR v_lado_a IS NULL OR NOT (
+        v_extremidade_esq IS NULL OR
+        v_extremidade_esq IN (v_lado_a, v_lado_b) OR
+        v_extremidade_dir IN (v_lado_a, v_lado_b)
+    ) THEN
+        RETURN QUERY SELECT FALSE, 'Jogada não é possível'::TEXT, NULL::INTEGER, NULL::INTEGER;
+        RETURN;
+    END IF;
+    
+    -- Remover peça da mão do jogador (sem linha atualizada = não tinha a peça)
+    UPDATE pecas_partida 
+    SET status = 'jogada'
     WHERE id_partida = p_id_partida 
-    ORDER BY ordem_jogada DESC 
-    LIMIT 1;
+    AND id_usuario = p_id_usuario 
+    AND id_peca = p_id_peca
+    AND status = 'na_mao';
     
-    -- Obter próxima ordem de jogada
-    SELECT COALESCE(MAX(ordem_jogada), 0) + 1 INTO v_ordem_jogada
-    FROM mesa_jogo WHERE id_partida = p_id_partida;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT FALSE, 'Jogada não é possível'::TEXT, NULL::INTEGER, NULL::INTEGER;
+        RETURN;
+    END IF;
     
     -- Se é a primeira peça
     IF v_extremidade_esq IS NULL THEN
@@ -136,30 +228,61 @@ BEGIN
         id_partida, id_peca, id_usuario, ordem_jogada, 
         lado_conectado, extremidade_a, extremidade_b
     ) VALUES (
-        p_id_partida, p_id_peca, p_id_usuario, v_ordem_jogada,
+        p_id_partida, p_id_peca, p_id_usuario, v_estado.proxima_ordem_jogada,
         p_lado_conectado, v_nova_extremidade_a, v_nova_extremidade_b
     );
     
-    -- Remover peça da mão do jogador
-    UPDATE pecas_partida 
-    SET status = 'jogada'
-    WHERE id_partida = p_id_partida 
-    AND id_usuario = p_id_usuario 
-    AND id_peca = p_id_peca;
+    -- Atualizar o estado antes de registrar a jogada: o trigger
+    -- verificar_vitoria_partida já lê as novas extremidades e mãos
+    UPDATE estado_partida
+    SET extremidade_a = v_nova_extremidade_a,
+        extremidade_b = v_nova_extremidade_b,
+        proxima_ordem_jogada = proxima_ordem_jogada + 1,
+        proximo_turno = proximo_turno + 1,
+        pecas_mesa = pecas_mesa + 1,
+        pecas_mao[v_posicao] = pecas_mao[v_posicao] - 1,
+        jogador_atual = jogadores[v_posicao % array_length(jogadores, 1) + 1],
+        ultimo_jogador = p_id_usuario,
+        ultima_peca = p_id_peca,
+        ultima_jogada = CURRENT_TIMESTAMP
+    WHERE id_partida = p_id_partida;
     
     -- Registrar jogada
     INSERT INTO jogadas (id_partida, id_usuario, ordem_turno, tipo_jogada, id_peca)
-    VALUES (p_id_partida, p_id_usuario, 
-            (SELECT COALESCE(MAX(ordem_turno), 0) + 1 FROM jogadas WHERE id_partida = p_id_partida),
-            'jogou_peca', p_id_peca);
+    VALUES (p_id_partida, p_id_usuario, v_estado.proximo_turno, 'jogou_peca', p_id_peca);
     
     RETURN QUERY SELECT TRUE, 'Jogada executada com sucesso'::TEXT, 
                        v_nova_extremidade_a, v_nova_extremidade_b;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Procedimento para passar a vez (sem jogada possível e sem monte)
+CREATE OR REPLACE FUNCTION passar_vez(p_id_partida INTEGER, p_id_usuario INTEGER)
+RETURNS VOID AS $$
+    WITH estado AS (
+        UPDATE estado_partida
+        SET proximo_turno = proximo_turno + 1,
+            jogador_atual = jogadores[array_position(jogadores, p_id_usuario) % array_length(jogadores, 1) + 1]
+        WHERE id_partida = p_id_partida
+        RETURNING proximo_turno - 1 AS ordem_turno
+    )
+    INSERT INTO jogadas (id_partida, id_usuario, ordem_turno, tipo_jogada)
+    SELECT p_id_partida, p_id_usuario, ordem_turno, 'passou'
+    FROM estado;
+$$ LANGUAGE sql;
+
 -- Procedimento para iniciar nova partida
-CREATE OR REPLACE FUNCTION iniciar_partida(p_id_jogo INTEGER, p_numero_partida INTEGER)
+-- Embaralha as 28 peças uma única vez e grava partida, mãos, monte e estado
+-- em um único comando. A posição k de jogador (ordem de posicao_mesa)
+-- recebe as peças k*7+1 a k*7+7 do baralho e o restante vai para o monte.
+-- p_pecas permite informar a ordem do baralho (id_peca) gerada fora do
+-- banco (capivara_domino.gerar_distribuicoes); NULL embaralha aqui.
+DROP FUNCTION IF EXISTS iniciar_partida(INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION iniciar_partida(
+    p_id_jogo INTEGER,
+    p_numero_partida INTEGER,
+    p_pecas INTEGER[] DEFAULT NULL
+)
 RETURNS TABLE (
     sucesso BOOLEAN,
     id_partida_criada INTEGER,
@@ -168,72 +291,124 @@ RETURNS TABLE (
 ) AS $$
 DECLARE
     v_id_partida INTEGER;
-    v_numero_jogadores INTEGER;
     v_primeiro_jogador INTEGER;
-    v_usuario RECORD;
-    v_peca RECORD;
-    v_contador INTEGER := 0;
-    v_tem_66 BOOLEAN := FALSE;
 BEGIN
-    -- Obter número de jogadores
-    SELECT numero_jogadores INTO v_numero_jogadores
-    FROM jogos WHERE id_jogo = p_id_jogo;
-    
-    -- Criar nova partida
-    INSERT INTO partidas (id_jogo, numero_partida, primeiro_jogador)
-    VALUES (p_id_jogo, p_numero_partida, 1) -- Temporário, será atualizado
-    RETURNING id_partida INTO v_id_partida;
-    
-    -- Distribuir peças para cada jogador (7 peças cada)
-    FOR v_usuario IN (
-        SELECT id_usuario FROM participantes_jogo 
-        WHERE id_jogo = p_id_jogo 
-        ORDER BY posicao_mesa
-    ) LOOP
-        v_contador := 0;
-        FOR v_peca IN (
-            SELECT id_peca FROM pecas_domino 
-            ORDER BY RANDOM() 
-            LIMIT 7 OFFSET (SELECT COUNT(*) FROM pecas_partida WHERE id_partida = v_id_partida)
-        ) LOOP
-            v_contador := v_contador + 1;
-            INSERT INTO pecas_partida (id_partida, id_peca, id_usuario, posicao_mao, status)
-            VALUES (v_id_partida, v_peca.id_peca, v_usuario.id_usuario, v_contador, 'na_mao');
-            
-            -- Verificar se é a peça 6-6 para definir primeiro jogador
-            IF EXISTS(SELECT 1 FROM pecas_domino WHERE id_peca = v_peca.id_peca AND lado_a = 6 AND lado_b = 6) THEN
-                v_primeiro_jogador := v_usuario.id_usuario;
-                v_tem_66 := TRUE;
-            END IF;
-        END LOOP;
-    END LOOP;
-    
-    -- Se não tiver 6-6, escolher aleatoriamente
-    IF NOT v_tem_66 THEN
-        SELECT id_usuario INTO v_primeiro_jogador
-        FROM participantes_jogo 
-        WHERE id_jogo = p_id_jogo 
-        ORDER BY RANDOM() 
-        LIMIT 1;
+    IF NOT EXISTS(SELECT 1 FROM participantes_jogo WHERE id_jogo = p_id_jogo) THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, NULL::INTEGER, 'Jogo sem participantes'::TEXT;
+        RETURN;
     END IF;
     
-    -- Atualizar primeiro jogador
-    UPDATE partidas SET primeiro_jogador = v_primeiro_jogador WHERE id_partida = v_id_partida;
-    
-    -- Colocar peças restantes no monte (para jogos de 2-3 jogadores)
-    IF v_numero_jogadores < 4 THEN
-        INSERT INTO pecas_partida (id_partida, id_peca, status)
-        SELECT v_id_partida, pd.id_peca, 'no_monte'
-        FROM pecas_domino pd
-        WHERE pd.id_peca NOT IN (
-            SELECT id_peca FROM pecas_partida WHERE id_partida = v_id_partida
-        );
-        
-        -- Criar registro do monte
-        INSERT INTO monte_partida (id_partida, pecas_restantes)
-        VALUES (v_id_partida, (SELECT COUNT(*) FROM pecas_partida WHERE id_partida = v_id_partida AND status = 'no_monte'));
+    IF p_pecas IS NOT NULL AND (
+        SELECT COUNT(DISTINCT pd.id_peca) FROM pecas_domino pd WHERE pd.id_peca = ANY(p_pecas)
+    ) <> 28 THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, NULL::INTEGER, 'Ordem de peças inválida'::TEXT;
+        RETURN;
     END IF;
     
+    WITH jogadores AS (
+        SELECT pj.id_usuario, ROW_NUMBER() OVER (ORDER BY pj.posicao_mesa) - 1 AS posicao
+        FROM participantes_jogo pj
+        WHERE pj.id_jogo = p_id_jogo
+    ),
+    distribuicao AS MATERIALIZED (
+        SELECT baralho.id_peca, baralho.e_66, j.id_usuario,
+               CASE WHEN j.id_usuario IS NULL THEN NULL ELSE baralho.ordem % 7 + 1 END AS posicao_mao,
+               CASE WHEN j.id_usuario IS NULL THEN 'no_monte' ELSE 'na_mao' END AS status
+        FROM (
+            SELECT pd.id_peca, (pd.lado_a = 6 AND pd.lado_b = 6) AS e_66,
+                   ROW_NUMBER() OVER (
+                       ORDER BY COALESCE(array_position(p_pecas, pd.id_peca)::DOUBLE PRECISION, RANDOM())
+                   ) - 1 AS ordem
+            FROM pecas_domino pd
+        ) baralho
+        LEFT JOIN jogadores j ON j.posicao = baralho.ordem / 7
+    ),
+    partida AS (
+        -- Quem recebeu o 6-6 começa; sem 6-6 distribuído, sorteia
+        INSERT INTO partidas (id_jogo, numero_partida, primeiro_jogador)
+        SELECT p_id_jogo, p_numero_partida, COALESCE(
+            (SELECT d.id_usuario FROM distribuicao d WHERE d.e_66 AND d.id_usuario IS NOT NULL),
+            (SELECT j.id_usuario FROM jogadores j ORDER BY RANDOM() LIMIT 1)
+        )
+        RETURNING partidas.id_partida, partidas.primeiro_jogador AS id_primeiro
+    ),
+    maos AS (
+        INSERT INTO pecas_partida (id_partida, id_peca, id_usuario, posicao_mao, status)
+        SELECT pt.id_partida, d.id_peca, d.id_usuario, d.posicao_mao, d.status
+        FROM distribuicao d CROSS JOIN partida pt
+    ),
+    monte AS (
+        INSERT INTO monte_partida (id_partida, pecas_restantes)
+        SELECT pt.id_partida, (SELECT COUNT(*) FROM distribuicao d WHERE d.status = 'no_monte')
+        FROM partida pt
+        WHERE EXISTS(SELECT 1 FROM distribuicao d WHERE d.status = 'no_monte')
+    ),
+    estado AS (
+        INSERT INTO estado_partida (id_partida, pecas_monte, jogadores, pecas_mao, jogador_atual)
+        SELECT pt.id_partida,
+               (SELECT COUNT(*) FROM distribuicao d WHERE d.status = 'no_monte'),
+               (SELECT ARRAY_AGG(j.id_usuario ORDER BY j.posicao) FROM jogadores j),
+               (SELECT ARRAY_AGG(m.total ORDER BY m.posicao) FROM (
+                    SELECT j.posicao, COUNT(d.id_peca)::INTEGER AS total
+                    FROM jogadores j
+                    LEFT JOIN distribuicao d ON d.id_usuario = j.id_usuario
+                    GROUP BY j.posicao
+               ) m),
+               pt.id_primeiro
+        FROM partida pt
+    )
+    SELECT pt.id_partida, pt.id_primeiro INTO v_id_partida, v_primeiro_jogador
+    FROM partida pt;
+    
     RETURN QUERY SELECT TRUE, v_id_partida, v_primeiro_jogador, 'Partida iniciada com sucesso'::TEXT;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+-- Reconstrução completa do placar (ranking) a partir das tabelas base.
+-- O dia a dia é feito pelos triggers; use após cargas externas ou para
+-- preencher o placar de um banco criado antes da tabela existir.
+CREATE OR REPLACE FUNCTION reconstruir_ranking()
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    LOCK TABLE placar_usuarios IN EXCLUSIVE MODE;
+    DELETE FROM placar_usuarios;
+    
+    INSERT INTO placar_usuarios (
+        id_usuario, total_jogos, jogos_vencidos, total_partidas, partidas_vencidas, pontos_totais
+    )
+    SELECT
+        u.id_usuario,
+        COALESCE(part.total_jogos, 0),
+        COALESCE(vj.jogos_vencidos, 0),
+        COALESCE(part.total_partidas, 0),
+        COALESCE(vp.partidas_vencidas, 0),
+        COALESCE(part.pontos_totais, 0)
+    FROM usuarios u
+    LEFT JOIN (
+        SELECT pj.id_usuario,
+               COUNT(*) AS total_jogos,
+               SUM(COALESCE(np.partidas, 0)) AS total_partidas,
+               SUM(COALESCE(pj.pontuacao_total, 0)) AS pontos_totais
+        FROM participantes_jogo pj
+        LEFT JOIN (
+            SELECT id_jogo, COUNT(*) AS partidas FROM partidas GROUP BY id_jogo
+        ) np ON np.id_jogo = pj.id_jogo
+        GROUP BY pj.id_usuario
+    ) part ON part.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT vencedor_jogo AS id_usuario, COUNT(*) AS jogos_vencidos
+        FROM jogos WHERE vencedor_jogo IS NOT NULL
+        GROUP BY vencedor_jogo
+    ) vj ON vj.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT vencedor_partida AS id_usuario, COUNT(*) AS partidas_vencidas
+        FROM partidas WHERE vencedor_partida IS NOT NULL
+        GROUP BY vencedor_partida
+    ) vp ON vp.id_usuario = u.id_usuario;
+    
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
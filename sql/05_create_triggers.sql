@@ -17,7 +17,7 @@ BEGIN
     -- Só executar quando status muda para 'finalizada'
     IF NEW.status = 'finalizada' AND OLD.status != 'finalizada' THEN
         
-        SELECT id_jogo, numero_jogadores INTO v_id_jogo, v_numero_jogadores
+        SELECT p.id_jogo, j.numero_jogadores INTO v_id_jogo, v_numero_jogadores
         FROM partidas p JOIN jogos j ON p.id_jogo = j.id_jogo
         WHERE p.id_partida = NEW.id_partida;
         
@@ -31,7 +31,7 @@ BEGIN
             AND pj.id_usuario != NEW.vencedor_partida;
             
             -- Atualizar pontos do vencedor
-            UPDATE NEW SET pontos_vencedor = v_pontos_adversarios;
+            NEW.pontos_vencedor := v_pontos_adversarios;
             
             -- Atualizar pontuação total do jogador
             UPDATE participantes_jogo 
@@ -92,7 +92,7 @@ BEGIN
             SET pontuacao_total = pontuacao_total + v_pontos_adversarios
             WHERE id_jogo = v_id_jogo AND dupla = v_dupla_vencedora;
             
-            UPDATE NEW SET pontos_vencedor = v_pontos_adversarios;
+            NEW.pontos_vencedor := v_pontos_adversarios;
         END IF;
         
         -- Verificar se o jogo chegou ao fim (50 pontos)
@@ -131,11 +131,18 @@ DECLARE
 BEGIN
     IF NEW.tipo_jogada = 'jogou_peca' THEN
         -- Verificar se o jogador ficou sem peças (batida)
-        SELECT COUNT(*) INTO v_pecas_restantes
-        FROM pecas_partida 
-        WHERE id_partida = NEW.id_partida 
-        AND id_usuario = NEW.id_usuario 
-        AND status = 'na_mao';
+        SELECT e.pecas_mao[array_position(e.jogadores, NEW.id_usuario)] INTO v_pecas_restantes
+        FROM estado_partida e
+        WHERE e.id_partida = NEW.id_partida;
+        
+        -- Jogada registrada fora de executar_jogada: conta nas tabelas base
+        IF v_pecas_restantes IS NULL THEN
+            SELECT COUNT(*) INTO v_pecas_restantes
+            FROM pecas_partida 
+            WHERE id_partida = NEW.id_partida 
+            AND id_usuario = NEW.id_usuario 
+            AND status = 'na_mao';
+        END IF;
         
         IF v_pecas_restantes = 0 THEN
             -- Jogador bateu
@@ -184,4 +191,135 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER trigger_ultimo_acesso_jogadas
     AFTER INSERT ON jogadas
     FOR EACH ROW
-    EXECUTE FUNCTION atualizar_ultimo_acesso();
\ No newline at end of file
+    EXECUTE FUNCTION atualizar_ultimo_acesso();
+
+-- ============================================
+-- PLACAR (ranking materializado em placar_usuarios)
+-- Cada trigger aplica só a diferença causada pela linha alterada.
+-- ============================================
+
+-- Soma variações no placar de um usuário (cria a linha se não existir)
+CREATE OR REPLACE FUNCTION somar_placar(
+    p_id_usuario INTEGER,
+    p_jogos INTEGER,
+    p_jogos_vencidos INTEGER,
+    p_partidas INTEGER,
+    p_partidas_vencidas INTEGER,
+    p_pontos INTEGER
+) RETURNS VOID AS $$
+    INSERT INTO placar_usuarios AS pl (
+        id_usuario, total_jogos, jogos_vencidos, total_partidas, partidas_vencidas, pontos_totais
+    )
+    SELECT p_id_usuario, p_jogos, p_jogos_vencidos, p_partidas, p_partidas_vencidas, p_pontos
+    WHERE p_id_usuario IS NOT NULL
+    ON CONFLICT (id_usuario) DO UPDATE SET
+        total_jogos = pl.total_jogos + EXCLUDED.total_jogos,
+        jogos_vencidos = pl.jogos_vencidos + EXCLUDED.jogos_vencidos,
+        total_partidas = pl.total_partidas + EXCLUDED.total_partidas,
+        partidas_vencidas = pl.partidas_vencidas + EXCLUDED.partidas_vencidas,
+        pontos_totais = pl.pontos_totais + EXCLUDED.pontos_totais;
+$$ LANGUAGE sql;
+
+-- Todo usuário novo entra no placar zerado
+CREATE OR REPLACE FUNCTION placar_novo_usuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO placar_usuarios (id_usuario) VALUES (NEW.id_usuario)
+    ON CONFLICT (id_usuario) DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_placar_usuario
+    AFTER INSERT ON usuarios
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_novo_usuario();
+
+-- Participação: jogos, partidas do jogo e pontuação acumulada
+CREATE OR REPLACE FUNCTION placar_participantes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.id_usuario = OLD.id_usuario AND NEW.id_jogo = OLD.id_jogo THEN
+        -- Caso comum: calcular_pontos_partida atualizando a pontuação
+        PERFORM somar_placar(NEW.id_usuario, 0, 0, 0, 0,
+                             COALESCE(NEW.pontuacao_total, 0) - COALESCE(OLD.pontuacao_total, 0));
+        RETURN NULL;
+    END IF;
+    
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM somar_placar(OLD.id_usuario, -1, 0,
+                             -(SELECT COUNT(*)::INTEGER FROM partidas WHERE id_jogo = OLD.id_jogo),
+                             0, -COALESCE(OLD.pontuacao_total, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM somar_placar(NEW.id_usuario, 1, 0,
+                             (SELECT COUNT(*)::INTEGER FROM partidas WHERE id_jogo = NEW.id_jogo),
+                             0, COALESCE(NEW.pontuacao_total, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_placar_participantes
+    AFTER INSERT OR DELETE OR UPDATE OF id_usuario, id_jogo, pontuacao_total ON participantes_jogo
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_participantes();
+
+-- Partidas: total de partidas dos participantes e partidas vencidas
+CREATE OR REPLACE FUNCTION placar_partidas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF TG_OP = 'DELETE' OR NEW.id_jogo <> OLD.id_jogo THEN
+            UPDATE placar_usuarios pl
+            SET total_partidas = pl.total_partidas - 1
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = OLD.id_jogo AND pj.id_usuario = pl.id_usuario;
+        END IF;
+        IF TG_OP = 'DELETE' OR NEW.vencedor_partida IS DISTINCT FROM OLD.vencedor_partida THEN
+            PERFORM somar_placar(OLD.vencedor_partida, 0, 0, 0, -1, 0);
+        END IF;
+    END IF;
+    
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' OR NEW.id_jogo <> OLD.id_jogo THEN
+            UPDATE placar_usuarios pl
+            SET total_partidas = pl.total_partidas + 1
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = NEW.id_jogo AND pj.id_usuario = pl.id_usuario;
+        END IF;
+        IF TG_OP = 'INSERT' OR NEW.vencedor_partida IS DISTINCT FROM OLD.vencedor_partida THEN
+            PERFORM somar_placar(NEW.vencedor_partida, 0, 0, 0, 1, 0);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_placar_partidas
+    AFTER INSERT OR DELETE OR UPDATE OF id_jogo, vencedor_partida ON partidas
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_partidas();
+
+-- Jogos: jogos vencidos (vencedor_jogo é definido na finalização)
+CREATE OR REPLACE FUNCTION placar_jogos()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF TG_OP = 'DELETE' OR NEW.vencedor_jogo IS DISTINCT FROM OLD.vencedor_jogo THEN
+            PERFORM somar_placar(OLD.vencedor_jogo, 0, -1, 0, 0, 0);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' OR NEW.vencedor_jogo IS DISTINCT FROM OLD.vencedor_jogo THEN
+            PERFORM somar_placar(NEW.vencedor_jogo, 0, 1, 0, 0, 0);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_placar_jogos
+    AFTER INSERT OR DELETE OR UPDATE OF vencedor_jogo ON jogos
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_jogos();
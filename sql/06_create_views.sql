@@ -3,35 +3,35 @@
 -- ============================================
 
 -- View: Ranking de pontuação por usuário
+-- Lê o placar mantido pelos triggers (uma linha por usuário); o ORDER BY
+-- segue o índice idx_placar_usuarios_ranking
 CREATE OR REPLACE VIEW ranking_usuarios AS
 SELECT 
     u.id_usuario,
     u.nome_usuario,
     u.nome_completo,
-    COUNT(DISTINCT j.id_jogo) as total_jogos_participados,
-    COUNT(DISTINCT CASE WHEN j.vencedor_jogo = u.id_usuario THEN j.id_jogo END) as jogos_vencidos,
-    COUNT(DISTINCT CASE WHEN p.vencedor_partida = u.id_usuario THEN p.id_partida END) as partidas_vencidas,
-    COALESCE(SUM(pj.pontuacao_total), 0) as pontos_totais_acumulados,
+    pl.total_jogos::BIGINT as total_jogos_participados,
+    pl.jogos_vencidos::BIGINT as jogos_vencidos,
+    pl.partidas_vencidas::BIGINT as partidas_vencidas,
+    pl.pontos_totais::BIGINT as pontos_totais_acumulados,
     ROUND(
-        CASE WHEN COUNT(DISTINCT j.id_jogo) > 0 
-        THEN COUNT(DISTINCT CASE WHEN j.vencedor_jogo = u.id_usuario THEN j.id_jogo END)::DECIMAL / COUNT(DISTINCT j.id_jogo) * 100 
+        CASE WHEN pl.total_jogos > 0 
+        THEN pl.jogos_vencidos::DECIMAL / pl.total_jogos * 100 
         ELSE 0 END, 2
     ) as percentual_vitorias_jogos,
     ROUND(
-        CASE WHEN COUNT(DISTINCT p.id_partida) > 0 
-        THEN COUNT(DISTINCT CASE WHEN p.vencedor_partida = u.id_usuario THEN p.id_partida END)::DECIMAL / COUNT(DISTINCT p.id_partida) * 100 
+        CASE WHEN pl.total_partidas > 0 
+        THEN pl.partidas_vencidas::DECIMAL / pl.total_partidas * 100 
         ELSE 0 END, 2
     ) as percentual_vitorias_partidas,
     u.data_ultimo_acesso
-FROM usuarios u
-LEFT JOIN participantes_jogo pj ON u.id_usuario = pj.id_usuario
-LEFT JOIN jogos j ON pj.id_jogo = j.id_jogo
-LEFT JOIN partidas p ON j.id_jogo = p.id_jogo
+FROM placar_usuarios pl
+JOIN usuarios u ON pl.id_usuario = u.id_usuario
 WHERE u.ativo = TRUE
-GROUP BY u.id_usuario, u.nome_usuario, u.nome_completo, u.data_ultimo_acesso
-ORDER BY jogos_vencidos DESC, pontos_totais_acumulados DESC;
+ORDER BY pl.jogos_vencidos DESC, pl.pontos_totais DESC;
 
 -- View: Listagem de jogos e vencedores
+-- Partidas e participantes em subconsultas por jogo (sem multiplicar linhas)
 CREATE OR REPLACE VIEW listagem_jogos AS
 SELECT 
     j.id_jogo,
@@ -42,7 +42,7 @@ SELECT
     j.status,
     u_vencedor.nome_usuario as vencedor,
     u_vencedor.nome_completo as nome_completo_vencedor,
-    COUNT(p.id_partida) as total_partidas,
+    (SELECT COUNT(*) FROM partidas p WHERE p.id_jogo = j.id_jogo) as total_partidas,
     CASE 
         WHEN j.numero_jogadores = 4 THEN 'Duplas'
         ELSE 'Individual'
@@ -53,14 +53,12 @@ SELECT
         ELSE 
             EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - j.data_inicio)) / 60
     END as duracao_minutos,
-    STRING_AGG(DISTINCT u_participante.nome_usuario, ', ' ORDER BY u_participante.nome_usuario) as participantes
+    (SELECT STRING_AGG(u_participante.nome_usuario, ', ' ORDER BY u_participante.nome_usuario)
+     FROM participantes_jogo pj
+     JOIN usuarios u_participante ON pj.id_usuario = u_participante.id_usuario
+     WHERE pj.id_jogo = j.id_jogo) as participantes
 FROM jogos j
 LEFT JOIN usuarios u_vencedor ON j.vencedor_jogo = u_vencedor.id_usuario
-LEFT JOIN partidas p ON j.id_jogo = p.id_jogo
-LEFT JOIN participantes_jogo pj ON j.id_jogo = pj.id_jogo
-LEFT JOIN usuarios u_participante ON pj.id_usuario = u_participante.id_usuario
-GROUP BY j.id_jogo, j.data_inicio, j.data_fim, j.numero_jogadores, 
-         j.pontuacao_meta, j.status, u_vencedor.nome_usuario, u_vencedor.nome_completo
 ORDER BY j.data_inicio DESC;
 
 -- View: Histórico detalhado de partidas
@@ -93,35 +91,32 @@ GROUP BY p.id_partida, j.id_jogo, p.numero_partida, p.data_inicio, p.data_fim,
          p.pontos_vencedor, p.status
 ORDER BY p.data_inicio DESC;
 
--- View: Estado atual da mesa de jogo
+-- View: Estado atual da mesa de jogo (lido de estado_partida, sem agregações)
 CREATE OR REPLACE VIEW estado_mesa_atual AS
 SELECT 
     p.id_partida,
-    j.id_jogo,
+    p.id_jogo,
     p.numero_partida,
     p.status as status_partida,
-    mj.extremidade_a as extremidade_esquerda,
-    mj.extremidade_b as extremidade_direita,
-    COUNT(mj.id_mesa) as pecas_jogadas_mesa,
-    mj_ultima.id_usuario as ultimo_jogador,
+    e.extremidade_a as extremidade_esquerda,
+    e.extremidade_b as extremidade_direita,
+    e.pecas_mesa::BIGINT as pecas_jogadas_mesa,
+    e.ultimo_jogador,
     u_ultimo.nome_usuario as nome_ultimo_jogador,
     pd_ultima.lado_a as ultimo_lado_a,
     pd_ultima.lado_b as ultimo_lado_b,
-    mj_ultima.timestamp_jogada as timestamp_ultima_jogada
+    e.ultima_jogada as timestamp_ultima_jogada,
+    e.jogador_atual,
+    u_atual.nome_usuario as nome_jogador_atual,
+    e.pecas_monte,
+    e.jogadores,
+    e.pecas_mao
 FROM partidas p
-JOIN jogos j ON p.id_jogo = j.id_jogo
-LEFT JOIN mesa_jogo mj ON p.id_partida = mj.id_partida
-LEFT JOIN mesa_jogo mj_ultima ON p.id_partida = mj_ultima.id_partida 
-    AND mj_ultima.ordem_jogada = (
-        SELECT MAX(ordem_jogada) FROM mesa_jogo WHERE id_partida = p.id_partida
-    )
-LEFT JOIN usuarios u_ultimo ON mj_ultima.id_usuario = u_ultimo.id_usuario
-LEFT JOIN pecas_domino pd_ultima ON mj_ultima.id_peca = pd_ultima.id_peca
+JOIN estado_partida e ON p.id_partida = e.id_partida
+LEFT JOIN usuarios u_ultimo ON e.ultimo_jogador = u_ultimo.id_usuario
+LEFT JOIN usuarios u_atual ON e.jogador_atual = u_atual.id_usuario
+LEFT JOIN pecas_domino pd_ultima ON e.ultima_peca = pd_ultima.id_peca
 WHERE p.status = 'em_andamento'
-GROUP BY p.id_partida, j.id_jogo, p.numero_partida, p.status,
-         mj.extremidade_a, mj.extremidade_b, mj_ultima.id_usuario,
-         u_ultimo.nome_usuario, pd_ultima.lado_a, pd_ultima.lado_b,
-         mj_ultima.timestamp_jogada
 ORDER BY p.data_inicio DESC;
 
 -- View: Estatísticas de jogadores por partida
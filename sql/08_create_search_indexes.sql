@@ -0,0 +1,20 @@
+-- ============================================
+-- BUSCA DE USUÁRIOS POR TRIGRAMAS - CAPIVARA GAME
+-- ============================================
+
+-- Extensões para similaridade de texto e remoção de acentos
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() não é IMMUTABLE; o wrapper permite usá-lo em índices
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent', $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- Índices GIN de trigramas (LIKE '%termo%', operadores % e <%)
+CREATE INDEX IF NOT EXISTS idx_usuarios_nome_usuario_trgm
+    ON usuarios USING gin (f_unaccent(lower(nome_usuario)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_usuarios_nome_completo_trgm
+    ON usuarios USING gin (f_unaccent(lower(nome_completo)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_usuarios_email_trgm
+    ON usuarios USING gin (lower(email) gin_trgm_ops);
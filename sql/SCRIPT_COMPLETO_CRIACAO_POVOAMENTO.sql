@@ -2,34 +2,45 @@
 -- CAPIVARA GAME LBD - SCRIPT COMPLETO DE CRIAÇÃO E POVOAMENTO
 -- Sistema de Gerenciamento de Jogos de Dominó
 -- =====================================================
--- Este arquivo contém TUDO necessário para criar e popular o banco
--- Execute este script no PostgreSQL para ter o sistema funcionando
+-- Junção, em um único arquivo, de 01_create_database.sql e dos arquivos
+-- executados por 00_setup_complete.sql, na mesma ordem (02 a 06, 08 e 07).
+-- Não edite este arquivo diretamente: altere os arquivos numerados e
+-- gere-o de novo, para que os dois caminhos de instalação criem o mesmo
+-- banco.
+--
+-- Uso (conectado como superusuário, fora do banco capivara_game):
+--   psql -U postgres -h localhost -p 5433 -f sql/SCRIPT_COMPLETO_CRIACAO_POVOAMENTO.sql
 -- =====================================================
 
 -- =====================================================
 -- 1. CRIAÇÃO DO BANCO DE DADOS
+-- (origem: sql/01_create_database.sql)
 -- =====================================================
 
--- Conectar como superusuário primeiro
--- psql -U postgres -h localhost -p 5433
+-- ============================================
+-- TRABALHO PRÁTICO - LABORATÓRIO DE BASE DE DADOS
+-- SISTEMA: CAPIVARA GAME - DOMINÓ
+-- SGBD: PostgreSQL 12+
+-- ============================================
 
--- Criar banco de dados
-DROP DATABASE IF EXISTS capivara_game;
-CREATE DATABASE capivara_game 
-    WITH 
-    OWNER = postgres
-    ENCODING = 'UTF8'
-    LC_COLLATE = 'Portuguese_Brazil.1252'
-    LC_CTYPE = 'Portuguese_Brazil.1252'
-    TEMPLATE = template0;
+-- Criação do banco de dados
+CREATE DATABASE capivara_game;
 
--- Conectar ao banco capivara_game após criação
--- \c capivara_game;
+-- Conectar ao banco
+\c capivara_game;
+
+-- Extensões necessárias
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- =====================================================
--- 2. CRIAÇÃO DAS TABELAS
+-- 2. TABELAS (inclui estado_partida e placar_usuarios)
+-- (origem: sql/02_create_tables.sql)
 -- =====================================================
 
+-- ============================================
+-- CRIAÇÃO DAS TABELAS - CAPIVARA GAME
+-- ============================================
+
 -- Tabela de usuários
 CREATE TABLE usuarios (
     id_usuario SERIAL PRIMARY KEY,
@@ -38,429 +49,1337 @@ CREATE TABLE usuarios (
     email VARCHAR(100) UNIQUE NOT NULL,
     senha_hash VARCHAR(255) NOT NULL,
     data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    ativo BOOLEAN DEFAULT TRUE,
-    
-    -- Constraints adicionais
-    CONSTRAINT check_nome_usuario_length CHECK (char_length(nome_usuario) >= 3),
-    CONSTRAINT check_email_format CHECK (email LIKE '%@%.%')
+    data_ultimo_acesso TIMESTAMP,
+    ativo BOOLEAN DEFAULT TRUE
 );
 
--- Tabela de jogos
+-- Tabela de jogos (uma partida completa até 50 pontos)
 CREATE TABLE jogos (
     id_jogo SERIAL PRIMARY KEY,
-    numero_jogadores INTEGER NOT NULL,
     data_inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    data_fim TIMESTAMP NULL,
-    status VARCHAR(20) DEFAULT 'em_andamento',
-    pontos_meta INTEGER DEFAULT 50,
-    vencedor_id INTEGER NULL,
-    
-    -- Constraints
-    CONSTRAINT check_numero_jogadores CHECK (numero_jogadores BETWEEN 2 AND 4),
-    CONSTRAINT check_pontos_meta CHECK (pontos_meta > 0),
-    CONSTRAINT check_status CHECK (status IN ('em_andamento', 'finalizado', 'cancelado', 'simulacao')),
-    
-    -- Foreign key para vencedor (será adicionada após criação das outras tabelas)
-    CONSTRAINT fk_jogos_vencedor FOREIGN KEY (vencedor_id) REFERENCES usuarios(id_usuario)
+    data_fim TIMESTAMP,
+    numero_jogadores INTEGER NOT NULL CHECK (numero_jogadores IN (2, 3, 4)),
+    pontuacao_meta INTEGER DEFAULT 50,
+    status VARCHAR(20) DEFAULT 'em_andamento' CHECK (status IN ('em_andamento', 'finalizado', 'cancelado')),
+    vencedor_jogo INTEGER,
+    FOREIGN KEY (vencedor_jogo) REFERENCES usuarios(id_usuario)
 );
 
--- Tabela de participantes do jogo (relacionamento N:N)
+-- Tabela de participantes do jogo
 CREATE TABLE participantes_jogo (
-    id_participante SERIAL PRIMARY KEY,
+    id_participacao SERIAL PRIMARY KEY,
     id_jogo INTEGER NOT NULL,
     id_usuario INTEGER NOT NULL,
-    posicao_mesa INTEGER NOT NULL,
-    pontos_acumulados INTEGER DEFAULT 0,
-    data_entrada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    
-    -- Constraints
-    CONSTRAINT check_posicao_mesa CHECK (posicao_mesa BETWEEN 1 AND 4),
-    CONSTRAINT check_pontos_acumulados CHECK (pontos_acumulados >= 0),
-    
-    -- Foreign Keys
-    CONSTRAINT fk_participantes_jogo FOREIGN KEY (id_jogo) REFERENCES jogos(id_jogo) ON DELETE CASCADE,
-    CONSTRAINT fk_participantes_usuario FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario) ON DELETE CASCADE,
-    
-    -- Unique constraints
-    CONSTRAINT unique_usuario_jogo UNIQUE (id_jogo, id_usuario),
-    CONSTRAINT unique_posicao_jogo UNIQUE (id_jogo, posicao_mesa)
+    posicao_mesa INTEGER NOT NULL CHECK (posicao_mesa BETWEEN 1 AND 4),
+    dupla INTEGER CHECK (dupla IN (1, 2)), -- Para jogos de 4 pessoas
+    pontuacao_total INTEGER DEFAULT 0,
+    FOREIGN KEY (id_jogo) REFERENCES jogos(id_jogo) ON DELETE CASCADE,
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario),
+    UNIQUE(id_jogo, posicao_mesa),
+    UNIQUE(id_jogo, id_usuario)
 );
 
--- Tabela de auditoria (para logs do sistema)
-CREATE TABLE log_auditoria (
-    id_log SERIAL PRIMARY KEY,
-    tabela VARCHAR(50) NOT NULL,
-    operacao VARCHAR(10) NOT NULL,
-    usuario_sistema VARCHAR(50) DEFAULT current_user,
-    timestamp_operacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    dados_antes JSONB NULL,
-    dados_depois JSONB NULL,
-    
-    CONSTRAINT check_operacao CHECK (operacao IN ('INSERT', 'UPDATE', 'DELETE'))
+-- Tabela de partidas (rodadas dentro de um jogo)
+CREATE TABLE partidas (
+    id_partida SERIAL PRIMARY KEY,
+    id_jogo INTEGER NOT NULL,
+    numero_partida INTEGER NOT NULL,
+    data_inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_fim TIMESTAMP,
+    primeiro_jogador INTEGER NOT NULL,
+    vencedor_partida INTEGER,
+    tipo_vitoria VARCHAR(20) CHECK (tipo_vitoria IN ('batida', 'trancamento')),
+    pontos_vencedor INTEGER DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'em_andamento' CHECK (status IN ('em_andamento', 'finalizada')),
+    FOREIGN KEY (id_jogo) REFERENCES jogos(id_jogo) ON DELETE CASCADE,
+    FOREIGN KEY (primeiro_jogador) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (vencedor_partida) REFERENCES usuarios(id_usuario),
+    UNIQUE(id_jogo, numero_partida)
 );
 
--- =====================================================
--- 3. ÍNDICES DE PERFORMANCE
--- =====================================================
+-- Tabela de peças do dominó
+CREATE TABLE pecas_domino (
+    id_peca SERIAL PRIMARY KEY,
+    lado_a INTEGER NOT NULL CHECK (lado_a BETWEEN 0 AND 6),
+    lado_b INTEGER NOT NULL CHECK (lado_b BETWEEN 0 AND 6),
+    valor_total INTEGER GENERATED ALWAYS AS (lado_a + lado_b) STORED,
+    UNIQUE(lado_a, lado_b),
+    CHECK (lado_a <= lado_b) -- Garantir ordenação única (ex: 2-5, não 5-2)
+);
 
--- Índices para consultas frequentes
-CREATE INDEX idx_usuarios_email ON usuarios(email);
-CREATE INDEX idx_usuarios_nome_usuario ON usuarios(nome_usuario);
-CREATE INDEX idx_usuarios_ativo ON usuarios(ativo);
+-- Tabela de distribuição de peças para cada partida
+CREATE TABLE pecas_partida (
+    id_distribuicao SERIAL PRIMARY KEY,
+    id_partida INTEGER NOT NULL,
+    id_peca INTEGER NOT NULL,
+    id_usuario INTEGER, -- NULL se estiver no monte
+    posicao_mao INTEGER, -- posição na mão do jogador
+    status VARCHAR(20) DEFAULT 'na_mao' CHECK (status IN ('na_mao', 'jogada', 'no_monte')),
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    FOREIGN KEY (id_peca) REFERENCES pecas_domino(id_peca),
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario)
+);
+
+-- Tabela de mesa (peças jogadas na mesa)
+CREATE TABLE mesa_jogo (
+    id_mesa SERIAL PRIMARY KEY,
+    id_partida INTEGER NOT NULL,
+    id_peca INTEGER NOT NULL,
+    id_usuario INTEGER NOT NULL,
+    ordem_jogada INTEGER NOT NULL,
+    lado_conectado VARCHAR(10) CHECK (lado_conectado IN ('esquerda', 'direita', 'inicial')),
+    extremidade_a INTEGER, -- valor da extremidade esquerda após a jogada
+    extremidade_b INTEGER, -- valor da extremidade direita após a jogada
+    timestamp_jogada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    FOREIGN KEY (id_peca) REFERENCES pecas_domino(id_peca),
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario),
+    UNIQUE(id_partida, ordem_jogada)
+);
+
+-- Tabela de jogadas (inclui passes)
+CREATE TABLE jogadas (
+    id_jogada SERIAL PRIMARY KEY,
+    id_partida INTEGER NOT NULL,
+    id_usuario INTEGER NOT NULL,
+    ordem_turno INTEGER NOT NULL,
+    tipo_jogada VARCHAR(20) NOT NULL CHECK (tipo_jogada IN ('jogou_peca', 'passou', 'comprou_monte')),
+    id_peca INTEGER, -- NULL em caso de passe
+    pecas_compradas INTEGER DEFAULT 0,
+    timestamp_jogada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (id_peca) REFERENCES pecas_domino(id_peca),
+    UNIQUE(id_partida, ordem_turno)
+);
 
-CREATE INDEX idx_jogos_status ON jogos(status);
-CREATE INDEX idx_jogos_data_inicio ON jogos(data_inicio);
-CREATE INDEX idx_jogos_numero_jogadores ON jogos(numero_jogadores);
+-- Tabela de monte (peças disponíveis para compra)
+CREATE TABLE monte_partida (
+    id_monte SERIAL PRIMARY KEY,
+    id_partida INTEGER NOT NULL,
+    pecas_restantes INTEGER DEFAULT 0,
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    UNIQUE(id_partida)
+);
 
-CREATE INDEX idx_participantes_usuario ON participantes_jogo(id_usuario);
-CREATE INDEX idx_participantes_jogo ON participantes_jogo(id_jogo);
-CREATE INDEX idx_participantes_pontos ON participantes_jogo(pontos_acumulados);
+-- Estado corrente de cada partida (uma linha por partida), atualizado na
+-- mesma transação de cada jogada/compra: validar uma jogada e mostrar a
+-- mesa viram leituras por chave primária
+CREATE TABLE estado_partida (
+    id_partida INTEGER PRIMARY KEY,
+    extremidade_a INTEGER, -- NULL enquanto a mesa estiver vazia
+    extremidade_b INTEGER,
+    proxima_ordem_jogada INTEGER NOT NULL DEFAULT 1,
+    proximo_turno INTEGER NOT NULL DEFAULT 1,
+    pecas_mesa INTEGER NOT NULL DEFAULT 0,
+    pecas_monte INTEGER NOT NULL DEFAULT 0,
+    jogadores INTEGER[] NOT NULL, -- IDs em ordem de posicao_mesa
+    pecas_mao INTEGER[] NOT NULL, -- peças na mão, alinhado com jogadores
+    jogador_atual INTEGER,
+    ultimo_jogador INTEGER,
+    ultima_peca INTEGER,
+    ultima_jogada TIMESTAMP,
+    FOREIGN KEY (id_partida) REFERENCES partidas(id_partida) ON DELETE CASCADE,
+    FOREIGN KEY (jogador_atual) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (ultimo_jogador) REFERENCES usuarios(id_usuario),
+    FOREIGN KEY (ultima_peca) REFERENCES pecas_domino(id_peca)
+);
 
-CREATE INDEX idx_auditoria_tabela ON log_auditoria(tabela);
-CREATE INDEX idx_auditoria_timestamp ON log_auditoria(timestamp_operacao);
+-- Placar por usuário (uma linha por usuário), mantido pelos triggers de
+-- 05_create_triggers.sql; base da view ranking_usuarios.
+-- reconstruir_ranking() recalcula tudo a partir das tabelas base.
+CREATE TABLE placar_usuarios (
+    id_usuario INTEGER PRIMARY KEY,
+    total_jogos INTEGER NOT NULL DEFAULT 0,
+    jogos_vencidos INTEGER NOT NULL DEFAULT 0,
+    total_partidas INTEGER NOT NULL DEFAULT 0, -- partidas dos jogos em que participa
+    partidas_vencidas INTEGER NOT NULL DEFAULT 0,
+    pontos_totais INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario) ON DELETE CASCADE
+);
+
+-- Índices para otimização
+CREATE INDEX idx_participantes_jogo_usuario ON participantes_jogo(id_usuario);
+CREATE INDEX idx_partidas_jogo ON partidas(id_jogo);
+CREATE INDEX idx_pecas_partida_usuario ON pecas_partida(id_usuario);
+-- Mãos de uma partida (verificação de jogadas e de trancamento)
+CREATE INDEX idx_pecas_partida_mao ON pecas_partida(id_partida, id_usuario) WHERE status = 'na_mao';
+CREATE INDEX idx_mesa_jogo_partida ON mesa_jogo(id_partida);
+CREATE INDEX idx_jogadas_partida ON jogadas(id_partida);
+CREATE INDEX idx_jogadas_usuario ON jogadas(id_usuario);
+CREATE INDEX idx_placar_usuarios_ranking ON placar_usuarios(jogos_vencidos DESC, pontos_totais DESC);
 
 -- =====================================================
--- 4. FUNÇÕES E PROCEDIMENTOS
+-- 3. FUNÇÕES
+-- (origem: sql/03_create_functions.sql)
 -- =====================================================
 
--- Função para validar capacidade do jogo
-CREATE OR REPLACE FUNCTION validar_capacidade_jogo(
-    p_id_jogo INTEGER,
-    p_numero_max INTEGER DEFAULT 4
+-- ============================================
+-- FUNÇÕES DO SISTEMA CAPIVARA GAME
+-- ============================================
+
+-- As três funções abaixo são consultas únicas (set-based): as extremidades
+-- da mesa são lidas uma vez, na CTE (chave primária de estado_partida), e
+-- cruzadas com as mãos em um só join - sem laço por jogador nem consulta
+-- por peça. São chamadas pelo trigger verificar_vitoria_partida a cada
+-- peça jogada.
+
+-- Função para verificar se uma jogada é possível
+CREATE OR REPLACE FUNCTION verificar_jogada_possivel(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER,
+    p_id_peca INTEGER
 ) RETURNS BOOLEAN AS $$
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    )
+    SELECT EXISTS(
+        SELECT 1
+        FROM pecas_partida pp
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
+        AND pp.id_usuario = p_id_usuario
+        AND pp.id_peca = p_id_peca
+        AND pp.status = 'na_mao'
+        -- Mesa vazia: qualquer peça pode ser jogada
+        AND (e.extremidade_a IS NULL OR
+             pd.lado_a IN (e.extremidade_a, e.extremidade_b) OR
+             pd.lado_b IN (e.extremidade_a, e.extremidade_b))
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Função para detectar jogo trancado (nenhuma peça em nenhuma mão encaixa)
+CREATE OR REPLACE FUNCTION detectar_jogo_trancado(p_id_partida INTEGER) 
+RETURNS BOOLEAN AS $$
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    )
+    SELECT NOT EXISTS(
+        SELECT 1
+        FROM pecas_partida pp
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
+        AND pp.status = 'na_mao'
+        AND (e.extremidade_a IS NULL OR
+             pd.lado_a IN (e.extremidade_a, e.extremidade_b) OR
+             pd.lado_b IN (e.extremidade_a, e.extremidade_b))
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Função para obter jogadas possíveis de um usuário
+CREATE OR REPLACE FUNCTION obter_jogadas_possiveis(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER
+) RETURNS TABLE (
+    id_peca INTEGER,
+    lado_a INTEGER,
+    lado_b INTEGER,
+    pode_jogar_esq BOOLEAN,
+    pode_jogar_dir BOOLEAN
+) AS $$
+    WITH extremidades AS (
+        SELECT extremidade_a, extremidade_b
+        FROM estado_partida
+        WHERE id_partida = p_id_partida
+    ),
+    mao AS (
+        SELECT
+            pp.id_peca,
+            pd.lado_a,
+            pd.lado_b,
+            (e.extremidade_a IS NULL OR e.extremidade_a IN (pd.lado_a, pd.lado_b)) AS pode_jogar_esq,
+            (e.extremidade_b IS NULL OR e.extremidade_b IN (pd.lado_a, pd.lado_b)) AS pode_jogar_dir
+        FROM pecas_partida pp
+        JOIN pecas_domino pd ON pd.id_peca = pp.id_peca
+        LEFT JOIN extremidades e ON TRUE
+        WHERE pp.id_partida = p_id_partida
+        AND pp.id_usuario = p_id_usuario
+        AND pp.status = 'na_mao'
+    )
+    SELECT id_peca, lado_a, lado_b, pode_jogar_esq, pode_jogar_dir
+    FROM mao
+    WHERE pode_jogar_esq OR pode_jogar_dir;
+$$ LANGUAGE sql STABLE;
+
+-- Função para calcular pontos na mão de um jogador
+CREATE OR REPLACE FUNCTION calcular_pontos_mao(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    v_total_pontos INTEGER;
+BEGIN
+    SELECT COALESCE(SUM(pd.valor_total), 0) INTO v_total_pontos
+    FROM pecas_partida pp
+    JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
+    WHERE pp.id_partida = p_id_partida
+    AND pp.id_usuario = p_id_usuario
+    AND pp.status = 'na_mao';
+    
+    RETURN v_total_pontos;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Função para obter próximo jogador
+CREATE OR REPLACE FUNCTION obter_proximo_jogador(
+    p_id_partida INTEGER,
+    p_id_usuario_atual INTEGER
+) RETURNS INTEGER AS $$
 DECLARE
-    v_participantes_atual INTEGER;
+    v_id_jogo INTEGER;
+    v_posicao_atual INTEGER;
+    v_proxima_posicao INTEGER;
     v_numero_jogadores INTEGER;
+    v_proximo_usuario INTEGER;
 BEGIN
-    -- Verificar número máximo de jogadores para este jogo
+    -- Obter informações da partida
+    SELECT id_jogo INTO v_id_jogo
+    FROM partidas WHERE id_partida = p_id_partida;
+    
+    -- Obter posição do jogador atual
+    SELECT posicao_mesa INTO v_posicao_atual
+    FROM participantes_jogo 
+    WHERE id_jogo = v_id_jogo AND id_usuario = p_id_usuario_atual;
+    
+    -- Obter número de jogadores
     SELECT numero_jogadores INTO v_numero_jogadores
-    FROM jogos
-    WHERE id_jogo = p_id_jogo;
+    FROM jogos WHERE id_jogo = v_id_jogo;
+    
+    -- Calcular próxima posição (anti-horário)
+    v_proxima_posicao := v_posicao_atual + 1;
+    IF v_proxima_posicao > v_numero_jogadores THEN
+        v_proxima_posicao := 1;
+    END IF;
+    
+    -- Obter usuário da próxima posição
+    SELECT id_usuario INTO v_proximo_usuario
+    FROM participantes_jogo 
+    WHERE id_jogo = v_id_jogo AND posicao_mesa = v_proxima_posicao;
+    
+    RETURN v_proximo_usuario;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- 4. PROCEDIMENTOS
+-- (origem: sql/04_create_procedures.sql)
+-- =====================================================
+
+-- ============================================
+-- PROCEDIMENTOS ARMAZENADOS - CAPIVARA GAME
+-- ============================================
+
+-- Recalcula o estado corrente de uma partida a partir das tabelas base
+-- (ao iniciar a partida e para partidas criadas antes de estado_partida)
+CREATE OR REPLACE FUNCTION reconstruir_estado_partida(p_id_partida INTEGER)
+RETURNS VOID AS $$
+    INSERT INTO estado_partida (
+        id_partida, extremidade_a, extremidade_b, proxima_ordem_jogada, proximo_turno,
+        pecas_mesa, pecas_monte, jogadores, pecas_mao, jogador_atual,
+        ultimo_jogador, ultima_peca, ultima_jogada
+    )
+    SELECT
+        p.id_partida,
+        ultima.extremidade_a,
+        ultima.extremidade_b,
+        COALESCE(ultima.ordem_jogada, 0) + 1,
+        COALESCE(turno.ordem_turno, 0) + 1,
+        (SELECT COUNT(*) FROM mesa_jogo WHERE id_partida = p.id_partida),
+        (SELECT COUNT(*) FROM pecas_partida WHERE id_partida = p.id_partida AND status = 'no_monte'),
+        maos.jogadores,
+        maos.pecas_mao,
+        COALESCE(obter_proximo_jogador(p.id_partida, turno.id_usuario), p.primeiro_jogador),
+        ultima.id_usuario,
+        ultima.id_peca,
+        ultima.timestamp_jogada
+    FROM partidas p
+    CROSS JOIN LATERAL (
+        SELECT
+            ARRAY_AGG(pj.id_usuario ORDER BY pj.posicao_mesa) AS jogadores,
+            ARRAY_AGG((
+                SELECT COUNT(*)::INTEGER FROM pecas_partida pp
+                WHERE pp.id_partida = p.id_partida
+                AND pp.id_usuario = pj.id_usuario
+                AND pp.status = 'na_mao'
+            ) ORDER BY pj.posicao_mesa) AS pecas_mao
+        FROM participantes_jogo pj
+        WHERE pj.id_jogo = p.id_jogo
+    ) maos
+    LEFT JOIN LATERAL (
+        SELECT m.extremidade_a, m.extremidade_b, m.ordem_jogada, m.id_usuario,
+               m.id_peca, m.timestamp_jogada
+        FROM mesa_jogo m
+        WHERE m.id_partida = p.id_partida
+        ORDER BY m.ordem_jogada DESC
+        LIMIT 1
+    ) ultima ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT jg.ordem_turno, jg.id_usuario
+        FROM jogadas jg
+        WHERE jg.id_partida = p.id_partida
+        ORDER BY jg.ordem_turno DESC
+        LIMIT 1
+    ) turno ON TRUE
+    WHERE p.id_partida = p_id_partida
+    ON CONFLICT (id_partida) DO UPDATE SET
+        extremidade_a = EXCLUDED.extremidade_a,
+        extremidade_b = EXCLUDED.extremidade_b,
+        proxima_ordem_jogada = EXCLUDED.proxima_ordem_jogada,
+        proximo_turno = EXCLUDED.proximo_turno,
+        pecas_mesa = EXCLUDED.pecas_mesa,
+        pecas_monte = EXCLUDED.pecas_monte,
+        jogadores = EXCLUDED.jogadores,
+        pecas_mao = EXCLUDED.pecas_mao,
+        jogador_atual = EXCLUDED.jogador_atual,
+        ultimo_jogador = EXCLUDED.ultimo_jogador,
+        ultima_peca = EXCLUDED.ultima_peca,
+        ultima_jogada = EXCLUDED.ultima_jogada;
+$$ LANGUAGE sql;
+
+-- Procedimento para comprar peça do monte
+CREATE OR REPLACE FUNCTION comprar_peca_monte(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER
+) RETURNS TABLE (
+    sucesso BOOLEAN,
+    id_peca_comprada INTEGER,
+    mensagem TEXT
+) AS $$
+DECLARE
+    v_estado estado_partida%ROWTYPE;
+    v_posicao INTEGER;
+    v_peca_disponivel INTEGER;
+BEGIN
+    -- Estado corrente (a trava da linha serializa jogadas e compras da partida)
+    SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    IF NOT FOUND THEN
+        PERFORM reconstruir_estado_partida(p_id_partida);
+        SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    END IF;
+    v_posicao := array_position(v_estado.jogadores, p_id_usuario);
+    
+    IF v_posicao IS NULL THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, 'Jogador não participa da partida'::TEXT;
+        RETURN;
+    END IF;
+    
+    IF v_estado.pecas_monte = 0 THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, 'Monte vazio'::TEXT;
+        RETURN;
+    END IF;
     
-    -- Contar participantes atuais
-    SELECT COUNT(*) INTO v_participantes_atual
-    FROM participantes_jogo
-    WHERE id_jogo = p_id_jogo;
+    -- Pegar uma peça aleatória do monte
+    SELECT id_peca INTO v_peca_disponivel
+    FROM pecas_partida pp
+    WHERE pp.id_partida = p_id_partida 
+    AND pp.status = 'no_monte'
+    ORDER BY RANDOM()
+    LIMIT 1;
+    
+    -- Transferir a peça para o jogador
+    UPDATE pecas_partida 
+    SET id_usuario = p_id_usuario, 
+        status = 'na_mao',
+        posicao_mao = (
+            SELECT COALESCE(MAX(posicao_mao), 0) + 1
+            FROM pecas_partida 
+            WHERE id_partida = p_id_partida 
+            AND id_usuario = p_id_usuario 
+            AND status = 'na_mao'
+        )
+    WHERE id_partida = p_id_partida 
+    AND id_peca = v_peca_disponivel 
+    AND status = 'no_monte';
+    
+    UPDATE estado_partida
+    SET pecas_monte = pecas_monte - 1,
+        pecas_mao[v_posicao] = pecas_mao[v_posicao] + 1
+    WHERE id_partida = p_id_partida;
     
-    -- Retornar se ainda cabe mais jogadores
-    RETURN v_participantes_atual < LEAST(v_numero_jogadores, p_numero_max);
+    -- Atualizar contador do monte
+    UPDATE monte_partida 
+    SET pecas_restantes = pecas_restantes - 1
+    WHERE id_partida = p_id_partida;
+    
+    RETURN QUERY SELECT TRUE, v_peca_disponivel, 'Peça comprada com sucesso'::TEXT;
 END;
 $$ LANGUAGE plpgsql;
 
--- Função para calcular estatísticas de usuário
-CREATE OR REPLACE FUNCTION calcular_estatisticas_usuario(p_id_usuario INTEGER)
-RETURNS TABLE(
-    total_jogos INTEGER,
-    total_pontos INTEGER,
-    media_pontos NUMERIC,
-    jogos_vencidos INTEGER,
-    taxa_vitoria NUMERIC
+-- Procedimento para validar e executar jogada
+CREATE OR REPLACE FUNCTION executar_jogada(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER,
+    p_id_peca INTEGER,
+    p_lado_conectado VARCHAR(10) -- 'esquerda', 'direita'
+) RETURNS TABLE (
+    sucesso BOOLEAN,
+    mensagem TEXT,
+    nova_extremidade_a INTEGER,
+    nova_extremidade_b INTEGER
 ) AS $$
+DECLARE
+    v_estado estado_partida%ROWTYPE;
+    v_posicao INTEGER;
+    v_lado_a INTEGER;
+    v_lado_b INTEGER;
+    v_extremidade_esq INTEGER;
+    v_extremidade_dir INTEGER;
+    v_nova_extremidade_a INTEGER;
+    v_nova_extremidade_b INTEGER;
 BEGIN
-    RETURN QUERY
-    SELECT 
-        COUNT(DISTINCT p.id_jogo)::INTEGER as total_jogos,
-        COALESCE(SUM(p.pontos_acumulados), 0)::INTEGER as total_pontos,
-        ROUND(AVG(p.pontos_acumulados), 2) as media_pontos,
-        COUNT(DISTINCT j.id_jogo) FILTER (WHERE j.vencedor_id = p_id_usuario)::INTEGER as jogos_vencidos,
-        CASE 
-            WHEN COUNT(DISTINCT p.id_jogo) > 0 THEN 
-                ROUND((COUNT(DISTINCT j.id_jogo) FILTER (WHERE j.vencedor_id = p_id_usuario) * 100.0) / COUNT(DISTINCT p.id_jogo), 2)
-            ELSE 0
-        END as taxa_vitoria
-    FROM participantes_jogo p
-    LEFT JOIN jogos j ON p.id_jogo = j.id_jogo
-    WHERE p.id_usuario = p_id_usuario;
+    -- Estado corrente (a trava da linha serializa jogadas e compras da partida)
+    SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    IF NOT FOUND THEN
+        PERFORM reconstruir_estado_partida(p_id_partida);
+        SELECT * INTO v_estado FROM estado_partida WHERE id_partida = p_id_partida FOR UPDATE;
+    END IF;
+    v_posicao := array_position(v_estado.jogadores, p_id_usuario);
+    v_extremidade_esq := v_estado.extremidade_a;
+    v_extremidade_dir := v_estado.extremidade_b;
+    
+    -- Obter dados da peça
+    SELECT lado_a, lado_b INTO v_lado_a, v_lado_b
+    FROM pecas_domino WHERE id_peca = p_id_peca;
+    
+    -- Verificar se a peça encaixa em alguma extremidade (mesa vazia: qualquer uma)
+    IF v_posicao IS NULL OR v_lado_a IS NULL OR NOT (
+        v_extremidade_esq IS NULL OR
+        v_extremidade_esq IN (v_lado_a, v_lado_b) OR
+        v_extremidade_dir IN (v_lado_a, v_lado_b)
+    ) THEN
+        RETURN QUERY SELECT FALSE, 'Jogada não é possível'::TEXT, NULL::INTEGER, NULL::INTEGER;
+        RETURN;
+    END IF;
+    
+    -- Remover peça da mão do jogador (sem linha atualizada = não tinha a peça)
+    UPDATE pecas_partida 
+    SET status = 'jogada'
+    WHERE id_partida = p_id_partida 
+    AND id_usuario = p_id_usuario 
+    AND id_peca = p_id_peca
+    AND status = 'na_mao';
+    
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT FALSE, 'Jogada não é possível'::TEXT, NULL::INTEGER, NULL::INTEGER;
+        RETURN;
+    END IF;
+    
+    -- Se é a primeira peça
+    IF v_extremidade_esq IS NULL THEN
+        v_nova_extremidade_a := v_lado_a;
+        v_nova_extremidade_b := v_lado_b;
+        p_lado_conectado := 'inicial';
+    ELSE
+        -- Calcular novas extremidades baseado no lado de conexão
+        IF p_lado_conectado = 'esquerda' THEN
+            -- Conectar na extremidade esquerda
+            IF v_lado_a = v_extremidade_esq THEN
+                v_nova_extremidade_a := v_lado_b;
+            ELSE
+                v_nova_extremidade_a := v_lado_a;
+            END IF;
+            v_nova_extremidade_b := v_extremidade_dir;
+        ELSE
+            -- Conectar na extremidade direita
+            v_nova_extremidade_a := v_extremidade_esq;
+            IF v_lado_a = v_extremidade_dir THEN
+                v_nova_extremidade_b := v_lado_b;
+            ELSE
+                v_nova_extremidade_b := v_lado_a;
+            END IF;
+        END IF;
+    END IF;
+    
+    -- Inserir na mesa
+    INSERT INTO mesa_jogo (
+        id_partida, id_peca, id_usuario, ordem_jogada, 
+        lado_conectado, extremidade_a, extremidade_b
+    ) VALUES (
+        p_id_partida, p_id_peca, p_id_usuario, v_estado.proxima_ordem_jogada,
+        p_lado_conectado, v_nova_extremidade_a, v_nova_extremidade_b
+    );
+    
+    -- Atualizar o estado antes de registrar a jogada: o trigger
+    -- verificar_vitoria_partida já lê as novas extremidades e mãos
+    UPDATE estado_partida
+    SET extremidade_a = v_nova_extremidade_a,
+        extremidade_b = v_nova_extremidade_b,
+        proxima_ordem_jogada = proxima_ordem_jogada + 1,
+        proximo_turno = proximo_turno + 1,
+        pecas_mesa = pecas_mesa + 1,
+        pecas_mao[v_posicao] = pecas_mao[v_posicao] - 1,
+        jogador_atual = jogadores[v_posicao % array_length(jogadores, 1) + 1],
+        ultimo_jogador = p_id_usuario,
+        ultima_peca = p_id_peca,
+        ultima_jogada = CURRENT_TIMESTAMP
+    WHERE id_partida = p_id_partida;
+    
+    -- Registrar jogada
+    INSERT INTO jogadas (id_partida, id_usuario, ordem_turno, tipo_jogada, id_peca)
+    VALUES (p_id_partida, p_id_usuario, v_estado.proximo_turno, 'jogou_peca', p_id_peca);
+    
+    RETURN QUERY SELECT TRUE, 'Jogada executada com sucesso'::TEXT, 
+                       v_nova_extremidade_a, v_nova_extremidade_b;
 END;
 $$ LANGUAGE plpgsql;
 
--- Procedimento para finalizar jogo automaticamente
-CREATE OR REPLACE PROCEDURE finalizar_jogo(
+-- Procedimento para passar a vez (sem jogada possível e sem monte)
+CREATE OR REPLACE FUNCTION passar_vez(p_id_partida INTEGER, p_id_usuario INTEGER)
+RETURNS VOID AS $$
+    WITH estado AS (
+        UPDATE estado_partida
+        SET proximo_turno = proximo_turno + 1,
+            jogador_atual = jogadores[array_position(jogadores, p_id_usuario) % array_length(jogadores, 1) + 1]
+        WHERE id_partida = p_id_partida
+        RETURNING proximo_turno - 1 AS ordem_turno
+    )
+    INSERT INTO jogadas (id_partida, id_usuario, ordem_turno, tipo_jogada)
+    SELECT p_id_partida, p_id_usuario, ordem_turno, 'passou'
+    FROM estado;
+$$ LANGUAGE sql;
+
+-- Procedimento para iniciar nova partida
+-- Embaralha as 28 peças uma única vez e grava partida, mãos, monte e estado
+-- em um único comando. A posição k de jogador (ordem de posicao_mesa)
+-- recebe as peças k*7+1 a k*7+7 do baralho e o restante vai para o monte.
+-- p_pecas permite informar a ordem do baralho (id_peca) gerada fora do
+-- banco (capivara_domino.gerar_distribuicoes); NULL embaralha aqui.
+DROP FUNCTION IF EXISTS iniciar_partida(INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION iniciar_partida(
     p_id_jogo INTEGER,
-    p_pontos_meta INTEGER DEFAULT 50
+    p_numero_partida INTEGER,
+    p_pecas INTEGER[] DEFAULT NULL
 )
-LANGUAGE plpgsql AS $$
+RETURNS TABLE (
+    sucesso BOOLEAN,
+    id_partida_criada INTEGER,
+    primeiro_jogador INTEGER,
+    mensagem TEXT
+) AS $$
 DECLARE
-    v_vencedor_id INTEGER;
-    v_max_pontos INTEGER;
-    v_participantes_count INTEGER;
+    v_id_partida INTEGER;
+    v_primeiro_jogador INTEGER;
 BEGIN
-    -- Verificar se o jogo existe e não está finalizado
-    IF NOT EXISTS (SELECT 1 FROM jogos WHERE id_jogo = p_id_jogo AND status = 'em_andamento') THEN
-        RAISE EXCEPTION 'Jogo % não existe ou já foi finalizado', p_id_jogo;
+    IF NOT EXISTS(SELECT 1 FROM participantes_jogo WHERE id_jogo = p_id_jogo) THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, NULL::INTEGER, 'Jogo sem participantes'::TEXT;
+        RETURN;
     END IF;
     
-    -- Verificar se há participantes
-    SELECT COUNT(*) INTO v_participantes_count
-    FROM participantes_jogo
-    WHERE id_jogo = p_id_jogo;
-    
-    IF v_participantes_count = 0 THEN
-        RAISE EXCEPTION 'Jogo % não possui participantes', p_id_jogo;
+    IF p_pecas IS NOT NULL AND (
+        SELECT COUNT(DISTINCT pd.id_peca) FROM pecas_domino pd WHERE pd.id_peca = ANY(p_pecas)
+    ) <> 28 THEN
+        RETURN QUERY SELECT FALSE, NULL::INTEGER, NULL::INTEGER, 'Ordem de peças inválida'::TEXT;
+        RETURN;
     END IF;
     
-    -- Encontrar o vencedor (maior pontuação)
-    SELECT p.id_usuario, p.pontos_acumulados
-    INTO v_vencedor_id, v_max_pontos
-    FROM participantes_jogo p
-    WHERE p.id_jogo = p_id_jogo
-    ORDER BY p.pontos_acumulados DESC, p.data_entrada ASC
-    LIMIT 1;
+    WITH jogadores AS (
+        SELECT pj.id_usuario, ROW_NUMBER() OVER (ORDER BY pj.posicao_mesa) - 1 AS posicao
+        FROM participantes_jogo pj
+        WHERE pj.id_jogo = p_id_jogo
+    ),
+    distribuicao AS MATERIALIZED (
+        SELECT baralho.id_peca, baralho.e_66, j.id_usuario,
+               CASE WHEN j.id_usuario IS NULL THEN NULL ELSE baralho.ordem % 7 + 1 END AS posicao_mao,
+               CASE WHEN j.id_usuario IS NULL THEN 'no_monte' ELSE 'na_mao' END AS status
+        FROM (
+            SELECT pd.id_peca, (pd.lado_a = 6 AND pd.lado_b = 6) AS e_66,
+                   ROW_NUMBER() OVER (
+                       ORDER BY COALESCE(array_position(p_pecas, pd.id_peca)::DOUBLE PRECISION, RANDOM())
+                   ) - 1 AS ordem
+            FROM pecas_domino pd
+        ) baralho
+        LEFT JOIN jogadores j ON j.posicao = baralho.ordem / 7
+    ),
+    partida AS (
+        -- Quem recebeu o 6-6 começa; sem 6-6 distribuído, sorteia
+        INSERT INTO partidas (id_jogo, numero_partida, primeiro_jogador)
+        SELECT p_id_jogo, p_numero_partida, COALESCE(
+            (SELECT d.id_usuario FROM distribuicao d WHERE d.e_66 AND d.id_usuario IS NOT NULL),
+            (SELECT j.id_usuario FROM jogadores j ORDER BY RANDOM() LIMIT 1)
+        )
+        RETURNING partidas.id_partida, partidas.primeiro_jogador AS id_primeiro
+    ),
+    maos AS (
+        INSERT INTO pecas_partida (id_partida, id_peca, id_usuario, posicao_mao, status)
+        SELECT pt.id_partida, d.id_peca, d.id_usuario, d.posicao_mao, d.status
+        FROM distribuicao d CROSS JOIN partida pt
+    ),
+    monte AS (
+        INSERT INTO monte_partida (id_partida, pecas_restantes)
+        SELECT pt.id_partida, (SELECT COUNT(*) FROM distribuicao d WHERE d.status = 'no_monte')
+        FROM partida pt
+        WHERE EXISTS(SELECT 1 FROM distribuicao d WHERE d.status = 'no_monte')
+    ),
+    estado AS (
+        INSERT INTO estado_partida (id_partida, pecas_monte, jogadores, pecas_mao, jogador_atual)
+        SELECT pt.id_partida,
+               (SELECT COUNT(*) FROM distribuicao d WHERE d.status = 'no_monte'),
+               (SELECT ARRAY_AGG(j.id_usuario ORDER BY j.posicao) FROM jogadores j),
+               (SELECT ARRAY_AGG(m.total ORDER BY m.posicao) FROM (
+                    SELECT j.posicao, COUNT(d.id_peca)::INTEGER AS total
+                    FROM jogadores j
+                    LEFT JOIN distribuicao d ON d.id_usuario = j.id_usuario
+                    GROUP BY j.posicao
+               ) m),
+               pt.id_primeiro
+        FROM partida pt
+    )
+    SELECT pt.id_partida, pt.id_primeiro INTO v_id_partida, v_primeiro_jogador
+    FROM partida pt;
+    
+    RETURN QUERY SELECT TRUE, v_id_partida, v_primeiro_jogador, 'Partida iniciada com sucesso'::TEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reconstrução completa do placar (ranking) a partir das tabelas base.
+-- O dia a dia é feito pelos triggers; use após cargas externas ou para
+-- preencher o placar de um banco criado antes da tabela existir.
+CREATE OR REPLACE FUNCTION reconstruir_ranking()
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    LOCK TABLE placar_usuarios IN EXCLUSIVE MODE;
+    DELETE FROM placar_usuarios;
     
-    -- Atualizar o jogo
-    UPDATE jogos 
-    SET status = 'finalizado',
-        data_fim = CURRENT_TIMESTAMP,
-        vencedor_id = v_vencedor_id
-    WHERE id_jogo = p_id_jogo;
+    INSERT INTO placar_usuarios (
+        id_usuario, total_jogos, jogos_vencidos, total_partidas, partidas_vencidas, pontos_totais
+    )
+    SELECT
+        u.id_usuario,
+        COALESCE(part.total_jogos, 0),
+        COALESCE(vj.jogos_vencidos, 0),
+        COALESCE(part.total_partidas, 0),
+        COALESCE(vp.partidas_vencidas, 0),
+        COALESCE(part.pontos_totais, 0)
+    FROM usuarios u
+    LEFT JOIN (
+        SELECT pj.id_usuario,
+               COUNT(*) AS total_jogos,
+               SUM(COALESCE(np.partidas, 0)) AS total_partidas,
+               SUM(COALESCE(pj.pontuacao_total, 0)) AS pontos_totais
+        FROM participantes_jogo pj
+        LEFT JOIN (
+            SELECT id_jogo, COUNT(*) AS partidas FROM partidas GROUP BY id_jogo
+        ) np ON np.id_jogo = pj.id_jogo
+        GROUP BY pj.id_usuario
+    ) part ON part.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT vencedor_jogo AS id_usuario, COUNT(*) AS jogos_vencidos
+        FROM jogos WHERE vencedor_jogo IS NOT NULL
+        GROUP BY vencedor_jogo
+    ) vj ON vj.id_usuario = u.id_usuario
+    LEFT JOIN (
+        SELECT vencedor_partida AS id_usuario, COUNT(*) AS partidas_vencidas
+        FROM partidas WHERE vencedor_partida IS NOT NULL
+        GROUP BY vencedor_partida
+    ) vp ON vp.id_usuario = u.id_usuario;
     
-    RAISE NOTICE 'Jogo % finalizado. Vencedor: usuário % com % pontos', p_id_jogo, v_vencedor_id, v_max_pontos;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
 END;
-$$;
+$$ LANGUAGE plpgsql;
 
 -- =====================================================
--- 5. TRIGGERS DE INTEGRIDADE E AUDITORIA
+-- 5. TRIGGERS
+-- (origem: sql/05_create_triggers.sql)
 -- =====================================================
 
--- Função de trigger para auditoria
-CREATE OR REPLACE FUNCTION trigger_auditoria() RETURNS TRIGGER AS $$
+-- ============================================
+-- TRIGGERS - CAPIVARA GAME
+-- ============================================
+
+-- Trigger para calcular pontos automaticamente ao finalizar partida
+CREATE OR REPLACE FUNCTION calcular_pontos_partida()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_id_jogo INTEGER;
+    v_numero_jogadores INTEGER;
+    v_pontos_adversarios INTEGER := 0;
+    v_pontos_dupla1 INTEGER := 0;
+    v_pontos_dupla2 INTEGER := 0;
+    v_dupla_vencedora INTEGER;
+    v_usuario RECORD;
 BEGIN
-    IF TG_OP = 'INSERT' THEN
-        INSERT INTO log_auditoria (tabela, operacao, dados_depois)
-        VALUES (TG_TABLE_NAME, TG_OP, row_to_json(NEW));
-        RETURN NEW;
-    ELSIF TG_OP = 'UPDATE' THEN
-        INSERT INTO log_auditoria (tabela, operacao, dados_antes, dados_depois)
-        VALUES (TG_TABLE_NAME, TG_OP, row_to_json(OLD), row_to_json(NEW));
-        RETURN NEW;
-    ELSIF TG_OP = 'DELETE' THEN
-        INSERT INTO log_auditoria (tabela, operacao, dados_antes)
-        VALUES (TG_TABLE_NAME, TG_OP, row_to_json(OLD));
-        RETURN OLD;
+    -- Só executar quando status muda para 'finalizada'
+    IF NEW.status = 'finalizada' AND OLD.status != 'finalizada' THEN
+        
+        SELECT p.id_jogo, j.numero_jogadores INTO v_id_jogo, v_numero_jogadores
+        FROM partidas p JOIN jogos j ON p.id_jogo = j.id_jogo
+        WHERE p.id_partida = NEW.id_partida;
+        
+        -- Para jogos de 2-3 jogadores
+        IF v_numero_jogadores <= 3 THEN
+            -- Calcular pontos dos adversários
+            SELECT COALESCE(SUM(calcular_pontos_mao(NEW.id_partida, pj.id_usuario)), 0) 
+            INTO v_pontos_adversarios
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = v_id_jogo 
+            AND pj.id_usuario != NEW.vencedor_partida;
+            
+            -- Atualizar pontos do vencedor
+            NEW.pontos_vencedor := v_pontos_adversarios;
+            
+            -- Atualizar pontuação total do jogador
+            UPDATE participantes_jogo 
+            SET pontuacao_total = pontuacao_total + v_pontos_adversarios
+            WHERE id_jogo = v_id_jogo AND id_usuario = NEW.vencedor_partida;
+            
+        -- Para jogos de 4 jogadores (duplas)
+        ELSE
+            -- Calcular pontos de cada dupla
+            SELECT COALESCE(SUM(calcular_pontos_mao(NEW.id_partida, pj.id_usuario)), 0) 
+            INTO v_pontos_dupla1
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = v_id_jogo AND pj.dupla = 1;
+            
+            SELECT COALESCE(SUM(calcular_pontos_mao(NEW.id_partida, pj.id_usuario)), 0) 
+            INTO v_pontos_dupla2
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = v_id_jogo AND pj.dupla = 2;
+            
+            -- Determinar dupla vencedora
+            IF NEW.tipo_vitoria = 'batida' THEN
+                -- Quem bateu leva todos os pontos dos adversários
+                SELECT dupla INTO v_dupla_vencedora
+                FROM participantes_jogo 
+                WHERE id_jogo = v_id_jogo AND id_usuario = NEW.vencedor_partida;
+                
+                IF v_dupla_vencedora = 1 THEN
+                    v_pontos_adversarios := v_pontos_dupla2;
+                ELSE
+                    v_pontos_adversarios := v_pontos_dupla1;
+                END IF;
+                
+            ELSE -- trancamento
+                -- Dupla com menos pontos ganha os pontos da outra dupla
+                IF v_pontos_dupla1 < v_pontos_dupla2 THEN
+                    v_dupla_vencedora := 1;
+                    v_pontos_adversarios := v_pontos_dupla2;
+                ELSIF v_pontos_dupla2 < v_pontos_dupla1 THEN
+                    v_dupla_vencedora := 2;
+                    v_pontos_adversarios := v_pontos_dupla1;
+                ELSE
+                    -- Empate: quem trancou perde
+                    SELECT dupla INTO v_dupla_vencedora
+                    FROM participantes_jogo 
+                    WHERE id_jogo = v_id_jogo AND id_usuario != NEW.vencedor_partida
+                    LIMIT 1;
+                    
+                    IF v_dupla_vencedora = 1 THEN
+                        v_pontos_adversarios := v_pontos_dupla2;
+                    ELSE
+                        v_pontos_adversarios := v_pontos_dupla1;
+                    END IF;
+                END IF;
+            END IF;
+            
+            -- Atualizar pontos dos vencedores
+            UPDATE participantes_jogo 
+            SET pontuacao_total = pontuacao_total + v_pontos_adversarios
+            WHERE id_jogo = v_id_jogo AND dupla = v_dupla_vencedora;
+            
+            NEW.pontos_vencedor := v_pontos_adversarios;
+        END IF;
+        
+        -- Verificar se o jogo chegou ao fim (50 pontos)
+        IF EXISTS(
+            SELECT 1 FROM participantes_jogo 
+            WHERE id_jogo = v_id_jogo AND pontuacao_total >= 50
+        ) THEN
+            UPDATE jogos 
+            SET status = 'finalizado', 
+                data_fim = CURRENT_TIMESTAMP,
+                vencedor_jogo = (
+                    SELECT id_usuario FROM participantes_jogo 
+                    WHERE id_jogo = v_id_jogo 
+                    ORDER BY pontuacao_total DESC 
+                    LIMIT 1
+                )
+            WHERE id_jogo = v_id_jogo;
+        END IF;
     END IF;
-    RETURN NULL;
+    
+    RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
--- Função para validar participantes
-CREATE OR REPLACE FUNCTION validar_participantes() RETURNS TRIGGER AS $$
+CREATE TRIGGER trigger_calcular_pontos_partida
+    BEFORE UPDATE ON partidas
+    FOR EACH ROW
+    EXECUTE FUNCTION calcular_pontos_partida();
+
+-- Trigger para verificar vitória automaticamente
+CREATE OR REPLACE FUNCTION verificar_vitoria_partida()
+RETURNS TRIGGER AS $$
 DECLARE
-    v_numero_jogadores INTEGER;
-    v_participantes_atual INTEGER;
+    v_pecas_restantes INTEGER;
+    v_jogo_trancado BOOLEAN;
 BEGIN
-    -- Obter número máximo de jogadores para este jogo
-    SELECT numero_jogadores INTO v_numero_jogadores
-    FROM jogos
-    WHERE id_jogo = NEW.id_jogo;
+    IF NEW.tipo_jogada = 'jogou_peca' THEN
+        -- Verificar se o jogador ficou sem peças (batida)
+        SELECT e.pecas_mao[array_position(e.jogadores, NEW.id_usuario)] INTO v_pecas_restantes
+        FROM estado_partida e
+        WHERE e.id_partida = NEW.id_partida;
+        
+        -- Jogada registrada fora de executar_jogada: conta nas tabelas base
+        IF v_pecas_restantes IS NULL THEN
+            SELECT COUNT(*) INTO v_pecas_restantes
+            FROM pecas_partida 
+            WHERE id_partida = NEW.id_partida 
+            AND id_usuario = NEW.id_usuario 
+            AND status = 'na_mao';
+        END IF;
+        
+        IF v_pecas_restantes = 0 THEN
+            -- Jogador bateu
+            UPDATE partidas 
+            SET status = 'finalizada',
+                data_fim = CURRENT_TIMESTAMP,
+                vencedor_partida = NEW.id_usuario,
+                tipo_vitoria = 'batida'
+            WHERE id_partida = NEW.id_partida;
+        ELSE
+            -- Verificar se o jogo está trancado
+            SELECT detectar_jogo_trancado(NEW.id_partida) INTO v_jogo_trancado;
+            
+            IF v_jogo_trancado THEN
+                UPDATE partidas 
+                SET status = 'finalizada',
+                    data_fim = CURRENT_TIMESTAMP,
+                    vencedor_partida = NEW.id_usuario,
+                    tipo_vitoria = 'trancamento'
+                WHERE id_partida = NEW.id_partida;
+            END IF;
+        END IF;
+    END IF;
     
-    -- Contar participantes atuais (incluindo o novo)
-    SELECT COUNT(*) INTO v_participantes_atual
-    FROM participantes_jogo
-    WHERE id_jogo = NEW.id_jogo;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_verificar_vitoria
+    AFTER INSERT ON jogadas
+    FOR EACH ROW
+    EXECUTE FUNCTION verificar_vitoria_partida();
+
+-- Trigger para atualizar último acesso do usuário
+CREATE OR REPLACE FUNCTION atualizar_ultimo_acesso()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE usuarios 
+    SET data_ultimo_acesso = CURRENT_TIMESTAMP
+    WHERE id_usuario = NEW.id_usuario;
     
-    -- Validar se não excede o limite
-    IF v_participantes_atual >= v_numero_jogadores THEN
-        RAISE EXCEPTION 'Jogo % já possui o número máximo de participantes (%)', NEW.id_jogo, v_numero_jogadores;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_ultimo_acesso_jogadas
+    AFTER INSERT ON jogadas
+    FOR EACH ROW
+    EXECUTE FUNCTION atualizar_ultimo_acesso();
+
+-- ============================================
+-- PLACAR (ranking materializado em placar_usuarios)
+-- Cada trigger aplica só a diferença causada pela linha alterada.
+-- ============================================
+
+-- Soma variações no placar de um usuário (cria a linha se não existir)
+CREATE OR REPLACE FUNCTION somar_placar(
+    p_id_usuario INTEGER,
+    p_jogos INTEGER,
+    p_jogos_vencidos INTEGER,
+    p_partidas INTEGER,
+    p_partidas_vencidas INTEGER,
+    p_pontos INTEGER
+) RETURNS VOID AS $$
+    INSERT INTO placar_usuarios AS pl (
+        id_usuario, total_jogos, jogos_vencidos, total_partidas, partidas_vencidas, pontos_totais
+    )
+    SELECT p_id_usuario, p_jogos, p_jogos_vencidos, p_partidas, p_partidas_vencidas, p_pontos
+    WHERE p_id_usuario IS NOT NULL
+    ON CONFLICT (id_usuario) DO UPDATE SET
+        total_jogos = pl.total_jogos + EXCLUDED.total_jogos,
+        jogos_vencidos = pl.jogos_vencidos + EXCLUDED.jogos_vencidos,
+        total_partidas = pl.total_partidas + EXCLUDED.total_partidas,
+        partidas_vencidas = pl.partidas_vencidas + EXCLUDED.partidas_vencidas,
+        pontos_totais = pl.pontos_totais + EXCLUDED.pontos_totais;
+$$ LANGUAGE sql;
+
+-- Todo usuário novo entra no placar zerado
+CREATE OR REPLACE FUNCTION placar_novo_usuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO placar_usuarios (id_usuario) VALUES (NEW.id_usuario)
+    ON CONFLICT (id_usuario) DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_placar_usuario
+    AFTER INSERT ON usuarios
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_novo_usuario();
+
+-- Participação: jogos, partidas do jogo e pontuação acumulada
+CREATE OR REPLACE FUNCTION placar_participantes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.id_usuario = OLD.id_usuario AND NEW.id_jogo = OLD.id_jogo THEN
+        -- Caso comum: calcular_pontos_partida atualizando a pontuação
+        PERFORM somar_placar(NEW.id_usuario, 0, 0, 0, 0,
+                             COALESCE(NEW.pontuacao_total, 0) - COALESCE(OLD.pontuacao_total, 0));
+        RETURN NULL;
     END IF;
     
-    -- Validar se o jogo não está finalizado
-    IF EXISTS (SELECT 1 FROM jogos WHERE id_jogo = NEW.id_jogo AND status != 'em_andamento') THEN
-        RAISE EXCEPTION 'Não é possível adicionar participantes a um jogo finalizado';
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM somar_placar(OLD.id_usuario, -1, 0,
+                             -(SELECT COUNT(*)::INTEGER FROM partidas WHERE id_jogo = OLD.id_jogo),
+                             0, -COALESCE(OLD.pontuacao_total, 0));
     END IF;
-    
-    RETURN NEW;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM somar_placar(NEW.id_usuario, 1, 0,
+                             (SELECT COUNT(*)::INTEGER FROM partidas WHERE id_jogo = NEW.id_jogo),
+                             0, COALESCE(NEW.pontuacao_total, 0));
+    END IF;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Criação dos triggers
-CREATE TRIGGER trg_usuarios_audit
-    AFTER INSERT OR UPDATE OR DELETE ON usuarios
-    FOR EACH ROW EXECUTE FUNCTION trigger_auditoria();
+CREATE TRIGGER trigger_placar_participantes
+    AFTER INSERT OR DELETE OR UPDATE OF id_usuario, id_jogo, pontuacao_total ON participantes_jogo
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_participantes();
+
+-- Partidas: total de partidas dos participantes e partidas vencidas
+CREATE OR REPLACE FUNCTION placar_partidas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF TG_OP = 'DELETE' OR NEW.id_jogo <> OLD.id_jogo THEN
+            UPDATE placar_usuarios pl
+            SET total_partidas = pl.total_partidas - 1
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = OLD.id_jogo AND pj.id_usuario = pl.id_usuario;
+        END IF;
+        IF TG_OP = 'DELETE' OR NEW.vencedor_partida IS DISTINCT FROM OLD.vencedor_partida THEN
+            PERFORM somar_placar(OLD.vencedor_partida, 0, 0, 0, -1, 0);
+        END IF;
+    END IF;
+    
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' OR NEW.id_jogo <> OLD.id_jogo THEN
+            UPDATE placar_usuarios pl
+            SET total_partidas = pl.total_partidas + 1
+            FROM participantes_jogo pj
+            WHERE pj.id_jogo = NEW.id_jogo AND pj.id_usuario = pl.id_usuario;
+        END IF;
+        IF TG_OP = 'INSERT' OR NEW.vencedor_partida IS DISTINCT FROM OLD.vencedor_partida THEN
+            PERFORM somar_placar(NEW.vencedor_partida, 0, 0, 0, 1, 0);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
 
-CREATE TRIGGER trg_jogos_audit
-    AFTER INSERT OR UPDATE OR DELETE ON jogos
-    FOR EACH ROW EXECUTE FUNCTION trigger_auditoria();
+CREATE TRIGGER trigger_placar_partidas
+    AFTER INSERT OR DELETE OR UPDATE OF id_jogo, vencedor_partida ON partidas
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_partidas();
 
-CREATE TRIGGER trg_participantes_audit
-    AFTER INSERT OR UPDATE OR DELETE ON participantes_jogo
-    FOR EACH ROW EXECUTE FUNCTION trigger_auditoria();
+-- Jogos: jogos vencidos (vencedor_jogo é definido na finalização)
+CREATE OR REPLACE FUNCTION placar_jogos()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF TG_OP = 'DELETE' OR NEW.vencedor_jogo IS DISTINCT FROM OLD.vencedor_jogo THEN
+            PERFORM somar_placar(OLD.vencedor_jogo, 0, -1, 0, 0, 0);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' OR NEW.vencedor_jogo IS DISTINCT FROM OLD.vencedor_jogo THEN
+            PERFORM somar_placar(NEW.vencedor_jogo, 0, 1, 0, 0, 0);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
 
-CREATE TRIGGER trg_validar_participantes
-    BEFORE INSERT ON participantes_jogo
-    FOR EACH ROW EXECUTE FUNCTION validar_participantes();
+CREATE TRIGGER trigger_placar_jogos
+    AFTER INSERT OR DELETE OR UPDATE OF vencedor_jogo ON jogos
+    FOR EACH ROW
+    EXECUTE FUNCTION placar_jogos();
 
 -- =====================================================
--- 6. VIEWS ÚTEIS
+-- 6. VIEWS
+-- (origem: sql/06_create_views.sql)
 -- =====================================================
 
--- View com estatísticas de usuários
-CREATE VIEW v_estatisticas_usuarios AS
+-- ============================================
+-- VIEWS - CAPIVARA GAME
+-- ============================================
+
+-- View: Ranking de pontuação por usuário
+-- Lê o placar mantido pelos triggers (uma linha por usuário); o ORDER BY
+-- segue o índice idx_placar_usuarios_ranking
+CREATE OR REPLACE VIEW ranking_usuarios AS
 SELECT 
     u.id_usuario,
     u.nome_usuario,
     u.nome_completo,
-    u.email,
-    u.data_cadastro,
-    COALESCE(COUNT(DISTINCT p.id_jogo), 0) as total_jogos,
-    COALESCE(SUM(p.pontos_acumulados), 0) as pontos_totais,
-    COALESCE(ROUND(AVG(p.pontos_acumulados), 2), 0) as media_pontos,
-    COALESCE(COUNT(DISTINCT j.id_jogo) FILTER (WHERE j.vencedor_id = u.id_usuario), 0) as jogos_vencidos,
-    CASE 
-        WHEN COUNT(DISTINCT p.id_jogo) > 0 THEN 
-            ROUND((COUNT(DISTINCT j.id_jogo) FILTER (WHERE j.vencedor_id = u.id_usuario) * 100.0) / COUNT(DISTINCT p.id_jogo), 2)
-        ELSE 0
-    END as taxa_vitoria_pct
-FROM usuarios u
-LEFT JOIN participantes_jogo p ON u.id_usuario = p.id_usuario
-LEFT JOIN jogos j ON p.id_jogo = j.id_jogo
+    pl.total_jogos::BIGINT as total_jogos_participados,
+    pl.jogos_vencidos::BIGINT as jogos_vencidos,
+    pl.partidas_vencidas::BIGINT as partidas_vencidas,
+    pl.pontos_totais::BIGINT as pontos_totais_acumulados,
+    ROUND(
+        CASE WHEN pl.total_jogos > 0 
+        THEN pl.jogos_vencidos::DECIMAL / pl.total_jogos * 100 
+        ELSE 0 END, 2
+    ) as percentual_vitorias_jogos,
+    ROUND(
+        CASE WHEN pl.total_partidas > 0 
+        THEN pl.partidas_vencidas::DECIMAL / pl.total_partidas * 100 
+        ELSE 0 END, 2
+    ) as percentual_vitorias_partidas,
+    u.data_ultimo_acesso
+FROM placar_usuarios pl
+JOIN usuarios u ON pl.id_usuario = u.id_usuario
 WHERE u.ativo = TRUE
-GROUP BY u.id_usuario, u.nome_usuario, u.nome_completo, u.email, u.data_cadastro
-ORDER BY pontos_totais DESC;
+ORDER BY pl.jogos_vencidos DESC, pl.pontos_totais DESC;
 
--- View com detalhes dos jogos
-CREATE VIEW v_detalhes_jogos AS
+-- View: Listagem de jogos e vencedores
+-- Partidas e participantes em subconsultas por jogo (sem multiplicar linhas)
+CREATE OR REPLACE VIEW listagem_jogos AS
 SELECT 
     j.id_jogo,
-    j.numero_jogadores,
     j.data_inicio,
     j.data_fim,
+    j.numero_jogadores,
+    j.pontuacao_meta,
     j.status,
-    j.pontos_meta,
-    v.nome_completo as vencedor_nome,
-    COUNT(p.id_participante) as participantes_atual,
-    COALESCE(MAX(p.pontos_acumulados), 0) as maior_pontuacao,
-    EXTRACT(EPOCH FROM (COALESCE(j.data_fim, CURRENT_TIMESTAMP) - j.data_inicio))/60 as duracao_minutos
+    u_vencedor.nome_usuario as vencedor,
+    u_vencedor.nome_completo as nome_completo_vencedor,
+    (SELECT COUNT(*) FROM partidas p WHERE p.id_jogo = j.id_jogo) as total_partidas,
+    CASE 
+        WHEN j.numero_jogadores = 4 THEN 'Duplas'
+        ELSE 'Individual'
+    END as tipo_jogo,
+    CASE 
+        WHEN j.status = 'finalizado' THEN 
+            EXTRACT(EPOCH FROM (j.data_fim - j.data_inicio)) / 60
+        ELSE 
+            EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - j.data_inicio)) / 60
+    END as duracao_minutos,
+    (SELECT STRING_AGG(u_participante.nome_usuario, ', ' ORDER BY u_participante.nome_usuario)
+     FROM participantes_jogo pj
+     JOIN usuarios u_participante ON pj.id_usuario = u_participante.id_usuario
+     WHERE pj.id_jogo = j.id_jogo) as participantes
 FROM jogos j
-LEFT JOIN usuarios v ON j.vencedor_id = v.id_usuario
-LEFT JOIN participantes_jogo p ON j.id_jogo = p.id_jogo
-GROUP BY j.id_jogo, j.numero_jogadores, j.data_inicio, j.data_fim, j.status, j.pontos_meta, v.nome_completo
+LEFT JOIN usuarios u_vencedor ON j.vencedor_jogo = u_vencedor.id_usuario
 ORDER BY j.data_inicio DESC;
 
--- View de ranking geral
-CREATE VIEW v_ranking_geral AS
+-- View: Histórico detalhado de partidas
+CREATE OR REPLACE VIEW historico_partidas AS
+SELECT 
+    p.id_partida,
+    j.id_jogo,
+    p.numero_partida,
+    p.data_inicio,
+    p.data_fim,
+    u_primeiro.nome_usuario as primeiro_jogador,
+    u_vencedor.nome_usuario as vencedor,
+    p.tipo_vitoria,
+    p.pontos_vencedor,
+    p.status,
+    COUNT(jog.id_jogada) as total_jogadas,
+    CASE 
+        WHEN p.status = 'finalizada' THEN 
+            EXTRACT(EPOCH FROM (p.data_fim - p.data_inicio)) / 60
+        ELSE 
+            EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - p.data_inicio)) / 60
+    END as duracao_minutos
+FROM partidas p
+JOIN jogos j ON p.id_jogo = j.id_jogo
+LEFT JOIN usuarios u_primeiro ON p.primeiro_jogador = u_primeiro.id_usuario
+LEFT JOIN usuarios u_vencedor ON p.vencedor_partida = u_vencedor.id_usuario
+LEFT JOIN jogadas jog ON p.id_partida = jog.id_partida
+GROUP BY p.id_partida, j.id_jogo, p.numero_partida, p.data_inicio, p.data_fim,
+         u_primeiro.nome_usuario, u_vencedor.nome_usuario, p.tipo_vitoria, 
+         p.pontos_vencedor, p.status
+ORDER BY p.data_inicio DESC;
+
+-- View: Estado atual da mesa de jogo (lido de estado_partida, sem agregações)
+CREATE OR REPLACE VIEW estado_mesa_atual AS
 SELECT 
-    ROW_NUMBER() OVER (ORDER BY pontos_totais DESC, taxa_vitoria_pct DESC) as posicao,
-    nome_usuario,
-    nome_completo,
-    total_jogos,
-    pontos_totais,
-    media_pontos,
-    jogos_vencidos,
-    taxa_vitoria_pct
-FROM v_estatisticas_usuarios
-WHERE total_jogos > 0
-ORDER BY pontos_totais DESC, taxa_vitoria_pct DESC;
+    p.id_partida,
+    p.id_jogo,
+    p.numero_partida,
+    p.status as status_partida,
+    e.extremidade_a as extremidade_esquerda,
+    e.extremidade_b as extremidade_direita,
+    e.pecas_mesa::BIGINT as pecas_jogadas_mesa,
+    e.ultimo_jogador,
+    u_ultimo.nome_usuario as nome_ultimo_jogador,
+    pd_ultima.lado_a as ultimo_lado_a,
+    pd_ultima.lado_b as ultimo_lado_b,
+    e.ultima_jogada as timestamp_ultima_jogada,
+    e.jogador_atual,
+    u_atual.nome_usuario as nome_jogador_atual,
+    e.pecas_monte,
+    e.jogadores,
+    e.pecas_mao
+FROM partidas p
+JOIN estado_partida e ON p.id_partida = e.id_partida
+LEFT JOIN usuarios u_ultimo ON e.ultimo_jogador = u_ultimo.id_usuario
+LEFT JOIN usuarios u_atual ON e.jogador_atual = u_atual.id_usuario
+LEFT JOIN pecas_domino pd_ultima ON e.ultima_peca = pd_ultima.id_peca
+WHERE p.status = 'em_andamento'
+ORDER BY p.data_inicio DESC;
+
+-- View: Estatísticas de jogadores por partida
+CREATE OR REPLACE VIEW estatisticas_jogadores_partida AS
+SELECT 
+    p.id_partida,
+    p.numero_partida,
+    pj.id_usuario,
+    u.nome_usuario,
+    COUNT(pp.id_peca) as pecas_na_mao,
+    COALESCE(SUM(pd.valor_total), 0) as pontos_na_mao,
+    COUNT(jog.id_jogada) as total_jogadas_feitas,
+    COUNT(CASE WHEN jog.tipo_jogada = 'passou' THEN 1 END) as vezes_passou,
+    COUNT(CASE WHEN jog.tipo_jogada = 'comprou_monte' THEN 1 END) as vezes_comprou_monte,
+    COALESCE(SUM(jog.pecas_compradas), 0) as total_pecas_compradas
+FROM partidas p
+JOIN participantes_jogo pj ON p.id_jogo = pj.id_jogo
+JOIN usuarios u ON pj.id_usuario = u.id_usuario
+LEFT JOIN pecas_partida pp ON p.id_partida = pp.id_partida 
+    AND pj.id_usuario = pp.id_usuario AND pp.status = 'na_mao'
+LEFT JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
+LEFT JOIN jogadas jog ON p.id_partida = jog.id_partida 
+    AND pj.id_usuario = jog.id_usuario
+GROUP BY p.id_partida, p.numero_partida, pj.id_usuario, u.nome_usuario
+ORDER BY p.id_partida, pj.posicao_mesa;
 
 -- =====================================================
--- 7. POVOAMENTO COM DADOS INICIAIS
+-- 7. ÍNDICES DE BUSCA (pg_trgm/unaccent)
+-- (origem: sql/08_create_search_indexes.sql)
 -- =====================================================
 
--- Inserir usuários iniciais
-INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash) VALUES
-('admin', 'Administrator', 'admin@capivara.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.2.'),
-('joao', 'João Silva', 'joao@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.3.'),
-('maria', 'Maria Santos', 'maria@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.4.'),
-('pedro', 'Pedro Oliveira', 'pedro@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.5.'),
-('ana', 'Ana Costa', 'ana@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.6.'),
-('carlos', 'Carlos Mendes', 'carlos@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj0kJFlV0.7.');
-
--- Inserir jogos de exemplo
-INSERT INTO jogos (numero_jogadores, data_inicio, status, pontos_meta) VALUES
-(2, CURRENT_TIMESTAMP - INTERVAL '2 days', 'finalizado', 50),
-(3, CURRENT_TIMESTAMP - INTERVAL '1 day', 'finalizado', 50),
-(4, CURRENT_TIMESTAMP - INTERVAL '5 hours', 'em_andamento', 50),
-(2, CURRENT_TIMESTAMP - INTERVAL '1 hour', 'em_andamento', 30);
-
--- Inserir participantes nos jogos
--- Jogo 1 (2 jogadores - finalizado)
-INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontos_acumulados) VALUES
-(1, 1, 1, 45), -- admin perdeu por pouco
-(1, 2, 2, 52); -- joao venceu
-
--- Jogo 2 (3 jogadores - finalizado)  
-INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontos_acumulados) VALUES
-(2, 2, 1, 38), -- joao
-(2, 3, 2, 51), -- maria venceu
-(2, 4, 3, 29); -- pedro
-
--- Jogo 3 (4 jogadores - em andamento)
-INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontos_acumulados) VALUES
-(3, 1, 1, 25), -- admin
-(3, 3, 2, 31), -- maria
-(3, 5, 3, 18), -- ana
-(3, 6, 4, 22); -- carlos
-
--- Jogo 4 (2 jogadores - em andamento)
-INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontos_acumulados) VALUES
-(4, 4, 1, 15), -- pedro
-(4, 5, 2, 12); -- ana
-
--- Atualizar vencedores dos jogos finalizados
-UPDATE jogos SET vencedor_id = 2 WHERE id_jogo = 1; -- joao venceu jogo 1
-UPDATE jogos SET vencedor_id = 3, data_fim = CURRENT_TIMESTAMP - INTERVAL '23 hours' WHERE id_jogo = 2; -- maria venceu jogo 2
+-- ============================================
+-- BUSCA DE USUÁRIOS POR TRIGRAMAS - CAPIVARA GAME
+-- ============================================
+
+-- Extensões para similaridade de texto e remoção de acentos
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() não é IMMUTABLE; o wrapper permite usá-lo em índices
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent', $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- Índices GIN de trigramas (LIKE '%termo%', operadores % e <%)
+CREATE INDEX IF NOT EXISTS idx_usuarios_nome_usuario_trgm
+    ON usuarios USING gin (f_unaccent(lower(nome_usuario)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_usuarios_nome_completo_trgm
+    ON usuarios USING gin (f_unaccent(lower(nome_completo)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_usuarios_email_trgm
+    ON usuarios USING gin (lower(email) gin_trgm_ops);
 
 -- =====================================================
--- 8. CONSULTAS DE EXEMPLO E TESTES
+-- 8. POVOAMENTO COM DADOS INICIAIS
+-- (origem: sql/07_populate_data.sql)
 -- =====================================================
 
--- Verificar estrutura criada
-SELECT 'Tabelas criadas:' as info;
-SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;
+-- ============================================
+-- POVOAMENTO INICIAL - CAPIVARA GAME
+-- ============================================
 
-SELECT 'Usuários cadastrados:' as info;
-SELECT COUNT(*) as total_usuarios FROM usuarios;
+-- Inserir todas as peças do dominó (0-0 até 6-6)
+INSERT INTO pecas_domino (lado_a, lado_b) VALUES
+    (0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6),
+    (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6),
+    (2, 2), (2, 3), (2, 4), (2, 5), (2, 6),
+    (3, 3), (3, 4), (3, 5), (3, 6),
+    (4, 4), (4, 5), (4, 6),
+    (5, 5), (5, 6),
+    (6, 6);
 
-SELECT 'Jogos criados:' as info; 
-SELECT COUNT(*) as total_jogos FROM jogos;
-
-SELECT 'Participações registradas:' as info;
-SELECT COUNT(*) as total_participacoes FROM participantes_jogo;
+-- Inserir usuários de exemplo
+INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash) VALUES
+    ('player1', 'João Silva', 'joao.silva@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO'),
+    ('player2', 'Maria Santos', 'maria.santos@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO'),
+    ('player3', 'Pedro Oliveira', 'pedro.oliveira@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO'),
+    ('player4', 'Ana Costa', 'ana.costa@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO'),
+    ('player5', 'Carlos Pereira', 'carlos.pereira@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO'),
+    ('player6', 'Luiza Ferreira', 'luiza.ferreira@email.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewGxPPkrjFrX9xOO');
 
--- Exibir ranking
-SELECT 'Ranking atual:' as info;
-SELECT * FROM v_ranking_geral;
+-- Criar alguns jogos de exemplo
 
--- Exibir jogos ativos
-SELECT 'Jogos em andamento:' as info;
-SELECT * FROM v_detalhes_jogos WHERE status = 'em_andamento';
+-- Jogo 1: 2 jogadores (João vs Maria)
+INSERT INTO jogos (numero_jogadores, status) VALUES (2, 'em_andamento');
 
--- =====================================================
--- 9. COMENTÁRIOS FINAIS
--- =====================================================
+INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontuacao_total) VALUES
+    (1, 1, 1, 0),  -- João
+    (1, 2, 2, 0);  -- Maria
 
-/*
-INSTRUÇÕES DE USO:
+-- Jogo 2: 4 jogadores em duplas
+INSERT INTO jogos (numero_jogadores, status) VALUES (4, 'em_andamento');
 
-1. Execute este script completo no PostgreSQL:
-   psql -U postgres -h localhost -p 5433 -f script_completo.sql
+INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, dupla, pontuacao_total) VALUES
+    (2, 3, 1, 1, 0),  -- Pedro (Dupla 1)
+    (2, 4, 2, 2, 0),  -- Ana (Dupla 2)
+    (2, 5, 3, 1, 0),  -- Carlos (Dupla 1)
+    (2, 6, 4, 2, 0);  -- Luiza (Dupla 2)
 
-2. Execute o sistema Python:
-   python capivara_lbd_final.py
+-- Jogo 3: Jogo finalizado para demonstrar histórico
+INSERT INTO jogos (numero_jogadores, status, data_inicio, data_fim, vencedor_jogo) VALUES 
+    (2, 'finalizado', CURRENT_TIMESTAMP - INTERVAL '2 hours', CURRENT_TIMESTAMP - INTERVAL '1 hour', 1);
 
-3. O sistema irá detectar automaticamente o banco criado e funcionar normalmente.
+INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, pontuacao_total) VALUES
+    (3, 1, 1, 52),  -- João (vencedor)
+    (3, 3, 2, 34);  -- Pedro
 
-FUNCIONALIDADES IMPLEMENTADAS:
-- ✅ Criação completa do banco de dados
-- ✅ Tabelas com constraints de integridade  
-- ✅ Índices de performance
-- ✅ Funções e procedimentos úteis
-- ✅ Triggers de validação e auditoria
-- ✅ Views para consultas frequentes
-- ✅ Dados iniciais para demonstração
-- ✅ Consultas de exemplo e verificação
+-- Criar algumas partidas de exemplo no jogo finalizado
+INSERT INTO partidas (id_jogo, numero_partida, primeiro_jogador, vencedor_partida, tipo_vitoria, pontos_vencedor, status, data_inicio, data_fim) VALUES
+    (3, 1, 1, 1, 'batida', 18, 'finalizada', CURRENT_TIMESTAMP - INTERVAL '2 hours', CURRENT_TIMESTAMP - INTERVAL '110 minutes'),
+    (3, 2, 3, 1, 'trancamento', 15, 'finalizada', CURRENT_TIMESTAMP - INTERVAL '105 minutes', CURRENT_TIMESTAMP - INTERVAL '90 minutes'),
+    (3, 3, 1, 1, 'batida', 19, 'finalizada', CURRENT_TIMESTAMP - INTERVAL '85 minutes', CURRENT_TIMESTAMP - INTERVAL '65 minutes');
 
-REQUISITOS:
-- PostgreSQL 12+ 
-- Porta padrão: 5433 (ou ajustar no Python)
-- Usuário: postgres
-- Senha: configurada no sistema 
+-- Verificar integridade dos dados inseridos
+DO $$
+DECLARE
+    v_total_pecas INTEGER;
+    v_total_usuarios INTEGER;
+    v_total_jogos INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO v_total_pecas FROM pecas_domino;
+    SELECT COUNT(*) INTO v_total_usuarios FROM usuarios WHERE ativo = TRUE;
+    SELECT COUNT(*) INTO v_total_jogos FROM jogos;
+    
+    RAISE NOTICE 'Povoamento concluído:';
+    RAISE NOTICE '- % peças de dominó inseridas', v_total_pecas;
+    RAISE NOTICE '- % usuários cadastrados', v_total_usuarios;
+    RAISE NOTICE '- % jogos criados', v_total_jogos;
+    
+    IF v_total_pecas != 28 THEN
+        RAISE EXCEPTION 'Erro: Deveria ter exatamente 28 peças, encontrado %', v_total_pecas;
+    END IF;
+END $$;
 
-SUPORTE:
-- Sistema híbrido: funciona com ou sem PostgreSQL
-- Fallback automático para JSON se PostgreSQL indisponível
-- Log completo de todas operações SQL
-- Documentação completa no código Python
+-- =====================================================
+-- 9. VERIFICAÇÃO
+-- =====================================================
 
-*/
+SELECT 'Tabelas criadas:' AS info;
+SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;
 
-SELECT 'Script executado com sucesso! Banco Capivara Game está pronto para uso.' as status;
\ No newline at end of file
+SELECT 'Ranking atual:' AS info;
+SELECT * FROM ranking_usuarios;
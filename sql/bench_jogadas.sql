@@ -0,0 +1,247 @@
+-- ============================================
+-- BENCHMARK DE JOGADAS - CAPIVARA GAME
+-- ============================================
+-- Simula partidas completas (iniciar_partida, obter_jogadas_possiveis,
+-- executar_jogada, compras e passes, com os triggers de vitória) duas vezes
+-- com a mesma semente, trocando apenas as três funções de jogada possível e
+-- trancamento: verificar_jogada_possivel, detectar_jogo_trancado e
+-- obter_jogadas_possiveis. A primeira execução usa as versões set-based de
+-- 03_create_functions.sql; a segunda, as versões antigas (laço por jogador +
+-- consulta por peça).
+--
+-- Não é uma comparação com o esquema antigo inteiro: executar_jogada, o
+-- trigger de vitória e a tabela estado_partida continuam os atuais nas duas
+-- execuções. A diferença medida é só a dessas três funções.
+-- Tudo roda em uma transação desfeita no final: o banco não é alterado.
+--
+-- Uso (conectado ao banco capivara_game):
+--   psql -d capivara_game -f sql/bench_jogadas.sql
+--   psql -d capivara_game -v jogadores=2 -v partidas=50 -f sql/bench_jogadas.sql
+
+\set ON_ERROR_STOP on
+\if :{?jogadores}
+\else
+    \set jogadores 4
+\endif
+\if :{?partidas}
+\else
+    \set partidas 20
+\endif
+
+BEGIN;
+
+-- Jogadores e jogo de teste
+INSERT INTO usuarios (nome_usuario, nome_completo, email, senha_hash)
+SELECT 'bench_' || txid_current() || '_' || n, 'Benchmark ' || n,
+       'bench_' || txid_current() || '_' || n || '@bench.local', 'bench'
+FROM generate_series(1, :jogadores) AS n;
+
+INSERT INTO jogos (numero_jogadores, pontuacao_meta)
+VALUES (:jogadores, 1000000)
+RETURNING id_jogo AS bench_jogo \gset
+
+INSERT INTO participantes_jogo (id_jogo, id_usuario, posicao_mesa, dupla)
+SELECT :bench_jogo, u.id_usuario, u.posicao,
+       CASE WHEN :jogadores = 4 THEN 2 - u.posicao % 2 END
+FROM (
+    SELECT id_usuario, ROW_NUMBER() OVER (ORDER BY id_usuario) AS posicao
+    FROM usuarios
+    WHERE nome_usuario LIKE 'bench\_' || txid_current() || '\_%'
+) u;
+
+-- Joga p_quantidade partidas até o fim; retorna tempo total e por jogada
+CREATE FUNCTION pg_temp.simular_partidas(
+    p_id_jogo INTEGER,
+    p_primeira INTEGER,
+    p_quantidade INTEGER
+) RETURNS TABLE (
+    total_partidas INTEGER,
+    total_jogadas BIGINT,
+    tempo_ms NUMERIC,
+    us_por_jogada NUMERIC
+) AS $$
+DECLARE
+    v_inicio TIMESTAMPTZ := clock_timestamp();
+    v_id_partida INTEGER;
+    v_jogador INTEGER;
+    v_peca RECORD;
+    v_turnos INTEGER;
+    v_jogadas BIGINT := 0;
+BEGIN
+    FOR v_numero IN p_primeira .. p_primeira + p_quantidade - 1 LOOP
+        SELECT ip.id_partida_criada, ip.primeiro_jogador INTO v_id_partida, v_jogador
+        FROM iniciar_partida(p_id_jogo, v_numero) ip;
+        v_turnos := 0;
+        
+        -- O limite de turnos só protege contra laço infinito
+        WHILE v_turnos < 500 AND
+              (SELECT status FROM partidas WHERE id_partida = v_id_partida) = 'em_andamento' LOOP
+            v_turnos := v_turnos + 1;
+            
+            SELECT j.id_peca, j.pode_jogar_esq INTO v_peca
+            FROM obter_jogadas_possiveis(v_id_partida, v_jogador) j
+            ORDER BY j.id_peca
+            LIMIT 1;
+            
+            IF FOUND THEN
+                PERFORM executar_jogada(v_id_partida, v_jogador, v_peca.id_peca,
+                                        CASE WHEN v_peca.pode_jogar_esq THEN 'esquerda' ELSE 'direita' END);
+                v_jogadas := v_jogadas + 1;
+            ELSIF EXISTS(SELECT 1 FROM pecas_partida
+                         WHERE id_partida = v_id_partida AND status = 'no_monte') THEN
+                -- Compra e tenta de novo na mesma vez
+                PERFORM comprar_peca_monte(v_id_partida, v_jogador);
+                CONTINUE;
+            ELSE
+                PERFORM passar_vez(v_id_partida, v_jogador);
+            END IF;
+            
+            SELECT jogador_atual INTO v_jogador FROM estado_partida WHERE id_partida = v_id_partida;
+        END LOOP;
+    END LOOP;
+    
+    total_partidas := p_quantidade;
+    total_jogadas := v_jogadas;
+    tempo_ms := ROUND(EXTRACT(EPOCH FROM clock_timestamp() - v_inicio)::NUMERIC * 1000, 1);
+    us_por_jogada := ROUND(tempo_ms * 1000 / GREATEST(v_jogadas, 1), 1);
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 1) Três funções atuais (set-based)
+SELECT setseed(0.42);
+SELECT 'tres_funcoes_set_based' AS versao, * FROM pg_temp.simular_partidas(:bench_jogo, 1, :partidas);
+
+-- 2) Versões antigas das três funções, recriadas só dentro desta transação
+-- (o restante do esquema continua o atual)
+-- Função para verificar se uma jogada é possível
+CREATE OR REPLACE FUNCTION verificar_jogada_possivel(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER,
+    p_id_peca INTEGER
+) RETURNS BOOLEAN AS $$
+DECLARE
+    v_lado_a INTEGER;
+    v_lado_b INTEGER;
+    v_extremidade_esq INTEGER;
+    v_extremidade_dir INTEGER;
+    v_tem_peca BOOLEAN;
+BEGIN
+    -- Verificar se o usuário possui a peça
+    SELECT EXISTS(
+        SELECT 1 FROM pecas_partida pp
+        WHERE pp.id_partida = p_id_partida 
+        AND pp.id_usuario = p_id_usuario 
+        AND pp.id_peca = p_id_peca 
+        AND pp.status = 'na_mao'
+    ) INTO v_tem_peca;
+    
+    IF NOT v_tem_peca THEN
+        RETURN FALSE;
+    END IF;
+    
+    -- Obter valores da peça
+    SELECT lado_a, lado_b INTO v_lado_a, v_lado_b
+    FROM pecas_domino WHERE id_peca = p_id_peca;
+    
+    -- Obter extremidades atuais da mesa
+    SELECT extremidade_a, extremidade_b INTO v_extremidade_esq, v_extremidade_dir
+    FROM mesa_jogo 
+    WHERE id_partida = p_id_partida 
+    ORDER BY ordem_jogada DESC 
+    LIMIT 1;
+    
+    -- Se não há peças na mesa, qualquer peça pode ser jogada
+    IF v_extremidade_esq IS NULL THEN
+        RETURN TRUE;
+    END IF;
+    
+    -- Verificar se a peça encaixa em alguma extremidade
+    RETURN (v_lado_a = v_extremidade_esq OR v_lado_b = v_extremidade_esq OR
+            v_lado_a = v_extremidade_dir OR v_lado_b = v_extremidade_dir);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Função para detectar jogo trancado
+CREATE OR REPLACE FUNCTION detectar_jogo_trancado(p_id_partida INTEGER) 
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_usuario RECORD;
+    v_tem_jogada_possivel BOOLEAN := FALSE;
+BEGIN
+    -- Para cada usuário na partida
+    FOR v_usuario IN (
+        SELECT DISTINCT pp.id_usuario
+        FROM pecas_partida pp
+        WHERE pp.id_partida = p_id_partida 
+        AND pp.status = 'na_mao'
+    ) LOOP
+        -- Verificar se tem alguma peça jogável
+        SELECT EXISTS(
+            SELECT 1 FROM pecas_partida pp
+            JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
+            WHERE pp.id_partida = p_id_partida
+            AND pp.id_usuario = v_usuario.id_usuario
+            AND pp.status = 'na_mao'
+            AND verificar_jogada_possivel(p_id_partida, v_usuario.id_usuario, pp.id_peca)
+        ) INTO v_tem_jogada_possivel;
+        
+        IF v_tem_jogada_possivel THEN
+            RETURN FALSE;
+        END IF;
+    END LOOP;
+    
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Função para obter jogadas possíveis de um usuário
+CREATE OR REPLACE FUNCTION obter_jogadas_possiveis(
+    p_id_partida INTEGER,
+    p_id_usuario INTEGER
+) RETURNS TABLE (
+    id_peca INTEGER,
+    lado_a INTEGER,
+    lado_b INTEGER,
+    pode_jogar_esq BOOLEAN,
+    pode_jogar_dir BOOLEAN
+) AS $$
+DECLARE
+    v_extremidade_esq INTEGER;
+    v_extremidade_dir INTEGER;
+BEGIN
+    -- Obter extremidades atuais da mesa
+    SELECT extremidade_a, extremidade_b INTO v_extremidade_esq, v_extremidade_dir
+    FROM mesa_jogo 
+    WHERE id_partida = p_id_partida 
+    ORDER BY ordem_jogada DESC 
+    LIMIT 1;
+    
+    RETURN QUERY
+    SELECT 
+        pp.id_peca,
+        pd.lado_a,
+        pd.lado_b,
+        CASE 
+            WHEN v_extremidade_esq IS NULL THEN TRUE
+            ELSE (pd.lado_a = v_extremidade_esq OR pd.lado_b = v_extremidade_esq)
+        END as pode_jogar_esq,
+        CASE 
+            WHEN v_extremidade_dir IS NULL THEN TRUE
+            ELSE (pd.lado_a = v_extremidade_dir OR pd.lado_b = v_extremidade_dir)
+        END as pode_jogar_dir
+    FROM pecas_partida pp
+    JOIN pecas_domino pd ON pp.id_peca = pd.id_peca
+    WHERE pp.id_partida = p_id_partida
+    AND pp.id_usuario = p_id_usuario
+    AND pp.status = 'na_mao'
+    AND (v_extremidade_esq IS NULL OR 
+         pd.lado_a = v_extremidade_esq OR pd.lado_b = v_extremidade_esq OR
+         pd.lado_a = v_extremidade_dir OR pd.lado_b = v_extremidade_dir);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT setseed(0.42);
+SELECT 'tres_funcoes_antigas' AS versao, * FROM pg_temp.simular_partidas(:bench_jogo, :partidas + 1, :partidas);
+
+ROLLBACK;
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Testes do índice de busca de usuários em memória"""
+
+from capivara_search import EXATO, PREFIXO, UserSearchIndex
+
+
+def usuario(user_id, nome_usuario, nome_completo):
+    return {"id_usuario": user_id, "nome_usuario": nome_usuario,
+            "nome_completo": nome_completo, "email": f"{nome_usuario}@capivara.com"}
+
+
+def test_exato_vence_mais_prefixos_que_o_limite():
+    users = [usuario(i, f"user{i}", f"Ana Souza {i}") for i in range(1, 11)]
+    users.append(usuario(11, "ana", "Fulana de Tal"))
+    index = UserSearchIndex()
+    index.build(users)
+
+    resultados = index.search("ana", 5)
+
+    assert resultados[0][:2] == (11, EXATO)
+    assert [(user_id, tipo) for user_id, tipo, _ in resultados[1:]] == \
+        [(i, PREFIXO) for i in range(1, 5)]
+
+
+def test_exato_por_email_e_sem_acento_apos_add_e_remove():
+    index = UserSearchIndex()
+    index.build([usuario(1, "joao", "João Silva")])
+    index.add(usuario(2, "maria", "Maria João"))
+
+    assert index.search("joao@capivara.com", 5)[0][:2] == (1, EXATO)
+    assert index.search("JOÃO", 5)[0][:2] == (1, EXATO)
+
+    index.remove(1)
+    assert all(tipo != EXATO for _, tipo, _ in index.search("joao", 5))